@@ -1,4 +1,5 @@
 # accounts/authentication.py
+import logging
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
 from django.utils.translation import gettext_lazy as _
@@ -9,12 +10,45 @@ from .models import CustomUser
 
 # --- THÊM IMPORT NÀY ---
 from rest_framework_simplejwt.settings import api_settings as simplejwt_settings
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import DEFERRED
+from .revocation import revocation_registry
+# Đo thời gian xác thực cho RequestTimingMiddleware
+from monitoring.profiling import SPAN_AUTH, profile_span
+
+logger = logging.getLogger(__name__)
+
+# Claim của token (do CustomLoginView thêm) -> trường của CustomUser dựng sẵn ở chế độ không truy vấn DB
+TOKEN_EPOCH_CLAIM = 'epoch'
+STATELESS_USER_CLAIMS = ('email', 'user_type')
+
+
+def user_from_claims(user_id, validated_token):
+    """
+    CustomUser dựng từ claim của token, không truy vấn DB: chỉ có id, mọi trường khác là trường hoãn
+    (deferred) và được nạp từ DB khi view truy cập lần đầu. Claim (email, user_type) nằm riêng trong
+    `token_claims` (is_admin/is_regular_user đọc từ đây): không gán vào trường của model để save()
+    không ghi đè DB bằng giá trị cũ trong token.
+    """
+    fields = CustomUser._meta.concrete_fields
+    user = CustomUser.from_db(DEFAULT_DB_ALIAS, [field.attname for field in fields], [user_id if field.primary_key else DEFERRED for field in fields])
+    user.token_claims = {claim: validated_token[claim] for claim in STATELESS_USER_CLAIMS}
+    return user
+
 
 class CustomJWTAuthentication(JWTAuthentication):
     """
     Lớp xác thực JWT tùy chỉnh để tìm kiếm trong model CustomUser.
+    JWT_STATELESS_AUTH=True: tin claim đã ký, chỉ kiểm tra danh sách thu hồi trong bộ nhớ
+    (accounts/revocation.py) thay vì truy vấn CustomUser ở mỗi request.
+    Token có claim 'epoch' nhỏ hơn CustomUser.token_epoch (đã đổi mật khẩu/loại tài khoản) bị từ chối ở cả hai chế độ.
     """
 
+    def authenticate(self, request):
+        with profile_span(SPAN_AUTH):
+            return super().authenticate(request)
+
     def get_user(self, validated_token):
         """
         Ghi đè phương thức này để tìm kiếm trong bảng CustomUser.
@@ -31,18 +65,26 @@ class CustomJWTAuthentication(JWTAuthentication):
         except KeyError:
             raise InvalidToken(_("Token không chứa định danh người dùng hợp lệ"))
 
+        token_epoch = validated_token.get(TOKEN_EPOCH_CLAIM, 0)
+        if getattr(settings, 'JWT_STATELESS_AUTH', False) and all(claim in validated_token for claim in STATELESS_USER_CLAIMS):
+            if not revocation_registry.is_valid(int(user_id), token_epoch):
+                raise AuthenticationFailed(_("Token đã bị thu hồi."), code="token_revoked")
+            return user_from_claims(user_id, validated_token)
+
         # Tìm kiếm trực tiếp trong model CustomUser của bạn bằng ID lấy được
         try:
             user = CustomUser.objects.get(**{user_id_field: user_id}) # Sử dụng biến vừa lấy
         except CustomUser.DoesNotExist:
             raise AuthenticationFailed(_("User not found"), code="user_not_found")
-        except Exception as e:
-            print(f"CustomJWTAuthentication: Error fetching CustomUser with id {user_id}: {e}")
+        except Exception:
+            logger.exception("CustomJWTAuthentication: Error fetching CustomUser with id %s.", user_id)
             raise AuthenticationFailed(_("Lỗi khi truy vấn người dùng."), code="user_query_error")
 
         # Kiểm tra user có active không
         if not user.is_active:
             raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if token_epoch < user.token_epoch:
+            raise AuthenticationFailed(_("Token đã bị thu hồi."), code="token_revoked")
 
         # Trả về đối tượng CustomUser đã tìm thấy
         return user
\ No newline at end of file
@@ -0,0 +1,38 @@
+# accounts/filters.py
+from datetime import timedelta
+
+import django_filters
+
+from results.filters import day_start
+from .models import CustomUser
+
+
+class AdminUserFilter(django_filters.FilterSet):
+    """
+    Lọc danh sách user cho Admin:
+    ?user_type=REGULAR&is_active=true&created_from=2025-01-01&created_to=2025-01-31&email=nguyen
+    """
+    user_type = django_filters.ChoiceFilter(choices=CustomUser.USER_TYPE_CHOICES, label='Loại tài khoản')
+    is_active = django_filters.BooleanFilter(label='Đang hoạt động')
+    # Khoảng ngày tạo, chuyển thành khoảng timestamp để dùng được index của created_at
+    created_from = django_filters.DateFilter(method='filter_created_from', label='Tạo từ ngày (YYYY-MM-DD)')
+    created_to = django_filters.DateFilter(method='filter_created_to', label='Tạo đến ngày (YYYY-MM-DD)')
+    email = django_filters.CharFilter(method='filter_email_prefix', label='Email bắt đầu bằng')
+
+    class Meta:
+        model = CustomUser
+        fields = ['user_type', 'is_active', 'created_from', 'created_to', 'email']
+
+    def filter_created_from(self, queryset, name, value):
+        return queryset.filter(created_at__gte=day_start(value))
+
+    def filter_created_to(self, queryset, name, value):
+        return queryset.filter(created_at__lt=day_start(value + timedelta(days=1)))
+
+    def filter_email_prefix(self, queryset, name, value):
+        """
+        Tìm theo tiền tố (không phân biệt hoa thường): LIKE 'abc%' dùng được unique index của email
+        (collation *_ci của MySQL đã không phân biệt hoa thường), khác với icontains ('%abc%').
+        """
+        value = value.strip()
+        return queryset.filter(email__istartswith=value) if value else queryset
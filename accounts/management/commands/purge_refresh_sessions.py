@@ -0,0 +1,12 @@
+# accounts/management/commands/purge_refresh_sessions.py
+from django.core.management.base import BaseCommand
+
+from accounts.refresh import purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = "Xóa các phiên refresh token đã hết hạn (bảng accounts_refreshsession). Nên chạy định kỳ (cron)."
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_sessions()
+        self.stdout.write(self.style.SUCCESS(f"Đã xóa {deleted} phiên hết hạn."))
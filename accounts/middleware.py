@@ -6,7 +6,9 @@ from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 # from django.contrib.auth import get_user_model # <<< KHÔNG DÙNG get_user_model nữa
 from .models import CustomUser # <<< IMPORT TRỰC TIẾP CustomUser
 from urllib.parse import parse_qs
-import traceback 
+import logging
+
+logger = logging.getLogger(__name__)
 
 # User = get_user_model() # <<< Bỏ dòng này
 
@@ -17,12 +19,12 @@ def get_user_from_token(token_key):
     QUAN TRỌNG: Sử dụng trực tiếp CustomUser model.
     """
     if not token_key:
-        print("WebSocket Auth (get_user_from_token): No token key provided.")
+        logger.debug("WebSocket Auth (get_user_from_token): No token key provided.")
         return AnonymousUser()
     try:
         token = AccessToken(token_key)
         payload = token.payload 
-        print(f"WebSocket Auth (get_user_from_token): Token Payload: {payload}")
+        logger.debug("WebSocket Auth (get_user_from_token): Token Payload: %s", payload)
 
         # Vẫn lấy user ID dựa trên cấu hình SIMPLE_JWT['USER_ID_CLAIM']
         # Trong settings.py của bạn là 'admin_user_id'
@@ -33,31 +35,28 @@ def get_user_from_token(token_key):
             # Thử lại với 'user_id' mặc định nếu claim chính không có
             user_id_from_payload = payload.get('user_id') 
             if user_id_from_payload is None:
-                print(f"WebSocket Auth (get_user_from_token): Neither '{user_id_claim_name}' nor 'user_id' found.")
+                logger.warning("WebSocket Auth (get_user_from_token): Neither '%s' nor 'user_id' found.", user_id_claim_name)
                 return AnonymousUser()
         
-        print(f"WebSocket Auth (get_user_from_token): Attempting to fetch CustomUser with ID: {user_id_from_payload}")
+        logger.debug("WebSocket Auth (get_user_from_token): Attempting to fetch CustomUser with ID: %s", user_id_from_payload)
         # --- SỬA Ở ĐÂY: Dùng trực tiếp CustomUser ---
         user = CustomUser.objects.get(id=user_id_from_payload) 
-        print(f"WebSocket Auth (get_user_from_token): CustomUser {user.email} authenticated.")
+        logger.debug("WebSocket Auth (get_user_from_token): CustomUser %s authenticated.", user.email)
         return user
         # -------------------------------------------
     # ... (Các khối except giữ nguyên, nhưng thay User.DoesNotExist nếu có) ...
     except CustomUser.DoesNotExist: # <<< Sửa except nếu bạn có dùng User.DoesNotExist
         actual_id_used = user_id_from_payload if 'user_id_from_payload' in locals() and user_id_from_payload is not None else "ID_NOT_EXTRACTED"
-        print(f"WebSocket Auth (get_user_from_token): CustomUser with ID {actual_id_used} does not exist.")
+        logger.warning("WebSocket Auth (get_user_from_token): CustomUser with ID %s does not exist.", actual_id_used)
         return AnonymousUser()
     except InvalidToken: # Các except khác giữ nguyên
-        print(f"WebSocket Auth (get_user_from_token): Invalid token (InvalidToken exception): {token_key[:20]}...")
-        traceback.print_exc()
+        logger.warning("WebSocket Auth (get_user_from_token): Invalid token (InvalidToken exception): %s...", token_key[:20], exc_info=True)
         return AnonymousUser()
     except TokenError as e:
-        print(f"WebSocket Auth (get_user_from_token): Token error (TokenError exception): {e} for token: {token_key[:20]}...")
-        traceback.print_exc()
+        logger.warning("WebSocket Auth (get_user_from_token): Token error (TokenError exception): %s for token: %s...", e, token_key[:20])
         return AnonymousUser()
     except Exception as e:
-        print(f"WebSocket Auth (get_user_from_token): An unexpected error occurred: {e}")
-        traceback.print_exc()
+        logger.exception("WebSocket Auth (get_user_from_token): An unexpected error occurred: %s", e)
         return AnonymousUser()
 
 class TokenAuthMiddleware:
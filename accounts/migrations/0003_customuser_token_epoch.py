@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_admin_user_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='token_epoch',
+            field=models.PositiveIntegerField(default=0, verbose_name='Thế hệ token'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-19 12:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_customuser_token_epoch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefreshSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token_hash', models.CharField(max_length=64, unique=True, verbose_name='SHA-256 của token')),
+                ('family', models.CharField(db_index=True, max_length=32, verbose_name='Chuỗi phiên')),
+                ('token_epoch', models.PositiveIntegerField(default=0, verbose_name='Thế hệ token')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Hết hạn lúc')),
+                ('used_at', models.DateTimeField(blank=True, null=True, verbose_name='Đã gia hạn lúc')),
+                ('revoked_at', models.DateTimeField(blank=True, null=True, verbose_name='Thu hồi lúc')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='refresh_sessions', to='accounts.customuser', verbose_name='Người dùng')),
+            ],
+            options={
+                'verbose_name': 'Phiên refresh token',
+                'verbose_name_plural': 'Phiên refresh token',
+                'db_table': 'accounts_refreshsession',
+            },
+        ),
+    ]
@@ -12,6 +12,8 @@ class CustomUser(models.Model):
     last_name = models.CharField(max_length=150, blank=True, verbose_name="Họ")
     user_type = models.CharField(max_length=10, choices=USER_TYPE_CHOICES, default='REGULAR', verbose_name="Loại tài khoản")
     is_active = models.BooleanField(default=True, verbose_name="Đang hoạt động")
+    # Tăng khi đổi mật khẩu/đổi loại tài khoản: token có claim 'epoch' nhỏ hơn bị thu hồi (accounts/revocation.py)
+    token_epoch = models.PositiveIntegerField(default=0, verbose_name="Thế hệ token")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -20,18 +22,63 @@ class CustomUser(models.Model):
         verbose_name = "Tài khoản Người dùng"
         verbose_name_plural = "Tài khoản Người dùng"
         ordering = ['email']
+        indexes = [
+            # Danh sách user cho Admin (accounts/filters.py): lọc theo loại/trạng thái và khoảng ngày tạo
+            models.Index(fields=['user_type', 'is_active'], name='user_type_active_idx'),
+            models.Index(fields=['created_at'], name='user_created_at_idx'),
+        ]
 
     def __str__(self):
         return f"{self.email} ({self.get_user_type_display()})"
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # User dựng từ claim của token (accounts/authentication.py) hoãn mọi trường khác:
+        # lần đầu truy cập một trường hoãn thì nạp luôn cả dòng (một query thay vì một query mỗi trường)
+        deferred_fields = self.get_deferred_fields()
+        if fields is not None and deferred_fields and set(fields) <= deferred_fields:
+            fields = deferred_fields
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
     
+    def claim_or_field(self, name):
+        """Giá trị từ claim của token khi trường chưa được nạp (user dựng từ token), ngược lại là giá trị của trường."""
+        claims = getattr(self, 'token_claims', None)
+        if claims and name in claims and name in self.get_deferred_fields():
+            return claims[name]
+        return getattr(self, name)
+
     # ----- THÊM CÁC THUỘC TÍNH PROPERTY VÀO ĐÂY -----
     @property
     def is_admin(self):
         """Kiểm tra xem user có phải là Admin không."""
-        return self.user_type == 'ADMIN'
+        return self.claim_or_field('user_type') == 'ADMIN'
 
     @property
     def is_regular_user(self):
         """Kiểm tra xem user có phải là User thường không."""
-        return self.user_type == 'REGULAR'
-    # -----------------------------------------------
\ No newline at end of file
+        return self.claim_or_field('user_type') == 'REGULAR'
+    # -----------------------------------------------
+
+
+class RefreshSession(models.Model):
+    """
+    Một refresh token (accounts/refresh.py). Chỉ lưu SHA-256 của token; gia hạn phiên = một lần tra
+    theo unique index token_hash thay vì băm Argon2 lại mật khẩu. Mỗi lần gia hạn token cũ bị đánh dấu
+    đã dùng và token mới cùng `family` được cấp; token đã dùng bị dùng lại -> thu hồi cả family.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='refresh_sessions', verbose_name="Người dùng")
+    token_hash = models.CharField(max_length=64, unique=True, verbose_name="SHA-256 của token")
+    family = models.CharField(max_length=32, db_index=True, verbose_name="Chuỗi phiên")
+    # CustomUser.token_epoch lúc cấp: đổi mật khẩu/loại tài khoản làm mọi phiên cũ hết hiệu lực
+    token_epoch = models.PositiveIntegerField(default=0, verbose_name="Thế hệ token")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Hết hạn lúc")
+    used_at = models.DateTimeField(null=True, blank=True, verbose_name="Đã gia hạn lúc")
+    revoked_at = models.DateTimeField(null=True, blank=True, verbose_name="Thu hồi lúc")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'accounts_refreshsession'
+        verbose_name = "Phiên refresh token"
+        verbose_name_plural = "Phiên refresh token"
+
+    def __str__(self):
+        return f"{self.user_id}/{self.family}"
@@ -1,4 +1,7 @@
 # accounts/permissions.py
+import hmac
+
+from django.conf import settings
 from rest_framework import permissions
 from .models import CustomUser 
 
@@ -31,5 +34,10 @@ class IsRegularUserType(permissions.BasePermission):
         # Kiểm tra is_regular_user property
         return hasattr(request.user, 'is_regular_user') and request.user.is_regular_user
 
-# --- (Tùy chọn) Tạo permission HasRPiAPIKey nếu bạn làm bảo mật RPi ---
-# class HasRPiAPIKey(permissions.BasePermission): ...
\ No newline at end of file
+class HasRPiAPIKey(permissions.BasePermission):
+    """Request của RPi phải gửi header X-RPi-Key khớp RPI_API_KEY (để trống = từ chối mọi request)."""
+    message = "Yêu cầu khóa API của RPi."
+    def has_permission(self, request, view):
+        expected = getattr(settings, 'RPI_API_KEY', '')
+        provided = request.headers.get('X-RPi-Key', '')
+        return bool(expected) and hmac.compare_digest(provided.encode('utf-8'), expected.encode('utf-8'))
\ No newline at end of file
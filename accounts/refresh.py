@@ -0,0 +1,89 @@
+# accounts/refresh.py
+"""
+Refresh token dạng chuỗi ngẫu nhiên (không phải JWT), lưu trong bảng accounts_refreshsession.
+
+- Đăng nhập (Argon2, tốn CPU) cấp access token + refresh token.
+- POST /api/accounts/token/refresh/ {"refresh": ...}: một lần tra theo unique index của SHA-256 token
+  (khóa dòng), đánh dấu token đã dùng và cấp cặp token mới (rotation).
+- Token đã dùng/thu hồi bị gửi lại (bị lộ và đã được ai đó dùng) -> thu hồi toàn bộ chuỗi (family).
+- Phiên hết hạn được xóa bằng `python manage.py purge_refresh_sessions` (chạy định kỳ).
+"""
+import hashlib
+import logging
+import secrets
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import RefreshSession
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshTokenError(Exception):
+    """Refresh token không hợp lệ, hết hạn, bị thu hồi hoặc bị dùng lại."""
+
+
+def hash_token(raw_token):
+    return hashlib.sha256(raw_token.encode('utf-8')).hexdigest()
+
+
+def issue_refresh_token(user, family=None):
+    """Tạo phiên mới cho `user` (tiếp nối `family` nếu đang gia hạn). Trả về token gốc (chỉ trả cho client)."""
+    raw_token = secrets.token_urlsafe(32)
+    RefreshSession.objects.create(
+        user=user,
+        token_hash=hash_token(raw_token),
+        family=family or uuid.uuid4().hex,
+        token_epoch=user.token_epoch,
+        expires_at=timezone.now() + timedelta(days=getattr(settings, 'REFRESH_TOKEN_LIFETIME_DAYS', 14)),
+    )
+    return raw_token
+
+
+def revoke_family(family, now=None):
+    return RefreshSession.objects.filter(family=family, revoked_at__isnull=True).update(revoked_at=now or timezone.now())
+
+
+def rotate_refresh_token(raw_token):
+    """Đổi refresh token lấy (user, refresh token mới). Raise RefreshTokenError nếu không hợp lệ."""
+    now = timezone.now()
+    reused_family = None
+    with transaction.atomic():
+        session = (
+            RefreshSession.objects.select_for_update().select_related('user')
+            .filter(token_hash=hash_token(raw_token or '')).first()
+        )
+        if session is None:
+            raise RefreshTokenError("Refresh token không hợp lệ.")
+        user = session.user
+        if session.used_at is not None or session.revoked_at is not None:
+            reused_family = session.family
+            revoke_family(session.family, now)
+        elif session.expires_at <= now or not user.is_active or session.token_epoch < user.token_epoch:
+            raise RefreshTokenError("Phiên đăng nhập đã hết hạn.")
+        else:
+            session.used_at = now
+            session.save(update_fields=['used_at'])
+            return user, issue_refresh_token(user, family=session.family)
+    # Raise ngoài atomic() để việc thu hồi family được commit
+    logger.warning("rotate_refresh_token: Reused refresh token for user %s, family %s revoked.", user.pk, reused_family)
+    raise RefreshTokenError("Refresh token đã được sử dụng.")
+
+
+def revoke_refresh_token(raw_token):
+    """Đăng xuất: thu hồi chuỗi phiên của token. Trả về True nếu token tồn tại."""
+    family = RefreshSession.objects.filter(token_hash=hash_token(raw_token or '')).values_list('family', flat=True).first()
+    if family is None:
+        return False
+    revoke_family(family)
+    return True
+
+
+def purge_expired_sessions():
+    """Xóa các phiên đã hết hạn. Trả về số dòng đã xóa."""
+    deleted, _ = RefreshSession.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
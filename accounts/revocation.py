@@ -0,0 +1,159 @@
+# accounts/revocation.py
+"""
+Danh sách thu hồi token trong bộ nhớ cho chế độ xác thực không truy vấn DB (JWT_STATELESS_AUTH).
+
+Token đã ký chứa sẵn admin_user_id, user_type, email và 'epoch' (CustomUser.token_epoch lúc đăng nhập).
+Token chỉ còn hiệu lực khi:
+- user còn tồn tại và đang hoạt động: bitmap theo user ID (1 bit/user, ~12 KB cho 100.000 user);
+- claim 'epoch' >= token_epoch hiện tại của user (đổi mật khẩu/đổi loại tài khoản tăng token_epoch).
+
+Cập nhật:
+- Toàn bộ được nạp lại mỗi JWT_REVOCATION_REFRESH_SECONDS giây (một query lấy id, is_active, token_epoch),
+  để thấy thay đổi từ process khác. Chỉ một thread nạp lại, các request khác vẫn đọc bản cũ trong lúc đó
+  (chỉ lần nạp đầu tiên các request phải chờ).
+- Trong process hiện tại, thay đổi được áp dụng ngay qua accounts.signals.users_changed.
+- User có ID lớn hơn mọi ID đã nạp (đăng ký sau lần nạp gần nhất) được tra riêng khi gặp lần đầu;
+  ID tra không thấy (user đã bị xóa) được nhớ đến lần nạp lại sau để không query lại mỗi request.
+- User thay đổi trong lúc đang nạp lại được tra lại sau khi thay bản mới, để bản quét cũ không đè lên.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.dispatch import receiver
+
+from .models import CustomUser
+from .signals import users_changed
+
+
+class RevocationRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock() # Chỉ một thread quét bảng user tại một thời điểm
+        self._active = bytearray() # Bit user_id = 1: user tồn tại và đang hoạt động
+        self._epochs = {} # user_id -> token_epoch (chỉ các user có token_epoch > 0)
+        self._max_id = 0
+        self._missing = set() # ID lớn hơn _max_id đã tra nhưng không có trong DB
+        self._reloads_in_progress = 0
+        self._changed_during_reload = set()
+        self._loaded_at = None
+
+    @staticmethod
+    def _set_bit(bitmap, user_id, value):
+        index, mask = user_id >> 3, 1 << (user_id & 7)
+        if index >= len(bitmap):
+            if not value:
+                return # Bit ngoài bitmap đã là 0
+            bitmap.extend(bytes(index + 1 - len(bitmap)))
+        if value:
+            bitmap[index] |= mask
+        else:
+            bitmap[index] &= ~mask & 0xFF
+
+    def reload(self):
+        """Nạp lại toàn bộ trạng thái từ DB (dựng bản mới rồi thay một lần, request khác vẫn đọc bản cũ)."""
+        with self._reload_lock:
+            self._reload()
+
+    def _reload(self):
+        with self._lock:
+            self._reloads_in_progress += 1
+        try:
+            active, epochs, max_id = self._scan()
+            with self._lock:
+                self._active, self._epochs, self._max_id = active, epochs, max_id
+                self._missing = set()
+                self._loaded_at = time.monotonic()
+                changed = set(self._changed_during_reload)
+        finally:
+            with self._lock:
+                self._reloads_in_progress -= 1
+                if not self._reloads_in_progress:
+                    self._changed_during_reload = set()
+        if changed:
+            # Bản quét có thể đã đọc trạng thái cũ của các user này
+            self.refresh_users(changed)
+
+    def _scan(self):
+        active = bytearray()
+        epochs = {}
+        max_id = 0
+        rows = CustomUser.objects.order_by().values_list('id', 'is_active', 'token_epoch')
+        for user_id, is_active, epoch in rows.iterator(chunk_size=5000):
+            if is_active:
+                self._set_bit(active, user_id, True)
+            if epoch:
+                epochs[user_id] = epoch
+            max_id = max(max_id, user_id)
+        return active, epochs, max_id
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    def refresh_users(self, user_ids):
+        """Tra lại trạng thái một số user (user không còn trong DB -> thu hồi mọi token)."""
+        user_ids = set(user_ids)
+        rows = {user_id: (is_active, epoch) for user_id, is_active, epoch in
+                CustomUser.objects.filter(pk__in=user_ids).values_list('id', 'is_active', 'token_epoch')}
+        with self._lock:
+            if self._reloads_in_progress:
+                self._changed_during_reload.update(user_ids)
+            for user_id in user_ids:
+                is_active, epoch = rows.get(user_id, (False, 0))
+                self._set_bit(self._active, user_id, is_active)
+                if epoch:
+                    self._epochs[user_id] = epoch
+                else:
+                    self._epochs.pop(user_id, None)
+                if user_id in rows:
+                    self._max_id = max(self._max_id, user_id)
+                    self._missing.discard(user_id)
+                elif user_id > self._max_id:
+                    self._missing.add(user_id)
+
+    def _is_stale(self):
+        loaded_at = self._loaded_at
+        interval = getattr(settings, 'JWT_REVOCATION_REFRESH_SECONDS', 60.0)
+        return loaded_at is None or time.monotonic() - loaded_at >= interval
+
+    def _ensure_fresh(self):
+        if not self._is_stale():
+            return
+        if self._loaded_at is None:
+            # Chưa có bản nào để đọc: chờ thread đang nạp (nếu có) rồi kiểm tra lại
+            with self._reload_lock:
+                if self._is_stale():
+                    self._reload()
+        elif self._reload_lock.acquire(blocking=False):
+            # Bản cũ hết hạn: một thread nạp lại, các thread khác không chờ mà dùng bản cũ
+            try:
+                if self._is_stale():
+                    self._reload()
+            finally:
+                self._reload_lock.release()
+
+    def is_valid(self, user_id, epoch=0):
+        """Token của `user_id` mang claim epoch `epoch` còn hiệu lực không."""
+        self._ensure_fresh()
+        if user_id > self._max_id and user_id not in self._missing:
+            self.refresh_users([user_id])
+        index = user_id >> 3
+        if index >= len(self._active) or not self._active[index] & (1 << (user_id & 7)):
+            return False
+        return epoch >= self._epochs.get(user_id, 0)
+
+    def clear(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+# Dùng chung trong process
+revocation_registry = RevocationRegistry()
+
+
+@receiver(users_changed, dispatch_uid='accounts_revocation_users_changed')
+def _on_users_changed(sender, user_ids, **kwargs):
+    if revocation_registry.loaded: # Chưa nạp thì lần kiểm tra đầu tiên sẽ nạp toàn bộ
+        revocation_registry.refresh_users(user_ids)
@@ -1,4 +1,6 @@
 # accounts/serializers.py
+import logging
+from django.conf import settings
 from rest_framework import serializers
 from .models import CustomUser
 from argon2 import PasswordHasher
@@ -7,6 +9,8 @@ from argon2.exceptions import VerifyMismatchError
 # Khởi tạo PasswordHasher một lần để tái sử dụng
 ph = PasswordHasher()
 
+logger = logging.getLogger(__name__)
+
 class UserSerializer(serializers.ModelSerializer):
     """
     Serializer để hiển thị thông tin người dùng (không hiển thị password hash).
@@ -132,9 +136,8 @@ class ChangePasswordSerializer(serializers.Serializer):
                  raise serializers.ValidationError("Mật khẩu cũ không chính xác.")
         except VerifyMismatchError:
              raise serializers.ValidationError("Mật khẩu cũ không chính xác.")
-        except Exception as e:
-             # Log lỗi nếu cần
-             print(f"Error verifying old password: {e}")
+        except Exception:
+             logger.exception("ChangePasswordSerializer: Error verifying old password for user %s.", user.id)
              raise serializers.ValidationError("Lỗi khi kiểm tra mật khẩu cũ.")
         return value
 
@@ -163,8 +166,9 @@ class ChangePasswordSerializer(serializers.Serializer):
             # Như trên, không nên xảy ra
             raise serializers.ValidationError("Người dùng không tồn tại.")
 
-        # Hash mật khẩu mới
+        # Hash mật khẩu mới; tăng token_epoch để thu hồi các token đã cấp trước đó
         current_user.password_hash = ph.hash(password)
+        current_user.token_epoch += 1
         current_user.save()
         return current_user
     
@@ -192,7 +196,6 @@ class AdminUserManagementSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'email') # Email không cho sửa
 
     def create(self, validated_data):
-        print("DEBUG: AdminUserManagementSerializer - Bắt đầu create")
         if 'password' not in validated_data:
             raise serializers.ValidationError({'password': 'Mật khẩu là bắt buộc khi tạo người dùng mới.'})
         
@@ -206,23 +209,45 @@ class AdminUserManagementSerializer(serializers.ModelSerializer):
         # Hash mật khẩu - Đảm bảo 'ph' đã được khởi tạo thành công
         try:
              validated_data['password_hash'] = ph.hash(raw_password)
-        except Exception as hash_error:
-             print(f"ERROR: Không thể hash mật khẩu: {hash_error}")
+        except Exception:
+             logger.exception("AdminUserManagementSerializer: Could not hash password.")
              raise serializers.ValidationError("Lỗi hệ thống khi xử lý mật khẩu.")
 
-        print(f"DEBUG: AdminUserManagementSerializer - Dữ liệu tạo user (trước create): {validated_data}")
         user = CustomUser.objects.create(**validated_data)
-        print(f"DEBUG: AdminUserManagementSerializer - User đã tạo: {user.id}")
+        logger.debug("AdminUserManagementSerializer: Created user %s (type %s).", user.id, user.user_type)
         return user
 
     def update(self, instance, validated_data):
-        print(f"DEBUG: AdminUserManagementSerializer - Bắt đầu update user {instance.id}")
         validated_data.pop('password', None) # Không cho update password
 
         instance.first_name = validated_data.get('first_name', instance.first_name)
         instance.last_name = validated_data.get('last_name', instance.last_name)
-        instance.user_type = validated_data.get('user_type', instance.user_type)
+        if validated_data.get('user_type', instance.user_type) != instance.user_type:
+            # Claim user_type trong các token cũ không còn đúng -> thu hồi
+            instance.user_type = validated_data['user_type']
+            instance.token_epoch += 1
         instance.is_active = validated_data.get('is_active', instance.is_active)
-        instance.save(update_fields=['first_name', 'last_name', 'user_type', 'is_active', 'updated_at'])
-        print(f"DEBUG: AdminUserManagementSerializer - User đã update: {instance.id}")
+        instance.save(update_fields=['first_name', 'last_name', 'user_type', 'is_active', 'token_epoch', 'updated_at'])
+        logger.debug("AdminUserManagementSerializer: Updated user %s.", instance.id)
         return instance
+
+
+class AdminUserBulkActionSerializer(serializers.Serializer):
+    """Thao tác hàng loạt của Admin: {"action": "activate|deactivate|delete", "ids": [1, 2, ...]}."""
+    ACTION_ACTIVATE = 'activate'
+    ACTION_DEACTIVATE = 'deactivate'
+    ACTION_DELETE = 'delete'
+
+    action = serializers.ChoiceField(choices=[ACTION_ACTIVATE, ACTION_DEACTIVATE, ACTION_DELETE], label="Thao tác")
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, label="Danh sách ID user")
+
+    def validate_ids(self, value):
+        max_ids = getattr(settings, 'ADMIN_USER_BULK_MAX_IDS', 1000)
+        if len(value) > max_ids:
+            raise serializers.ValidationError(f"Tối đa {max_ids} user mỗi lần.")
+        return list(dict.fromkeys(value))
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    """Refresh token để gia hạn phiên hoặc đăng xuất (accounts/refresh.py)."""
+    refresh = serializers.CharField(required=True, max_length=128, label="Refresh token")
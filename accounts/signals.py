@@ -0,0 +1,49 @@
+# accounts/signals.py
+"""
+Signal `users_changed`: phát SAU KHI transaction commit khi Admin sửa/vô hiệu hóa/xóa tài khoản
+(AdminUserViewSet), kể cả thao tác hàng loạt chạy bằng một câu UPDATE/DELETE (không có post_save
+cho từng user). Các cache theo user (ví dụ notifications/acl.py) nhận signal này để bỏ entry của các user đó.
+
+Tham số: user_ids (list ID), action (một trong các hằng ACTION_*).
+
+Trong khi xóa tài khoản (`deleting_users()`), `user_deletion_in_progress()` là True: các signal
+xóa từng upload (kéo theo CASCADE) bỏ qua việc cập nhật dữ liệu gắn với user, vì dữ liệu đó cũng bị xóa theo.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.dispatch import Signal
+
+from .models import CustomUser
+
+ACTION_SAVED = 'saved'
+ACTION_ACTIVATED = 'activated'
+ACTION_DEACTIVATED = 'deactivated'
+ACTION_DELETED = 'deleted'
+
+users_changed = Signal()
+
+_user_deletion_running = ContextVar('accounts_user_deletion_running', default=False)
+
+
+def user_deletion_in_progress():
+    """True khi đang xóa tài khoản (upload của user bị xóa theo CASCADE)."""
+    return _user_deletion_running.get()
+
+
+@contextmanager
+def deleting_users():
+    token = _user_deletion_running.set(True)
+    try:
+        yield
+    finally:
+        _user_deletion_running.reset(token)
+
+
+def notify_users_changed(user_ids, action):
+    """Phát users_changed sau khi transaction hiện tại commit (ngay lập tức nếu không trong transaction)."""
+    user_ids = list(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: users_changed.send(sender=CustomUser, user_ids=user_ids, action=action))
+
@@ -1,11 +1,28 @@
 # accounts/tests.py
-from django.test import TestCase
+import threading
+from datetime import timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.db import IntegrityError # Để kiểm tra lỗi unique constraint
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory, APITestCase
 from rest_framework.exceptions import ValidationError # Để kiểm tra lỗi validation của DRF
 
 # Import các thành phần cần test từ app accounts
-from .models import CustomUser
+from .models import CustomUser, RefreshSession
 from .serializers import UserSerializer, RegisterSerializer, LoginSerializer
+from .signals import users_changed
+from .authentication import CustomJWTAuthentication
+from .revocation import RevocationRegistry, revocation_registry
+from .refresh import hash_token, purge_expired_sessions
+from stats.models import UserSummary
+from uploads.models import UserUpload
 
 # Import thư viện hash mật khẩu
 from argon2 import PasswordHasher
@@ -215,4 +232,287 @@ class LoginSerializerTest(TestCase):
         data = {'email': 'not-an-email', 'password': 'password123'}
         serializer = LoginSerializer(data=data)
         self.assertFalse(serializer.is_valid())
-        self.assertIn('email', serializer.errors)
\ No newline at end of file
+        self.assertIn('email', serializer.errors)
+
+
+# --- Test cho API quản lý user của Admin ---
+class AdminUserViewSetTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create(email='root@example.com', password_hash=ph.hash('adminpass'), user_type='ADMIN')
+        cls.users = [
+            CustomUser.objects.create(email=f'Field{n}@example.com', password_hash='x', is_active=n % 2 == 0)
+            for n in range(5)
+        ]
+        CustomUser.objects.filter(pk=cls.users[0].pk).update(created_at=timezone.now() - timedelta(days=30))
+        cls.list_url = reverse('accounts:admin-user-list')
+        cls.bulk_url = reverse('accounts:admin-user-bulk')
+
+    def setUp(self):
+        response = self.client.post(reverse('accounts:user_login'), {'email': 'root@example.com', 'password': 'adminpass'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.events = []
+        handler = lambda sender, **kwargs: self.events.append((kwargs['action'], kwargs['user_ids']))
+        users_changed.connect(handler, weak=False, dispatch_uid='accounts_test_users_changed')
+        self.addCleanup(users_changed.disconnect, dispatch_uid='accounts_test_users_changed')
+
+    def test_cursor_pagination_walks_all_users(self):
+        """Theo `next` đi hết danh sách, mỗi user đúng một lần, user mới nhất trước."""
+        seen = []
+        url = self.list_url + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen += [user['id'] for user in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, sorted(CustomUser.objects.values_list('id', flat=True), reverse=True))
+
+    def test_filters(self):
+        """Lọc theo loại, trạng thái, khoảng ngày tạo và tiền tố email (không phân biệt hoa thường)."""
+        def emails(**params):
+            return {user['email'] for user in self.client.get(self.list_url, params).data['results']}
+        self.assertEqual(emails(user_type='ADMIN'), {'root@example.com'})
+        self.assertEqual(emails(is_active='false'), {'Field1@example.com', 'Field3@example.com'})
+        self.assertEqual(emails(email='field'), {f'Field{n}@example.com' for n in range(5)})
+        self.assertEqual(emails(email='FIELD3'), {'Field3@example.com'})
+        old_day = (timezone.now() - timedelta(days=30)).date()
+        self.assertEqual(emails(created_to=old_day.isoformat()), {'Field0@example.com'})
+        self.assertNotIn('Field0@example.com', emails(created_from=(old_day + timedelta(days=1)).isoformat()))
+
+    def test_bulk_activate_and_deactivate_single_update(self):
+        ids = [user.pk for user in self.users[:4]]
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(4): # Xác thực, SAVEPOINT, một UPDATE, RELEASE
+                response = self.client.post(self.bulk_url, {'action': 'deactivate', 'ids': ids}, format='json')
+        self.assertEqual(response.data, {'action': 'deactivate', 'affected': 2}) # Field0, Field2
+        self.assertFalse(CustomUser.objects.filter(pk__in=ids, is_active=True).exists())
+        self.assertEqual(self.events, [('deactivated', ids)])
+        response = self.client.post(self.bulk_url, {'action': 'activate', 'ids': ids}, format='json')
+        self.assertEqual(response.data['affected'], 4)
+
+    def test_bulk_delete(self):
+        ids = [self.users[1].pk, self.users[2].pk, 999999]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.bulk_url, {'action': 'delete', 'ids': ids}, format='json')
+        self.assertEqual(response.data['affected'], 2)
+        self.assertFalse(CustomUser.objects.filter(pk__in=ids).exists())
+        self.assertEqual(self.events, [('deleted', ids)])
+
+    def test_bulk_delete_queries_do_not_grow_with_uploads(self):
+        """Xóa user không cập nhật UserSummary theo từng upload; summary bị xóa theo user."""
+        def delete_with_uploads(user, upload_count):
+            for n in range(upload_count):
+                UserUpload.objects.create(uploaded_by=user, file=SimpleUploadedFile(f'bulk_{user.pk}_{n}.jpg', b'x', 'image/jpeg'))
+            self.assertTrue(UserSummary.objects.filter(user_id=user.pk).exists())
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.bulk_url, {'action': 'delete', 'ids': [user.pk]}, format='json')
+            self.assertEqual(response.data['affected'], 1)
+            self.assertFalse(UserSummary.objects.filter(user_id=user.pk).exists())
+            return len(queries)
+
+        self.assertEqual(delete_with_uploads(self.users[1], 1), delete_with_uploads(self.users[2], 4))
+
+    def test_bulk_rejects_own_account_and_invalid_payload(self):
+        response = self.client.post(self.bulk_url, {'action': 'delete', 'ids': [self.admin.pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(CustomUser.objects.filter(pk=self.admin.pk).exists())
+        self.assertEqual(self.client.post(self.bulk_url, {'action': 'ban', 'ids': [1]}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(self.bulk_url, {'action': 'activate', 'ids': []}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_single_update_notifies(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('accounts:admin-user-detail', kwargs={'pk': self.users[0].pk}), {'is_active': False}, format='json')
+        self.assertEqual(self.events, [('saved', [self.users[0].pk])])
+
+
+# --- Test cho xác thực JWT không truy vấn DB ---
+@override_settings(JWT_STATELESS_AUTH=True, JWT_REVOCATION_REFRESH_SECONDS=3600)
+class StatelessAuthTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create(email='stateless_admin@example.com', password_hash=ph.hash('adminpass'), user_type='ADMIN')
+        cls.user = CustomUser.objects.create(email='stateless@example.com', password_hash=ph.hash('oldpassword'), first_name='An')
+
+    def setUp(self):
+        revocation_registry.clear()
+        self.addCleanup(revocation_registry.clear)
+
+    def _token(self, email, password):
+        return self.client.post(reverse('accounts:user_login'), {'email': email, 'password': password}, format='json').data['access']
+
+    def _authenticate(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return CustomJWTAuthentication().authenticate(request)[0]
+
+    def test_claims_trusted_without_query_and_row_loaded_lazily(self):
+        token = self._token('stateless@example.com', 'oldpassword')
+        self._authenticate(token) # Nạp danh sách thu hồi
+        with self.assertNumQueries(0):
+            user = self._authenticate(token)
+            self.assertEqual((user.pk, user.token_claims['email'], user.is_regular_user), (self.user.pk, 'stateless@example.com', True))
+        with self.assertNumQueries(1): # Cả dòng được nạp khi cần trường khác
+            self.assertEqual((user.first_name, user.last_name, user.email), ('An', '', 'stateless@example.com'))
+            self.assertIsNotNone(user.created_at)
+
+    def test_stale_token_profile_update_keeps_db_values(self):
+        """PATCH profile bằng token cũ không ghi claim cũ (user_type, token_epoch) đè lên DB."""
+        token = self._token('stateless_admin@example.com', 'adminpass')
+        self._authenticate(token) # Nạp danh sách thu hồi
+        # Process khác hạ quyền admin; danh sách thu hồi của process này chưa nạp lại
+        CustomUser.objects.filter(pk=self.admin.pk).update(user_type='REGULAR', token_epoch=5)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.patch(reverse('accounts:user_profile'), {'first_name': 'Binh'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user_type'], 'REGULAR')
+        self.admin.refresh_from_db()
+        self.assertEqual((self.admin.first_name, self.admin.user_type, self.admin.token_epoch), ('Binh', 'REGULAR', 5))
+
+    def test_deactivated_user_rejected_immediately(self):
+        token = self._token('stateless@example.com', 'oldpassword')
+        self._authenticate(token)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self._token('stateless_admin@example.com', 'adminpass')}")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('accounts:admin-user-bulk'), {'action': 'deactivate', 'ids': [self.user.pk]}, format='json')
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate(token)
+
+    def test_password_change_revokes_old_tokens(self):
+        """Đổi mật khẩu thu hồi token cũ (cả hai chế độ); phiên hiện tại nhận token mới."""
+        for stateless in (True, False):
+            with self.subTest(stateless=stateless), self.settings(JWT_STATELESS_AUTH=stateless):
+                old_password, new_password = ('oldpassword', 'newpassword') if stateless else ('newpassword', 'oldpassword')
+                token = self._token('stateless@example.com', old_password)
+                self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.put(reverse('accounts:change_password'), {
+                        'old_password': old_password, 'new_password1': new_password, 'new_password2': new_password,
+                    }, format='json')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(self.client.get(reverse('accounts:user_profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+                self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+                self.assertEqual(self.client.get(reverse('accounts:user_profile')).data['first_name'], 'An')
+
+    def test_changes_from_other_process_seen_after_reload(self):
+        token = self._token('stateless@example.com', 'oldpassword')
+        self._authenticate(token)
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False) # Không có signal trong process này
+        self._authenticate(token)
+        revocation_registry.reload()
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate(token)
+
+    def test_user_created_after_load_is_accepted(self):
+        self._authenticate(self._token('stateless@example.com', 'oldpassword'))
+        CustomUser.objects.create(email='new@example.com', password_hash=ph.hash('newuserpass'))
+        self.assertEqual(self._authenticate(self._token('new@example.com', 'newuserpass')).email, 'new@example.com')
+
+
+    def test_change_during_reload_not_overwritten(self):
+        """Thay đổi áp dụng trong lúc đang nạp lại không bị bản quét cũ ghi đè."""
+        user_pk = self.user.pk
+
+        class RacingRegistry(RevocationRegistry):
+            def _scan(self):
+                snapshot = super()._scan()
+                # Admin vô hiệu hóa user sau khi bản quét đã đọc xong
+                CustomUser.objects.filter(pk=user_pk).update(is_active=False)
+                self.refresh_users([user_pk])
+                return snapshot
+
+        registry = RacingRegistry()
+        registry.reload()
+        self.assertFalse(registry.is_valid(user_pk))
+
+    @override_settings(JWT_REVOCATION_REFRESH_SECONDS=0)
+    def test_expired_registry_is_reloaded_by_one_thread(self):
+        """Khi hết hạn chỉ một thread quét lại; thread khác dùng bản cũ, không chờ và không truy vấn DB."""
+        scan_started = threading.Event()
+        finish_scan = threading.Event()
+
+        class BlockingRegistry(RevocationRegistry):
+            scans = 0
+
+            def _scan(self):
+                self.scans += 1
+                if self.scans > 1:
+                    scan_started.set()
+                    finish_scan.wait(timeout=5)
+                active = bytearray()
+                self._set_bit(active, 5, True)
+                return active, {}, 5
+
+        registry = BlockingRegistry()
+        registry.reload()
+        reloading_thread = threading.Thread(target=registry.is_valid, args=(5,))
+        reloading_thread.start()
+        self.addCleanup(reloading_thread.join, 5)
+        self.addCleanup(finish_scan.set)
+        self.assertTrue(scan_started.wait(timeout=5))
+        with self.assertNumQueries(0):
+            self.assertTrue(registry.is_valid(5))
+        self.assertEqual(registry.scans, 2)
+
+    def test_missing_user_lookup_is_cached(self):
+        """ID lớn hơn mọi ID đã nạp nhưng không tồn tại chỉ bị tra DB một lần."""
+        revocation_registry.reload()
+        missing_id = CustomUser.objects.order_by('-pk').first().pk + 1000
+        with self.assertNumQueries(1):
+            self.assertFalse(revocation_registry.is_valid(missing_id))
+            self.assertFalse(revocation_registry.is_valid(missing_id))
+
+# --- Test cho refresh token ---
+class RefreshTokenTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(email='refresh@example.com', password_hash=ph.hash('refreshpass'))
+        cls.refresh_url = reverse('accounts:token_refresh')
+
+    def _login(self):
+        response = self.client.post(reverse('accounts:user_login'), {'email': 'refresh@example.com', 'password': 'refreshpass'}, format='json')
+        return response.data['refresh']
+
+    def _refresh(self, token):
+        return self.client.post(self.refresh_url, {'refresh': token}, format='json')
+
+    def test_rotation_without_password_hash(self):
+        """Gia hạn: token mới khác token cũ, access token dùng được, chỉ lưu SHA-256 của token."""
+        token = self._login()
+        self.assertTrue(RefreshSession.objects.filter(token_hash=hash_token(token)).exists())
+        response = self._refresh(token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['refresh'], token)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get(reverse('accounts:user_profile')).status_code, status.HTTP_200_OK)
+        self.assertEqual(self._refresh(response.data['refresh']).status_code, status.HTTP_200_OK)
+
+    def test_reuse_revokes_family(self):
+        """Dùng lại token đã gia hạn -> 401 và token mới nhất của chuỗi cũng bị thu hồi."""
+        first = self._login()
+        second = self._refresh(first).data['refresh']
+        self.assertEqual(self._refresh(first).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self._refresh(second).status_code, status.HTTP_401_UNAUTHORIZED)
+        other_login = self._login() # Phiên đăng nhập khác không bị ảnh hưởng
+        self.assertEqual(self._refresh(other_login).status_code, status.HTTP_200_OK)
+
+    def test_expired_inactive_and_epoch_rejected(self):
+        token = self._login()
+        RefreshSession.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self._refresh(token).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(purge_expired_sessions(), 1)
+
+        token = self._login()
+        CustomUser.objects.filter(pk=self.user.pk).update(token_epoch=5) # Đã đổi mật khẩu
+        self.assertEqual(self._refresh(token).status_code, status.HTTP_401_UNAUTHORIZED)
+        token = self._login()
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self._refresh(token).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self._refresh('khong-ton-tai').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_revokes(self):
+        token = self._login()
+        self.assertEqual(self.client.post(reverse('accounts:user_logout'), {'refresh': token}, format='json').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self._refresh(token).status_code, status.HTTP_401_UNAUTHORIZED)
@@ -16,6 +16,8 @@ urlpatterns = [
     # URLs cho người dùng tự phục vụ
     path('register/', views.RegisterView.as_view(), name='user_register'),
     path('login/', views.CustomLoginView.as_view(), name='user_login'),
+    path('token/refresh/', views.TokenRefreshView.as_view(), name='token_refresh'),
+    path('logout/', views.LogoutView.as_view(), name='user_logout'),
     path('profile/', views.UserProfileView.as_view(), name='user_profile'),
     path('password/change/', views.ChangePasswordView.as_view(), name='change_password'),
 
@@ -1,6 +1,14 @@
 # accounts/views.py
+import logging
+from django.conf import settings
+from django.db import transaction
 from django.http import Http404
+from django.utils import timezone
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, permissions, status, viewsets # <<< THÊM viewsets
+from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 # Import token của SimpleJWT để tạo thủ công
@@ -16,16 +24,33 @@ from .serializers import (
     UserSerializer,
     LoginSerializer,
     ChangePasswordSerializer,
-    AdminUserManagementSerializer
+    AdminUserManagementSerializer,
+    AdminUserBulkActionSerializer,
+    RefreshTokenSerializer
 )
+from .refresh import RefreshTokenError, issue_refresh_token, revoke_refresh_token, rotate_refresh_token
+from .filters import AdminUserFilter
+from .signals import ACTION_ACTIVATED, ACTION_DEACTIVATED, ACTION_DELETED, ACTION_SAVED, deleting_users, notify_users_changed
 
 # Import Argon2
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
 
+logger = logging.getLogger(__name__)
+
 # Khởi tạo PasswordHasher
 ph = PasswordHasher()
 
+def issue_access_token(user):
+    """Access token kèm các claim mà xác thực không truy vấn DB dùng (accounts/authentication.py)."""
+    access_token = AccessToken.for_user(user)
+    # Thêm các claim tùy chỉnh vào token payload
+    access_token['user_type'] = user.user_type
+    access_token['email'] = user.email
+    access_token['epoch'] = user.token_epoch # Token bị thu hồi khi token_epoch tăng (accounts/revocation.py)
+    return str(access_token)
+
+
 # --- View Đăng Ký ---
 class RegisterView(generics.CreateAPIView):
     """
@@ -70,23 +95,56 @@ class CustomLoginView(APIView):
                 user.save(update_fields=['password_hash', 'updated_at'])
         except VerifyMismatchError:
             return Response({"detail": "Email hoặc mật khẩu không đúng."}, status=status.HTTP_401_UNAUTHORIZED)
-        except Exception as e:
-            print(f"Password verification error for {email}: {e}")
+        except Exception:
+            logger.exception("CustomLoginView: Password verification error for user %s.", user.id)
             return Response({"detail": "Lỗi trong quá trình xác thực."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        access_token = AccessToken.for_user(user)
-        # Thêm các claim tùy chỉnh vào token payload
-        access_token['user_type'] = user.user_type
-        access_token['email'] = user.email
-
         data = {
-            'access': str(access_token),
+            'access': issue_access_token(user),
+            'refresh': issue_refresh_token(user), # Gia hạn qua /api/accounts/token/refresh/ thay vì đăng nhập lại
             # Có thể trả về thêm thông tin user nếu muốn
             # 'user': UserSerializer(user).data 
         }
         return Response(data, status=status.HTTP_200_OK)
 
 
+# --- View Gia hạn phiên và Đăng xuất ---
+class TokenRefreshView(APIView):
+    """
+    API endpoint đổi refresh token lấy cặp access/refresh token mới (refresh token cũ hết hiệu lực).
+    POST: /api/accounts/token/refresh/ {"refresh": "..."}
+    Không yêu cầu access token (access token có thể đã hết hạn).
+    """
+    permission_classes = (AllowAny,)
+    authentication_classes = ()
+    serializer_class = RefreshTokenSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            user, refresh_token = rotate_refresh_token(serializer.validated_data['refresh'])
+        except RefreshTokenError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response({'access': issue_access_token(user), 'refresh': refresh_token}, status=status.HTTP_200_OK)
+
+
+class LogoutView(APIView):
+    """
+    API endpoint thu hồi refresh token (và các token gia hạn từ cùng lần đăng nhập).
+    POST: /api/accounts/logout/ {"refresh": "..."}
+    """
+    permission_classes = (AllowAny,)
+    authentication_classes = ()
+    serializer_class = RefreshTokenSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        revoke_refresh_token(serializer.validated_data['refresh'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 # --- View Xem và Cập nhật Profile ---
 class UserProfileView(generics.RetrieveUpdateAPIView):
     """
@@ -105,7 +163,7 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
              # Trường hợp này không nên xảy ra nếu IsAuthenticatedCustom hoạt động đúng
              # và CustomJWTAuthentication trả về CustomUser
             user_from_token = getattr(self.request, 'user', None)
-            print(f"WARNING in UserProfileView: request.user is not a valid CustomUser. Type: {type(user_from_token)}")
+            logger.warning("UserProfileView: request.user is not a valid CustomUser. Type: %s", type(user_from_token))
             # Cố gắng lấy lại user từ DB nếu chỉ có ID
             if user_from_token and hasattr(user_from_token, 'id'):
                  try:
@@ -132,7 +190,7 @@ class ChangePasswordView(generics.UpdateAPIView):
         # Tương tự UserProfileView, đảm bảo trả về CustomUser
         if not (hasattr(self.request, 'user') and isinstance(self.request.user, CustomUser)):
             user_from_token = getattr(self.request, 'user', None)
-            print(f"WARNING in ChangePasswordView: request.user is not a valid CustomUser. Type: {type(user_from_token)}")
+            logger.warning("ChangePasswordView: request.user is not a valid CustomUser. Type: %s", type(user_from_token))
             if user_from_token and hasattr(user_from_token, 'id'):
                  try:
                      return CustomUser.objects.get(pk=user_from_token.id)
@@ -151,30 +209,91 @@ class ChangePasswordView(generics.UpdateAPIView):
         serializer = self.get_serializer(data=request.data) 
 
         if serializer.is_valid(raise_exception=True):
-            serializer.save() # Logic lưu và hash mật khẩu mới nằm trong serializer
-            return Response({"detail": "Đổi mật khẩu thành công."}, status=status.HTTP_200_OK)
+            user = serializer.save() # Logic lưu và hash mật khẩu mới nằm trong serializer
+            notify_users_changed([user.pk], ACTION_SAVED)
+            # Token và refresh token hiện tại đã bị thu hồi (token_epoch tăng): trả cặp token mới cho phiên này
+            return Response({
+                "detail": "Đổi mật khẩu thành công.",
+                "access": issue_access_token(user),
+                "refresh": issue_refresh_token(user),
+            }, status=status.HTTP_200_OK)
         # Không cần trả về lỗi 400 ở đây nếu raise_exception=True
 
 # ---- THÊM VIEWSET MỚI CHO ADMIN QUẢN LÝ USER ----
+class AdminUserPagination(CursorPagination):
+    """
+    Phân trang theo cursor (?cursor=...): mỗi trang là một truy vấn WHERE id < ? LIMIT n theo index,
+    không phải OFFSET/COUNT(*) trên toàn bảng như phân trang theo số trang.
+    """
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_page_size(self, request):
+        self.page_size = getattr(settings, 'ADMIN_USER_PAGE_SIZE', 50)
+        return super().get_page_size(request)
+
+
 class AdminUserViewSet(viewsets.ModelViewSet):
     """
     API endpoint cho phép Admin quản lý người dùng.
-    - GET /api/accounts/admin/users/: Lấy danh sách tất cả user.
+    - GET /api/accounts/admin/users/: Danh sách user, phân trang theo cursor ({"next", "previous", "results"}).
+      Lọc: ?user_type=, ?is_active=, ?created_from=, ?created_to=, ?email= (tiền tố, accounts/filters.py).
+      Sắp xếp: ?ordering=email|-created_at|... (mặc định user mới nhất trước).
     - POST /api/accounts/admin/users/: Tạo user mới.
     - GET /api/accounts/admin/users/{id}/: Lấy chi tiết user cụ thể.
     - PUT /api/accounts/admin/users/{id}/: Cập nhật toàn bộ user (trừ password, email).
     - PATCH /api/accounts/admin/users/{id}/: Cập nhật một phần user (trừ password, email).
     - DELETE /api/accounts/admin/users/{id}/: Xóa user.
+    - POST /api/accounts/admin/users/bulk/: Kích hoạt/vô hiệu hóa/xóa nhiều user bằng một câu lệnh SQL.
+    Sửa/xóa user phát accounts.signals.users_changed để các cache theo user bỏ entry cũ.
     """
-    queryset = CustomUser.objects.all().order_by('id')
+    queryset = CustomUser.objects.all().order_by('-id')
     serializer_class = AdminUserManagementSerializer
     permission_classes = [IsAdminUserType] # Chỉ Admin mới có quyền truy cập ViewSet này
+    pagination_class = AdminUserPagination
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_class = AdminUserFilter
+    ordering_fields = ['id', 'email', 'created_at']
+    ordering = ['-id']
 
-    # Có thể thêm phân trang
-    # from rest_framework.pagination import PageNumberPagination
-    # pagination_class = PageNumberPagination
-    # pagination_class.page_size = 10
+    # perform_update chỉ bổ sung thông báo users_changed,
+    # logic lưu đã được xử lý trong AdminUserManagementSerializer.
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        notify_users_changed([serializer.instance.pk], ACTION_SAVED)
+
+    def perform_destroy(self, instance):
+        user_id = instance.pk
+        with deleting_users():
+            super().perform_destroy(instance)
+        notify_users_changed([user_id], ACTION_DELETED)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        {"action": "activate|deactivate|delete", "ids": [...]} -> {"action", "affected": số user thay đổi}.
+        Admin không thể vô hiệu hóa/xóa chính mình. ID không tồn tại được bỏ qua.
+        """
+        serializer = AdminUserBulkActionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        bulk_action = serializer.validated_data['action']
+        user_ids = serializer.validated_data['ids']
+        if bulk_action != AdminUserBulkActionSerializer.ACTION_ACTIVATE and request.user.pk in user_ids:
+            return Response({"ids": ["Không thể vô hiệu hóa hoặc xóa tài khoản đang đăng nhập."]}, status=status.HTTP_400_BAD_REQUEST)
 
-    # perform_create và perform_update không cần ghi đè ở đây
-    # vì logic đã được xử lý trong AdminUserManagementSerializer.
+        users = CustomUser.objects.filter(pk__in=user_ids)
+        with transaction.atomic():
+            if bulk_action == AdminUserBulkActionSerializer.ACTION_DELETE:
+                # Upload và UserSummary của các user bị xóa theo (CASCADE), theo lô thay vì từng user;
+                # summary không bị cập nhật lại cho từng upload (stats/signals.py)
+                with deleting_users():
+                    affected = users.delete()[1].get(CustomUser._meta.label, 0)
+                signal_action = ACTION_DELETED
+            else:
+                is_active = bulk_action == AdminUserBulkActionSerializer.ACTION_ACTIVATE
+                affected = users.exclude(is_active=is_active).update(is_active=is_active, updated_at=timezone.now())
+                signal_action = ACTION_ACTIVATED if is_active else ACTION_DEACTIVATED
+            notify_users_changed(user_ids, signal_action)
+        return Response({"action": bulk_action, "affected": affected}, status=status.HTTP_200_OK)
 # --------------------------------------------------
\ No newline at end of file
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class InsectLibraryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'insect_library'
+
+    def ready(self):
+        from . import signals # Đăng ký signal cập nhật chỉ mục tìm kiếm
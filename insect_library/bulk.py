@@ -0,0 +1,214 @@
+# insect_library/bulk.py
+"""
+Nhập/xuất hàng loạt thư viện côn trùng (CSV hoặc NDJSON, mỗi dòng một côn trùng).
+
+Nhập (POST /api/library/insects/import/, python manage.py import_insect_library):
+1. Đọc file theo dòng (không nạp toàn bộ vào bộ nhớ) và kiểm tra MỌI dòng trong một lượt;
+   có lỗi -> không ghi gì, trả về danh sách lỗi kèm số dòng.
+2. Đọc lại file và upsert theo `name` từng lô INSECT_IMPORT_BATCH_SIZE dòng bằng
+   bulk_create(update_conflicts=True), mỗi lô một transaction. bulk_create không phát signal nên
+   mỗi lô tự cập nhật search_document, chỉ mục ngược và phiên bản thư viện (cache).
+Xuất (GET /api/library/insects/export/): StreamingHttpResponse đọc DB theo từng phần.
+"""
+import csv
+import io
+import json
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .cache import mark_library_changed
+from .models import InsectReference
+from .search import build_search_document, index_insects
+
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+FORMATS = (FORMAT_CSV, FORMAT_NDJSON)
+CONTENT_TYPES = {
+    FORMAT_CSV: 'text/csv; charset=utf-8',
+    FORMAT_NDJSON: 'application/x-ndjson; charset=utf-8',
+}
+
+# Các cột nhập/xuất (name là khóa upsert)
+LIBRARY_FIELDS = ('name', 'scientific_name', 'description', 'habitat', 'host_plants', 'treatment', 'active_season')
+UPDATE_FIELDS = [field for field in LIBRARY_FIELDS if field != 'name'] + ['search_document', 'updated_at']
+# Số lỗi tối đa trả về (vẫn đếm toàn bộ lỗi)
+MAX_REPORTED_ERRORS = 100
+EXPORT_CHUNK_SIZE = 500
+
+
+class LibraryImportError(Exception):
+    """File nhập có lỗi; `errors` = [{"line", "field", "message"}], `error_count` = tổng số lỗi."""
+
+    def __init__(self, errors, error_count):
+        super().__init__(f"{error_count} lỗi trong file nhập.")
+        self.errors = errors
+        self.error_count = error_count
+
+
+def detect_format(file_name='', requested=None):
+    """Định dạng từ tham số (nếu có) hoặc phần mở rộng file; None nếu không xác định được."""
+    if requested:
+        return requested if requested in FORMATS else None
+    extension = file_name.rsplit('.', 1)[-1].lower() if '.' in file_name else ''
+    if extension in ('ndjson', 'jsonl'):
+        return FORMAT_NDJSON
+    if extension == 'csv':
+        return FORMAT_CSV
+    return None
+
+
+# --- Đọc file ---
+def _iter_records(text, file_format):
+    """(số dòng, dict dữ liệu hoặc None, thông báo lỗi) cho từng bản ghi."""
+    if file_format == FORMAT_CSV:
+        reader = csv.DictReader(text)
+        if 'name' not in (reader.fieldnames or []):
+            yield 1, None, "Thiếu cột 'name'."
+            return
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"JSON không hợp lệ: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "Mỗi dòng phải là một object JSON."
+            continue
+        yield line_number, record, None
+
+
+def _field_limits():
+    return {field: InsectReference._meta.get_field(field).max_length for field in LIBRARY_FIELDS}
+
+
+def clean_record(record, limits):
+    """(giá trị đã chuẩn hóa, [(trường, thông báo lỗi)])."""
+    values = {}
+    errors = []
+    for field in LIBRARY_FIELDS:
+        value = record.get(field)
+        if value is not None and not isinstance(value, str):
+            errors.append((field, "Phải là chuỗi."))
+            continue
+        value = (value or '').strip() or None
+        if value is not None and limits[field] and len(value) > limits[field]:
+            errors.append((field, f"Tối đa {limits[field]} ký tự."))
+        values[field] = value
+    if not values.get('name') and not any(field == 'name' for field, _ in errors):
+        errors.append(('name', "Không được để trống."))
+    return values, errors
+
+
+def validate_library_file(text, file_format):
+    """Kiểm tra toàn bộ file trong một lượt đọc. Trả về số bản ghi; raise LibraryImportError nếu có lỗi."""
+    limits = _field_limits()
+    errors = []
+    error_count = 0
+    seen_names = {}
+    count = 0
+
+    def add_error(line, field, message):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'line': line, 'field': field, 'message': message})
+
+    for line, record, read_error in _iter_records(text, file_format):
+        if read_error:
+            add_error(line, None, read_error)
+            continue
+        values, record_errors = clean_record(record, limits)
+        for field, message in record_errors:
+            add_error(line, field, message)
+        name = values.get('name')
+        if name:
+            if name in seen_names:
+                add_error(line, 'name', f"Trùng với dòng {seen_names[name]}.")
+            else:
+                seen_names[name] = line
+        count += 1
+    if error_count:
+        raise LibraryImportError(errors, error_count)
+    return count
+
+
+# --- Ghi DB ---
+def _upsert_batch(batch):
+    """Upsert một lô trong một transaction. Trả về (số tạo mới, số cập nhật)."""
+    names = [insect.name for insect in batch]
+    with transaction.atomic():
+        existing = set(InsectReference.objects.filter(name__in=names).values_list('name', flat=True))
+        options = {'update_conflicts': True, 'update_fields': UPDATE_FIELDS}
+        if connection.features.supports_update_conflicts_with_target:
+            options['unique_fields'] = ['name'] # MySQL không hỗ trợ chỉ định cột (ON DUPLICATE KEY UPDATE)
+        InsectReference.objects.bulk_create(batch, **options)
+        index_insects(InsectReference.objects.filter(name__in=names))
+        mark_library_changed()
+    return len(batch) - len(existing), len(existing)
+
+
+def import_library(fileobj, file_format, batch_size=None):
+    """
+    Kiểm tra rồi upsert file nhập (file nhị phân, đọc được lại từ đầu).
+    Trả về {"created", "updated", "batches"}; raise LibraryImportError nếu file có lỗi.
+    """
+    batch_size = batch_size or getattr(settings, 'INSECT_IMPORT_BATCH_SIZE', 500)
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    try:
+        try:
+            validate_library_file(text, file_format)
+        except UnicodeDecodeError:
+            raise LibraryImportError([{'line': None, 'field': None, 'message': "File phải được mã hóa UTF-8."}], 1)
+        text.seek(0)
+
+        limits = _field_limits()
+        summary = {'created': 0, 'updated': 0, 'batches': 0}
+        batch = []
+
+        def flush():
+            created, updated = _upsert_batch(batch)
+            summary['created'] += created
+            summary['updated'] += updated
+            summary['batches'] += 1
+            batch.clear()
+
+        for _, record, _ in _iter_records(text, file_format):
+            values, _ = clean_record(record, limits)
+            insect = InsectReference(**values)
+            insect.search_document = build_search_document(insect)
+            batch.append(insect)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        return summary
+    finally:
+        text.detach() # Không đóng file gốc (do view/command quản lý)
+
+
+# --- Xuất ---
+class _Echo:
+    """File giả cho csv.writer: trả lại chuỗi vừa ghi thay vì lưu lại."""
+
+    def write(self, value):
+        return value
+
+
+def export_library(file_format):
+    """Sinh nội dung file xuất theo từng dòng (dùng cho StreamingHttpResponse)."""
+    rows = InsectReference.objects.order_by('name').values_list(*LIBRARY_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    if file_format == FORMAT_NDJSON:
+        for row in rows:
+            yield json.dumps(dict(zip(LIBRARY_FIELDS, row)), ensure_ascii=False) + '\n'
+        return
+    writer = csv.writer(_Echo())
+    yield '\ufeff' # BOM để Excel nhận đúng tiếng Việt (import_library bỏ qua BOM)
+    yield writer.writerow(LIBRARY_FIELDS)
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row])
@@ -0,0 +1,161 @@
+# insect_library/cache.py
+"""
+Cache trong process của toàn bộ thư viện côn trùng (ít dòng, chỉ Admin sửa, được đọc rất nhiều).
+
+Một snapshot chứa sẵn JSON (bytes) của danh sách và của từng côn trùng kèm ETag, cùng dict
+{name: dữ liệu} cho API tra cứu hàng loạt và {name: tóm tắt} để làm giàu kết quả xử lý
+(results.serializers, ?enrich=insects). Snapshot gắn với LibraryVersion.token:
+- Tạo/sửa/xóa InsectReference (signals.py) tăng phiên bản trong cùng transaction và xóa snapshot
+  của process hiện tại.
+- Các process khác kiểm tra phiên bản tối đa mỗi INSECT_LIBRARY_CACHE_CHECK_SECONDS giây
+  (một query theo khóa chính) và nạp lại khi phiên bản đổi.
+Snapshot luôn được đọc từ primary (kể cả trong request đọc từ read replica): replica trễ có thể
+trả về phiên bản cũ và làm snapshot dùng chung của process quay lại dữ liệu cũ.
+"""
+import hashlib
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import InsectReference, LibraryVersion
+from .serializers import InsectReferenceSerializer
+
+VERSION_PK = 1
+# Độ dài tối đa (ký tự) của tóm tắt cách xử lý gắn vào kết quả (?enrich=insects)
+TREATMENT_SUMMARY_CHARS = 160
+
+
+def current_version():
+    """(version, token) hiện tại của thư viện."""
+    return LibraryVersion.objects.using(DEFAULT_DB_ALIAS).filter(pk=VERSION_PK).values_list('version', 'token').first() or (0, '')
+
+
+def bump_version():
+    """Tăng phiên bản thư viện; gọi trong transaction của thao tác ghi."""
+    token = uuid.uuid4().hex
+    if not LibraryVersion.objects.filter(pk=VERSION_PK).update(version=F('version') + 1, token=token):
+        LibraryVersion.objects.update_or_create(pk=VERSION_PK, defaults={'version': 1, 'token': token})
+
+
+def mark_library_changed():
+    """Gọi trong transaction của mọi thao tác ghi thư viện (signal, import hàng loạt)."""
+    bump_version()
+    library_cache.invalidate()
+    # Request khác trong process có thể dựng lại snapshot (dữ liệu cũ) trước khi transaction này commit
+    # -> bỏ thêm lần nữa sau commit
+    transaction.on_commit(library_cache.invalidate)
+
+
+def summarize_treatment(text, limit=TREATMENT_SUMMARY_CHARS):
+    """Rút gọn cách xử lý về tối đa `limit` ký tự, cắt ở ranh giới từ."""
+    text = ' '.join((text or '').split())
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(' ', 1)[0].rstrip(' ,.;:') + '…'
+
+
+def reference_summary(item):
+    """Thông tin tham khảo gọn của một côn trùng, gắn vào từng phát hiện trong kết quả."""
+    return {
+        'id': item['id'],
+        'scientific_name': item['scientific_name'],
+        'treatment_summary': summarize_treatment(item['treatment']),
+    }
+
+
+def _etag(blob):
+    return f'"{hashlib.sha256(blob).hexdigest()[:32]}"'
+
+
+class LibrarySnapshot:
+    """JSON dựng sẵn của toàn bộ thư viện tại một phiên bản."""
+
+    def __init__(self, version, token, insects):
+        renderer = JSONRenderer()
+        items = InsectReferenceSerializer(insects, many=True).data
+        self.version = version
+        self.token = token
+        self.items = items
+        self.list_json = renderer.render(items)
+        self.list_etag = _etag(self.list_json)
+        self.items_by_name = {item['name']: item for item in items}
+        self.summaries_by_name = {item['name']: reference_summary(item) for item in items}
+        self.json_by_id = {}
+        for item in items:
+            blob = renderer.render(item)
+            self.json_by_id[item['id']] = (item, blob, _etag(blob))
+
+
+class LibraryCache:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+
+    def snapshot(self):
+        """Snapshot hiện hành, hoặc None nếu cache bị tắt (INSECT_LIBRARY_CACHE_ENABLED)."""
+        if not getattr(settings, 'INSECT_LIBRARY_CACHE_ENABLED', True):
+            return None
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < getattr(settings, 'INSECT_LIBRARY_CACHE_CHECK_SECONDS', 2.0):
+            return snapshot
+        with self._lock:
+            # Đọc phiên bản TRƯỚC dữ liệu: thay đổi xen giữa sẽ làm lần kiểm tra sau nạp lại
+            version, token = current_version()
+            if self._snapshot is None or self._snapshot.token != token:
+                self._snapshot = LibrarySnapshot(version, token, list(InsectReference.objects.using(DEFAULT_DB_ALIAS).order_by('name')))
+            self._checked_at = now
+            return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+
+# Cache dùng chung trong process
+library_cache = LibraryCache()
+
+
+def get_reference_summaries():
+    """
+    {name: thông tin tham khảo gọn} của toàn bộ thư viện: lấy từ snapshot (không query),
+    hoặc một query nếu cache bị tắt.
+    """
+    snapshot = library_cache.snapshot()
+    if snapshot is not None:
+        return snapshot.summaries_by_name
+    rows = InsectReference.objects.values('id', 'name', 'scientific_name', 'treatment')
+    return {row['name']: reference_summary(row) for row in rows}
+
+
+class PrerenderedResponse(Response):
+    """Response với nội dung JSON dựng sẵn (không render lại); .data vẫn là dữ liệu gốc."""
+
+    def __init__(self, data, blob, **kwargs):
+        super().__init__(data, **kwargs)
+        self.blob = blob
+
+    @property
+    def rendered_content(self):
+        self['Content-Type'] = 'application/json'
+        return self.blob
+
+
+def cached_json_response(request, data, blob, etag):
+    """Trả JSON dựng sẵn; 304 nếu client đã có đúng phiên bản (If-None-Match)."""
+    if etag in [value.strip() for value in request.headers.get('If-None-Match', '').split(',')]:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = PrerenderedResponse(data, blob)
+    response['ETag'] = etag
+    # Client phải hỏi lại server (kèm If-None-Match) trước khi dùng bản đã lưu
+    response['Cache-Control'] = 'private, no-cache'
+    return response
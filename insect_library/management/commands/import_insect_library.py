@@ -0,0 +1,28 @@
+# insect_library/management/commands/import_insect_library.py
+from django.core.management.base import BaseCommand, CommandError
+
+from insect_library.bulk import FORMATS, LibraryImportError, detect_format, import_library
+
+
+class Command(BaseCommand):
+    help = "Nhập hàng loạt thư viện côn trùng (upsert theo name) từ file CSV hoặc NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Đường dẫn file .csv/.ndjson")
+        parser.add_argument('--type', choices=FORMATS, help="Định dạng file (mặc định theo phần mở rộng)")
+        parser.add_argument('--batch-size', type=int, default=None, help="Số dòng mỗi lô (mặc định INSECT_IMPORT_BATCH_SIZE)")
+
+    def handle(self, *args, **options):
+        file_format = detect_format(options['path'], options['type'])
+        if file_format is None:
+            raise CommandError(f"Không xác định được định dạng file, dùng --type ({', '.join(FORMATS)}).")
+        with open(options['path'], 'rb') as fileobj:
+            try:
+                summary = import_library(fileobj, file_format, batch_size=options['batch_size'])
+            except LibraryImportError as e:
+                for error in e.errors:
+                    self.stderr.write(f"Dòng {error['line']} ({error['field'] or '-'}): {error['message']}")
+                raise CommandError(f"{e.error_count} lỗi, không nhập dòng nào.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã nhập {summary['created']} côn trùng mới, cập nhật {summary['updated']} ({summary['batches']} lô)."
+        ))
@@ -0,0 +1,15 @@
+# insect_library/management/commands/rebuild_insect_search_index.py
+from django.core.management.base import BaseCommand
+
+from insect_library.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Tính lại văn bản tìm kiếm và chỉ mục ngược của thư viện côn trùng. "
+        "Dùng sau khi cập nhật dữ liệu hàng loạt không qua signal (queryset.update, import SQL, ...)."
+    )
+
+    def handle(self, *args, **options):
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Đã lập chỉ mục cho {count} côn trùng."))
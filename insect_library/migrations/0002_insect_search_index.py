@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-19 11:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FULLTEXT_INDEX_NAME = 'insect_search_document_ft'
+
+
+def build_search_index(apps, schema_editor):
+    from insect_library.search import rebuild_search_index
+    rebuild_search_index(apps.get_model('insect_library', 'InsectReference'), apps.get_model('insect_library', 'InsectSearchToken'))
+
+
+def create_fulltext_index(apps, schema_editor):
+    # FULLTEXT index chỉ có trên MySQL; DB khác dùng bảng InsectSearchToken
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(f'CREATE FULLTEXT INDEX {FULLTEXT_INDEX_NAME} ON insect_library_insectreference (search_document)')
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(f'DROP INDEX {FULLTEXT_INDEX_NAME} ON insect_library_insectreference')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insect_library', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='insectreference',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Văn bản tìm kiếm'),
+        ),
+        migrations.CreateModel(
+            name='InsectSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, verbose_name='Từ')),
+                ('weight', models.FloatField(verbose_name='Trọng số')),
+                ('insect', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='insect_library.insectreference', verbose_name='Côn trùng')),
+            ],
+            options={
+                'verbose_name': 'Từ chỉ mục tìm kiếm',
+                'verbose_name_plural': 'Từ chỉ mục tìm kiếm',
+                'db_table': 'insect_library_insectsearchtoken',
+                'indexes': [models.Index(fields=['token'], name='insect_search_token_idx')],
+                'constraints': [models.UniqueConstraint(fields=('insect', 'token'), name='insect_search_token_unique')],
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-19 11:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insect_library', '0002_insect_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibraryVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Phiên bản')),
+                ('token', models.CharField(blank=True, max_length=32, verbose_name='Mã phiên bản')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Ngày cập nhật')),
+            ],
+            options={
+                'verbose_name': 'Phiên bản thư viện côn trùng',
+                'verbose_name_plural': 'Phiên bản thư viện côn trùng',
+                'db_table': 'insect_library_libraryversion',
+            },
+        ),
+    ]
@@ -11,6 +11,8 @@ class InsectReference(models.Model):
     active_season = models.CharField(max_length=100, blank=True, null=True, verbose_name="Mùa Hoạt Động")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Ngày tạo")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Ngày cập nhật")
+    # Văn bản đã bỏ dấu/chuẩn hóa của các trường tìm kiếm (insect_library/search.py), cập nhật khi lưu
+    search_document = models.TextField(blank=True, default='', editable=False, verbose_name="Văn bản tìm kiếm")
 
     class Meta:
         db_table = 'insect_library_insectreference'
@@ -19,4 +21,48 @@ class InsectReference(models.Model):
         ordering = ['name']
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+class InsectSearchToken(models.Model):
+    """
+    Chỉ mục ngược (inverted index) cho tìm kiếm thư viện: mỗi từ (đã bỏ dấu) của một
+    InsectReference kèm trọng số theo trường và số lần xuất hiện. Được cập nhật khi lưu InsectReference.
+    """
+    insect = models.ForeignKey(InsectReference, on_delete=models.CASCADE, related_name='search_tokens', verbose_name="Côn trùng")
+    token = models.CharField(max_length=64, verbose_name="Từ")
+    weight = models.FloatField(verbose_name="Trọng số")
+
+    class Meta:
+        db_table = 'insect_library_insectsearchtoken'
+        verbose_name = "Từ chỉ mục tìm kiếm"
+        verbose_name_plural = "Từ chỉ mục tìm kiếm"
+        constraints = [
+            models.UniqueConstraint(fields=['insect', 'token'], name='insect_search_token_unique'),
+        ]
+        indexes = [
+            # Tra từ (token = ... hoặc token LIKE 'tiền tố%')
+            models.Index(fields=['token'], name='insect_search_token_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.token} -> {self.insect_id} ({self.weight})"
+
+
+class LibraryVersion(models.Model):
+    """
+    Phiên bản của thư viện côn trùng (một dòng duy nhất, pk=1), tăng mỗi khi InsectReference
+    được tạo/sửa/xóa. Cache trong process (insect_library/cache.py) so sánh `token` để biết khi nào
+    phải nạp lại; token ngẫu nhiên nên transaction bị rollback không làm cache nhầm phiên bản.
+    """
+    version = models.PositiveBigIntegerField(default=0, verbose_name="Phiên bản")
+    token = models.CharField(max_length=32, blank=True, verbose_name="Mã phiên bản")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Ngày cập nhật")
+
+    class Meta:
+        db_table = 'insect_library_libraryversion'
+        verbose_name = "Phiên bản thư viện côn trùng"
+        verbose_name_plural = "Phiên bản thư viện côn trùng"
+
+    def __str__(self):
+        return f"v{self.version}"
@@ -0,0 +1,204 @@
+# insect_library/search.py
+"""
+Tìm kiếm toàn văn cho thư viện côn trùng (GET /api/library/insects/?search=...).
+
+Văn bản được chuẩn hóa: chữ thường, bỏ dấu tiếng Việt (kể cả đ -> d), tách theo ký tự không phải
+chữ/số: "Muỗi vằn", "muoi_van" và "MUỖI VẰN" đều thành "muoi van". Khi lưu InsectReference (signals.py):
+- search_document = các từ đã chuẩn hóa của mọi trường tìm kiếm (có FULLTEXT index trên MySQL);
+- InsectSearchToken = chỉ mục ngược từ -> côn trùng, trọng số theo trường (tên nặng hơn mô tả).
+
+Backend (INSECT_SEARCH_BACKEND):
+- 'fulltext': MATCH ... AGAINST trên FULLTEXT index của search_document (chỉ MySQL).
+- 'index':    tra bảng InsectSearchToken (mọi DB, ví dụ SQLite khi test), xếp hạng kiểu tf-idf.
+- 'auto':     'fulltext' với MySQL, 'index' với DB khác.
+Mọi từ khóa đều phải khớp (AND), khớp theo tiền tố ("muo" tìm được "muoi"); khớp trọn từ được ưu tiên.
+Từ khóa ngắn hơn INSECT_SEARCH_MIN_PREFIX_LENGTH chỉ khớp trọn từ (tiền tố 1-2 ký tự khớp gần hết chỉ mục).
+Backend 'index' chỉ xếp hạng tối đa MAX_RANKED_RESULTS kết quả; khi bị cắt, response phân trang có
+truncated=true và total_matches là tổng số côn trùng khớp.
+"""
+import math
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, When
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+from rest_framework.pagination import PageNumberPagination
+
+from .models import InsectReference, InsectSearchToken
+
+BACKEND_AUTO = 'auto'
+BACKEND_FULLTEXT = 'fulltext'
+BACKEND_INDEX = 'index'
+
+# Trọng số của từng trường khi xếp hạng
+FIELD_WEIGHTS = {
+    'name': 8.0,
+    'scientific_name': 6.0,
+    'host_plants': 2.0,
+    'active_season': 2.0,
+    'habitat': 1.5,
+    'description': 1.0,
+    'treatment': 1.0,
+}
+# Từ chỉ khớp theo tiền tố được tính bằng một phần trọng số của từ khớp trọn vẹn
+PREFIX_MATCH_FACTOR = 0.5
+MAX_TOKEN_LENGTH = 64
+MAX_QUERY_TERMS = 10
+# Số kết quả tối đa được xếp hạng cho một truy vấn (backend 'index')
+MAX_RANKED_RESULTS = 500
+# Thuộc tính của request ghi tổng số kết quả khớp khi danh sách xếp hạng bị cắt
+TOTAL_MATCHES_ATTR = 'insect_search_total_matches'
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+# --- Chuẩn hóa văn bản ---
+def fold_text(text):
+    """Chữ thường, bỏ dấu: 'Rầy nâu Đồng Tháp' -> 'ray nau dong thap'."""
+    decomposed = unicodedata.normalize('NFD', (text or '').lower().replace('đ', 'd'))
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    return [token[:MAX_TOKEN_LENGTH] for token in _TOKEN_RE.findall(fold_text(text))]
+
+
+def parse_query(query):
+    """Các từ khóa (đã chuẩn hóa, không trùng, giữ thứ tự) của chuỗi tìm kiếm."""
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+
+# --- Duy trì chỉ mục ---
+def build_search_document(insect):
+    return ' '.join(token for field in FIELD_WEIGHTS for token in tokenize(getattr(insect, field)))
+
+
+def build_token_weights(insect):
+    """{từ: trọng số} = tổng trọng số trường của mỗi lần từ xuất hiện."""
+    weights = {}
+    for field, field_weight in FIELD_WEIGHTS.items():
+        for token in tokenize(getattr(insect, field)):
+            weights[token] = weights.get(token, 0.0) + field_weight
+    return weights
+
+
+def index_insects(insects, token_model=InsectSearchToken):
+    """Ghi lại các từ chỉ mục của nhiều côn trùng (thay toàn bộ từ cũ của chúng)."""
+    insects = list(insects)
+    token_model.objects.filter(insect_id__in=[insect.pk for insect in insects]).delete()
+    token_model.objects.bulk_create([
+        token_model(insect_id=insect.pk, token=token, weight=weight)
+        for insect in insects
+        for token, weight in build_token_weights(insect).items()
+    ], batch_size=1000)
+
+
+def index_insect(insect, token_model=InsectSearchToken):
+    index_insects([insect], token_model)
+
+
+def rebuild_search_index(insect_model=InsectReference, token_model=InsectSearchToken):
+    """Tính lại search_document và chỉ mục ngược của mọi côn trùng. Trả về số côn trùng đã xử lý."""
+    count = 0
+    for insect in insect_model.objects.all().iterator():
+        insect_model.objects.filter(pk=insect.pk).update(search_document=build_search_document(insect))
+        index_insect(insect, token_model)
+        count += 1
+    return count
+
+
+# --- Truy vấn ---
+def get_search_backend():
+    backend = getattr(settings, 'INSECT_SEARCH_BACKEND', BACKEND_AUTO)
+    if backend == BACKEND_INDEX or connection.vendor != 'mysql':
+        return BACKEND_INDEX # FULLTEXT index chỉ được tạo trên MySQL (migration 0002)
+    return BACKEND_FULLTEXT
+
+
+def get_min_prefix_length():
+    return getattr(settings, 'INSECT_SEARCH_MIN_PREFIX_LENGTH', 3)
+
+
+def rank_with_index(terms):
+    """[(insect_id, điểm)] tất cả côn trùng khớp mọi từ khóa, điểm giảm dần."""
+    total = InsectReference.objects.count()
+    min_prefix_length = get_min_prefix_length()
+    scores = None
+    for term in terms:
+        term_weights = {}
+        if len(term) >= min_prefix_length:
+            tokens = InsectSearchToken.objects.filter(token__startswith=term)
+        else:
+            tokens = InsectSearchToken.objects.filter(token=term) # Tiền tố quá ngắn: chỉ khớp trọn từ
+        for insect_id, token, weight in tokens.values_list('insect_id', 'token', 'weight'):
+            if token != term:
+                weight *= PREFIX_MATCH_FACTOR
+            term_weights[insect_id] = max(weight, term_weights.get(insect_id, 0.0))
+        idf = math.log(1 + total / len(term_weights)) if term_weights else 0.0
+        if scores is None:
+            scores = {insect_id: weight * idf for insect_id, weight in term_weights.items()}
+        else:
+            scores = {insect_id: score + term_weights[insect_id] * idf for insect_id, score in scores.items() if insect_id in term_weights}
+        if not scores:
+            return []
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+class InsectSearchFilter(BaseFilterBackend):
+    """
+    Thay SearchFilter (chuỗi LIKE '%...%' OR trên 7 trường, không dùng được index).
+    Kết quả xếp theo độ liên quan, trừ khi request có ?ordering=.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        terms = parse_query(request.query_params.get(self.search_param, ''))
+        if not terms:
+            return queryset
+        keep_ordering = bool(request.query_params.get(OrderingFilter.ordering_param))
+        min_token_size = getattr(settings, 'INSECT_SEARCH_MYSQL_MIN_TOKEN_SIZE', 3)
+        if get_search_backend() == BACKEND_FULLTEXT and all(len(term) >= min_token_size for term in terms):
+            table = InsectReference._meta.db_table
+            queryset = queryset.annotate(search_relevance=RawSQL(
+                f'MATCH ({table}.search_document) AGAINST (%s IN BOOLEAN MODE)',
+                (' '.join(f'+{term}*' for term in terms),),
+            )).filter(search_relevance__gt=0)
+            return queryset if keep_ordering else queryset.order_by('-search_relevance', 'name')
+
+        # Từ khóa ngắn hơn innodb_ft_min_token_size không có trong FULLTEXT index: dùng chỉ mục ngược
+        ranked = rank_with_index(terms)
+        if len(ranked) > MAX_RANKED_RESULTS:
+            # Giới hạn kích thước IN/CASE trong SQL; LibrarySearchPagination báo việc cắt cho client
+            setattr(request, TOTAL_MATCHES_ATTR, len(ranked))
+            ranked = ranked[:MAX_RANKED_RESULTS]
+        ranked_ids = [insect_id for insect_id, _ in ranked]
+        queryset = queryset.filter(pk__in=ranked_ids)
+        if keep_ordering or not ranked_ids:
+            return queryset
+        return queryset.order_by(Case(*[When(pk=pk, then=position) for position, pk in enumerate(ranked_ids)], output_field=IntegerField()))
+
+
+class LibrarySearchPagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_page_size(self, request):
+        self.page_size = getattr(settings, 'INSECT_SEARCH_PAGE_SIZE', 20)
+        return super().get_page_size(request)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        total_matches = getattr(self.request, TOTAL_MATCHES_ATTR, None)
+        # count chỉ gồm các kết quả đã xếp hạng; total_matches là tổng số côn trùng khớp
+        response.data['truncated'] = total_matches is not None
+        response.data['total_matches'] = total_matches if total_matches is not None else self.page.paginator.count
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['truncated'] = {'type': 'boolean'}
+        schema['properties']['total_matches'] = {'type': 'integer'}
+        return schema
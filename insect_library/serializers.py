@@ -9,5 +9,5 @@ class InsectReferenceSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = InsectReference
-        fields = '__all__' # Lấy tất cả các trường trong model
+        exclude = ('search_document',) # Lấy tất cả các trường trong model (trừ văn bản tìm kiếm nội bộ)
         read_only_fields = ('created_at', 'updated_at') # Không cho phép sửa trực tiếp qua API
\ No newline at end of file
@@ -0,0 +1,34 @@
+# insect_library/signals.py
+"""
+Khi InsectReference được tạo/sửa/xóa:
+- cập nhật search_document và chỉ mục ngược (insect_library/search.py);
+- tăng phiên bản thư viện và bỏ snapshot cache của process này (insect_library/cache.py).
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import mark_library_changed
+from .models import InsectReference
+from .search import build_search_document, index_insect
+
+
+@receiver(pre_save, sender=InsectReference, dispatch_uid='insect_search_pre_save')
+def update_search_document(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.search_document = build_search_document(instance)
+
+
+@receiver(post_save, sender=InsectReference, dispatch_uid='insect_search_post_save')
+def update_search_index(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and 'search_document' not in update_fields:
+        # save(update_fields=[...]) không ghi search_document vừa tính ở pre_save
+        InsectReference.objects.filter(pk=instance.pk).update(search_document=instance.search_document)
+    index_insect(instance)
+    mark_library_changed()
+
+
+@receiver(post_delete, sender=InsectReference, dispatch_uid='insect_library_post_delete')
+def library_row_deleted(sender, instance, **kwargs):
+    mark_library_changed()
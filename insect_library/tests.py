@@ -1,11 +1,17 @@
 # insect_library/tests.py
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse # Để tạo URL từ tên của nó
 from rest_framework import status
-from rest_framework.test import APITestCase, TestCase # Dùng APITestCase để test API endpoint
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase # Dùng APITestCase để test API endpoint
 
 # Import models và serializers
 from .models import InsectReference
 from .serializers import InsectReferenceSerializer
+from .cache import bump_version, current_version, library_cache
+from .models import InsectSearchToken
 
 # Import model user và thư viện hash để tạo user test
 from accounts.models import CustomUser
@@ -187,4 +193,240 @@ class InsectReferenceViewSetTest(APITestCase):
         """User thường không thể xóa."""
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.user_token}')
         response = self.client.delete(self.detail_url(self.ref1.pk))
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class InsectSearchTest(APITestCase):
+    """Test cho tìm kiếm toàn văn thư viện côn trùng (insect_library/search.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(
+            email='search_user@example.com',
+            password_hash=ph.hash('searchpass'),
+            user_type='REGULAR', is_active=True
+        )
+        cls.muoi_vang = InsectReference.objects.create(
+            name='muoi_vang', scientific_name='Aedes flavus',
+            description='Muỗi có sọc vàng, hoạt động ban ngày.', host_plants='Không gây hại cây trồng'
+        )
+        cls.ray_nau = InsectReference.objects.create(
+            name='ray_nau', scientific_name='Nilaparvata lugens',
+            description='Rầy nâu chích hút lúa, có thể mang virus vàng lùn.', host_plants='Lúa'
+        )
+        cls.sau_duc_than = InsectReference.objects.create(
+            name='sau_duc_than', description='Sâu đục thân lúa ở Đồng Tháp.', treatment='Dùng bẫy đèn'
+        )
+        cls.url = reverse('insect-reference-list')
+
+    def setUp(self):
+        response = self.client.post(reverse('accounts:user_login'), {'email': 'search_user@example.com', 'password': 'searchpass'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def _search(self, query, **params):
+        response = self.client.get(self.url, {'search': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def _names(self, response):
+        return [item['name'] for item in response.data['results']]
+
+    def test_fold_text_removes_vietnamese_accents(self):
+        """Bỏ dấu tiếng Việt, kể cả chữ đ."""
+        from .search import fold_text, tokenize
+        self.assertEqual(fold_text('Rầy nâu Đồng Tháp'), 'ray nau dong thap')
+        self.assertEqual(tokenize('Muỗi_VẰN, sâu-đục'), ['muoi', 'van', 'sau', 'duc'])
+
+    def test_search_is_accent_insensitive_and_ranked(self):
+        """'vàng' khớp 'vang' (tên) và 'vàng' (mô tả); khớp ở tên được xếp trước."""
+        for query in ('vàng', 'vang', 'VÀNG'):
+            with self.subTest(query=query):
+                self.assertEqual(self._names(self._search(query)), ['muoi_vang', 'ray_nau'])
+
+    def test_all_terms_must_match_and_prefix_matching(self):
+        """Mọi từ khóa phải khớp; từ khóa khớp theo tiền tố."""
+        self.assertEqual(self._names(self._search('lúa đồng tháp')), ['sau_duc_than'])
+        self.assertEqual(self._names(self._search('nilapar')), ['ray_nau'])
+        self.assertEqual(self._search('muỗi lúa').data['count'], 0)
+
+    def test_short_terms_match_whole_tokens_only(self):
+        """Từ khóa ngắn hơn INSECT_SEARCH_MIN_PREFIX_LENGTH không khớp theo tiền tố."""
+        self.assertEqual(self._search('ra').data['count'], 0) # Không khớp 'ray'
+        self.assertEqual(self._names(self._search('ray')), ['ray_nau'])
+        with self.settings(INSECT_SEARCH_MIN_PREFIX_LENGTH=2):
+            self.assertEqual(self._names(self._search('ra')), ['ray_nau'])
+
+    def test_truncated_ranking_is_reported(self):
+        """Khi số kết quả vượt MAX_RANKED_RESULTS, response báo truncated và tổng số kết quả khớp."""
+        response = self._search('lua')
+        self.assertEqual((response.data['truncated'], response.data['total_matches']), (False, 2))
+        with mock.patch('insect_library.search.MAX_RANKED_RESULTS', 1):
+            response = self._search('lua')
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual((response.data['truncated'], response.data['total_matches']), (True, 2))
+
+    def test_search_results_are_paginated(self):
+        """Kết quả tìm kiếm được phân trang; danh sách đầy đủ vẫn là mảng."""
+        response = self._search('lua', page_size=1)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(len(self.client.get(self.url).data), 3)
+
+    def test_index_updated_on_save(self):
+        """Sửa/xóa côn trùng cập nhật chỉ mục."""
+        self.sau_duc_than.habitat = 'Ruộng lúa nước'
+        self.sau_duc_than.save(update_fields=['habitat'])
+        self.assertEqual(self._names(self._search('ruộng')), ['sau_duc_than'])
+        self.sau_duc_than.refresh_from_db()
+        self.assertIn('ruong', self.sau_duc_than.search_document)
+        self.sau_duc_than.delete()
+        self.assertEqual(self._search('ruộng').data['count'], 0)
+
+
+@override_settings(INSECT_LIBRARY_CACHE_ENABLED=True, INSECT_LIBRARY_CACHE_CHECK_SECONDS=0)
+class InsectLibraryCacheTest(APITestCase):
+    """Test cho cache thư viện trong process (insect_library/cache.py) và API tra cứu hàng loạt."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(
+            email='cache_user@example.com',
+            password_hash=ph.hash('cachepass'),
+            user_type='REGULAR', is_active=True
+        )
+        cls.muoi_vang = InsectReference.objects.create(name='muoi_vang', description='Muỗi vàng')
+        cls.ray_nau = InsectReference.objects.create(name='ray_nau', description='Rầy nâu')
+        cls.list_url = reverse('insect-reference-list')
+        cls.lookup_url = reverse('insect-reference-lookup')
+
+    def setUp(self):
+        library_cache.invalidate()
+        response = self.client.post(reverse('accounts:user_login'), {'email': 'cache_user@example.com', 'password': 'cachepass'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def test_list_served_from_cache_with_etag(self):
+        """Danh sách trả kèm ETag; If-None-Match đúng -> 304 không cần query thư viện."""
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['name'] for item in response.json()], ['muoi_vang', 'ray_nau'])
+        etag = response['ETag']
+        with self.assertNumQueries(2): # Xác thực user + kiểm tra phiên bản
+            not_modified = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        detail = self.client.get(reverse('insect-reference-detail', kwargs={'pk': self.ray_nau.pk}))
+        self.assertEqual(detail.json()['description'], 'Rầy nâu')
+        self.assertIn('ETag', detail)
+
+    def test_write_bumps_version_and_refreshes_cache(self):
+        """Tạo/sửa/xóa tăng phiên bản thư viện; ETag cũ không còn khớp."""
+        etag = self.client.get(self.list_url)['ETag']
+        version = current_version()[0]
+        InsectReference.objects.filter(pk=self.ray_nau.pk).first().delete()
+        self.assertEqual(current_version()[0], version + 1)
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['name'] for item in response.json()], ['muoi_vang'])
+
+    def test_stale_snapshot_of_other_process_is_reloaded(self):
+        """Snapshot mang token khác token trong DB (process khác đã sửa) được nạp lại."""
+        self.client.get(self.list_url)
+        InsectReference.objects.filter(pk=self.muoi_vang.pk).update(description='Đã sửa')
+        bump_version() # Như process khác vừa ghi (không qua signal của process này)
+        self.assertEqual(self.client.get(self.list_url).json()[0]['description'], 'Đã sửa')
+
+    def test_lookup_by_names(self):
+        """Tra nhiều tên trong một request (GET và POST)."""
+        response = self.client.get(self.lookup_url, {'names': 'ray_nau,muoi_vang,khong_co'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results']), {'ray_nau', 'muoi_vang'})
+        self.assertEqual(response.data['missing'], ['khong_co'])
+        response = self.client.post(self.lookup_url, {'names': ['ray_nau']}, format='json')
+        self.assertEqual(response.data['results']['ray_nau']['id'], self.ray_nau.pk)
+        self.assertEqual(self.client.post(self.lookup_url, {'names': 'ray_nau'}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(INSECT_LIBRARY_CACHE_ENABLED=False)
+    def test_lookup_without_cache(self):
+        response = self.client.get(self.lookup_url, {'names': ['muoi_vang', 'ray_nau']})
+        self.assertEqual(set(response.data['results']), {'muoi_vang', 'ray_nau'})
+
+
+class InsectLibraryBulkTest(APITestCase):
+    """Test cho nhập/xuất hàng loạt thư viện (insect_library/bulk.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = CustomUser.objects.create(
+            email='bulk_admin@example.com',
+            password_hash=ph.hash('bulkadminpass'),
+            user_type='ADMIN', is_active=True
+        )
+        CustomUser.objects.create(
+            email='bulk_user@example.com',
+            password_hash=ph.hash('bulkuserpass'),
+            user_type='REGULAR', is_active=True
+        )
+        InsectReference.objects.create(name='ray_nau', description='Mô tả cũ')
+        cls.import_url = reverse('insect-reference-import-library')
+        cls.export_url = reverse('insect-reference-export-library')
+
+    def _login(self, email, password):
+        response = self.client.post(reverse('accounts:user_login'), {'email': email, 'password': password}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def setUp(self):
+        self._login('bulk_admin@example.com', 'bulkadminpass')
+
+    def _import(self, name, content, **params):
+        upload = SimpleUploadedFile(name, content.encode('utf-8'))
+        url = self.import_url + ('?' + '&'.join(f'{key}={value}' for key, value in params.items()) if params else '')
+        return self.client.post(url, {'file': upload}, format='multipart')
+
+    @override_settings(INSECT_IMPORT_BATCH_SIZE=2)
+    def test_csv_import_upserts_in_batches(self):
+        """CSV (có BOM) tạo mới và cập nhật theo name; chỉ mục tìm kiếm và phiên bản thư viện được cập nhật."""
+        version = current_version()[0]
+        content = '\ufeffname,scientific_name,description\nray_nau,Nilaparvata lugens,Rầy nâu hại lúa\nmuoi_vang,,Muỗi vàng\nsau_cuon_la,,\n'
+        response = self._import('library.csv', content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data, {'created': 2, 'updated': 1, 'batches': 2})
+        ray_nau = InsectReference.objects.get(name='ray_nau')
+        self.assertEqual((ray_nau.scientific_name, ray_nau.description), ('Nilaparvata lugens', 'Rầy nâu hại lúa'))
+        self.assertIn('nilaparvata', ray_nau.search_document)
+        self.assertTrue(InsectSearchToken.objects.filter(insect__name='muoi_vang', token='muoi').exists())
+        self.assertIsNone(InsectReference.objects.get(name='sau_cuon_la').scientific_name)
+        self.assertEqual(current_version()[0], version + 2) # Mỗi lô một lần
+
+    def test_ndjson_import(self):
+        response = self._import('library.ndjson', '{"name": "bo_xit", "habitat": "Ruộng lúa"}\n\n{"name": "ray_nau"}\n')
+        self.assertEqual(response.data, {'created': 1, 'updated': 1, 'batches': 1})
+        self.assertEqual(InsectReference.objects.get(name='bo_xit').habitat, 'Ruộng lúa')
+
+    def test_invalid_file_writes_nothing(self):
+        """Mọi lỗi được báo kèm số dòng; không ghi dòng hợp lệ nào."""
+        content = 'name,active_season\nbo_xit,Hè\n,Thu\nbo_xit,Đông\nsau,' + 'x' * 101 + '\n'
+        response = self._import('library.csv', content)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error_count'], 3)
+        self.assertEqual([(error['line'], error['field']) for error in response.data['errors']], [(3, 'name'), (4, 'name'), (5, 'active_season')])
+        self.assertFalse(InsectReference.objects.filter(name='bo_xit').exists())
+        bad_json = self._import('library.txt', '{"name": "a"}\nkhông phải json\n', type='ndjson')
+        self.assertEqual(bad_json.data['errors'][0]['line'], 2)
+        self.assertEqual(self._import('library.txt', 'name\na\n').status_code, status.HTTP_400_BAD_REQUEST) # Không rõ định dạng
+
+    def test_export_round_trip(self):
+        """File xuất nhập lại được, không thay đổi gì."""
+        InsectReference.objects.create(name='muoi_vang', scientific_name='Aedes', treatment='Phun, diệt "lăng quăng"')
+        for file_format in ('csv', 'ndjson'):
+            response = self.client.get(self.export_url, {'type': file_format})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn(f'insect_library.{file_format}', response['Content-Disposition'])
+            content = b''.join(response.streaming_content).decode('utf-8')
+            reimported = self._import(f'library.{file_format}', content)
+            self.assertEqual(reimported.data, {'created': 0, 'updated': 2, 'batches': 1})
+        self.assertEqual(InsectReference.objects.get(name='muoi_vang').treatment, 'Phun, diệt "lăng quăng"')
+
+    def test_regular_user_forbidden(self):
+        self._login('bulk_user@example.com', 'bulkuserpass')
+        self.assertEqual(self._import('library.csv', 'name\nbo_xit\n').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(self.export_url).status_code, status.HTTP_403_FORBIDDEN)
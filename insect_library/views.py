@@ -2,41 +2,49 @@
 from rest_framework import viewsets
 from rest_framework import permissions
 from rest_framework import filters # Import SearchFilter, OrderingFilter
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+from django.http import StreamingHttpResponse
 
 # Import Model và Serializer từ app hiện tại
 from .models import InsectReference
 from .serializers import InsectReferenceSerializer
+from .search import InsectSearchFilter, LibrarySearchPagination
+from .cache import cached_json_response, library_cache
+from . import bulk
 # Import custom permissions từ app accounts
 from accounts.permissions import IsAuthenticatedCustom, IsAdminUserType
+from main_config.db.routers import ReplicaReadMixin
 
-class InsectReferenceViewSet(viewsets.ModelViewSet):
+class InsectReferenceViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     API endpoint cho phép xem (User/Admin) và quản lý (Admin)
     thông tin côn trùng tham khảo.
     Hỗ trợ tìm kiếm và sắp xếp.
+    Tìm kiếm dùng chỉ mục toàn văn (insect_library/search.py): không phân biệt dấu,
+    xếp theo độ liên quan và được phân trang (?page=, ?page_size=).
 
     Ví dụ:
-    - GET /api/library/insects/?search=vang
+    - GET /api/library/insects/?search=muỗi vàng
     - GET /api/library/insects/?ordering=scientific_name
+    - GET /api/library/insects/lookup/?names=muoi_vang,ray_nau
+    - POST /api/library/insects/import/ (Admin, multipart `file` .csv/.ndjson)
+    - GET /api/library/insects/export/?type=ndjson (Admin)
+
+    Danh sách (không tham số) và chi tiết được trả từ cache trong process (insect_library/cache.py)
+    kèm ETag; client gửi If-None-Match để nhận 304 khi thư viện không đổi.
     """
     queryset = InsectReference.objects.all().order_by('name')
     serializer_class = InsectReferenceSerializer
+    pagination_class = LibrarySearchPagination
 
-    # Kích hoạt Tìm kiếm và Sắp xếp
+    # Kích hoạt Sắp xếp và Tìm kiếm (tìm kiếm chạy sau để xếp theo độ liên quan)
+    # Các trường được tìm kiếm và trọng số: insect_library.search.FIELD_WEIGHTS
     filter_backends = [
-        filters.SearchFilter,
-        filters.OrderingFilter
-    ]
-    
-    # Các trường để tìm kiếm (search)
-    search_fields = [
-        'name',
-        'scientific_name',
-        'description',
-        'habitat',
-        'host_plants',
-        'treatment',
-        'active_season',
+        filters.OrderingFilter,
+        InsectSearchFilter,
     ]
     
     # Các trường cho phép sắp xếp (ordering)
@@ -45,15 +53,101 @@ class InsectReferenceViewSet(viewsets.ModelViewSet):
     # Sắp xếp mặc định
     ordering = ['name'] 
 
+    # Chỉ danh sách đọc từ read replica (main_config/db/routers.py)
+    replica_read_actions = ('list',)
+
+    # Số tên tối đa trong một lần tra cứu hàng loạt
+    max_lookup_names = 200
+
+    def list(self, request, *args, **kwargs):
+        snapshot = None if request.query_params else library_cache.snapshot()
+        if snapshot is None: # Có tìm kiếm/sắp xếp/... hoặc cache bị tắt
+            return super().list(request, *args, **kwargs)
+        return cached_json_response(request, snapshot.items, snapshot.list_json, snapshot.list_etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        snapshot = library_cache.snapshot()
+        cached = snapshot.json_by_id.get(self._lookup_pk()) if snapshot is not None else None
+        if cached is None:
+            return super().retrieve(request, *args, **kwargs)
+        return cached_json_response(request, *cached)
+
+    def _lookup_pk(self):
+        try:
+            return int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @action(detail=False, methods=['get', 'post'], url_path='lookup')
+    def lookup(self, request):
+        """
+        Tra nhiều côn trùng theo `name` trong một request (ví dụ làm giàu detected_insects của một kết quả).
+        GET ?names=muoi_vang,ray_nau (hoặc lặp lại ?names=) / POST {"names": [...]}
+        Trả về {"results": {name: dữ liệu}, "missing": [tên không có trong thư viện]}.
+        """
+        if request.method == 'POST':
+            names = request.data.get('names') if isinstance(request.data, dict) else None
+            if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+                return Response({"names": ["Phải là danh sách tên côn trùng."]}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            names = [name for value in request.query_params.getlist('names') for name in value.split(',')]
+        names = list(dict.fromkeys(name.strip() for name in names if name.strip()))
+        if len(names) > self.max_lookup_names:
+            return Response({"names": [f"Tối đa {self.max_lookup_names} tên mỗi lần."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        snapshot = library_cache.snapshot()
+        if snapshot is not None:
+            items = snapshot.items_by_name
+        else:
+            items = {item['name']: item for item in self.get_serializer(InsectReference.objects.filter(name__in=names), many=True).data}
+        return Response({
+            "results": {name: items[name] for name in names if name in items},
+            "missing": [name for name in names if name not in items],
+        })
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_library(self, request):
+        """
+        Nhập hàng loạt (upsert theo `name`) từ file CSV/NDJSON (insect_library/bulk.py).
+        Định dạng theo ?type=csv|ndjson hoặc phần mở rộng file. File có lỗi -> 400, không ghi dòng nào.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"file": ["Chưa chọn file."]}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = bulk.detect_format(upload.name, request.query_params.get('type'))
+        if file_format is None:
+            return Response({"type": [f"Định dạng phải là một trong: {', '.join(bulk.FORMATS)}."]}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            summary = bulk.import_library(upload.file, file_format)
+        except bulk.LibraryImportError as e:
+            return Response({"errors": e.errors, "error_count": e.error_count}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export_library(self, request):
+        """Xuất toàn bộ thư viện (?type=csv|ndjson, mặc định csv), gửi dần theo từng phần."""
+        file_format = request.query_params.get('type', bulk.FORMAT_CSV)
+        if file_format not in bulk.FORMATS:
+            return Response({"type": [f"Định dạng phải là một trong: {', '.join(bulk.FORMATS)}."]}, status=status.HTTP_400_BAD_REQUEST)
+        response = StreamingHttpResponse(bulk.export_library(file_format), content_type=bulk.CONTENT_TYPES[file_format])
+        response['Content-Disposition'] = f'attachment; filename="insect_library.{file_format}"'
+        return response
+
+    def paginate_queryset(self, queryset):
+        # Chỉ phân trang kết quả tìm kiếm; danh sách đầy đủ giữ định dạng mảng như trước
+        if not self.request.query_params.get(InsectSearchFilter.search_param):
+            return None
+        return super().paginate_queryset(queryset)
+
     def get_permissions(self):
         """
         Gán quyền truy cập động dựa trên hành động (action).
         """
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'lookup']:
             # Yêu cầu đăng nhập để xem danh sách và chi tiết
             permission_classes = [IsAuthenticatedCustom]
-        elif self.action in ['create', 'update', 'partial_update', 'destroy']:
-            # Chỉ Admin được tạo, sửa, xóa
+        elif self.action in ['create', 'update', 'partial_update', 'destroy', 'import_library', 'export_library']:
+            # Chỉ Admin được tạo, sửa, xóa, nhập/xuất hàng loạt
             permission_classes = [IsAdminUserType]
         else:
             # Các action khác (nếu có) mặc định yêu cầu đăng nhập
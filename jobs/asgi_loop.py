@@ -0,0 +1,69 @@
+"""
+Gửi message channel layer từ thread không thuộc event loop của ASGI server (worker thread 'in_process').
+
+InMemoryChannelLayer giữ hàng đợi asyncio của consumer trên event loop của Daphne. async_to_sync()
+gọi từ một thread thường tạo event loop mới: hàng đợi không an toàn giữa các thread và consumer không
+được đánh thức, nên message chỉ tới khi consumer tự thức dậy (vài giây sau) hoặc không bao giờ.
+Vì vậy event loop của ASGI server được ghi nhớ ở request/kết nối đầu tiên (main_config/asgi.py),
+và run_on_asgi_loop() chuyển coroutine sang chạy trên loop đó rồi chờ kết quả.
+"""
+import asyncio
+import concurrent.futures
+import threading
+
+from django.conf import settings
+
+try:
+    from asgiref.sync import async_to_sync
+except ImportError:
+    def async_to_sync(func): return func
+
+_lock = threading.Lock()
+_asgi_loop = None
+
+
+def set_asgi_loop(loop):
+    global _asgi_loop
+    with _lock:
+        _asgi_loop = loop
+
+
+def remember_asgi_loop():
+    """Ghi nhớ event loop đang chạy (gọi trong coroutine của ASGI application)."""
+    loop = asyncio.get_running_loop()
+    if _asgi_loop is not loop:
+        set_asgi_loop(loop)
+
+
+def get_asgi_loop():
+    """Event loop của ASGI server nếu nó còn chạy, ngược lại None."""
+    loop = _asgi_loop
+    if loop is None or loop.is_closed() or not loop.is_running():
+        return None
+    return loop
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def run_on_asgi_loop(async_func, *args, timeout=None):
+    """
+    Chạy async_func(*args) trên event loop của ASGI server và trả về kết quả (gọi từ code đồng bộ).
+    Không có loop ASGI (process không phục vụ WebSocket, test...) -> dùng async_to_sync như trước.
+    Quá `timeout` giây -> hủy coroutine và ném TimeoutError để người gọi gửi lại sau.
+    """
+    loop = get_asgi_loop()
+    if loop is None or _running_loop() is loop:
+        return async_to_sync(async_func)(*args)
+    if timeout is None:
+        timeout = getattr(settings, 'CHANNEL_SEND_TIMEOUT_SECONDS', 10.0)
+    future = asyncio.run_coroutine_threadsafe(async_func(*args), loop)
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
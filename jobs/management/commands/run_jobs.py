@@ -0,0 +1,67 @@
+# jobs/management/commands/run_jobs.py
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+try:
+    from channels.layers import InMemoryChannelLayer, get_channel_layer
+except ImportError:
+    InMemoryChannelLayer = None
+
+from jobs.outbox import dispatch_outbox
+from jobs.registry import registered_jobs
+from jobs.worker import JobWorker, purge_finished_jobs
+
+# Dọn job đã thành công mỗi giờ
+PURGE_INTERVAL_SECONDS = 3600
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker chạy các tác vụ nền (bảng jobs_job) và gửi message outbox (jobs_outboxmessage). Dùng khi JOBS_MODE='worker' "
+        "(cần channel layer dùng chung giữa các process để gửi được WebSocket), "
+        "hoặc với --once để chạy lại các job còn tồn (ví dụ job đang chờ retry)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Chạy hết các job đến hạn rồi thoát.')
+        parser.add_argument('--batch-size', type=int, help='Số job lấy mỗi lần (mặc định JOBS_BATCH_SIZE).')
+        parser.add_argument('--poll', type=float, help='Số giây chờ khi không có job (mặc định JOBS_POLL_SECONDS).')
+        parser.add_argument('--name', action='append', help='Chỉ chạy job có tên này (lặp lại để chọn nhiều).')
+
+    def handle(self, *args, **options):
+        if InMemoryChannelLayer is not None and isinstance(get_channel_layer(), InMemoryChannelLayer):
+            # Message gửi từ process này không tới được consumer của process web nhưng vẫn bị xóa khỏi outbox
+            raise CommandError(
+                "run_jobs cần channel layer dùng chung giữa các process (ví dụ channels_redis); "
+                "với InMemoryChannelLayer hãy dùng JOBS_MODE='in_process'."
+            )
+        worker = JobWorker(batch_size=options['batch_size'], names=options['name'])
+        poll_seconds = options['poll'] if options['poll'] is not None else getattr(settings, 'JOBS_POLL_SECONDS', 2.0)
+        self.stdout.write(f"Worker {worker.worker_id}; job đã đăng ký: {', '.join(registered_jobs())}")
+
+        self._stopping = False
+        def stop(signum, frame):
+            self._stopping = True
+        signal.signal(signal.SIGTERM, stop)
+
+        total = 0
+        last_purge = 0.0
+        try:
+            while not self._stopping:
+                processed = dispatch_outbox() + worker.run_pending()
+                total += processed
+                if time.monotonic() - last_purge > PURGE_INTERVAL_SECONDS:
+                    purge_finished_jobs()
+                    last_purge = time.monotonic()
+                close_old_connections()
+                if not processed:
+                    if options['once']:
+                        break
+                    time.sleep(poll_seconds)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Đã chạy {total} job/message outbox."))
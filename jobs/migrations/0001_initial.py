@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-19 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Tên job')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Tham số')),
+                ('status', models.CharField(choices=[('queued', 'Đang chờ'), ('running', 'Đang chạy'), ('succeeded', 'Thành công'), ('failed', 'Thất bại')], default='queued', max_length=20, verbose_name='Trạng thái')),
+                ('idempotency_key', models.CharField(blank=True, max_length=200, null=True, unique=True, verbose_name='Khóa idempotency')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Số lần đã chạy')),
+                ('max_attempts', models.PositiveIntegerField(default=5, verbose_name='Số lần chạy tối đa')),
+                ('run_at', models.DateTimeField(verbose_name='Chạy từ thời điểm')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='Worker đang giữ')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Thời điểm bắt đầu chạy')),
+                ('last_error', models.TextField(blank=True, verbose_name='Lỗi gần nhất')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Thời điểm tạo')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Thời điểm kết thúc')),
+            ],
+            options={
+                'verbose_name': 'Tác vụ nền',
+                'verbose_name_plural': 'Tác vụ nền',
+                'db_table': 'jobs_job',
+                'ordering': ['run_at', 'id'],
+                'indexes': [models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-19 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group', models.CharField(max_length=200, verbose_name='Group nhận')),
+                ('message', models.JSONField(verbose_name='Message')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Số lần gửi lỗi')),
+                ('available_at', models.DateTimeField(verbose_name='Gửi từ thời điểm')),
+                ('last_error', models.TextField(blank=True, verbose_name='Lỗi gần nhất')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Thời điểm tạo')),
+            ],
+            options={
+                'verbose_name': 'Message outbox',
+                'verbose_name_plural': 'Message outbox',
+                'db_table': 'jobs_outboxmessage',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['available_at'], name='outbox_available_at_idx')],
+            },
+        ),
+    ]
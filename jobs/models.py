@@ -0,0 +1,73 @@
+# jobs/models.py
+from django.db import models
+
+
+class Job(models.Model):
+    """
+    Một tác vụ nền (side effect không quan trọng của request: thông báo WebSocket, ...)
+    được lưu trong DB và chạy bởi worker (xem jobs/worker.py).
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Đang chờ'),
+        (STATUS_RUNNING, 'Đang chạy'),
+        (STATUS_SUCCEEDED, 'Thành công'),
+        (STATUS_FAILED, 'Thất bại'),
+    ]
+
+    name = models.CharField(max_length=100, verbose_name="Tên job")
+    payload = models.JSONField(default=dict, blank=True, verbose_name="Tham số")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED, verbose_name="Trạng thái")
+    # Khóa chống tạo trùng: enqueue cùng khóa nhiều lần chỉ tạo một job
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True, verbose_name="Khóa idempotency")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Số lần đã chạy")
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name="Số lần chạy tối đa")
+    run_at = models.DateTimeField(verbose_name="Chạy từ thời điểm")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="Worker đang giữ")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="Thời điểm bắt đầu chạy")
+    last_error = models.TextField(blank=True, verbose_name="Lỗi gần nhất")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Thời điểm tạo")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Thời điểm kết thúc")
+
+    class Meta:
+        db_table = 'jobs_job'
+        verbose_name = "Tác vụ nền"
+        verbose_name_plural = "Tác vụ nền"
+        ordering = ['run_at', 'id']
+        indexes = [
+            # Worker lấy job đến hạn: status = 'queued' AND run_at <= now ORDER BY run_at
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job #{self.pk} {self.name} ({self.status}, lần {self.attempts}/{self.max_attempts})"
+
+
+class OutboxMessage(models.Model):
+    """
+    Message channel layer (group_send) được ghi trong cùng transaction với thay đổi dữ liệu
+    và chỉ được gửi sau khi commit (xem jobs/outbox.py). Dòng bị xóa khi đã gửi xong.
+    """
+    group = models.CharField(max_length=200, verbose_name="Group nhận")
+    # Event gửi nguyên vẹn cho group_send: {"type": "send.stats.update", "message": {...}}
+    message = models.JSONField(verbose_name="Message")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Số lần gửi lỗi")
+    available_at = models.DateTimeField(verbose_name="Gửi từ thời điểm")
+    last_error = models.TextField(blank=True, verbose_name="Lỗi gần nhất")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Thời điểm tạo")
+
+    class Meta:
+        db_table = 'jobs_outboxmessage'
+        verbose_name = "Message outbox"
+        verbose_name_plural = "Message outbox"
+        ordering = ['id']
+        indexes = [
+            # Dispatcher lấy message đến hạn: available_at <= now ORDER BY id
+            models.Index(fields=['available_at'], name='outbox_available_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"Outbox #{self.pk} -> {self.group} ({self.message.get('type')})"
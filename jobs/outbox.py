@@ -0,0 +1,164 @@
+# jobs/outbox.py
+"""
+Transactional outbox cho thông báo channel layer (WebSocket).
+
+View ghi message vào bảng jobs_outboxmessage bằng publish() trong cùng transaction với thay
+đổi dữ liệu: transaction rollback thì message cũng biến mất, client không bao giờ được báo về
+dòng không tồn tại. Sau commit, dispatch_outbox() gửi message theo lô (một lần vào event loop
+cho cả lô) rồi xóa các dòng đã gửi; ai chạy dispatcher tùy JOBS_MODE giống job (xem jobs/queue.py).
+Lô được gửi trên event loop của ASGI server (jobs/asgi_loop.py): worker thread 'in_process' không được
+tự tạo event loop để gửi vào InMemoryChannelLayer, và dòng chỉ bị xóa khi message đã thực sự vào hàng đợi
+của consumer.
+
+Giao ít nhất một lần (at-least-once): process chết giữa lúc gửi và lúc xóa thì message được gửi
+lại, nên consumer phải chịu được message trùng. Gửi lỗi -> chạy lại với backoff; các message sau
+của cùng group (kể cả message publish sau lần lỗi) chỉ được gửi sau message lỗi, để giữ thứ tự trong
+group. Dispatcher giành lô bằng lease ngắn (OUTBOX_LEASE_SECONDS, compare-and-set giống jobs/worker.py) rồi
+commit trước khi gửi: không transaction/lock DB nào mở trong lúc chờ event loop. Dispatcher chết giữa chừng
+thì message được gửi lại khi hết lease; message đang trong lease chặn các message sau của cùng group.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+try:
+    from channels.layers import get_channel_layer
+    CHANNELS_INSTALLED_SUCCESSFULLY = True
+except ImportError:
+    def get_channel_layer(): return None
+    CHANNELS_INSTALLED_SUCCESSFULLY = False
+
+from .asgi_loop import run_on_asgi_loop
+from .models import OutboxMessage
+from .queue import MODE_EAGER, MODE_IN_PROCESS, get_jobs_mode, in_process_workers
+from .worker import MAX_ERROR_LENGTH, retry_delay_seconds
+
+logger = logging.getLogger(__name__)
+
+# Đánh dấu message không gửi vì message trước đó của cùng group bị lỗi
+_SKIPPED = object()
+
+
+def publish(group, event_type, message):
+    """
+    Ghi một message group_send vào outbox; gọi trong transaction.atomic() của thao tác ghi chính.
+    Message được gửi sau khi transaction commit.
+    """
+    row = OutboxMessage.objects.create(
+        group=group, message={'type': event_type, 'message': message}, available_at=timezone.now(),
+    )
+    transaction.on_commit(_dispatch)
+    return row
+
+
+def _dispatch():
+    mode = get_jobs_mode()
+    if mode == MODE_EAGER:
+        dispatch_outbox()
+    elif mode == MODE_IN_PROCESS:
+        in_process_workers.wake()
+
+
+async def _send_batch(channel_layer, rows):
+    """Gửi lần lượt các message; trả về danh sách None (đã gửi) / exception / _SKIPPED theo từng dòng."""
+    failed_groups = set()
+    outcomes = []
+    for row in rows:
+        if row.group in failed_groups:
+            outcomes.append(_SKIPPED)
+            continue
+        try:
+            await channel_layer.group_send(row.group, row.message)
+            outcomes.append(None)
+        except Exception as e:
+            failed_groups.add(row.group)
+            outcomes.append(e)
+    return outcomes
+
+
+def _claim(rows, now):
+    """
+    Giành các dòng bằng UPDATE có điều kiện (compare-and-set) như JobWorker giành job: đẩy available_at
+    tới hết lease và tăng attempts. Trả về (các dòng đã giành, thời điểm hết lease).
+    """
+    leased_until = now + timedelta(seconds=getattr(settings, 'OUTBOX_LEASE_SECONDS', 60))
+    claimed = []
+    lost_groups = set() # Dispatcher khác đã giành message trước: không gửi vượt lên message đó
+    with transaction.atomic():
+        for row in rows:
+            if row.group in lost_groups:
+                continue
+            won = OutboxMessage.objects.filter(pk=row.pk, available_at=row.available_at, attempts=row.attempts).update(
+                available_at=leased_until, attempts=F('attempts') + 1,
+            )
+            if not won:
+                lost_groups.add(row.group)
+                continue
+            row.available_at, row.attempts = leased_until, row.attempts + 1
+            claimed.append(row)
+    return claimed, leased_until
+
+
+def dispatch_outbox(batch_size=None, channel_layer=None):
+    """Gửi một lô message đến hạn trong outbox. Trả về số message đã gửi."""
+    if channel_layer is None:
+        if not CHANNELS_INSTALLED_SUCCESSFULLY:
+            return 0
+        channel_layer = get_channel_layer()
+    if channel_layer is None:
+        logger.error("dispatch_outbox: Channel layer is None! Outbox messages stay queued.")
+        return 0
+    batch_size = batch_size or getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+    now = timezone.now()
+    # Message đang chờ gửi lại (hoặc đang được dispatcher khác gửi) chặn các message sau nó trong cùng group
+    waiting_retry = OutboxMessage.objects.filter(group=OuterRef('group'), id__lt=OuterRef('id'), available_at__gt=now)
+    candidates = list(
+        OutboxMessage.objects.filter(available_at__lte=now).exclude(Exists(waiting_retry)).order_by('id')[:batch_size]
+    )
+    rows, leased_until = _claim(candidates, now)
+    if not rows:
+        return 0
+
+    # Gửi ngoài transaction: không giữ lock/kết nối DB trong lúc chờ event loop (tới CHANNEL_SEND_TIMEOUT_SECONDS)
+    try:
+        outcomes = run_on_asgi_loop(_send_batch, channel_layer, rows)
+    except Exception as e:
+        # Event loop không chạy lô kịp (quá CHANNEL_SEND_TIMEOUT_SECONDS): coi cả lô là gửi lỗi
+        outcomes = [e] * len(rows)
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Chỉ đụng tới dòng còn trong lease của lần giành này
+        leased = OutboxMessage.objects.filter(available_at=leased_until)
+        delivered = [row.pk for row, outcome in zip(rows, outcomes) if outcome is None]
+        leased.filter(pk__in=delivered).delete()
+        retry_at = {}
+        for row, outcome in zip(rows, outcomes):
+            if outcome is None or outcome is _SKIPPED:
+                continue
+            retry_at[row.group] = _record_failure(row, outcome, now, leased_until)
+        for row, outcome in zip(rows, outcomes):
+            if outcome is _SKIPPED:
+                # Chưa thực sự gửi: trả lại lần thử, chờ cùng lúc với message lỗi trước nó (hoặc gửi ngay nếu message đó đã bị bỏ)
+                leased.filter(pk=row.pk).update(available_at=retry_at.get(row.group) or now, attempts=F('attempts') - 1)
+    if len(delivered) < len(rows):
+        logger.warning("dispatch_outbox: %d/%d message(s) not delivered, will retry.", len(rows) - len(delivered), len(rows))
+    return len(delivered)
+
+
+def _record_failure(row, error, now, leased_until):
+    """Lên lịch gửi lại message lỗi; trả về thời điểm gửi lại (None nếu đã bỏ message)."""
+    attempts = row.attempts # Đã tính lần gửi này khi giành dòng
+    leased = OutboxMessage.objects.filter(pk=row.pk, available_at=leased_until)
+    if attempts >= getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 10):
+        # Thông báo đã quá cũ để còn ý nghĩa với client
+        logger.error("dispatch_outbox: Dropping message %s to group %s after %d attempt(s): %s", row.pk, row.group, attempts, error)
+        leased.delete()
+        return None
+    available_at = now + timedelta(seconds=retry_delay_seconds(attempts))
+    leased.update(available_at=available_at, last_error=repr(error)[:MAX_ERROR_LENGTH])
+    return available_at
@@ -0,0 +1,132 @@
+# jobs/queue.py
+"""
+Đưa job vào hàng đợi (bảng jobs_job) trong cùng transaction với thao tác ghi chính của request:
+job chỉ tồn tại nếu thao tác ghi đó commit. Sau khi commit, job được chạy tùy theo JOBS_MODE:
+
+- 'in_process': đánh thức các worker thread trong chính process web (JOBS_IN_PROCESS_WORKERS).
+                Dùng với InMemoryChannelLayer, vì message WebSocket chỉ tới được consumer cùng process;
+                worker thread gửi message trên event loop của ASGI server (jobs/asgi_loop.py).
+- 'worker':     không làm gì; các process `python manage.py run_jobs` lấy job từ DB
+                (cần channel layer dùng chung giữa các process, ví dụ Redis; run_jobs từ chối chạy
+                với InMemoryChannelLayer).
+- 'eager':      chạy ngay sau commit trong thread của request (hành vi cũ; dùng cho test/benchmark).
+Job lỗi ở mọi chế độ vẫn nằm trong DB và được chạy lại với backoff.
+Message outbox (jobs/outbox.py) được gửi bởi cùng các worker này.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import Job
+from .registry import get_job
+
+logger = logging.getLogger(__name__)
+
+MODE_IN_PROCESS = 'in_process'
+MODE_WORKER = 'worker'
+MODE_EAGER = 'eager'
+
+
+def get_jobs_mode():
+    return getattr(settings, 'JOBS_MODE', MODE_IN_PROCESS)
+
+
+def enqueue(name, payload=None, idempotency_key=None, run_at=None, max_attempts=None):
+    """
+    Tạo job `name` với `payload` (dict JSON được). Nếu đã có job cùng `idempotency_key`,
+    trả về job đó và không tạo thêm. Gọi trong transaction.atomic() của thao tác ghi chính.
+    """
+    definition = get_job(name)
+    if definition is None:
+        raise ValueError(f"Job chưa được đăng ký: {name}")
+    fields = {
+        'name': name,
+        'payload': payload or {},
+        'run_at': run_at or timezone.now(),
+        'max_attempts': max_attempts or definition.max_attempts or getattr(settings, 'JOBS_DEFAULT_MAX_ATTEMPTS', 5),
+    }
+    if idempotency_key:
+        try:
+            with transaction.atomic():
+                job = Job.objects.create(idempotency_key=idempotency_key, **fields)
+        except IntegrityError:
+            return Job.objects.get(idempotency_key=idempotency_key)
+    else:
+        job = Job.objects.create(**fields)
+    transaction.on_commit(lambda: _dispatch(job.pk))
+    return job
+
+
+def _dispatch(job_id):
+    mode = get_jobs_mode()
+    if mode == MODE_EAGER:
+        from .worker import JobWorker
+        JobWorker(worker_id='eager').run_job_by_id(job_id)
+    elif mode == MODE_IN_PROCESS:
+        in_process_workers.wake()
+
+
+class InProcessWorkers:
+    """Các worker thread chạy trong process web, được khởi động ở lần enqueue/publish đầu tiên."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event() # Tín hiệu dừng của nhóm thread hiện tại
+        self._threads = []
+
+    def wake(self):
+        self._ensure_started()
+        self._wakeup.set()
+
+    def _ensure_started(self):
+        count = getattr(settings, 'JOBS_IN_PROCESS_WORKERS', 1)
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < count:
+                thread = threading.Thread(
+                    target=self._run, args=(self._stop,), name=f'jobs-worker-{len(self._threads) + 1}', daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        """Dừng các worker thread đang chạy (benchmark kết thúc); wake() sau đó khởi động nhóm thread mới."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+            self._stop.set()
+            self._stop = threading.Event()
+        self._wakeup.set()
+        for thread in threads:
+            thread.join(timeout)
+
+    def _run(self, stop):
+        from .outbox import dispatch_outbox
+        from .worker import JobWorker, default_worker_id
+
+        worker = JobWorker(worker_id=f'{default_worker_id()}:{threading.current_thread().name}')
+        poll_seconds = getattr(settings, 'JOBS_POLL_SECONDS', 2.0)
+        while not stop.is_set():
+            self._wakeup.wait(timeout=poll_seconds)
+            if stop.is_set():
+                break
+            self._wakeup.clear()
+            try:
+                # Ưu tiên gửi thông báo trong outbox rồi mới chạy job
+                while dispatch_outbox() or worker.run_pending():
+                    pass
+            except Exception as e:
+                logger.exception("In-process job worker %s error: %s", worker.worker_id, e)
+            finally:
+                close_old_connections()
+        connection.close()
+
+    def __len__(self):
+        return len(self._threads)
+
+
+# Worker thread dùng chung trong process
+in_process_workers = InProcessWorkers()
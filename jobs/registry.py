@@ -0,0 +1,39 @@
+# jobs/registry.py
+"""
+Đăng ký các hàm job theo tên. Khai báo trong <app>/tasks.py (được nạp tự động khi khởi động):
+
+    @register_job('uploads.dispatch_upload', max_attempts=8)
+    def dispatch_upload(upload_id):
+        ...
+
+Hàm job nhận payload dưới dạng keyword arguments. Job có thể chạy lại (retry, hoặc worker
+chết giữa chừng) nên phải idempotent; raise exception để được chạy lại sau (backoff).
+"""
+_jobs = {}
+
+
+class JobDefinition:
+    __slots__ = ('name', 'func', 'max_attempts')
+
+    def __init__(self, name, func, max_attempts=None):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+
+
+def register_job(name, max_attempts=None):
+    def decorator(func):
+        if name in _jobs and _jobs[name].func is not func:
+            raise ValueError(f"Job '{name}' đã được đăng ký.")
+        _jobs[name] = JobDefinition(name, func, max_attempts)
+        return func
+    return decorator
+
+
+def get_job(name):
+    """JobDefinition của job `name`, hoặc None nếu chưa đăng ký."""
+    return _jobs.get(name)
+
+
+def registered_jobs():
+    return sorted(_jobs)
@@ -0,0 +1,320 @@
+# jobs/tests.py
+import asyncio
+import base64
+import io
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from .asgi_loop import set_asgi_loop
+from .models import Job, OutboxMessage
+from .outbox import dispatch_outbox, publish
+from .queue import enqueue
+from .registry import register_job
+from .worker import JobWorker, purge_finished_jobs, retry_delay_seconds
+
+calls = []
+
+
+@register_job('jobs.tests.record')
+def record_job(value):
+    calls.append(value)
+
+
+@register_job('jobs.tests.flaky', max_attempts=2)
+def flaky_job(value):
+    calls.append(value)
+    raise RuntimeError("Lỗi tạm thời")
+
+
+class JobQueueTest(TestCase):
+
+    def setUp(self):
+        calls.clear()
+        self.worker = JobWorker(worker_id='test-worker')
+
+    def test_enqueue_is_idempotent(self):
+        first = enqueue('jobs.tests.record', {'value': 1}, idempotency_key='record:1')
+        second = enqueue('jobs.tests.record', {'value': 2}, idempotency_key='record:1')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.count(), 1)
+        self.assertEqual(Job.objects.get().payload, {'value': 1})
+
+    def test_enqueue_unknown_job_raises(self):
+        with self.assertRaises(ValueError):
+            enqueue('jobs.tests.missing')
+
+    def test_worker_runs_due_jobs(self):
+        job = enqueue('jobs.tests.record', {'value': 'a'})
+        enqueue('jobs.tests.record', {'value': 'later'}, run_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(self.worker.run_pending(), 1)
+        self.assertEqual(calls, ['a'])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(self.worker.run_pending(), 0) # Không chạy lại job đã xong
+
+    @override_settings(JOBS_RETRY_BASE_SECONDS=10, JOBS_RETRY_MAX_SECONDS=60)
+    def test_failed_job_is_retried_with_backoff_then_failed(self):
+        job = enqueue('jobs.tests.flaky', {'value': 'x'})
+        before = timezone.now()
+        self.worker.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_QUEUED)
+        self.assertIn('Lỗi tạm thời', job.last_error)
+        self.assertGreaterEqual(job.run_at, before + timedelta(seconds=10))
+        self.assertEqual(self.worker.run_pending(), 0) # Chưa tới hạn chạy lại
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.worker.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED) # max_attempts=2
+        self.assertEqual(calls, ['x', 'x'])
+
+    def test_retry_delay_grows_and_is_capped(self):
+        self.assertTrue(5 <= retry_delay_seconds(1, base=5, maximum=100) <= 6.25)
+        self.assertTrue(20 <= retry_delay_seconds(3, base=5, maximum=100) <= 25)
+        self.assertTrue(100 <= retry_delay_seconds(10, base=5, maximum=100) <= 125)
+
+    @override_settings(JOBS_LEASE_SECONDS=60)
+    def test_expired_lease_is_reclaimed(self):
+        job = enqueue('jobs.tests.record', {'value': 'b'})
+        # Worker khác đã lấy job rồi chết
+        Job.objects.filter(pk=job.pk).update(status=Job.STATUS_RUNNING, locked_by='dead', locked_at=timezone.now(), attempts=1)
+        self.assertEqual(self.worker.run_pending(), 0)
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(seconds=120))
+        self.assertEqual(self.worker.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), (Job.STATUS_SUCCEEDED, 2, 'test-worker'))
+
+    @override_settings(JOBS_MODE='eager')
+    def test_eager_mode_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job = enqueue('jobs.tests.record', {'value': 'c'})
+            self.assertEqual(calls, []) # Chưa commit
+        self.assertEqual(calls, ['c'])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+
+    def test_purge_finished_jobs(self):
+        old = enqueue('jobs.tests.record', {'value': 1})
+        failed = enqueue('jobs.tests.record', {'value': 2})
+        Job.objects.filter(pk=old.pk).update(status=Job.STATUS_SUCCEEDED, finished_at=timezone.now() - timedelta(days=30))
+        Job.objects.filter(pk=failed.pk).update(status=Job.STATUS_FAILED, finished_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(purge_finished_jobs(older_than_days=7), 1)
+        self.assertTrue(Job.objects.filter(pk=failed.pk).exists())
+
+
+class SaveResultOutboxTest(APITestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, CAMERA_DEDUP_ENABLED=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _post_result(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (8, 8), 'green').save(buffer, format='JPEG')
+        return self.client.post(reverse('save-processing-result'), {
+            'image_base64': base64.b64encode(buffer.getvalue()).decode('ascii'),
+            'timestamp': '2025-05-01T10:00:00Z',
+            'insects': [{'name': 'muoi_vang'}],
+        }, format='json')
+
+    def test_notification_is_written_to_outbox_and_delivered_after_commit(self):
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)('dashboard_stats_updates', channel_name)
+        self.addCleanup(async_to_sync(channel_layer.group_discard), 'dashboard_stats_updates', channel_name)
+
+        response = self._post_result()
+        self.assertEqual(response.status_code, 201)
+        outbox_message = OutboxMessage.objects.get()
+        self.assertEqual((outbox_message.group, outbox_message.message['type']), ('dashboard_stats_updates', 'send.stats.update'))
+        self.assertFalse(Job.objects.exists()) # Kết quả camera: không có upload nào cần cập nhật hàng đợi
+
+        self.assertEqual(JobWorker(worker_id='test-worker').run_pending(), 0)
+        self.assertEqual(dispatch_outbox(), 1)
+        message = async_to_sync(channel_layer.receive)(channel_name)
+        self.assertEqual(message['type'], 'send.stats.update')
+        self.assertEqual(message['message']['result_id'], response.data['id'])
+        self.assertFalse(OutboxMessage.objects.exists())
+
+
+class FlakyChannelLayer:
+    """Channel layer giả: group_send vào các group trong `failing` bị lỗi."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.sent = []
+
+    async def group_send(self, group, message):
+        if group in self.failing:
+            raise ConnectionError("Channel layer không kết nối được")
+        self.sent.append((group, message['message']))
+
+
+class OutboxTest(TestCase):
+
+    def test_rolled_back_transaction_leaves_no_message(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                publish('group-a', 'send.stats.update', {'n': 1})
+                raise RuntimeError("Ghi dữ liệu lỗi")
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_batch_is_sent_in_order_and_deleted(self):
+        for n in range(3):
+            publish('group-a', 'send.stats.update', {'n': n})
+        publish('group-b', 'send.stats.update', {'n': 9})
+        channel_layer = FlakyChannelLayer()
+        self.assertEqual(dispatch_outbox(batch_size=3, channel_layer=channel_layer), 3)
+        self.assertEqual(dispatch_outbox(batch_size=3, channel_layer=channel_layer), 1)
+        self.assertEqual(channel_layer.sent, [('group-a', {'n': 0}), ('group-a', {'n': 1}), ('group-a', {'n': 2}), ('group-b', {'n': 9})])
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    @override_settings(JOBS_RETRY_BASE_SECONDS=30)
+    def test_failed_send_is_retried_and_keeps_group_order(self):
+        publish('group-a', 'send.stats.update', {'n': 1})
+        publish('group-b', 'send.stats.update', {'n': 2})
+        publish('group-a', 'send.stats.update', {'n': 3})
+        self.assertEqual(dispatch_outbox(channel_layer=FlakyChannelLayer(failing={'group-a'})), 1)
+        pending = list(OutboxMessage.objects.order_by('id'))
+        self.assertEqual([row.message['message']['n'] for row in pending], [1, 3])
+        self.assertEqual([row.attempts for row in pending], [1, 0])
+        self.assertEqual(pending[0].available_at, pending[1].available_at) # Message sau chờ message lỗi
+        self.assertIn('ConnectionError', pending[0].last_error)
+        self.assertEqual(dispatch_outbox(channel_layer=FlakyChannelLayer()), 0) # Chưa tới hạn gửi lại
+
+        OutboxMessage.objects.update(available_at=timezone.now())
+        channel_layer = FlakyChannelLayer()
+        self.assertEqual(dispatch_outbox(channel_layer=channel_layer), 2)
+        self.assertEqual(channel_layer.sent, [('group-a', {'n': 1}), ('group-a', {'n': 3})])
+
+    @override_settings(JOBS_RETRY_BASE_SECONDS=30)
+    def test_message_published_after_failure_waits_for_retry(self):
+        """Message publish sau lần gửi lỗi không được gửi trước message đang chờ gửi lại của cùng group."""
+        publish('group-a', 'send.stats.update', {'n': 1})
+        dispatch_outbox(channel_layer=FlakyChannelLayer(failing={'group-a'}))
+        publish('group-a', 'send.stats.update', {'n': 2})
+        publish('group-b', 'send.stats.update', {'n': 3})
+        channel_layer = FlakyChannelLayer()
+        self.assertEqual(dispatch_outbox(channel_layer=channel_layer), 1)
+        self.assertEqual(channel_layer.sent, [('group-b', {'n': 3})])
+
+        OutboxMessage.objects.filter(attempts=1).update(available_at=timezone.now())
+        self.assertEqual(dispatch_outbox(channel_layer=channel_layer), 2)
+        self.assertEqual(channel_layer.sent[1:], [('group-a', {'n': 1}), ('group-a', {'n': 2})])
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=1)
+    def test_message_dropped_after_max_attempts(self):
+        publish('group-a', 'send.stats.update', {'n': 1})
+        dispatch_outbox(channel_layer=FlakyChannelLayer(failing={'group-a'}))
+        self.assertFalse(OutboxMessage.objects.exists())
+
+
+class LeaseCheckingChannelLayer:
+    """Channel layer ghi lại trạng thái DB trong lúc gửi."""
+
+    def __init__(self):
+        self.seen = []
+
+    async def group_send(self, group, message):
+        def inspect():
+            row = OutboxMessage.objects.get(group=group)
+            return connection.in_atomic_block, row.attempts, row.available_at > timezone.now()
+        self.seen.append(await sync_to_async(inspect)())
+
+
+@override_settings(JOBS_MODE='worker') # Commit không đánh thức worker 'in_process' gửi hộ
+class OutboxLeaseTest(TransactionTestCase):
+
+    def test_rows_are_leased_and_committed_before_sending(self):
+        """Không transaction nào mở trong lúc gửi; dòng đang gửi đã được giành (lease) và ghi nhận lần thử."""
+        publish('group-a', 'send.stats.update', {'n': 1})
+        channel_layer = LeaseCheckingChannelLayer()
+        self.assertEqual(dispatch_outbox(channel_layer=channel_layer), 1)
+        self.assertEqual(channel_layer.seen, [(False, 1, True)])
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_leased_rows_are_resent_after_lease_expires(self):
+        """Dispatcher chết sau khi giành lô: lô bị chặn tới khi hết lease rồi được gửi lại."""
+        publish('group-a', 'send.stats.update', {'n': 1})
+        publish('group-a', 'send.stats.update', {'n': 2})
+        first = OutboxMessage.objects.order_by('id').first()
+        OutboxMessage.objects.filter(pk=first.pk).update(available_at=timezone.now() + timedelta(seconds=60), attempts=1)
+        channel_layer = FlakyChannelLayer()
+        self.assertEqual(dispatch_outbox(channel_layer=channel_layer), 0) # Message sau không vượt lên message đang gửi
+
+        OutboxMessage.objects.filter(pk=first.pk).update(available_at=timezone.now())
+        self.assertEqual(dispatch_outbox(channel_layer=channel_layer), 2)
+        self.assertEqual(channel_layer.sent, [('group-a', {'n': 1}), ('group-a', {'n': 2})])
+
+
+class OutboxAsgiLoopTest(TestCase):
+    """Consumer sống trên event loop riêng (như Daphne), dispatcher chạy ở thread khác (như worker 'in_process')."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        thread.start()
+        set_asgi_loop(self.loop)
+
+        def stop_loop():
+            set_asgi_loop(None)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            thread.join(timeout=5)
+            self.loop.close()
+        self.addCleanup(stop_loop)
+
+    def _on_loop(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def test_message_reaches_waiting_consumer_on_server_loop(self):
+        channel_layer = InMemoryChannelLayer()
+
+        async def subscribe():
+            channel_name = await channel_layer.new_channel()
+            await channel_layer.group_add('group-a', channel_name)
+            return channel_name
+        channel_name = self._on_loop(subscribe()).result(timeout=5)
+        received = self._on_loop(channel_layer.receive(channel_name)) # Consumer đang chờ message
+
+        publish('group-a', 'send.stats.update', {'n': 1})
+        self.assertEqual(dispatch_outbox(channel_layer=channel_layer), 1)
+        # Consumer được đánh thức ngay, không phải chờ tới lần thức dậy kế tiếp của loop
+        message = received.result(timeout=1)
+        self.assertEqual(message, {'type': 'send.stats.update', 'message': {'n': 1}})
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    @override_settings(CHANNEL_SEND_TIMEOUT_SECONDS=0.2, JOBS_RETRY_BASE_SECONDS=30)
+    def test_message_kept_when_server_loop_does_not_send_in_time(self):
+        blocked = threading.Event()
+        self.addCleanup(blocked.set)
+        self.loop.call_soon_threadsafe(blocked.wait) # Loop bận, không chạy được lô
+        publish('group-a', 'send.stats.update', {'n': 1})
+        self.assertEqual(dispatch_outbox(channel_layer=FlakyChannelLayer()), 0)
+        pending = OutboxMessage.objects.get()
+        self.assertEqual(pending.attempts, 1)
+        self.assertIn('TimeoutError', pending.last_error)
+
+
+class RunJobsCommandTest(TestCase):
+
+    def test_refuses_in_memory_channel_layer(self):
+        with self.assertRaises(CommandError):
+            call_command('run_jobs', '--once')
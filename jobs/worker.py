@@ -0,0 +1,127 @@
+# jobs/worker.py
+"""
+Lấy và chạy các job đến hạn.
+
+- Lấy job: chọn các job 'queued' có run_at <= now (index job_status_run_at_idx) và các job
+  'running' đã quá JOBS_LEASE_SECONDS (worker chết giữa chừng), rồi giành từng job bằng một
+  UPDATE có điều kiện (compare-and-set) nên nhiều worker/process chạy song song không lấy trùng.
+- Lỗi: chạy lại sau JOBS_RETRY_BASE_SECONDS * 2^(lần - 1) giây (tối đa JOBS_RETRY_MAX_SECONDS,
+  cộng jitter ngẫu nhiên tới 25%), tới khi hết max_attempts thì chuyển sang 'failed'.
+"""
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+from .registry import get_job
+
+logger = logging.getLogger(__name__)
+
+MAX_ERROR_LENGTH = 4000
+
+
+def retry_delay_seconds(attempt, base=None, maximum=None):
+    """Thời gian chờ trước lần chạy thứ attempt + 1 (exponential backoff + jitter)."""
+    base = base if base is not None else getattr(settings, 'JOBS_RETRY_BASE_SECONDS', 5)
+    maximum = maximum if maximum is not None else getattr(settings, 'JOBS_RETRY_MAX_SECONDS', 600)
+    delay = min(base * (2 ** max(attempt - 1, 0)), maximum)
+    return delay * (1 + random.random() * 0.25)
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class JobWorker:
+
+    def __init__(self, worker_id=None, batch_size=None, names=None):
+        self.worker_id = worker_id or default_worker_id()
+        self.batch_size = batch_size or getattr(settings, 'JOBS_BATCH_SIZE', 20)
+        self.names = names # Chỉ chạy các job có tên trong danh sách này (None = tất cả)
+
+    # --- Lấy job ---
+    def _candidates(self, now):
+        lease_expired_at = now - timedelta(seconds=getattr(settings, 'JOBS_LEASE_SECONDS', 300))
+        queryset = Job.objects.filter(
+            Q(status=Job.STATUS_QUEUED, run_at__lte=now)
+            | Q(status=Job.STATUS_RUNNING, locked_at__lt=lease_expired_at)
+        )
+        if self.names:
+            queryset = queryset.filter(name__in=self.names)
+        return queryset.order_by('run_at', 'id').values_list('pk', 'status', 'locked_at')[:self.batch_size]
+
+    def _claim(self, job_id, status, locked_at, now):
+        """Giành job bằng UPDATE có điều kiện; True nếu worker này giành được."""
+        return bool(
+            Job.objects.filter(pk=job_id, status=status, locked_at=locked_at)
+            .update(status=Job.STATUS_RUNNING, locked_by=self.worker_id, locked_at=now, attempts=F('attempts') + 1)
+        )
+
+    def run_pending(self):
+        """Chạy một lô job đến hạn. Trả về số job đã chạy."""
+        processed = 0
+        now = timezone.now()
+        for job_id, status, locked_at in list(self._candidates(now)):
+            if not self._claim(job_id, status, locked_at, now):
+                continue
+            job = Job.objects.get(pk=job_id)
+            if job.attempts > job.max_attempts:
+                # Worker chạy job này chết quá nhiều lần (hết lease): không chạy lại nữa
+                self._record_failure(job, RuntimeError("Hết lease quá số lần cho phép."), permanent=True)
+            else:
+                self._execute(job)
+            processed += 1
+        return processed
+
+    def run_job_by_id(self, job_id):
+        """Chạy ngay một job cụ thể nếu nó đang chờ (chế độ eager). True nếu đã chạy."""
+        row = Job.objects.filter(pk=job_id, status=Job.STATUS_QUEUED).values_list('status', 'locked_at').first()
+        if row is None or not self._claim(job_id, *row, timezone.now()):
+            return False
+        self._execute(Job.objects.get(pk=job_id))
+        return True
+
+    # --- Chạy job ---
+    def _execute(self, job):
+        definition = get_job(job.name)
+        started_at = time.perf_counter()
+        try:
+            if definition is None:
+                raise LookupError(f"Job chưa được đăng ký: {job.name}")
+            definition.func(**job.payload)
+        except Exception as e:
+            self._record_failure(job, e, permanent=definition is None)
+            return False
+        Job.objects.filter(pk=job.pk, locked_by=self.worker_id).update(
+            status=Job.STATUS_SUCCEEDED, finished_at=timezone.now(), last_error='',
+        )
+        logger.debug("Job %s (%s) succeeded in %.3fs", job.pk, job.name, time.perf_counter() - started_at)
+        return True
+
+    def _record_failure(self, job, error, permanent=False):
+        error_text = ''.join(traceback.format_exception(error))[-MAX_ERROR_LENGTH:]
+        now = timezone.now()
+        if permanent or job.attempts >= job.max_attempts:
+            logger.error("Job %s (%s) failed permanently after %d attempt(s): %s", job.pk, job.name, job.attempts, error)
+            updates = {'status': Job.STATUS_FAILED, 'finished_at': now}
+        else:
+            delay = retry_delay_seconds(job.attempts)
+            logger.warning("Job %s (%s) attempt %d failed, retrying in %.1fs: %s", job.pk, job.name, job.attempts, delay, error)
+            updates = {'status': Job.STATUS_QUEUED, 'run_at': now + timedelta(seconds=delay), 'locked_at': None, 'locked_by': ''}
+        Job.objects.filter(pk=job.pk, locked_by=self.worker_id).update(last_error=error_text, **updates)
+
+
+def purge_finished_jobs(older_than_days=None):
+    """Xóa các job đã thành công cũ hơn N ngày (job thất bại được giữ để điều tra). Trả về số job đã xóa."""
+    days = older_than_days if older_than_days is not None else getattr(settings, 'JOBS_KEEP_SUCCEEDED_DAYS', 7)
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = Job.objects.filter(status=Job.STATUS_SUCCEEDED, finished_at__lt=cutoff).delete()
+    return deleted
@@ -1,10 +1,11 @@
 # livefeed/consumers.py
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
+from monitoring.ws_metrics import WebSocketMetricsMixin
 # Import model User hoặc permission nếu cần kiểm tra quyền Admin phức tạp hơn
 # from accounts.models import CustomUser 
 
-class LiveFeedConsumer(AsyncWebsocketConsumer):
+class LiveFeedConsumer(WebSocketMetricsMixin, AsyncWebsocketConsumer):
     # Tên group phải khớp với tên được dùng trong ReceiveLiveFrameAPIView
     group_name = "live_camera_feed" 
 
@@ -1,4 +1,5 @@
 # livefeed/views.py
+import logging
 from django.utils import timezone
 from datetime import datetime
 from rest_framework.views import APIView
@@ -11,13 +12,17 @@ try:
     from asgiref.sync import async_to_sync
     CHANNELS_INSTALLED_SUCCESSFULLY = True
 except ImportError:
-    print("WARNING: Django Channels is not installed or configured properly. Livefeed features might not work.")
+    logging.getLogger(__name__).warning("Django Channels is not installed or configured properly. Livefeed features might not work.")
     get_channel_layer = lambda: None # Hàm giả
     async_to_sync = lambda func: func # Hàm giả
     CHANNELS_INSTALLED_SUCCESSFULLY = False
 
 import json
-import traceback
+
+# Đo thời gian gửi vào channel layer (RequestTimingMiddleware)
+from monitoring.profiling import SPAN_CHANNEL_SEND, profile_span
+
+logger = logging.getLogger(__name__)
 
 # Tùy chọn: Import permission nếu bạn làm bảo mật API Key
 # from accounts.permissions import HasRPiAPIKey 
@@ -47,23 +52,23 @@ class ReceiveLiveFrameAPIView(APIView):
 
         channel_layer = get_channel_layer() 
         if channel_layer is None: 
-            print("CRITICAL ERROR (ReceiveLiveFrameAPIView): Channel layer is None!")
+            logger.critical("ReceiveLiveFrameAPIView: Channel layer is None!")
             return Response({"error": "Lỗi hệ thống: Channel layer không khả dụng."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         # Tên group mà các Admin client sẽ lắng nghe
         admin_live_feed_group = "live_camera_feed" # Đặt tên group nhất quán
 
         try:
-            async_to_sync(channel_layer.group_send)(
-                admin_live_feed_group, 
-                {
-                    "type": "send.live.frame", # Hàm xử lý trong LiveFeedConsumer (đổi dấu . thành _)
-                    "payload": websocket_payload # Dữ liệu gửi đi
-                }
-            )
+            with profile_span(SPAN_CHANNEL_SEND):
+                async_to_sync(channel_layer.group_send)(
+                    admin_live_feed_group, 
+                    {
+                        "type": "send.live.frame", # Hàm xử lý trong LiveFeedConsumer (đổi dấu . thành _)
+                        "payload": websocket_payload # Dữ liệu gửi đi
+                    }
+                )
             # print(f"DEBUG (ReceiveLiveFrameAPIView): Relayed frame to group '{admin_live_feed_group}'")
             return Response({"status": "frame_relayed"}, status=status.HTTP_200_OK)
-        except Exception as e:
-            print(f"ERROR (ReceiveLiveFrameAPIView): Could not send frame to channel group '{admin_live_feed_group}': {e}")
-            traceback.print_exc() 
+        except Exception:
+            logger.exception("ReceiveLiveFrameAPIView: Could not send frame to channel group '%s'.", admin_live_feed_group)
             return Response({"error": "Lỗi khi chuyển tiếp frame qua WebSocket."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
@@ -12,6 +12,9 @@ import notifications.routing  # Cho UploadStatusConsumer
 import livefeed.routing       # Cho LiveFeedConsumer (app mới)
 import stats.routing        # Thêm dòng này nếu bạn tạo consumer cho stats
 
+# Worker thread nền gửi message WebSocket qua event loop của server (xem jobs/asgi_loop.py)
+from jobs.asgi_loop import remember_asgi_loop
+
 # Chỉ định file settings cho Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main_config.settings')
 
@@ -19,7 +22,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main_config.settings')
 django_asgi_app = get_asgi_application()
 
 # Định nghĩa cấu trúc application ASGI chính
-application = ProtocolTypeRouter({
+router = ProtocolTypeRouter({
     # Xử lý các request HTTP thông thường bằng Django
     "http": django_asgi_app,
 
@@ -38,4 +41,10 @@ application = ProtocolTypeRouter({
             )
         )
     ),
-})
\ No newline at end of file
+})
+
+
+async def application(scope, receive, send):
+    # Ghi nhớ event loop của server để worker thread gửi message channel layer trên đúng loop
+    remember_asgi_loop()
+    return await router(scope, receive, send)
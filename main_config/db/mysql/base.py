@@ -0,0 +1,15 @@
+# main_config/db/mysql/base.py
+"""
+Backend MySQL có pool kết nối (main_config/db/pool.py). Dùng: DATABASES['default']['ENGINE'] = 'main_config.db.mysql'
+(main_config/settings.py tự chọn khi DB_ENGINE là MySQL và DB_POOL_ENABLED bật).
+"""
+from django.db.backends.mysql.base import DatabaseWrapper as MySQLDatabaseWrapper
+
+from main_config.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, MySQLDatabaseWrapper):
+
+    def check_pooled_connection(self, connection):
+        # mysqlclient: một gói COM_PING, raise nếu server đã cắt kết nối
+        connection.ping()
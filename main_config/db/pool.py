@@ -0,0 +1,230 @@
+# main_config/db/pool.py
+"""
+Pool kết nối DB dùng chung trong process cho Django (MySQL không có pool sẵn như PostgreSQL).
+
+Django giữ một kết nối cho mỗi thread và (với CONN_MAX_AGE=0) đóng nó khi request/lệnh
+database_sync_to_async kết thúc (close_old_connections). Với backend pool (main_config/db/mysql):
+- "mở" kết nối = lấy một kết nối rảnh trong pool (chỉ tạo kết nối TCP + xác thực MySQL mới khi pool rỗng);
+- "đóng" kết nối = trả về pool. Kết nối đang dở transaction hoặc vừa gặp lỗi thì bị đóng thật.
+Cấu hình trong DATABASES[alias]['POOL'] (main_config/settings.py, biến môi trường DB_POOL_*):
+- MAX_SIZE: số kết nối mở tối đa (đang dùng + rảnh); hết chỗ thì chờ tối đa TIMEOUT giây.
+- IDLE_TIMEOUT: kết nối rảnh lâu hơn bị đóng (trước khi MySQL wait_timeout tự cắt).
+- HEALTH_CHECK_SECONDS: kết nối rảnh lâu hơn được kiểm tra (ping) trước khi dùng lại.
+"""
+import threading
+import time
+from collections import deque
+
+DEFAULT_POOL_OPTIONS = {
+    'MAX_SIZE': 20,
+    'IDLE_TIMEOUT': 300.0,
+    'HEALTH_CHECK_SECONDS': 30.0,
+    'TIMEOUT': 10.0,
+}
+
+
+class PoolTimeout(Exception):
+    """Không có kết nối rảnh và pool đã đạt MAX_SIZE trong suốt thời gian chờ."""
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """
+    Pool kết nối DB-API an toàn đa luồng. `connect()` tạo kết nối mới, `check(connection)` trả về
+    False/raise nếu kết nối hỏng. Kết nối rảnh được lấy theo LIFO (kết nối vừa dùng, còn "ấm").
+    """
+
+    def __init__(self, connect, check, max_size=20, idle_timeout=300.0, health_check_seconds=30.0, timeout=10.0):
+        self._connect = connect
+        self._check = check
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_seconds = health_check_seconds
+        self.timeout = timeout
+        self._idle = deque() # (kết nối, thời điểm trả về pool); bên trái là kết nối rảnh lâu nhất
+        self._open = 0
+        self._condition = threading.Condition()
+        self._stats = {'created': 0, 'reused': 0, 'closed': 0, 'health_check_failures': 0, 'waits': 0, 'timeouts': 0}
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            candidate = None
+            reserved = False
+            with self._condition:
+                expired = self._prune_idle()
+                if self._idle:
+                    candidate, released_at = self._idle.pop()
+                elif self._open < self.max_size:
+                    self._open += 1
+                    reserved = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(f"Không lấy được kết nối DB sau {self.timeout}s (MAX_SIZE={self.max_size}).")
+                    self._stats['waits'] += 1
+                    self._condition.wait(remaining)
+            for connection in expired:
+                _close_quietly(connection)
+
+            if reserved:
+                return self._create()
+            if candidate is None: # Vừa chờ xong: thử lại
+                continue
+            # Kiểm tra ngoài lock (một round-trip mạng) và chỉ với kết nối đã rảnh đủ lâu
+            if time.monotonic() - released_at < self.health_check_seconds or self._is_healthy(candidate):
+                with self._condition:
+                    self._stats['reused'] += 1
+                return candidate
+            self._discard(candidate, health_check_failed=True)
+
+    def _create(self):
+        try:
+            connection = self._connect()
+        except BaseException:
+            with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._stats['created'] += 1
+        return connection
+
+    def _is_healthy(self, connection):
+        try:
+            return self._check(connection) is not False
+        except Exception:
+            return False
+
+    def _prune_idle(self):
+        """Lấy ra các kết nối rảnh quá IDLE_TIMEOUT (gọi khi đang giữ lock, đóng sau khi nhả lock)."""
+        expired = []
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            expired.append(self._idle.popleft()[0])
+        self._open -= len(expired)
+        self._stats['closed'] += len(expired)
+        if expired:
+            self._condition.notify(len(expired))
+        return expired
+
+    def release(self, connection):
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            expired = self._prune_idle()
+            self._condition.notify()
+        for expired_connection in expired:
+            _close_quietly(expired_connection)
+
+    def _discard(self, connection, health_check_failed=False):
+        with self._condition:
+            self._open -= 1
+            self._stats['closed'] += 1
+            if health_check_failed:
+                self._stats['health_check_failures'] += 1
+            self._condition.notify()
+        _close_quietly(connection)
+
+    def discard(self, connection):
+        """Đóng thật kết nối đang được dùng (không trả về pool)."""
+        self._discard(connection)
+
+    def close_all(self):
+        with self._condition:
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._open -= len(idle)
+            self._stats['closed'] += len(idle)
+            self._condition.notify_all()
+        for connection in idle:
+            _close_quietly(connection)
+
+    def snapshot(self):
+        with self._condition:
+            return {
+                'max_size': self.max_size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                **self._stats,
+            }
+
+
+# alias DB -> ConnectionPool dùng chung cho mọi thread của process
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, factory):
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                pool = _pools[alias] = factory()
+    return pool
+
+
+def pool_snapshots():
+    """{alias: số liệu pool} của các pool đã tạo trong process (cho /api/monitoring/metrics/)."""
+    return {alias: pool.snapshot() for alias, pool in sorted(_pools.items())}
+
+
+def close_pool(alias):
+    with _pools_lock:
+        pool = _pools.pop(alias, None)
+    if pool is not None:
+        pool.close_all()
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Mixin cho DatabaseWrapper của Django: lấy/trả kết nối qua ConnectionPool của alias.
+    Lớp con có thể ghi đè check_pooled_connection() (mặc định chạy SELECT 1).
+    """
+
+    def check_pooled_connection(self, connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+
+    def _create_pool(self, conn_params):
+        options = {**DEFAULT_POOL_OPTIONS, **self.settings_dict.get('POOL', {})}
+        return ConnectionPool(
+            connect=lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params),
+            check=self.check_pooled_connection,
+            max_size=int(options['MAX_SIZE']),
+            idle_timeout=float(options['IDLE_TIMEOUT']),
+            health_check_seconds=float(options['HEALTH_CHECK_SECONDS']),
+            timeout=float(options['TIMEOUT']),
+        )
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, lambda: self._create_pool(self.get_connection_params()))
+
+    def get_new_connection(self, conn_params):
+        return get_pool(self.alias, lambda: self._create_pool(conn_params)).acquire()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # Kết nối đang dở transaction, đã đổi autocommit hoặc vừa gặp lỗi: không đưa lại cho request khác
+        reusable = (
+            not self.in_atomic_block
+            and not self.errors_occurred
+            and self.get_autocommit() == self.settings_dict['AUTOCOMMIT']
+        )
+        if reusable:
+            self.pool.release(self.connection)
+        else:
+            self.pool.discard(self.connection)
@@ -0,0 +1,113 @@
+# main_config/db/routers.py
+"""
+Định tuyến truy vấn đọc sang read replica (DATABASE_ROUTERS).
+
+Mặc định mọi truy vấn đều vào 'default' (primary). Chỉ các view đọc nhiều có ReplicaReadMixin
+(thống kê tần suất, tìm kiếm kết quả, device feed, danh sách thư viện côn trùng) đọc từ replica,
+để không tranh tài nguyên với luồng ghi kết quả từ RPi:
+- Mỗi request chọn MỘT replica trong DB_READ_REPLICAS: mọi query của request thấy cùng một trạng thái dữ liệu.
+- Xác thực và kiểm tra quyền chạy trước khi bật replica nên vẫn dùng primary.
+- Request đã ghi (db_for_write) thì các truy vấn đọc sau đó trong request dùng primary.
+- User vừa ghi (ví dụ upload ảnh) đọc từ primary trong DB_REPLICA_STICKY_SECONDS giây sau đó, để thấy
+  ngay dữ liệu của mình dù replica còn trễ. Mốc này lưu trong cache của Django (CACHES): khi chạy nhiều
+  process cần cache dùng chung (Redis/Memcached), cache mặc định chỉ có hiệu lực trong process.
+Ngoài request HTTP (consumer WebSocket, lệnh quản lý, job nền) mọi truy vấn dùng primary.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+# Trạng thái định tuyến của request hiện tại (ReplicaRoutingMiddleware), None ngoài request
+_request_state = ContextVar('db_replica_request_state', default=None)
+
+STICKY_CACHE_KEY = 'db_replica:sticky:{user_id}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def replica_aliases():
+    return getattr(settings, 'DB_READ_REPLICAS', ())
+
+
+def pin_to_primary(user_id):
+    """User `user_id` vừa ghi: các request của user đọc từ primary trong DB_REPLICA_STICKY_SECONDS giây."""
+    cache.set(STICKY_CACHE_KEY.format(user_id=user_id), True, getattr(settings, 'DB_REPLICA_STICKY_SECONDS', 10.0))
+
+
+def is_pinned_to_primary(user_id):
+    return cache.get(STICKY_CACHE_KEY.format(user_id=user_id), False)
+
+
+def route_reads_to_replica(user_id=None):
+    """
+    Cho các truy vấn đọc còn lại của request hiện tại chạy trên một replica.
+    Trả về alias đã chọn, hoặc None (ngoài request, không có replica, request đã ghi hoặc user đang bị ghim).
+    """
+    state = _request_state.get()
+    replicas = replica_aliases()
+    if state is None or not replicas or state['wrote']:
+        return None
+    if user_id is not None and is_pinned_to_primary(user_id):
+        return None
+    state['replica'] = random.choice(replicas)
+    return state['replica']
+
+
+class ReadReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None or state['replica'] is None or state['wrote']:
+            return None # Django dùng DB của instance (hint) hoặc 'default'
+        return state['replica']
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True # Replica là bản sao của primary
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Tạo trạng thái định tuyến cho từng request; user đã ghi trong request bị ghim vào primary."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = {'replica': None, 'wrote': False}
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state['wrote'] and replica_aliases():
+            # request.user được DRF gán lại sau khi xác thực JWT
+            user_id = getattr(getattr(request, 'user', None), 'id', None)
+            if user_id is not None:
+                pin_to_primary(user_id)
+        return response
+
+
+class ReplicaReadMixin:
+    """
+    Mixin cho view DRF đọc nhiều: truy vấn đọc của các action trong `replica_read_actions`
+    (None = mọi action) với request GET/HEAD/OPTIONS chạy trên replica.
+    """
+    replica_read_actions = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs) # Xác thực, kiểm tra quyền, throttle: trên primary
+        if request.method not in SAFE_METHODS:
+            return
+        if self.replica_read_actions is not None and getattr(self, 'action', None) not in self.replica_read_actions:
+            return
+        route_reads_to_replica(getattr(request.user, 'id', None))
@@ -60,11 +60,15 @@ INSTALLED_APPS = [
     'uploads',
     'stats',
     'livefeed',
+    'monitoring',
+    'mediastore',
+    'jobs',
 ]
 
 ASGI_APPLICATION = 'main_config.asgi.application'
 
 MIDDLEWARE = [
+    'monitoring.middleware.RequestTimingMiddleware', # Đặt đầu tiên để đo toàn bộ request
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,6 +76,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     # 'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'main_config.db.routers.ReplicaRoutingMiddleware', # Đọc từ read replica cho các view đọc nhiều
 ]
 
 ROOT_URLCONF = 'main_config.urls'
@@ -109,9 +114,50 @@ DATABASES = {
             'charset': 'utf8mb4', # Đảm bảo sử dụng utf8mb4
             # 'init_command': "SET sql_mode='STRICT_TRANS_TABLES'", # Tùy chọn
         },
+        # Kiểm tra kết nối cũ còn sống trước khi dùng lại (khi CONN_MAX_AGE > 0)
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# --- Pool kết nối DB (main_config/db/pool.py) ---
+# Dùng chung cho view đồng bộ và database_sync_to_async của consumer: mỗi request/lệnh chỉ mượn kết nối
+# trong pool thay vì mở kết nối MySQL mới. Chỉ áp dụng cho MySQL.
+DB_POOL_ENABLED = os.getenv('DB_POOL_ENABLED', 'True').lower() in ('true', '1', 't')
+if DB_POOL_ENABLED and DATABASES['default']['ENGINE'] == 'django.db.backends.mysql':
+    DATABASES['default']['ENGINE'] = 'main_config.db.mysql'
+    DATABASES['default']['CONN_MAX_AGE'] = 0 # Trả kết nối về pool cuối mỗi request; pool tự quản lý thời gian sống
+    DATABASES['default']['POOL'] = {
+        # Số kết nối mở tối đa của một process (nên >= số thread xử lý của Daphne)
+        'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', '20')),
+        # Đóng kết nối rảnh quá số giây này (phải nhỏ hơn wait_timeout của MySQL)
+        'IDLE_TIMEOUT': float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300')),
+        # Ping kết nối đã rảnh quá số giây này trước khi dùng lại
+        'HEALTH_CHECK_SECONDS': float(os.getenv('DB_POOL_HEALTH_CHECK_SECONDS', '30')),
+        # Số giây chờ tối đa khi pool đã đầy
+        'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+    }
+else:
+    # Không có pool: giữ kết nối của mỗi thread tối đa DB_CONN_MAX_AGE giây (0 = đóng sau mỗi request)
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '0'))
+
+# --- Read replica (main_config/db/routers.py) ---
+# Host MySQL replica, cách nhau bởi dấu phẩy ("host" hoặc "host:port"); rỗng = chỉ dùng 'default'.
+# Replica dùng chung cấu hình (tên DB, user, pool) với 'default'; khi chạy test replica mirror 'default'.
+DB_REPLICA_HOSTS = [host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+DB_READ_REPLICAS = []
+for replica_index, replica_host in enumerate(DB_REPLICA_HOSTS, start=1):
+    replica_hostname, _, replica_port = replica_host.partition(':')
+    DATABASES[f'replica{replica_index}'] = {
+        **DATABASES['default'],
+        'HOST': replica_hostname,
+        'PORT': replica_port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DB_READ_REPLICAS.append(f'replica{replica_index}')
+# Số giây user đọc từ primary sau khi chính user đó ghi (nên lớn hơn độ trễ replication)
+DB_REPLICA_STICKY_SECONDS = float(os.getenv('DB_REPLICA_STICKY_SECONDS', '10'))
+DATABASE_ROUTERS = ['main_config.db.routers.ReadReplicaRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -156,12 +202,40 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# --- Lưu trữ file media (mediastore) ---
+# 'local': FileSystemStorage; 'cas': lưu theo địa chỉ nội dung trong MEDIA_ROOT (nội dung trùng chỉ lưu một lần);
+# 's3': object store S3-compatible (AWS S3/MinIO, hoặc `python manage.py run_object_store_standin` khi dev)
+MEDIA_STORAGE_BACKEND = os.getenv('MEDIA_STORAGE_BACKEND', 'local')
+MEDIA_STORAGE_BACKENDS = {
+    'local': 'django.core.files.storage.FileSystemStorage',
+    'cas': 'mediastore.storage.ContentAddressedStorage',
+    's3': 'mediastore.s3.S3Storage',
+}
+STORAGES = {
+    'default': {'BACKEND': MEDIA_STORAGE_BACKENDS.get(MEDIA_STORAGE_BACKEND, MEDIA_STORAGE_BACKEND)},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+MEDIA_S3_ENDPOINT_URL = os.getenv('MEDIA_S3_ENDPOINT_URL', 'http://127.0.0.1:9000')
+# Endpoint client (trình duyệt) dùng trong presigned URL, để trống = MEDIA_S3_ENDPOINT_URL
+MEDIA_S3_PUBLIC_ENDPOINT_URL = os.getenv('MEDIA_S3_PUBLIC_ENDPOINT_URL', '')
+MEDIA_S3_BUCKET = os.getenv('MEDIA_S3_BUCKET', 'pbl5-media')
+MEDIA_S3_ACCESS_KEY = os.getenv('MEDIA_S3_ACCESS_KEY', '')
+MEDIA_S3_SECRET_KEY = os.getenv('MEDIA_S3_SECRET_KEY', '')
+MEDIA_S3_REGION = os.getenv('MEDIA_S3_REGION', 'us-east-1')
+# Thời gian sống (giây) của presigned URL
+MEDIA_S3_PRESIGN_SECONDS = int(os.getenv('MEDIA_S3_PRESIGN_SECONDS', '3600'))
+# Cách phục vụ file media cục bộ tại MEDIA_URL: 'django' (dev), 'x-accel' (nginx) hoặc 'x-sendfile' (Apache)
+MEDIA_SERVE_MODE = os.getenv('MEDIA_SERVE_MODE', 'django')
+# Location `internal` của nginx trỏ tới MEDIA_ROOT (dùng với MEDIA_SERVE_MODE='x-accel')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+MEDIA_CACHE_MAX_AGE_SECONDS = int(os.getenv('MEDIA_CACHE_MAX_AGE_SECONDS', '86400'))
+
 SIMPLE_JWT = {
     # Đặt thời gian sống cho Access Token theo ý muốn
     # Ví dụ: 1 giờ, 8 giờ, 1 ngày...
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1), # Ví dụ: Access token sống 1 giờ
 
-    # Không cần refresh token nữa
+    # Refresh token không dùng JWT của SimpleJWT mà là phiên lưu trong DB (accounts/refresh.py, REFRESH_TOKEN_LIFETIME_DAYS)
     'REFRESH_TOKEN_LIFETIME': timedelta(days=0), # Hoặc xóa dòng này
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': False,
@@ -201,7 +275,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [], # Vẫn không có permission mặc định
     'UNAUTHENTICATED_USER': None,
     'UNAUTHENTICATED_TOKEN': None,
-    'DEFAULT_RENDERER_CLASSES': ('rest_framework.renderers.JSONRenderer',),
+    'DEFAULT_RENDERER_CLASSES': ('monitoring.renderers.ProfiledJSONRenderer',), # JSONRenderer có đo thời gian render
     'DEFAULT_PARSER_CLASSES': ('rest_framework.parsers.JSONParser',),
 }
 
@@ -261,10 +335,169 @@ REST_FRAMEWORK = {
 #     },
 # }
 
+# Logging không chặn: request thread chỉ đưa record vào hàng đợi,
+# thread nền ghi ra console (xem monitoring/log_handlers.py)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False, # Giữ lại logger mặc định
+    'formatters': {
+        'verbose': {
+            'format': '{levelname} {asctime} {name} {process:d} {thread:d} {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'async_console': {
+            'class': 'monitoring.log_handlers.NonBlockingQueueHandler',
+            'formatter': 'verbose',
+            'max_queue_size': int(os.getenv('LOG_QUEUE_SIZE', '10000')),
+        },
+    },
+    'root': {
+        'handlers': ['async_console'],
+        'level': os.getenv('LOG_LEVEL', 'INFO'), # Đặt DEBUG để xem log chi tiết của các app
+    },
+    'loggers': {
+        'django': {
+            'handlers': ['async_console'],
+            'level': os.getenv('DJANGO_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
 
 
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
+        # InMemoryChannelLayer có đo đạc hàng đợi/message bị bỏ (xem monitoring/channel_layer.py)
+        "BACKEND": "monitoring.channel_layer.InstrumentedInMemoryChannelLayer",
+    },
+}
+
+# Số message tiến độ tối đa mỗi giây gửi cho một client WebSocket upload-status
+# (các sự kiện queued/claimed/processing được gộp phía server)
+UPLOAD_STATUS_MAX_MESSAGES_PER_SECOND = int(os.getenv('UPLOAD_STATUS_MAX_MESSAGES_PER_SECOND', '4'))
+# Khóa RPi gửi trong header X-RPi-Key khi báo tiến độ (POST /api/uploads/progress/<id>/); để trống = từ chối mọi request
+RPI_API_KEY = os.getenv('RPI_API_KEY', '')
+# Số upload đầu hàng đợi được gửi lại vị trí mỗi khi một upload hoàn thành
+UPLOAD_QUEUE_POSITION_BROADCAST_LIMIT = int(os.getenv('UPLOAD_QUEUE_POSITION_BROADCAST_LIMIT', '50'))
+# Số topic tối đa một kết nối ws/multiplex/ được đăng ký
+MULTIPLEX_MAX_TOPICS_PER_CONNECTION = int(os.getenv('MULTIPLEX_MAX_TOPICS_PER_CONNECTION', '100'))
+# Số user tối đa được giữ trong ACL cache (user -> upload sở hữu) của WebSocket consumers (LRU)
+UPLOAD_ACL_CACHE_MAX_USERS = int(os.getenv('UPLOAD_ACL_CACHE_MAX_USERS', '10000'))
+
+# --- Monitoring WebSocket / channel layer ---
+# Hàng đợi của một kết nối vượt ngưỡng này (message) thì bị coi là consumer chậm (0 = tắt)
+WS_SLOW_CONSUMER_QUEUE_THRESHOLD = int(os.getenv('WS_SLOW_CONSUMER_QUEUE_THRESHOLD', '50'))
+# Message nằm chờ trong hàng đợi của một kết nối lâu hơn số giây này cũng bị coi là chậm (0 = tắt)
+WS_SLOW_CONSUMER_QUEUE_WAIT_SECONDS = float(os.getenv('WS_SLOW_CONSUMER_QUEUE_WAIT_SECONDS', '1.0'))
+# True: ngắt kết nối consumer chậm (close code 4008) và giải phóng hàng đợi của nó
+WS_SLOW_CONSUMER_DISCONNECT = os.getenv('WS_SLOW_CONSUMER_DISCONNECT', 'False').lower() in ('true', '1', 't')
+# Token để Prometheus đọc /api/monitoring/metrics/ qua header X-Metrics-Token (để trống = chỉ Admin)
+MONITORING_SCRAPE_TOKEN = os.getenv('MONITORING_SCRAPE_TOKEN', '')
+
+# --- Đo thời gian request (monitoring.middleware.RequestTimingMiddleware) ---
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'True').lower() in ('true', '1', 't')
+# Tỉ lệ request được đo (0.0 - 1.0)
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '1.0'))
+# Số mẫu tối đa giữ cho mỗi view để tính p50/p95/p99
+PROFILING_RESERVOIR_SIZE = int(os.getenv('PROFILING_RESERVOIR_SIZE', '512'))
+
+
+# --- Phân tích côn trùng (/api/stats/analytics/) ---
+# Một ngày bị coi là bất thường khi số cá thể > trung bình + N * độ lệch chuẩn của 7 ngày trước đó
+STATS_ANOMALY_STD_MULTIPLIER = float(os.getenv('STATS_ANOMALY_STD_MULTIPLIER', '3.0'))
+# ... và số cá thể trong ngày ít nhất bằng giá trị này (tránh báo động với số lượng nhỏ)
+STATS_ANOMALY_MIN_COUNT = int(os.getenv('STATS_ANOMALY_MIN_COUNT', '3'))
+
+
+# --- Lưu trữ / dọn dẹp ProcessingResult (python manage.py apply_result_retention, xem results/retention.py) ---
+# Theo từng nguồn: IMAGE_DAYS = xóa ảnh đã xử lý sau N ngày, ARCHIVE_DAYS = chuyển kết quả khỏi bảng chính sau N ngày (0 = không bao giờ)
+# ARCHIVE_TO: 'table' (bảng results_archivedprocessingresult) hoặc 'ndjson' (file .ndjson.gz theo tháng trong RESULT_ARCHIVE_DIR)
+RESULT_RETENTION_POLICIES = {
+    'camera': {
+        'IMAGE_DAYS': int(os.getenv('RESULT_RETENTION_CAMERA_IMAGE_DAYS', '30')),
+        'ARCHIVE_DAYS': int(os.getenv('RESULT_RETENTION_CAMERA_ARCHIVE_DAYS', '180')),
+        'ARCHIVE_TO': os.getenv('RESULT_RETENTION_CAMERA_ARCHIVE_TO', 'table'),
+    },
+    'user_upload': {
+        'IMAGE_DAYS': int(os.getenv('RESULT_RETENTION_UPLOAD_IMAGE_DAYS', '365')),
+        'ARCHIVE_DAYS': int(os.getenv('RESULT_RETENTION_UPLOAD_ARCHIVE_DAYS', '0')),
+        'ARCHIVE_TO': os.getenv('RESULT_RETENTION_UPLOAD_ARCHIVE_TO', 'table'),
     },
 }
+# Thư mục chứa file lưu trữ NDJSON.gz
+RESULT_ARCHIVE_DIR = os.getenv('RESULT_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive'))
+# Số kết quả xử lý mỗi lô và thời gian nghỉ (giây) giữa hai lô (giới hạn tốc độ)
+RESULT_RETENTION_BATCH_SIZE = int(os.getenv('RESULT_RETENTION_BATCH_SIZE', '500'))
+RESULT_RETENTION_BATCH_PAUSE_SECONDS = float(os.getenv('RESULT_RETENTION_BATCH_PAUSE_SECONDS', '0.5'))
+# Số lô tối đa mỗi lần chạy (0 = chạy tới khi hết dữ liệu quá hạn)
+RESULT_RETENTION_MAX_BATCHES = int(os.getenv('RESULT_RETENTION_MAX_BATCHES', '0'))
+
+# --- Gộp khung hình camera trùng lặp khi nhận kết quả (results/dedup.py) ---
+CAMERA_DEDUP_ENABLED = os.getenv('CAMERA_DEDUP_ENABLED', 'True').lower() in ('true', '1', 't')
+# Khoảng cách Hamming tối đa (trên 64 bit dHash) để hai khung hình bị coi là trùng
+CAMERA_DEDUP_MAX_DISTANCE = int(os.getenv('CAMERA_DEDUP_MAX_DISTANCE', '6'))
+# Chỉ gộp vào kết quả gốc cách không quá N giây (sau đó cảnh tĩnh vẫn tạo kết quả mới)
+CAMERA_DEDUP_WINDOW_SECONDS = int(os.getenv('CAMERA_DEDUP_WINDOW_SECONDS', '600'))
+# Số khung hình gần đây giữ cho mỗi thiết bị và số thiết bị tối đa trong bộ nhớ (LRU)
+CAMERA_DEDUP_FRAMES_PER_DEVICE = int(os.getenv('CAMERA_DEDUP_FRAMES_PER_DEVICE', '8'))
+CAMERA_DEDUP_MAX_DEVICES = int(os.getenv('CAMERA_DEDUP_MAX_DEVICES', '1000'))
+
+# --- Hàng đợi job nền cho side effect sau khi ghi (app jobs, python manage.py run_jobs) ---
+# 'in_process' = worker thread trong process web (dùng với InMemoryChannelLayer; message gửi trên event loop của Daphne),
+# 'worker' = chỉ các process run_jobs chạy job (bắt buộc channel layer dùng chung, ví dụ Redis),
+# 'eager' = chạy ngay sau commit trong thread của request
+JOBS_MODE = os.getenv('JOBS_MODE', 'in_process')
+# Số worker thread ở chế độ 'in_process' và chu kỳ (giây) kiểm tra job đến hạn (job chạy lại sau lỗi)
+JOBS_IN_PROCESS_WORKERS = int(os.getenv('JOBS_IN_PROCESS_WORKERS', '1'))
+JOBS_POLL_SECONDS = float(os.getenv('JOBS_POLL_SECONDS', '2.0'))
+# Số job lấy mỗi lượt; job 'running' quá N giây (worker chết giữa chừng) được worker khác lấy lại
+JOBS_BATCH_SIZE = int(os.getenv('JOBS_BATCH_SIZE', '20'))
+JOBS_LEASE_SECONDS = int(os.getenv('JOBS_LEASE_SECONDS', '300'))
+# Chạy lại job lỗi sau BASE * 2^(lần - 1) giây (tối đa MAX giây), tối đa JOBS_DEFAULT_MAX_ATTEMPTS lần
+JOBS_RETRY_BASE_SECONDS = float(os.getenv('JOBS_RETRY_BASE_SECONDS', '5'))
+JOBS_RETRY_MAX_SECONDS = float(os.getenv('JOBS_RETRY_MAX_SECONDS', '600'))
+JOBS_DEFAULT_MAX_ATTEMPTS = int(os.getenv('JOBS_DEFAULT_MAX_ATTEMPTS', '5'))
+# Job thành công được xóa sau N ngày (job thất bại được giữ lại)
+JOBS_KEEP_SUCCEEDED_DAYS = int(os.getenv('JOBS_KEEP_SUCCEEDED_DAYS', '7'))
+# Outbox thông báo WebSocket (jobs/outbox.py): số message gửi mỗi lô và số lần gửi lỗi tối đa trước khi bỏ message
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '10'))
+# Số giây tối đa worker thread chờ event loop của ASGI server gửi xong một lô message (jobs/asgi_loop.py)
+CHANNEL_SEND_TIMEOUT_SECONDS = float(os.getenv('CHANNEL_SEND_TIMEOUT_SECONDS', '10'))
+# Thời gian dispatcher giữ lô message đã giành; phải lớn hơn CHANNEL_SEND_TIMEOUT_SECONDS, hết lease thì lô được gửi lại
+OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', '60'))
+
+# --- Xác thực JWT không truy vấn DB (accounts/authentication.py, accounts/revocation.py) ---
+# True: tin claim đã ký (id, email, user_type) và chỉ kiểm tra danh sách thu hồi trong bộ nhớ
+JWT_STATELESS_AUTH = os.getenv('JWT_STATELESS_AUTH', 'False').lower() in ('true', '1', 't')
+# Chu kỳ (giây) nạp lại danh sách thu hồi để thấy thay đổi từ process khác
+JWT_REVOCATION_REFRESH_SECONDS = float(os.getenv('JWT_REVOCATION_REFRESH_SECONDS', '60'))
+
+# --- Refresh token (accounts/refresh.py) ---
+# Thời gian sống (ngày) của một refresh token; mỗi lần gia hạn cấp token mới với thời hạn mới
+REFRESH_TOKEN_LIFETIME_DAYS = int(os.getenv('REFRESH_TOKEN_LIFETIME_DAYS', '14'))
+
+# --- Quản lý user cho Admin (accounts/views.py AdminUserViewSet) ---
+# Số user mỗi trang (cursor pagination, client có thể đổi bằng ?page_size=, tối đa 200)
+ADMIN_USER_PAGE_SIZE = int(os.getenv('ADMIN_USER_PAGE_SIZE', '50'))
+# Số ID tối đa trong một thao tác hàng loạt (kích hoạt/vô hiệu hóa/xóa)
+ADMIN_USER_BULK_MAX_IDS = int(os.getenv('ADMIN_USER_BULK_MAX_IDS', '1000'))
+
+# --- Tìm kiếm thư viện côn trùng (insect_library/search.py) ---
+# 'auto' = FULLTEXT index với MySQL, chỉ mục ngược (bảng insect_library_insectsearchtoken) với DB khác; 'fulltext' hoặc 'index' để chọn cố định
+INSECT_SEARCH_BACKEND = os.getenv('INSECT_SEARCH_BACKEND', 'auto')
+# Phải bằng innodb_ft_min_token_size của MySQL: từ khóa ngắn hơn không có trong FULLTEXT index nên tra chỉ mục ngược
+INSECT_SEARCH_MYSQL_MIN_TOKEN_SIZE = int(os.getenv('INSECT_SEARCH_MYSQL_MIN_TOKEN_SIZE', '3'))
+# Từ khóa ngắn hơn N ký tự chỉ khớp trọn từ trong chỉ mục ngược (tiền tố 1-2 ký tự khớp gần hết bảng)
+INSECT_SEARCH_MIN_PREFIX_LENGTH = int(os.getenv('INSECT_SEARCH_MIN_PREFIX_LENGTH', '3'))
+# Số kết quả tìm kiếm mỗi trang (client có thể đổi bằng ?page_size=, tối đa 100)
+INSECT_SEARCH_PAGE_SIZE = int(os.getenv('INSECT_SEARCH_PAGE_SIZE', '20'))
+# Số dòng mỗi lô (mỗi lô một transaction) khi nhập hàng loạt thư viện (insect_library/bulk.py)
+INSECT_IMPORT_BATCH_SIZE = int(os.getenv('INSECT_IMPORT_BATCH_SIZE', '500'))
+
+# --- Cache thư viện côn trùng trong process (insect_library/cache.py) ---
+INSECT_LIBRARY_CACHE_ENABLED = os.getenv('INSECT_LIBRARY_CACHE_ENABLED', 'True').lower() in ('true', '1', 't')
+# Chu kỳ (giây) kiểm tra phiên bản thư viện để thấy thay đổi từ process khác
+INSECT_LIBRARY_CACHE_CHECK_SECONDS = float(os.getenv('INSECT_LIBRARY_CACHE_CHECK_SECONDS', '2.0'))
@@ -0,0 +1,23 @@
+# main_config/settings_replicas.py
+"""
+Cấu hình test định tuyến read replica với hai DB SQLite cục bộ: primary ('default') và
+replica ('replica1') độc lập, KHÔNG mirror. Dữ liệu chỉ ghi vào một DB sẽ không thấy ở DB kia,
+nhờ đó test biết được mỗi truy vấn đã chạy trên DB nào.
+
+    python manage.py test results.tests.ReadReplicaRoutingTest --settings=main_config.settings_replicas
+
+Chỉ dùng cho test định tuyến: các test khác ghi dữ liệu vào primary rồi đọc qua view đọc từ replica.
+"""
+from .settings import *
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica_test_primary.sqlite3',
+    },
+    'replica1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica_test_replica1.sqlite3',
+    },
+}
+DB_READ_REPLICAS = ['replica1']
@@ -2,7 +2,6 @@
 
 from django.urls import path, include
 from django.conf import settings      # Thêm nếu cần cấu hình media/static
-from django.conf.urls.static import static # Thêm nếu cần cấu hình media/static
 
 urlpatterns = [
     # DÒNG QUAN TRỌNG CẦN THÊM/SỬA:
@@ -15,12 +14,10 @@ urlpatterns = [
     path('api/results/', include('results.urls')),
     path('api/stats/', include('stats.urls')), 
     path('api/livefeed/', include('livefeed.urls')),
+    path('api/monitoring/', include('monitoring.urls')),
 ]
 
-# (Tùy chọn) Thêm phần này nếu bạn muốn serve file media khi DEBUG=True
-# if settings.DEBUG:
-#     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-
-# Dòng này rất quan trọng cho việc xem ảnh khi dev
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# File media: Django chỉ cấp URL/header, byte do web server (X-Accel-Redirect/X-Sendfile) hoặc
+# object store (presigned URL) gửi đi; MEDIA_SERVE_MODE='django' tự stream file khi dev (xem mediastore/views.py)
+if settings.DEBUG or settings.MEDIA_SERVE_MODE != 'django' or settings.MEDIA_STORAGE_BACKEND == 's3':
+    urlpatterns += [path(settings.MEDIA_URL.lstrip('/'), include('mediastore.urls'))]
\ No newline at end of file
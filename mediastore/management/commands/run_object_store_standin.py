@@ -0,0 +1,37 @@
+# mediastore/management/commands/run_object_store_standin.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from mediastore.standin import ObjectStoreStandin
+
+
+class Command(BaseCommand):
+    help = (
+        "Chạy object store S3-compatible tối giản (kiểu MinIO) để dev/test với MEDIA_STORAGE_BACKEND=s3. "
+        "Dùng cùng access key/secret key/region với MEDIA_S3_*. Không dùng cho production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=9000)
+        parser.add_argument('--root', default=None, help='Thư mục lưu object (mặc định <BASE_DIR>/object_store).')
+        parser.add_argument('--verbose', action='store_true', help='In log từng request.')
+
+    def handle(self, *args, **options):
+        root = options['root'] or str(settings.BASE_DIR / 'object_store')
+        server = ObjectStoreStandin(
+            root,
+            access_key=settings.MEDIA_S3_ACCESS_KEY,
+            secret_key=settings.MEDIA_S3_SECRET_KEY,
+            region=settings.MEDIA_S3_REGION,
+            host=options['host'],
+            port=options['port'],
+            verbose=options['verbose'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Object store stand-in: {server.endpoint_url} (thư mục {root}). Ctrl+C để dừng."))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,220 @@
+# mediastore/s3.py
+"""
+Storage backend cho object store tương thích S3 (AWS S3, MinIO, hoặc stand-in cục bộ
+trong mediastore/standin.py), dùng path-style URL: <endpoint>/<bucket>/<key>.
+
+Ký request bằng AWS Signature Version 4 (chỉ dùng thư viện chuẩn, không cần boto3):
+- PUT/GET/HEAD/DELETE ký qua header Authorization.
+- url(name) trả về presigned URL (ký trong query string, hết hạn sau MEDIA_S3_PRESIGN_SECONDS):
+  client tải byte trực tiếp từ object store, Django chỉ cấp URL.
+"""
+import hashlib
+import hmac
+import logging
+import mimetypes
+import posixpath
+from datetime import datetime, timezone as dt_timezone
+from email.utils import parsedate_to_datetime
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote, urlsplit
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+logger = logging.getLogger(__name__)
+
+ALGORITHM = 'AWS4-HMAC-SHA256'
+SERVICE = 's3'
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+AMZ_DATE_FORMAT = '%Y%m%dT%H%M%SZ'
+MAX_PRESIGN_SECONDS = 7 * 24 * 3600 # Giới hạn của SigV4
+
+
+class S3StorageError(OSError):
+    """Object store trả lỗi (kế thừa OSError để nơi gọi storage xử lý như lỗi file)."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def _sha256_hex(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _hmac(key, message):
+    return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+
+def canonical_uri(path):
+    # Mỗi đoạn path được mã hóa một lần (S3 không mã hóa hai lần như các dịch vụ AWS khác)
+    return quote(path, safe='/~')
+
+
+def canonical_query(params):
+    return '&'.join(
+        f"{quote(str(key), safe='~')}={quote(str(value), safe='~')}"
+        for key, value in sorted(params.items())
+    )
+
+
+def host_header(endpoint_url):
+    parts = urlsplit(endpoint_url)
+    default_port = 443 if parts.scheme == 'https' else 80
+    if parts.port and parts.port != default_port:
+        return f'{parts.hostname}:{parts.port}'
+    return parts.hostname
+
+
+class SigV4Signer:
+    """Tính chữ ký AWS Signature Version 4 (dùng chung cho client và stand-in)."""
+
+    def __init__(self, access_key, secret_key, region):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+
+    def scope(self, date_stamp):
+        return f'{date_stamp}/{self.region}/{SERVICE}/aws4_request'
+
+    def signature(self, method, path, query, headers, signed_headers, payload_hash, amz_date):
+        """
+        headers: {tên header viết thường: giá trị}; signed_headers: danh sách tên header được ký.
+        query: các tham số query (không gồm X-Amz-Signature).
+        """
+        canonical_headers = ''.join(f"{name}:{' '.join(str(headers[name]).split())}\n" for name in signed_headers)
+        canonical_request = '\n'.join([
+            method, canonical_uri(path), canonical_query(query),
+            canonical_headers, ';'.join(signed_headers), payload_hash,
+        ])
+        date_stamp = amz_date[:8]
+        string_to_sign = '\n'.join([ALGORITHM, amz_date, self.scope(date_stamp), _sha256_hex(canonical_request.encode('utf-8'))])
+        key = _hmac(('AWS4' + self.secret_key).encode('utf-8'), date_stamp)
+        for part in (self.region, SERVICE, 'aws4_request'):
+            key = _hmac(key, part)
+        return hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def authorization_header(self, signed_headers, signature, amz_date):
+        return (
+            f"{ALGORITHM} Credential={self.access_key}/{self.scope(amz_date[:8])}, "
+            f"SignedHeaders={';'.join(signed_headers)}, Signature={signature}"
+        )
+
+    def presign(self, method, endpoint_url, path, expires, now=None):
+        """URL đã ký (query string) cho `method` tới `path`, hết hạn sau `expires` giây."""
+        amz_date = (now or datetime.now(dt_timezone.utc)).strftime(AMZ_DATE_FORMAT)
+        query = {
+            'X-Amz-Algorithm': ALGORITHM,
+            'X-Amz-Credential': f'{self.access_key}/{self.scope(amz_date[:8])}',
+            'X-Amz-Date': amz_date,
+            'X-Amz-Expires': str(int(expires)),
+            'X-Amz-SignedHeaders': 'host',
+        }
+        headers = {'host': host_header(endpoint_url)}
+        query['X-Amz-Signature'] = self.signature(method, path, query, headers, ['host'], UNSIGNED_PAYLOAD, amz_date)
+        return f"{endpoint_url.rstrip('/')}{canonical_uri(path)}?{canonical_query(query)}"
+
+
+@deconstructible
+class S3Storage(Storage):
+    """Storage Django lưu file vào bucket S3-compatible (cấu hình MEDIA_S3_* trong settings)."""
+
+    def __init__(self, endpoint_url=None, bucket=None, access_key=None, secret_key=None, region=None,
+                 location=None, presign_seconds=None, public_endpoint_url=None, timeout=None):
+        self.endpoint_url = (endpoint_url or getattr(settings, 'MEDIA_S3_ENDPOINT_URL', '')).rstrip('/')
+        self.bucket = bucket or getattr(settings, 'MEDIA_S3_BUCKET', '')
+        if not self.endpoint_url or not self.bucket:
+            raise ImproperlyConfigured("S3Storage cần MEDIA_S3_ENDPOINT_URL và MEDIA_S3_BUCKET.")
+        self.signer = SigV4Signer(
+            access_key or getattr(settings, 'MEDIA_S3_ACCESS_KEY', ''),
+            secret_key or getattr(settings, 'MEDIA_S3_SECRET_KEY', ''),
+            region or getattr(settings, 'MEDIA_S3_REGION', 'us-east-1'),
+        )
+        self.location = (location if location is not None else getattr(settings, 'MEDIA_S3_LOCATION', '')).strip('/')
+        self.presign_seconds = min(presign_seconds or getattr(settings, 'MEDIA_S3_PRESIGN_SECONDS', 3600), MAX_PRESIGN_SECONDS)
+        # Endpoint mà trình duyệt truy cập được (có thể khác endpoint nội bộ server dùng)
+        self.public_endpoint_url = (public_endpoint_url or getattr(settings, 'MEDIA_S3_PUBLIC_ENDPOINT_URL', '') or self.endpoint_url).rstrip('/')
+        self.timeout = timeout or getattr(settings, 'MEDIA_S3_TIMEOUT_SECONDS', 10)
+
+    # --- Request đã ký ---
+    def _object_path(self, name):
+        key = posixpath.join(self.location, name) if self.location else name
+        return f'/{self.bucket}/{key.lstrip("/")}'
+
+    def _request(self, method, name, body=b'', headers=None):
+        path = self._object_path(name)
+        amz_date = datetime.now(dt_timezone.utc).strftime(AMZ_DATE_FORMAT)
+        payload_hash = _sha256_hex(body)
+        signed = {'host': host_header(self.endpoint_url), 'x-amz-content-sha256': payload_hash, 'x-amz-date': amz_date}
+        signed_headers = sorted(signed)
+        signature = self.signer.signature(method, path, {}, signed, signed_headers, payload_hash, amz_date)
+        request_headers = dict(headers or {})
+        request_headers.update({
+            'x-amz-content-sha256': payload_hash,
+            'x-amz-date': amz_date,
+            'Authorization': self.signer.authorization_header(signed_headers, signature, amz_date),
+        })
+        request = Request(self.endpoint_url + canonical_uri(path), data=body if method == 'PUT' else None, headers=request_headers, method=method)
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.headers, response.read()
+        except HTTPError as e:
+            return e.code, e.headers, e.read()
+        except URLError as e:
+            raise S3StorageError(f"Không kết nối được object store {self.endpoint_url}: {e.reason}") from e
+
+    def _check(self, method, name, status, body):
+        if status >= 300:
+            raise S3StorageError(f"{method} {name} thất bại (HTTP {status}): {body[:200]!r}", status=status)
+
+    # --- Storage API ---
+    def _save(self, name, content):
+        body = b''.join(content.chunks()) # Storage.save() luôn truyền vào một File
+        content_type = getattr(content, 'content_type', None) or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        status, _, response_body = self._request('PUT', name, body, {'Content-Type': content_type})
+        self._check('PUT', name, status, response_body)
+        return name
+
+    def _open(self, name, mode='rb'):
+        status, _, body = self._request('GET', name)
+        if status == 404:
+            raise FileNotFoundError(name)
+        self._check('GET', name, status, body)
+        return ContentFile(body, name=name)
+
+    def _head(self, name):
+        status, headers, _ = self._request('HEAD', name)
+        if status == 404:
+            return None
+        self._check('HEAD', name, status, b'')
+        return headers
+
+    def exists(self, name):
+        return self._head(name) is not None
+
+    def delete(self, name):
+        status, _, body = self._request('DELETE', name)
+        if status != 404:
+            self._check('DELETE', name, status, body)
+
+    def size(self, name):
+        headers = self._head(name)
+        if headers is None:
+            raise FileNotFoundError(name)
+        return int(headers.get('Content-Length', 0))
+
+    def get_modified_time(self, name):
+        headers = self._head(name)
+        if headers is None:
+            raise FileNotFoundError(name)
+        modified = parsedate_to_datetime(headers['Last-Modified'])
+        return modified if settings.USE_TZ else timezone.make_naive(modified)
+
+    def url(self, name):
+        """Presigned GET URL: client tải byte trực tiếp từ object store."""
+        return self.signer.presign('GET', self.public_endpoint_url, self._object_path(name), self.presign_seconds)
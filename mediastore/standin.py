@@ -0,0 +1,189 @@
+# mediastore/standin.py
+"""
+Object store S3-compatible tối giản (kiểu MinIO) để dev/test S3Storage mà không cần dịch vụ thật:
+`python manage.py run_object_store_standin`.
+
+Hỗ trợ PUT/GET/HEAD/DELETE object theo path-style (/<bucket>/<key>), lưu file dưới một thư mục
+gốc, kiểm tra chữ ký SigV4 (header Authorization hoặc presigned query kèm hạn dùng).
+Bucket được tạo tự động ở lần PUT đầu tiên. Không dùng cho production.
+"""
+import hmac
+import json
+import mimetypes
+import os
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from .s3 import AMZ_DATE_FORMAT, UNSIGNED_PAYLOAD, SigV4Signer, _sha256_hex
+
+META_SUFFIX = '.standin-meta'
+ERROR_TEMPLATE = '<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code><Message>{message}</Message></Error>'
+
+
+class SignatureError(Exception):
+    pass
+
+
+class ObjectStoreRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'ObjectStoreStandin/1.0'
+
+    # --- Tiện ích ---
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_error(self, status, code, message):
+        body = ERROR_TEMPLATE.format(code=code, message=message).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _object_file(self, path):
+        """Đường dẫn file của /<bucket>/<key> (None nếu path không hợp lệ)."""
+        parts = [part for part in unquote(path).split('/') if part]
+        if len(parts) < 2 or any(part in ('.', '..') for part in parts) or parts[-1].endswith(META_SUFFIX):
+            return None
+        return os.path.join(self.server.root, *parts)
+
+    def _verify_signature(self, path, query, body):
+        signer = self.server.signer
+        headers = {name.lower(): value for name, value in self.headers.items()}
+        if 'X-Amz-Signature' in query:
+            query = dict(query)
+            signature = query.pop('X-Amz-Signature')
+            amz_date = query.get('X-Amz-Date', '')
+            signed_headers = query.get('X-Amz-SignedHeaders', '').split(';')
+            credential = query.get('X-Amz-Credential', '')
+            payload_hash = UNSIGNED_PAYLOAD
+            try:
+                issued_at = datetime.strptime(amz_date, AMZ_DATE_FORMAT).replace(tzinfo=dt_timezone.utc)
+                expires = int(query.get('X-Amz-Expires', '0'))
+            except ValueError:
+                raise SignatureError("Presigned URL không hợp lệ.")
+            if datetime.now(dt_timezone.utc) > issued_at + timedelta(seconds=expires):
+                raise SignatureError("Presigned URL đã hết hạn.")
+        else:
+            authorization = headers.get('authorization', '')
+            fields = dict(item.strip().split('=', 1) for item in authorization.partition(' ')[2].split(',') if '=' in item)
+            signature = fields.get('Signature', '')
+            credential = fields.get('Credential', '')
+            signed_headers = fields.get('SignedHeaders', '').split(';')
+            amz_date = headers.get('x-amz-date', '')
+            payload_hash = headers.get('x-amz-content-sha256', '')
+            if payload_hash != UNSIGNED_PAYLOAD and payload_hash != _sha256_hex(body):
+                raise SignatureError("x-amz-content-sha256 không khớp nội dung.")
+        if not credential.startswith(f'{signer.access_key}/') or any(name not in headers for name in signed_headers):
+            raise SignatureError("Sai access key hoặc thiếu header đã ký.")
+        expected = signer.signature(self.command, unquote(path), query, headers, signed_headers, payload_hash, amz_date)
+        if not hmac.compare_digest(expected, signature):
+            raise SignatureError("Chữ ký không khớp.")
+
+    def _prepare(self):
+        parts = urlsplit(self.path)
+        query = dict(parse_qsl(parts.query, keep_blank_values=True))
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        file_path = self._object_file(parts.path)
+        if file_path is None:
+            self._send_error(400, 'InvalidRequest', 'Path phải có dạng /<bucket>/<key>.')
+            return None
+        try:
+            self._verify_signature(parts.path, query, body)
+        except SignatureError as e:
+            self._send_error(403, 'SignatureDoesNotMatch', str(e))
+            return None
+        return file_path, body
+
+    # --- Các method ---
+    def do_PUT(self):
+        prepared = self._prepare()
+        if prepared is None:
+            return
+        file_path, body = prepared
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temp_path = f'{file_path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as object_file:
+            object_file.write(body)
+        os.replace(temp_path, file_path)
+        with open(file_path + META_SUFFIX, 'w', encoding='utf-8') as meta_file:
+            json.dump({'content_type': self.headers.get('Content-Type') or 'application/octet-stream'}, meta_file)
+        self.send_response(200)
+        self.send_header('ETag', f'"{_sha256_hex(body)[:32]}"')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send_object(self, include_body):
+        prepared = self._prepare()
+        if prepared is None:
+            return
+        file_path, _ = prepared
+        if not os.path.isfile(file_path):
+            self._send_error(404, 'NoSuchKey', 'Object không tồn tại.')
+            return
+        try:
+            with open(file_path + META_SUFFIX, encoding='utf-8') as meta_file:
+                content_type = json.load(meta_file)['content_type']
+        except (OSError, ValueError, KeyError):
+            content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        stat = os.stat(file_path)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(stat.st_size))
+        self.send_header('Last-Modified', formatdate(stat.st_mtime, usegmt=True))
+        self.end_headers()
+        if include_body:
+            with open(file_path, 'rb') as object_file:
+                self.wfile.write(object_file.read())
+
+    def do_GET(self):
+        self._send_object(include_body=True)
+
+    def do_HEAD(self):
+        self._send_object(include_body=False)
+
+    def do_DELETE(self):
+        prepared = self._prepare()
+        if prepared is None:
+            return
+        file_path, _ = prepared
+        for path in (file_path, file_path + META_SUFFIX):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.send_response(204)
+        self.end_headers()
+
+
+class ObjectStoreStandin(ThreadingHTTPServer):
+    """Server stand-in; chạy nền bằng start() (dùng trong test) hoặc serve_forever()."""
+    daemon_threads = True
+
+    def __init__(self, root, access_key, secret_key, region='us-east-1', host='127.0.0.1', port=0, verbose=False):
+        super().__init__((host, port), ObjectStoreRequestHandler)
+        self.root = root
+        self.signer = SigV4Signer(access_key, secret_key, region)
+        self.verbose = verbose
+        self._thread = None
+
+    @property
+    def endpoint_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='object-store-standin', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
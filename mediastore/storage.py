@@ -0,0 +1,115 @@
+# mediastore/storage.py
+"""
+Storage cục bộ lưu nội dung theo địa chỉ nội dung (content-addressed).
+
+Mỗi nội dung được lưu MỘT lần dưới <MEDIA_ROOT>/.cas/<2 ký tự đầu>/<sha256>; tên file mà model
+lưu (ví dụ processed_results/.../processed_<uuid>.jpg) là hard link tới blob đó. Vì vậy:
+- Đường dẫn/URL của file không đổi so với FileSystemStorage (nginx vẫn phục vụ trực tiếp).
+- Ảnh/upload giống hệt nhau chỉ tốn dung lượng một lần.
+- Xóa một tên chỉ gỡ link; blob bị xóa khi không còn tên nào trỏ tới (st_nlink == 1).
+Filesystem không hỗ trợ hard link: file được sao chép (vẫn đúng, chỉ không tiết kiệm dung lượng).
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = '.cas'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def blob_path(self, digest):
+        return os.path.join(self.location, BLOB_DIR, digest[:2], digest)
+
+    def _store_blob(self, content):
+        """Ghi nội dung vào blob (nếu chưa có). Trả về (sha256, đường dẫn blob)."""
+        blob_root = os.path.join(self.location, BLOB_DIR)
+        os.makedirs(blob_root, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=blob_root, prefix='incoming-', delete=False) as temp_file:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                temp_file.write(chunk)
+        digest = digest.hexdigest()
+        blob_path = self.blob_path(digest)
+        if os.path.exists(blob_path):
+            os.remove(temp_file.name)
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_file.name, self.file_permissions_mode)
+            os.replace(temp_file.name, blob_path) # Nguyên tử: không ai thấy blob ghi dở
+        return digest, blob_path
+
+    def _link(self, blob_path, full_path):
+        try:
+            os.link(blob_path, full_path)
+        except (FileExistsError, FileNotFoundError):
+            raise
+        except OSError as e:
+            # Filesystem không hỗ trợ hard link (EPERM/EXDEV/...): sao chép
+            logger.debug("ContentAddressedStorage: hard link failed (%s), copying %s", e, full_path)
+            with open(blob_path, 'rb') as source, open(full_path, 'xb') as target:
+                shutil.copyfileobj(source, target)
+
+    def _save(self, name, content):
+        _, blob_path = self._store_blob(content)
+        while True:
+            full_path = self.path(name)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            try:
+                self._link(blob_path, full_path)
+                break
+            except FileExistsError:
+                # Tên đã bị file khác chiếm (giống FileSystemStorage): chọn tên khác
+                name = self.get_available_name(name)
+            except FileNotFoundError:
+                # Blob vừa bị dọn bởi một lần xóa song song: ghi lại
+                _, blob_path = self._store_blob(content)
+        return str(name).replace('\\', '/')
+
+    def content_hash(self, name):
+        """sha256 của nội dung file `name` (dùng làm ETag, kiểm tra trùng lặp)."""
+        digest = hashlib.sha256()
+        with self.open(name, 'rb') as stored_file:
+            for chunk in stored_file.chunks():
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def delete(self, name):
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        full_path = self.path(name)
+        try:
+            links = os.stat(full_path).st_nlink
+        except FileNotFoundError:
+            return
+        blob_path = self.blob_path(self.content_hash(name)) if links == 2 else None
+        super().delete(name)
+        # Chỉ còn blob trỏ tới nội dung này -> dọn blob
+        if blob_path is not None:
+            try:
+                if os.stat(blob_path).st_nlink == 1:
+                    os.remove(blob_path)
+            except FileNotFoundError:
+                pass
+
+    def collect_garbage(self):
+        """Xóa các blob không còn tên nào trỏ tới (ví dụ sau khi xóa file ngoài Django). Trả về số blob đã xóa."""
+        removed = 0
+        blob_root = os.path.join(self.location, BLOB_DIR)
+        for directory, _, file_names in os.walk(blob_root):
+            for file_name in file_names:
+                blob_path = os.path.join(directory, file_name)
+                if not file_name.startswith('incoming-') and os.stat(blob_path).st_nlink == 1:
+                    os.remove(blob_path)
+                    removed += 1
+        return removed
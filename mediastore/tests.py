@@ -0,0 +1,162 @@
+# mediastore/tests.py
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from django.core.files.base import ContentFile
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from .s3 import S3Storage, S3StorageError, SigV4Signer
+from .standin import ObjectStoreStandin
+from .storage import BLOB_DIR, ContentAddressedStorage
+from .views import serve_media
+
+ACCESS_KEY = 'standin-access'
+SECRET_KEY = 'standin-secret'
+
+
+class ContentAddressedStorageTest(SimpleTestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def _blobs(self):
+        blob_root = os.path.join(self.location, BLOB_DIR)
+        return [os.path.join(directory, name) for directory, _, names in os.walk(blob_root) for name in names]
+
+    def test_identical_content_is_stored_once(self):
+        first = self.storage.save('processed_results/a.jpg', ContentFile(b'same-bytes'))
+        second = self.storage.save('user_uploads/1/b.jpg', ContentFile(b'same-bytes'))
+        self.assertEqual(first, 'processed_results/a.jpg')
+        with self.storage.open(second) as stored_file:
+            self.assertEqual(stored_file.read(), b'same-bytes')
+        self.assertEqual(len(self._blobs()), 1)
+        self.assertTrue(os.path.samefile(self.storage.path(first), self.storage.path(second)))
+
+    def test_blob_removed_with_last_name(self):
+        first = self.storage.save('a.jpg', ContentFile(b'content'))
+        second = self.storage.save('b.jpg', ContentFile(b'content'))
+        self.storage.delete(first)
+        self.assertFalse(self.storage.exists(first))
+        self.assertEqual(len(self._blobs()), 1) # second vẫn dùng blob
+        self.storage.delete(second)
+        self.assertEqual(self._blobs(), [])
+
+    def test_existing_name_gets_new_name(self):
+        first = self.storage.save('a.jpg', ContentFile(b'one'))
+        second = self.storage.save('a.jpg', ContentFile(b'two'))
+        self.assertNotEqual(first, second)
+        with self.storage.open(first) as stored_file:
+            self.assertEqual(stored_file.read(), b'one')
+
+    def test_collect_garbage(self):
+        name = self.storage.save('a.jpg', ContentFile(b'orphan'))
+        os.remove(self.storage.path(name)) # Xóa ngoài Django
+        self.assertEqual(self.storage.collect_garbage(), 1)
+        self.assertEqual(self._blobs(), [])
+
+
+class S3StorageStandinTest(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp()
+        cls.server = ObjectStoreStandin(cls.root, ACCESS_KEY, SECRET_KEY).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.storage = S3Storage(
+            endpoint_url=self.server.endpoint_url, bucket='media',
+            access_key=ACCESS_KEY, secret_key=SECRET_KEY, presign_seconds=60,
+        )
+
+    def test_save_open_delete(self):
+        name = self.storage.save('processed_results/2025/05/01/frame one.jpg', ContentFile(b'jpeg-bytes'))
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.storage.size(name), len(b'jpeg-bytes'))
+        with self.storage.open(name) as stored_file:
+            self.assertEqual(stored_file.read(), b'jpeg-bytes')
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        with self.assertRaises(FileNotFoundError):
+            self.storage.open(name)
+
+    def test_presigned_url_streams_from_object_store(self):
+        name = self.storage.save('user_uploads/1/photo.png', ContentFile(b'png-bytes'))
+        url = self.storage.url(name)
+        self.assertIn('X-Amz-Signature=', url)
+        with urlopen(url) as response:
+            self.assertEqual(response.read(), b'png-bytes')
+            self.assertEqual(response.headers['Content-Type'], 'image/png')
+        with self.assertRaises(HTTPError) as tampered:
+            urlopen(url.replace('photo.png', 'other.png'))
+        self.assertEqual(tampered.exception.code, 403)
+
+    def test_expired_presigned_url_is_rejected(self):
+        name = self.storage.save('old.jpg', ContentFile(b'x'))
+        signer = SigV4Signer(ACCESS_KEY, SECRET_KEY, 'us-east-1')
+        issued_at = datetime.now(dt_timezone.utc) - timedelta(hours=2)
+        url = signer.presign('GET', self.server.endpoint_url, self.storage._object_path(name), 60, now=issued_at)
+        with self.assertRaises(HTTPError) as expired:
+            urlopen(url)
+        self.assertEqual(expired.exception.code, 403)
+
+    def test_wrong_secret_is_rejected(self):
+        storage = S3Storage(endpoint_url=self.server.endpoint_url, bucket='media', access_key=ACCESS_KEY, secret_key='wrong')
+        with self.assertRaises(S3StorageError) as error:
+            storage.save('denied.jpg', ContentFile(b'x'))
+        self.assertEqual(error.exception.status, 403)
+
+    def test_serve_media_redirects_to_presigned_url(self):
+        name = self.storage.save('redirect.jpg', ContentFile(b'x'))
+        response = serve_media(RequestFactory().get(f'/media/{name}'), name, storage=self.storage)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith(f'{self.server.endpoint_url}/media/redirect.jpg?'))
+
+
+class ServeMediaTest(SimpleTestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.location)
+        self.name = self.storage.save('processed_results/2025/05/01/a b.jpg', ContentFile(b'image'))
+        self.factory = RequestFactory()
+
+    def _serve(self, path):
+        return serve_media(self.factory.get(f'/media/{path}'), path, storage=self.storage)
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel', MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_x_accel_redirect(self):
+        response = self._serve(self.name)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/processed_results/2025/05/01/a%20b.jpg')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response.content, b'')
+        self.assertIn('max-age', response['Cache-Control'])
+
+    @override_settings(MEDIA_SERVE_MODE='x-sendfile')
+    def test_x_sendfile(self):
+        response = self._serve(self.name)
+        self.assertEqual(response['X-Sendfile'], self.storage.path(self.name))
+
+    @override_settings(MEDIA_SERVE_MODE='django')
+    def test_django_streams_file(self):
+        response = self._serve(self.name)
+        self.assertEqual(b''.join(response.streaming_content), b'image')
+
+    def test_hidden_and_missing_paths(self):
+        for path in ('../secret.txt', f'{BLOB_DIR}/ab/abcdef', 'missing.jpg'):
+            with self.subTest(path=path), self.assertRaises(Http404):
+                self._serve(path)
@@ -0,0 +1,8 @@
+# mediastore/urls.py
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # File media (được include tại MEDIA_URL trong main_config/urls.py)
+    path('<path:path>', views.serve_media, name='serve-media'),
+]
@@ -0,0 +1,62 @@
+# mediastore/views.py
+"""
+Phục vụ file media (MEDIA_URL) mà Django không phải tự đọc/stream byte:
+
+- Object store (S3Storage): chuyển hướng 302 tới presigned URL, client tải thẳng từ object store.
+- Storage cục bộ, MEDIA_SERVE_MODE:
+    'x-accel':    trả header X-Accel-Redirect (nginx `internal` location MEDIA_ACCEL_REDIRECT_PREFIX
+                  trỏ tới MEDIA_ROOT), nginx gửi file bằng sendfile.
+    'x-sendfile': trả header X-Sendfile (Apache mod_xsendfile, lighttpd) với đường dẫn tuyệt đối.
+    'django':     FileResponse (server dùng wsgi.file_wrapper/sendfile nếu có) - dùng khi dev.
+"""
+import mimetypes
+import posixpath
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
+
+from .s3 import S3Storage
+
+SERVE_DJANGO = 'django'
+SERVE_X_ACCEL = 'x-accel'
+SERVE_X_SENDFILE = 'x-sendfile'
+
+
+def clean_media_name(path):
+    """Chuẩn hóa đường dẫn trong URL; None nếu trỏ ra ngoài MEDIA_ROOT hoặc vào thư mục ẩn (.cas/...)."""
+    name = posixpath.normpath(path.replace('\\', '/')).lstrip('/')
+    if not name or any(part.startswith('.') for part in name.split('/')):
+        return None
+    return name
+
+
+@require_safe
+def serve_media(request, path, storage=None):
+    storage = storage or default_storage
+    name = clean_media_name(path)
+    if name is None:
+        raise Http404("File không tồn tại.")
+
+    if isinstance(storage, S3Storage):
+        # Không kiểm tra exists() (tốn một request): object store tự trả 404
+        return HttpResponseRedirect(storage.url(name))
+
+    if not storage.exists(name):
+        raise Http404("File không tồn tại.")
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    mode = getattr(settings, 'MEDIA_SERVE_MODE', SERVE_DJANGO)
+    if mode == SERVE_X_ACCEL:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/') + quote(name)
+    elif mode == SERVE_X_SENDFILE:
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = storage.path(name)
+    else:
+        response = FileResponse(storage.open(name, 'rb'), content_type=content_type)
+    # Tên file media luôn chứa uuid nên nội dung không đổi: cho phép cache lâu
+    patch_cache_control(response, public=True, max_age=getattr(settings, 'MEDIA_CACHE_MAX_AGE_SECONDS', 86400))
+    return response
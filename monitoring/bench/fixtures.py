@@ -0,0 +1,115 @@
+# monitoring/bench/fixtures.py
+"""
+Dữ liệu tổng hợp (synthetic) cho micro-benchmark, sinh bằng random.Random có seed
+cố định để các lần chạy (và các commit) so sánh được với nhau.
+
+Payload detected_insects_json giống dữ liệu RPi gửi lên:
+    [{"name": "muoi_vang", "confidence": 0.91, "bbox": [x1, y1, x2, y2]}, ...]
+"""
+import json
+import random
+from datetime import date, datetime, timedelta, timezone
+
+from accounts.models import CustomUser
+from results.models import ProcessingResult
+from uploads.models import UserUpload
+
+DEFAULT_SEED = 20240601
+
+INSECT_NAMES = (
+    'muoi_vang', 'bo_canh_cam', 'sau_xanh', 'ray_nau', 'bo_tri', 'rep_sap',
+    'sau_cuon_la', 'bo_xit_muoi', 'nhen_do', 'ruoi_vang', 'sau_keo', 'oc_buou_vang',
+)
+
+# Số payload khác nhau dùng chung cho các dòng (tránh tốn bộ nhớ khi sinh 1M dòng)
+PAYLOAD_POOL_SIZE = 512
+
+# Kích thước ảnh mà RPi dùng khi chạy nhận diện
+FRAME_WIDTH = 1280
+FRAME_HEIGHT = 720
+
+
+def make_insect(rng, name=None):
+    x1 = rng.randint(0, FRAME_WIDTH - 64)
+    y1 = rng.randint(0, FRAME_HEIGHT - 64)
+    return {
+        'name': name or rng.choice(INSECT_NAMES),
+        'confidence': round(rng.uniform(0.35, 0.99), 4),
+        'bbox': [x1, y1, x1 + rng.randint(16, 64), y1 + rng.randint(16, 64)],
+    }
+
+
+def make_detected_insects(rng, max_insects=6):
+    """Một payload: 0..max_insects côn trùng, thường vài con cùng loại trong một ảnh."""
+    count = rng.choices(range(max_insects + 1), weights=[2, 5, 4, 3, 2, 1, 1][:max_insects + 1])[0]
+    names = rng.sample(INSECT_NAMES, k=min(3, len(INSECT_NAMES)))
+    return [make_insect(rng, rng.choice(names)) for _ in range(count)]
+
+
+def make_payload_pool(seed=DEFAULT_SEED, pool_size=PAYLOAD_POOL_SIZE, json_string_ratio=0.1):
+    """
+    Tập payload dùng chung. Một phần nhỏ ở dạng chuỗi JSON (như dữ liệu cũ lưu trong
+    TextField) để benchmark đi qua cả nhánh json.loads của logic tổng hợp.
+    """
+    rng = random.Random(seed)
+    pool = []
+    for _ in range(pool_size):
+        insects = make_detected_insects(rng)
+        pool.append(json.dumps(insects) if rng.random() < json_string_ratio else insects)
+    return pool
+
+
+def make_frequency_rows(count, days=30, end_date=None, seed=DEFAULT_SEED):
+    """
+    Các dòng (ngày phát hiện, detected_insects_json) giống kết quả
+    values_list('detection_timestamp__date', 'detected_insects_json') trong FrequencyStatsView.
+    Trả về (rows, start_date, end_date).
+    """
+    end_date = end_date or date(2024, 6, 30)
+    start_date = end_date - timedelta(days=days - 1)
+    rng = random.Random(seed)
+    pool = make_payload_pool(seed)
+    date_list = [start_date + timedelta(days=offset) for offset in range(days)]
+    rows = [(rng.choice(date_list), rng.choice(pool)) for _ in range(count)]
+    return rows, start_date, end_date
+
+
+def make_processing_results(count, seed=DEFAULT_SEED, with_upload_ratio=0.5):
+    """
+    Các ProcessingResult chưa lưu DB (kèm UserUpload/CustomUser liên quan đã được gắn sẵn,
+    giống queryset có select_related) để benchmark ProcessingResultOutputSerializer mà không cần DB.
+    """
+    rng = random.Random(seed)
+    pool = [payload for payload in make_payload_pool(seed) if not isinstance(payload, str)]
+    base_time = datetime(2024, 6, 1, tzinfo=timezone.utc)
+    users = [
+        CustomUser(
+            id=user_id, email=f'rpi_user_{user_id}@example.com', first_name='Nguoi', last_name=f'Dung {user_id}',
+            user_type='REGULAR', created_at=base_time, updated_at=base_time,
+        )
+        for user_id in range(1, 21)
+    ]
+    results = []
+    for result_id in range(1, count + 1):
+        detected_at = base_time + timedelta(seconds=result_id * 37)
+        upload = None
+        if rng.random() < with_upload_ratio:
+            user = rng.choice(users)
+            upload = UserUpload(
+                id=result_id, uploaded_by=user, file=f'user_uploads/user_{user.id}/{detected_at:%Y/%m/%d}/image_{result_id}.jpg',
+                upload_time=detected_at, updated_at=detected_at,
+            )
+        results.append(ProcessingResult(
+            id=result_id,
+            source_upload=upload,
+            processed_image=f'processed_results/{detected_at:%Y/%m/%d}/processed_{result_id}.jpg',
+            detection_timestamp=detected_at,
+            detected_insects_json=rng.choice(pool),
+            received_at=detected_at,
+        ))
+    return results
+
+
+def make_image_bytes(size, seed=DEFAULT_SEED):
+    """Dữ liệu nhị phân ngẫu nhiên (không nén được, giống ảnh JPEG) kích thước `size` byte."""
+    return random.Random(seed).randbytes(size)
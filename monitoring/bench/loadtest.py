@@ -0,0 +1,448 @@
+# monitoring/bench/loadtest.py
+"""
+Bộ benchmark tải (load test) chạy trong cùng process với ứng dụng ASGI
+(main_config.asgi.application - giống như khi chạy bằng Daphne) và channel layer
+in-memory.
+
+Mô phỏng:
+- N RPi: gửi kết quả (POST /api/results/save/), stream frame trực tiếp
+  (POST /api/livefeed/send-frame/) và lấy media (GET /api/uploads/get-media/<id>/).
+- M dashboard: mỗi dashboard giữ 3 WebSocket: ws/stats/, ws/livefeed/view/ và
+  ws/upload-status/<id>/.
+
+Mỗi kịch bản (scenario) báo cáo: throughput, latency p50/p95/p99 theo loại thao tác,
+bộ nhớ (tracemalloc), số query DB, số message WebSocket mà các dashboard nhận được và
+độ trễ đầu-cuối từ lúc RPi gửi kết quả tới lúc dashboard nhận thông báo stats.
+Side effect sau commit chạy theo JOBS_MODE đang cấu hình (mặc định worker thread 'in_process'
+như khi chạy Daphne); truyền jobs_mode='eager' để so sánh với các baseline cũ.
+Báo cáo có thể lưu làm baseline và so sánh với các lần chạy sau (compare_reports).
+"""
+import asyncio
+import base64
+import io
+import json
+import platform
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from channels.testing import HttpCommunicator, WebsocketCommunicator
+
+from accounts.models import CustomUser
+from jobs.queue import MODE_IN_PROCESS, get_jobs_mode, in_process_workers
+from uploads.models import UserUpload
+from monitoring.profiling import PERCENTILES, percentile
+
+OP_POST_RESULT = 'post_result'
+OP_LIVE_FRAME = 'live_frame'
+OP_GET_MEDIA = 'get_media'
+
+# Tên kịch bản -> các thao tác mỗi RPi thực hiện trong một vòng
+SCENARIOS = {
+    'results': (OP_POST_RESULT,),
+    'live_frames': (OP_LIVE_FRAME,),
+    'media': (OP_GET_MEDIA,),
+    'mixed': (OP_POST_RESULT, OP_LIVE_FRAME, OP_GET_MEDIA),
+}
+
+BENCH_HOST = 'localhost'
+REQUEST_TIMEOUT_SECONDS = 30
+BENCH_PASSWORD_HASH = 'loadtest-not-a-real-hash' # User benchmark không cần đăng nhập bằng mật khẩu
+# Thời gian tối đa chờ các thông báo kết quả cuối cùng tới dashboard sau khi RPi dừng gửi
+DELIVERY_TIMEOUT_SECONDS = 15
+
+
+def make_jpeg_bytes(width=64, height=48):
+    """Ảnh JPEG nhỏ (Pillow) dùng làm file upload và ảnh kết quả."""
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (34, 139, 34)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def make_access_token(user):
+    """Tạo access token giống CustomLoginView."""
+    access_token = AccessToken.for_user(user)
+    access_token['user_type'] = user.user_type
+    access_token['email'] = user.email
+    return str(access_token)
+
+
+def summarize_latencies(latencies):
+    values = sorted(latencies)
+    return {f'p{p}': round(percentile(values, p) * 1000, 3) for p in PERCENTILES}
+
+
+class QueryCounter:
+    """
+    Đếm số query DB của mọi thread. Django chạy mỗi request HTTP (view đồng bộ) trong
+    một thread riêng với connection riêng, nên wrapper được gắn vào từng connection
+    mới qua signal connection_created (và vào connection của thread hiện tại).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def _install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        connection_created.connect(self._install, dispatch_uid=f'loadtest-query-counter-{id(self)}')
+        self._install(connection=connection)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(dispatch_uid=f'loadtest-query-counter-{id(self)}')
+        if self in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self)
+
+
+class OperationStats:
+    __slots__ = ('latencies', 'errors', 'errors_by_status')
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.errors_by_status = {} # Mã HTTP (hoặc tên exception) -> số lần
+
+    def add_error(self, key):
+        self.errors += 1
+        self.errors_by_status[str(key)] = self.errors_by_status.get(str(key), 0) + 1
+
+    def summary(self, duration):
+        count = len(self.latencies)
+        return {
+            'count': count,
+            'errors': self.errors,
+            'errors_by_status': self.errors_by_status,
+            'throughput_per_second': round(count / duration, 3) if duration else 0.0,
+            'latency_ms': summarize_latencies(self.latencies),
+        }
+
+
+class DashboardClient:
+    """Một dashboard giữ 3 WebSocket và đếm các message nhận được."""
+
+    def __init__(self, application, token, upload_id):
+        query = f'?token={token}'
+        self.communicators = [
+            WebsocketCommunicator(application, f'/ws/stats/{query}'),
+            WebsocketCommunicator(application, f'/ws/livefeed/view/{query}'),
+            WebsocketCommunicator(application, f'/ws/upload-status/{upload_id}/{query}'),
+        ]
+        self.messages_received = 0
+        self.bytes_received = 0
+        self.frame_latencies = []
+        # result_id -> thời điểm nhận thông báo stats (có thể tới trước khi RPi nhận response có result_id)
+        self.result_received_at = {}
+        self.stats_connected = False
+        self.connect_failures = 0
+        self._drain_tasks = []
+
+    async def connect(self):
+        for communicator in self.communicators:
+            connected, _ = await communicator.connect(timeout=REQUEST_TIMEOUT_SECONDS)
+            if not connected:
+                self.connect_failures += 1
+                continue
+            if communicator is self.communicators[0]:
+                self.stats_connected = True
+            self._drain_tasks.append(asyncio.ensure_future(self._drain(communicator)))
+
+    async def _drain(self, communicator):
+        while True:
+            # Timeout lớn: receive_output hủy application nếu hết thời gian chờ
+            message = await communicator.receive_output(timeout=3600)
+            text = message.get('text')
+            if message.get('type') != 'websocket.send' or text is None:
+                continue
+            received_at = time.perf_counter()
+            self.messages_received += 1
+            self.bytes_received += len(text)
+            payload = json.loads(text)
+            if payload.get('type') == 'live_feed_frame':
+                try:
+                    self.frame_latencies.append(received_at - float(payload['data']['timestamp']))
+                except (KeyError, TypeError, ValueError):
+                    pass
+            elif payload.get('type') == 'stats_dashboard_update':
+                result_id = (payload.get('data') or {}).get('result_id')
+                if result_id is not None:
+                    self.result_received_at.setdefault(result_id, received_at)
+
+    async def close(self):
+        for task in self._drain_tasks:
+            task.cancel()
+        await asyncio.gather(*self._drain_tasks, return_exceptions=True)
+        for communicator in self.communicators:
+            try:
+                await communicator.disconnect(timeout=REQUEST_TIMEOUT_SECONDS)
+            except Exception:
+                pass # Kết nối bị từ chối hoặc đã đóng
+
+
+class LoadTestRunner:
+    """
+    Chạy các kịch bản trên DB hiện tại (lệnh `loadtest` tự tạo DB test riêng).
+    `application` mặc định là main_config.asgi.application.
+    """
+
+    def __init__(self, rpis=5, dashboards=10, iterations=20, frame_bytes=20000, trace_memory=True, application=None, log=None, jobs_mode=None):
+        self.rpis = rpis
+        self.jobs_mode = jobs_mode # None = JOBS_MODE đang cấu hình
+        self.dashboards = dashboards
+        self.iterations = iterations
+        self.frame_bytes = frame_bytes
+        self.trace_memory = trace_memory
+        self.log = log or (lambda message: None)
+        if application is None:
+            from main_config.asgi import application
+        self.application = application
+
+        self.image_bytes = make_jpeg_bytes()
+        self.image_base64 = 'data:image/jpeg;base64,' + base64.b64encode(self.image_bytes).decode('ascii')
+        # Frame giả có kích thước gần với frame camera thật
+        self.frame_base64 = 'data:image/jpeg;base64,' + base64.b64encode(b'\xff' * frame_bytes).decode('ascii')
+
+    # --- Dữ liệu mẫu ---
+    def create_fixtures(self, scenario_name):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        suffix = f'{scenario_name}-{time.monotonic_ns()}'
+        admin = CustomUser.objects.create(email=f'loadtest-admin-{suffix}@example.com', password_hash=BENCH_PASSWORD_HASH, user_type='ADMIN')
+        uploader = CustomUser.objects.create(email=f'loadtest-user-{suffix}@example.com', password_hash=BENCH_PASSWORD_HASH)
+        upload_count = max(self.rpis * self.iterations, self.dashboards, 1)
+        uploads = [
+            UserUpload.objects.create(
+                uploaded_by=uploader,
+                file=SimpleUploadedFile(f'loadtest_{index}.jpg', self.image_bytes, 'image/jpeg'),
+            )
+            for index in range(upload_count)
+        ]
+        return admin, [upload.id for upload in uploads]
+
+    # --- Thao tác của RPi ---
+    async def http(self, method, path, payload=None):
+        """Gửi request HTTP qua ứng dụng ASGI; trả về response ASGI (status, headers, body)."""
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        headers = [
+            (b'host', BENCH_HOST.encode()),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ]
+        communicator = HttpCommunicator(self.application, method, path, body=body, headers=headers)
+        response = await communicator.get_response(timeout=REQUEST_TIMEOUT_SECONDS)
+        await communicator.wait(timeout=REQUEST_TIMEOUT_SECONDS) # Đợi handler của Django kết thúc hẳn
+        return response
+
+    async def post_result(self, pending_upload_ids, rpi_index, round_index):
+        source_upload_id = pending_upload_ids.popleft() if pending_upload_ids and round_index % 2 == 0 else None
+        return await self.http('POST', '/api/results/save/', {
+            'image_base64': self.image_base64,
+            'timestamp': '2025-05-01T10:00:00Z',
+            'insects': [{'name': f'LoadTestInsect{rpi_index % 3}', 'confidence': 0.9}],
+            'source_upload_id': source_upload_id,
+        })
+
+    async def live_frame(self):
+        # timestamp = thời điểm gửi (perf_counter) để dashboard tính độ trễ đầu-cuối
+        return await self.http('POST', '/api/livefeed/send-frame/', {
+            'frame_base64': self.frame_base64,
+            'timestamp': repr(time.perf_counter()),
+        })
+
+    async def get_media(self, media_upload_ids, round_index):
+        upload_id = media_upload_ids[round_index % len(media_upload_ids)]
+        return await self.http('GET', f'/api/uploads/get-media/{upload_id}/')
+
+    async def run_rpi(self, rpi_index, operations, stats, pending_upload_ids, media_upload_ids, result_sent_at):
+        for round_index in range(self.iterations):
+            for operation in operations:
+                started_at = time.perf_counter()
+                try:
+                    if operation == OP_POST_RESULT:
+                        response = await self.post_result(pending_upload_ids, rpi_index, round_index)
+                    elif operation == OP_LIVE_FRAME:
+                        response = await self.live_frame()
+                    else:
+                        response = await self.get_media(media_upload_ids, round_index)
+                except Exception as e:
+                    stats[operation].add_error(type(e).__name__)
+                    continue
+                if response['status'] >= 400:
+                    stats[operation].add_error(response['status'])
+                    continue
+                stats[operation].latencies.append(time.perf_counter() - started_at)
+                if operation == OP_POST_RESULT and response['status'] == 201:
+                    result_sent_at[json.loads(response['body'])['id']] = started_at
+
+    async def wait_for_result_notifications(self, dashboards, result_sent_at):
+        """Chờ tới khi mọi dashboard đã nhận thông báo của mọi kết quả (hoặc hết DELIVERY_TIMEOUT_SECONDS)."""
+        deadline = time.perf_counter() + DELIVERY_TIMEOUT_SECONDS
+        listening = [dashboard for dashboard in dashboards if dashboard.stats_connected]
+        while time.perf_counter() < deadline:
+            if all(result_sent_at.keys() <= dashboard.result_received_at.keys() for dashboard in listening):
+                return
+            await asyncio.sleep(0.01)
+
+    # --- Kịch bản ---
+    async def _run_clients(self, operations, stats, admin_token, upload_ids, query_counter):
+        result_sent_at = {}
+        # Các dashboard theo dõi những upload đầu hàng đợi -> sẽ nhận thông báo hoàn thành
+        dashboards = [
+            DashboardClient(self.application, admin_token, upload_ids[index % len(upload_ids)])
+            for index in range(self.dashboards)
+        ]
+        for dashboard in dashboards:
+            await dashboard.connect()
+
+        pending_upload_ids = deque(upload_ids)
+        media_upload_ids = upload_ids[-max(1, min(len(upload_ids), 10)):]
+        # Chỉ đếm query của các thao tác RPi và side effect của chúng (không tính lúc dashboard kết nối)
+        with query_counter:
+            started_at = time.perf_counter()
+            await asyncio.gather(*(
+                self.run_rpi(rpi_index, operations, stats, pending_upload_ids, media_upload_ids, result_sent_at)
+                for rpi_index in range(self.rpis)
+            ))
+            duration = time.perf_counter() - started_at
+            await self.wait_for_result_notifications(dashboards, result_sent_at)
+        await asyncio.sleep(0.05) # Cho các message WebSocket cuối cùng đến dashboard
+
+        for dashboard in dashboards:
+            await dashboard.close()
+        return duration, dashboards, result_sent_at
+
+    def run_scenario(self, scenario_name):
+        from asgiref.sync import async_to_sync
+
+        operations = SCENARIOS[scenario_name]
+        jobs_mode = self.jobs_mode or get_jobs_mode()
+        admin, upload_ids = self.create_fixtures(scenario_name)
+        admin_token = make_access_token(admin)
+        stats = {operation: OperationStats() for operation in operations}
+        self.log(f"Scenario '{scenario_name}': {self.rpis} RPi x {self.iterations} vòng, {self.dashboards} dashboard, JOBS_MODE={jobs_mode}...")
+
+        query_counter = QueryCounter()
+        if self.trace_memory:
+            tracemalloc.start()
+        try:
+            with override_settings(JOBS_MODE=jobs_mode):
+                try:
+                    duration, dashboards, result_sent_at = async_to_sync(self._run_clients)(
+                        operations, stats, admin_token, upload_ids, query_counter,
+                    )
+                finally:
+                    if jobs_mode == MODE_IN_PROCESS:
+                        in_process_workers.stop() # Không để worker thread ghi vào DB sau khi kịch bản kết thúc
+            memory = {}
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                memory = {'traced_current_kb': round(current / 1024, 1), 'traced_peak_kb': round(peak / 1024, 1)}
+        finally:
+            if self.trace_memory:
+                tracemalloc.stop()
+
+        total_operations = sum(len(operation_stats.latencies) for operation_stats in stats.values())
+        frame_latencies = [latency for dashboard in dashboards for latency in dashboard.frame_latencies]
+        listening = [dashboard for dashboard in dashboards if dashboard.stats_connected]
+        result_latencies = [
+            dashboard.result_received_at[result_id] - sent_at
+            for dashboard in listening for result_id, sent_at in result_sent_at.items()
+            if result_id in dashboard.result_received_at
+        ]
+        return {
+            'scenario': scenario_name,
+            'jobs_mode': jobs_mode,
+            'rpis': self.rpis,
+            'dashboards': self.dashboards,
+            'iterations': self.iterations,
+            'duration_seconds': round(duration, 4),
+            'throughput_per_second': round(total_operations / duration, 3) if duration else 0.0,
+            'operations': {operation: operation_stats.summary(duration) for operation, operation_stats in stats.items()},
+            'db_queries': query_counter.count,
+            'db_queries_per_operation': round(query_counter.count / total_operations, 3) if total_operations else 0.0,
+            'memory': memory,
+            'websocket': {
+                'connect_failures': sum(dashboard.connect_failures for dashboard in dashboards),
+                'messages_received': sum(dashboard.messages_received for dashboard in dashboards),
+                'bytes_received': sum(dashboard.bytes_received for dashboard in dashboards),
+                'live_frame_latency_ms': summarize_latencies(frame_latencies),
+                # Từ lúc RPi bắt đầu POST kết quả tới lúc dashboard nhận thông báo stats của kết quả đó
+                'result_notification_latency_ms': summarize_latencies(result_latencies),
+                'result_notifications_missing': len(result_sent_at) * len(listening) - len(result_latencies),
+            },
+        }
+
+    def run(self, scenario_names):
+        return {
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'channel_layer': settings.CHANNEL_LAYERS['default']['BACKEND'],
+                'platform': platform.platform(),
+            },
+            'scenarios': {name: self.run_scenario(name) for name in scenario_names},
+        }
+
+
+def compare_reports(baseline, current, tolerance=0.15):
+    """
+    So sánh báo cáo hiện tại với baseline.
+    Trả về list (scenario, chỉ số, giá trị baseline, giá trị hiện tại, có phải regression không).
+    - p95 latency tăng quá `tolerance` hoặc throughput giảm quá `tolerance` là regression.
+    - Số query DB / thao tác tăng (dù ít) cũng là regression.
+    """
+    rows = []
+    for scenario_name, current_scenario in current['scenarios'].items():
+        baseline_scenario = baseline.get('scenarios', {}).get(scenario_name)
+        if baseline_scenario is None:
+            continue
+
+        def add(metric, baseline_value, current_value, higher_is_worse, strict=False):
+            if baseline_value is None or current_value is None:
+                return
+            if strict:
+                regressed = current_value > baseline_value + 1e-9
+            elif higher_is_worse:
+                regressed = current_value > baseline_value * (1 + tolerance)
+            else:
+                regressed = current_value < baseline_value * (1 - tolerance)
+            rows.append((scenario_name, metric, baseline_value, current_value, regressed))
+
+        add('throughput_per_second', baseline_scenario['throughput_per_second'], current_scenario['throughput_per_second'], higher_is_worse=False)
+        add('db_queries_per_operation', baseline_scenario['db_queries_per_operation'], current_scenario['db_queries_per_operation'], higher_is_worse=True, strict=True)
+        for operation, operation_stats in current_scenario['operations'].items():
+            baseline_operation = baseline_scenario['operations'].get(operation)
+            if baseline_operation is None:
+                continue
+            add(f'{operation}.p95_ms', baseline_operation['latency_ms']['p95'], operation_stats['latency_ms']['p95'], higher_is_worse=True)
+        add(
+            'result_notification.p95_ms',
+            baseline_scenario.get('websocket', {}).get('result_notification_latency_ms', {}).get('p95'),
+            current_scenario.get('websocket', {}).get('result_notification_latency_ms', {}).get('p95'),
+            higher_is_worse=True,
+        )
+        add(
+            'memory.traced_peak_kb',
+            baseline_scenario.get('memory', {}).get('traced_peak_kb'),
+            current_scenario.get('memory', {}).get('traced_peak_kb'),
+            higher_is_worse=True,
+        )
+    return rows
@@ -0,0 +1,280 @@
+# monitoring/bench/micro.py
+"""
+Micro-benchmark cho các đoạn code nóng (hot path), chạy trên dữ liệu tổng hợp
+(monitoring/bench/fixtures.py) bằng timeit:
+
+- aggregation:      build_frequency_chart (logic của FrequencyStatsView) trên 10k/100k/1M dòng
+- serializer:       ProcessingResultOutputSerializer(many=True) trên danh sách kết quả lớn
+- base64_encode:    encode_media_as_data_uri (GetMediaForProcessingAPIView)
+- base64_decode:    decode_image_base64 (SaveResultAPIView)
+- token_auth:       get_user_from_token (xác thực WebSocket): phần đồng bộ và qua database_sync_to_async
+- db_connection:    vòng đời kết nối DB của một request (mở, SELECT 1, close_old_connections) không có pool
+                    và có pool (main_config/db/pool.py); kèm số kết nối mới mỗi request (connections_per_request).
+                    Với SQLite in-memory (DB test) Django không đóng kết nối nên không thấy khác biệt: đo trên MySQL.
+
+Kết quả là JSON (kèm commit git và môi trường) để lưu lại và so sánh giữa các commit
+bằng compare_results().
+"""
+import platform
+import statistics
+import subprocess
+import time
+import timeit
+
+import django
+from django.conf import settings
+from django.db import connection
+
+from monitoring.bench import fixtures
+
+GROUP_AGGREGATION = 'aggregation'
+GROUP_SERIALIZER = 'serializer'
+GROUP_BASE64_ENCODE = 'base64_encode'
+GROUP_BASE64_DECODE = 'base64_decode'
+GROUP_TOKEN_AUTH = 'token_auth'
+GROUP_TOKEN_AUTH_ASYNC = 'token_auth_async'
+GROUP_DB_CONNECTION = 'db_connection'
+GROUP_DB_CONNECTION_POOLED = 'db_connection_pooled'
+
+# Nhóm -> kích thước mặc định (số dòng / số object / số byte / số request)
+DEFAULT_SIZES = {
+    GROUP_AGGREGATION: (10_000, 100_000, 1_000_000),
+    GROUP_SERIALIZER: (1_000, 10_000),
+    GROUP_BASE64_ENCODE: (100_000, 1_000_000, 5_000_000),
+    GROUP_BASE64_DECODE: (100_000, 1_000_000, 5_000_000),
+    GROUP_TOKEN_AUTH: (1,),
+    GROUP_TOKEN_AUTH_ASYNC: (1,),
+    GROUP_DB_CONNECTION: (100,),
+    GROUP_DB_CONNECTION_POOLED: (100,),
+}
+
+# Kích thước nhỏ để chạy nhanh (kiểm tra bộ benchmark, test)
+QUICK_SIZES = {
+    GROUP_AGGREGATION: (1_000,),
+    GROUP_SERIALIZER: (50,),
+    GROUP_BASE64_ENCODE: (10_000,),
+    GROUP_BASE64_DECODE: (10_000,),
+    GROUP_TOKEN_AUTH: (1,),
+    GROUP_TOKEN_AUTH_ASYNC: (1,),
+    GROUP_DB_CONNECTION: (5,),
+    GROUP_DB_CONNECTION_POOLED: (5,),
+}
+
+# Các nhóm cần DB (user thật để get_user_from_token truy vấn)
+DB_GROUPS = (GROUP_TOKEN_AUTH, GROUP_TOKEN_AUTH_ASYNC)
+
+BENCH_USER_EMAIL = 'microbench@example.com'
+
+
+def benchmark_key(group, size):
+    return f'{group}[{size}]'
+
+
+def git_commit():
+    """Commit hiện tại của repo (None nếu không có git)."""
+    try:
+        output = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5, check=True,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+
+# --- Chuẩn bị từng benchmark: trả về hàm không tham số cần đo ---
+def setup_aggregation(size):
+    from stats.aggregation import build_frequency_chart
+    rows, start_date, end_date = fixtures.make_frequency_rows(size)
+    return lambda: build_frequency_chart(rows, start_date, end_date)
+
+
+def setup_serializer(size):
+    from results.serializers import ProcessingResultOutputSerializer
+    results = fixtures.make_processing_results(size)
+    return lambda: ProcessingResultOutputSerializer(results, many=True).data
+
+
+def setup_base64_encode(size):
+    from uploads.views import encode_media_as_data_uri
+    file_bytes = fixtures.make_image_bytes(size)
+    return lambda: encode_media_as_data_uri(file_bytes, 'image.jpg')
+
+
+def setup_base64_decode(size):
+    from results.views import decode_image_base64
+    from uploads.views import encode_media_as_data_uri
+    _, data_uri = encode_media_as_data_uri(fixtures.make_image_bytes(size), 'image.jpg')
+    return lambda: decode_image_base64(data_uri)
+
+
+def _bench_user_token():
+    from accounts.models import CustomUser
+    from monitoring.bench.loadtest import make_access_token
+    user, _ = CustomUser.objects.get_or_create(
+        email=BENCH_USER_EMAIL, defaults={'password_hash': 'microbench-not-a-real-hash'},
+    )
+    return make_access_token(user)
+
+
+def setup_token_auth(size):
+    from accounts.middleware import get_user_from_token
+    token = _bench_user_token()
+    # Hàm đồng bộ bên trong database_sync_to_async: giải mã JWT + truy vấn user
+    return lambda: get_user_from_token.func(token)
+
+
+def setup_token_auth_async(size):
+    from asgiref.sync import async_to_sync
+    from accounts.middleware import get_user_from_token
+    token = _bench_user_token()
+    # Bao gồm cả chi phí chuyển thread của database_sync_to_async
+    return lambda: async_to_sync(get_user_from_token)(token)
+
+
+def _bench_database_wrapper(pooled):
+    """DatabaseWrapper riêng (cùng cấu hình với 'default') có hoặc không có pool, đếm số kết nối mới được tạo."""
+    from django.db import connections
+    from django.db.backends.base.base import BaseDatabaseWrapper
+    from main_config.db.pool import PooledDatabaseWrapperMixin, close_pool
+
+    default_class = type(connections['default'])
+    base_class = next(
+        cls for cls in default_class.__mro__
+        if issubclass(cls, BaseDatabaseWrapper) and not issubclass(cls, PooledDatabaseWrapperMixin)
+    )
+    counter = {'connections': 0}
+
+    class CountingWrapper(base_class):
+        def get_new_connection(self, conn_params):
+            counter['connections'] += 1
+            return super().get_new_connection(conn_params)
+
+    wrapper_class = type('PooledBenchWrapper', (PooledDatabaseWrapperMixin, CountingWrapper), {}) if pooled else CountingWrapper
+    alias = f'bench_{GROUP_DB_CONNECTION_POOLED if pooled else GROUP_DB_CONNECTION}'
+    close_pool(alias)
+    settings_dict = {**connections['default'].settings_dict, 'CONN_MAX_AGE': 0}
+    return wrapper_class(settings_dict, alias), counter
+
+
+def _setup_db_connection(size, pooled):
+    wrapper, counter = _bench_database_wrapper(pooled)
+    calls = {'count': 0}
+
+    def run():
+        # `size` request liên tiếp, mỗi request như một view/lệnh database_sync_to_async
+        for _ in range(size):
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            wrapper.close_if_unusable_or_obsolete() # request_finished / close_old_connections
+        calls['count'] += size
+
+    run.extra_metrics = lambda: {'connections_per_request': round(counter['connections'] / max(calls['count'], 1), 4)}
+    return run
+
+
+def setup_db_connection(size):
+    return _setup_db_connection(size, pooled=False)
+
+
+def setup_db_connection_pooled(size):
+    return _setup_db_connection(size, pooled=True)
+
+
+SETUPS = {
+    GROUP_AGGREGATION: setup_aggregation,
+    GROUP_SERIALIZER: setup_serializer,
+    GROUP_BASE64_ENCODE: setup_base64_encode,
+    GROUP_BASE64_DECODE: setup_base64_decode,
+    GROUP_TOKEN_AUTH: setup_token_auth,
+    GROUP_TOKEN_AUTH_ASYNC: setup_token_auth_async,
+    GROUP_DB_CONNECTION: setup_db_connection,
+    GROUP_DB_CONNECTION_POOLED: setup_db_connection_pooled,
+}
+
+
+def summarize_timings(group, size, number, timings):
+    """`timings`: giây mỗi lần gọi của từng lần lặp; `number`: số lần gọi trong một lần lặp."""
+    median = statistics.median(timings)
+    return {
+        'group': group,
+        'size': size,
+        'number': number,
+        'repeat': len(timings),
+        'min_ms': round(min(timings) * 1000, 4),
+        'median_ms': round(median * 1000, 4),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 4),
+        'per_item_us': round(median / size * 1_000_000, 4),
+    }
+
+
+def measure(func, repeat=5, min_seconds=0.2):
+    """
+    Đo `func` bằng timeit: chọn số lần gọi mỗi lần lặp để một lần lặp dài ít nhất
+    `min_seconds`, rồi lặp `repeat` lần. Trả về (number, [giây mỗi lần gọi]).
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_seconds:
+            break
+        number *= 2 if elapsed * 10 >= min_seconds else 10
+    timings = [elapsed / number] + [seconds / number for seconds in timer.repeat(repeat=repeat - 1, number=number)]
+    return number, timings
+
+
+class MicroBenchmarkRunner:
+
+    def __init__(self, sizes=None, repeat=5, min_seconds=0.2, groups=None, log=None):
+        self.sizes = sizes or DEFAULT_SIZES
+        self.repeat = max(repeat, 1)
+        self.min_seconds = min_seconds
+        self.groups = [group for group in SETUPS if groups is None or group in groups]
+        self.log = log or (lambda message: None)
+
+    def run_one(self, group, size):
+        func = SETUPS[group](size)
+        func() # Chạy thử một lần (warm-up, cache import/serializer fields)
+        number, timings = measure(func, repeat=self.repeat, min_seconds=self.min_seconds)
+        result = summarize_timings(group, size, number, timings)
+        if hasattr(func, 'extra_metrics'):
+            result.update(func.extra_metrics())
+        self.log(f"{benchmark_key(group, size):<32} median={result['median_ms']}ms min={result['min_ms']}ms (n={number}x{self.repeat})")
+        return result
+
+    def run(self):
+        started_at = time.time()
+        benchmarks = {}
+        for group in self.groups:
+            for size in self.sizes.get(group, ()):
+                benchmarks[benchmark_key(group, size)] = self.run_one(group, size)
+        return {
+            'git_commit': git_commit(),
+            'created_at': started_at,
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'platform': platform.platform(),
+            },
+            'benchmarks': benchmarks,
+        }
+
+
+def compare_results(baseline, current, tolerance=0.10):
+    """
+    So sánh median giữa hai báo cáo micro-benchmark.
+    Trả về list (key, median baseline, median hiện tại, tỉ lệ, có phải regression không).
+    """
+    rows = []
+    for key, current_result in current['benchmarks'].items():
+        baseline_result = baseline.get('benchmarks', {}).get(key)
+        if baseline_result is None:
+            continue
+        baseline_median = baseline_result['median_ms']
+        current_median = current_result['median_ms']
+        ratio = current_median / baseline_median if baseline_median else None
+        regressed = ratio is not None and ratio > 1 + tolerance
+        rows.append((key, baseline_median, current_median, round(ratio, 3) if ratio is not None else None, regressed))
+    return rows
@@ -0,0 +1,115 @@
+# monitoring/channel_layer.py
+"""
+InMemoryChannelLayer có đo đạc (instrumented) để biết vì sao bộ nhớ của
+channel layer tăng: độ sâu hàng đợi của từng channel, message bị bỏ khi
+hàng đợi đầy (ChannelFull), thời gian message nằm chờ trong hàng đợi và
+các consumer chậm (hàng đợi vượt WS_SLOW_CONSUMER_QUEUE_THRESHOLD hoặc message
+chờ lâu hơn WS_SLOW_CONSUMER_QUEUE_WAIT_SECONDS).
+
+Cấu hình trong settings:
+    CHANNEL_LAYERS = {"default": {"BACKEND": "monitoring.channel_layer.InstrumentedInMemoryChannelLayer"}}
+"""
+import asyncio
+import time
+
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+
+from .ws_metrics import (
+    SLOW_CONSUMER_EVENT_TYPE,
+    get_slow_consumer_queue_threshold,
+    get_slow_consumer_queue_wait_seconds,
+    slow_consumer_disconnect_enabled,
+    ws_metrics,
+)
+
+# Key tạm gắn vào message để đo thời gian chờ trong hàng đợi (bị gỡ khi receive)
+ENQUEUED_AT_KEY = '__monitoring_enqueued_at__'
+
+
+class InstrumentedInMemoryChannelLayer(InMemoryChannelLayer):
+
+    def __init__(self, *args, metrics=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics or ws_metrics
+
+    # --- Truy vấn trạng thái (dùng cho snapshot metrics) ---
+    def queue_depths(self):
+        return {channel: queue.qsize() for channel, queue in list(self.channels.items())}
+
+    def group_sizes(self):
+        return {group: len(members) for group, members in list(self.groups.items())}
+
+    # --- Channel layer API ---
+    async def send(self, channel, message):
+        try:
+            await super().send(channel, dict(message, **{ENQUEUED_AT_KEY: time.monotonic()}))
+        except ChannelFull:
+            self.metrics.channel_message_dropped()
+            raise
+
+    async def receive(self, channel):
+        message = await super().receive(channel)
+        enqueued_at = message.pop(ENQUEUED_AT_KEY, None)
+        if enqueued_at is not None:
+            waited = time.monotonic() - enqueued_at
+            self.metrics.queue_wait_observed(channel, waited)
+            self._check_queue_wait(channel, waited)
+        return message
+
+    async def group_send(self, group, message):
+        """Giống InMemoryChannelLayer.group_send nhưng đếm lượt gửi/bị bỏ theo group và phát hiện consumer chậm."""
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        self._clean_expired()
+
+        channels = list(self.groups.get(group, {}).keys())
+        results = await asyncio.gather(
+            *(super(InstrumentedInMemoryChannelLayer, self).send(channel, dict(message, **{ENQUEUED_AT_KEY: time.monotonic()})) for channel in channels),
+            return_exceptions=True,
+        )
+        drops = 0
+        for result in results:
+            if isinstance(result, ChannelFull):
+                drops += 1
+            elif isinstance(result, BaseException):
+                raise result
+        self.metrics.group_message_sent(group, len(channels) - drops, drops)
+        self._check_slow_channels(channels)
+
+    # --- Consumer chậm ---
+    def _check_slow_channels(self, channels):
+        threshold = get_slow_consumer_queue_threshold()
+        if not threshold:
+            return
+        for channel in channels:
+            queue = self.channels.get(channel)
+            if queue is None or queue.qsize() < threshold:
+                continue
+            self._flag_slow_channel(channel, 'queue_depth', queue.qsize())
+
+    def _check_queue_wait(self, channel, waited):
+        # Consumer xử lý chậm (ví dụ client không đọc kịp) thì message nằm chờ lâu trong hàng đợi
+        threshold = get_slow_consumer_queue_wait_seconds()
+        if threshold and waited > threshold:
+            self._flag_slow_channel(channel, 'queue_wait', round(waited, 3))
+
+    def _flag_slow_channel(self, channel, reason, value):
+        disconnect = slow_consumer_disconnect_enabled()
+        self.metrics.flag_slow_consumer(channel, reason, value, disconnected=disconnect)
+        if disconnect:
+            self.evict_channel(channel)
+
+    def evict_channel(self, channel):
+        """
+        Giải phóng bộ nhớ của một channel chậm: rời mọi group, bỏ các message đang chờ
+        và chỉ để lại message yêu cầu consumer tự đóng kết nối.
+        """
+        self._remove_from_groups(channel)
+        for group in [group for group, members in self.groups.items() if not members]:
+            self.groups.pop(group, None)
+        # Hàng đợi rỗng đã bị receive() xóa: tạo lại để consumer vẫn nhận được message yêu cầu đóng
+        queue = self.channels.setdefault(channel, asyncio.Queue(maxsize=self.get_capacity(channel)))
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait((time.time() + self.expiry, {'type': SLOW_CONSUMER_EVENT_TYPE}))
@@ -0,0 +1,58 @@
+# monitoring/log_handlers.py
+"""
+Handler logging không chặn (non-blocking) cho hot path:
+request thread chỉ đưa record vào hàng đợi, một thread nền (QueueListener)
+ghi ra stderr. Khi hàng đợi đầy thì record bị bỏ (đếm trong `dropped`)
+thay vì làm chậm request.
+"""
+import atexit
+import copy
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Dùng trong settings.LOGGING:
+        'handlers': {'async_console': {'class': 'monitoring.log_handlers.NonBlockingQueueHandler', ...}}
+    Formatter cấu hình cho handler này được áp dụng ở thread ghi log.
+    """
+
+    def __init__(self, max_queue_size=10000, stream=None):
+        super().__init__(queue.Queue(maxsize=max_queue_size))
+        self.dropped = 0
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.listener = QueueListener(self.queue, self.target, respect_handler_level=False)
+        self.listener.start()
+        atexit.register(self.stop_listener)
+
+    def setFormatter(self, fmt):
+        # Định dạng được thực hiện ở thread nền, không phải ở request thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Chỉ ghép message + args; phần định dạng để target handler làm
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop_listener(self):
+        """Dừng thread nền sau khi ghi hết các record còn trong hàng đợi (gọi nhiều lần không lỗi)."""
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self.stop_listener()
+        super().close()
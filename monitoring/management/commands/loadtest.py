@@ -0,0 +1,113 @@
+# monitoring/management/commands/loadtest.py
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from jobs.queue import MODE_EAGER, MODE_IN_PROCESS
+from monitoring.bench.loadtest import SCENARIOS, LoadTestRunner, compare_reports
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark tải: mô phỏng N RPi (gửi kết quả, stream frame, lấy media) và M dashboard "
+        "(WebSocket stats/livefeed/upload-status) trên ứng dụng ASGI trong cùng process. "
+        "Chạy trên DB test riêng và MEDIA_ROOT tạm, không đụng vào dữ liệu thật."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rpis', type=int, default=5, help='Số RPi mô phỏng.')
+        parser.add_argument('--dashboards', type=int, default=10, help='Số dashboard (mỗi dashboard 3 WebSocket).')
+        parser.add_argument('--iterations', type=int, default=20, help='Số vòng thao tác của mỗi RPi.')
+        parser.add_argument('--frame-bytes', type=int, default=20000, help='Kích thước frame trực tiếp (byte, trước base64).')
+        parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='Kịch bản cần chạy (lặp lại để chạy nhiều). Mặc định: tất cả.')
+        parser.add_argument(
+            '--jobs-mode', choices=(MODE_IN_PROCESS, MODE_EAGER),
+            help="Chạy side effect sau commit theo chế độ này thay vì JOBS_MODE đang cấu hình ('eager' = như các baseline cũ).",
+        )
+        parser.add_argument('--no-memory', action='store_true', help='Không đo bộ nhớ bằng tracemalloc (tracemalloc làm chậm benchmark).')
+        parser.add_argument('--output', help='Ghi báo cáo JSON ra file.')
+        parser.add_argument('--save-baseline', metavar='PATH', help='Lưu báo cáo làm baseline.')
+        parser.add_argument('--compare', metavar='PATH', help='So sánh với baseline đã lưu.')
+        parser.add_argument('--tolerance', type=float, default=0.15, help='Ngưỡng chênh lệch cho phép khi so sánh (mặc định 0.15 = 15%%).')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Trả về lỗi nếu có regression so với baseline.')
+
+    def handle(self, *args, **options):
+        scenario_names = options['scenario'] or list(SCENARIOS)
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Không đọc được baseline {options['compare']}: {e}")
+
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            with tempfile.TemporaryDirectory(prefix='loadtest-media-') as media_root, \
+                    override_settings(MEDIA_ROOT=media_root, ALLOWED_HOSTS=['localhost']):
+                runner = LoadTestRunner(
+                    rpis=options['rpis'],
+                    dashboards=options['dashboards'],
+                    iterations=options['iterations'],
+                    frame_bytes=options['frame_bytes'],
+                    trace_memory=not options['no_memory'],
+                    log=lambda message: self.stdout.write(message),
+                    jobs_mode=options['jobs_mode'],
+                )
+                report = runner.run(scenario_names)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        self.print_report(report)
+
+        report_json = json.dumps(report, indent=2, ensure_ascii=False)
+        for path in filter(None, (options['output'], options['save_baseline'])):
+            with open(path, 'w', encoding='utf-8') as report_file:
+                report_file.write(report_json)
+            self.stdout.write(f"Đã ghi báo cáo: {path}")
+
+        if baseline is not None:
+            rows = compare_reports(baseline, report, tolerance=options['tolerance'])
+            regressions = self.print_comparison(rows)
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{regressions} chỉ số bị regression so với baseline.")
+
+    def print_report(self, report):
+        for scenario_name, scenario in report['scenarios'].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"\n== {scenario_name}: {scenario['rpis']} RPi, {scenario['dashboards']} dashboard, "
+                f"{scenario['duration_seconds']}s, {scenario['throughput_per_second']} thao tác/s, JOBS_MODE={scenario['jobs_mode']}"
+            ))
+            for operation, stats in scenario['operations'].items():
+                latency = stats['latency_ms']
+                self.stdout.write(
+                    f"  {operation:<12} n={stats['count']:<6} lỗi={stats['errors']:<4} {stats['throughput_per_second']:>9}/s  "
+                    f"p50={latency['p50']}ms p95={latency['p95']}ms p99={latency['p99']}ms"
+                )
+            websocket = scenario['websocket']
+            self.stdout.write(
+                f"  DB queries: {scenario['db_queries']} ({scenario['db_queries_per_operation']}/thao tác)  "
+                f"WS nhận: {websocket['messages_received']} message, {websocket['bytes_received']} byte  "
+                f"frame p95: {websocket['live_frame_latency_ms']['p95']}ms"
+            )
+            self.stdout.write(
+                f"  Thông báo kết quả tới dashboard: p50={websocket['result_notification_latency_ms']['p50']}ms "
+                f"p95={websocket['result_notification_latency_ms']['p95']}ms "
+                f"p99={websocket['result_notification_latency_ms']['p99']}ms, chưa nhận: {websocket['result_notifications_missing']}"
+            )
+            if scenario['memory']:
+                self.stdout.write(f"  Bộ nhớ (tracemalloc): peak {scenario['memory']['traced_peak_kb']} KB")
+
+    def print_comparison(self, rows):
+        self.stdout.write(self.style.MIGRATE_HEADING("\n== So sánh với baseline"))
+        regressions = 0
+        for scenario_name, metric, baseline_value, current_value, regressed in rows:
+            line = f"  {scenario_name:<12} {metric:<28} {baseline_value:>12} -> {current_value:<12}"
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line + ' REGRESSION'))
+            else:
+                self.stdout.write(self.style.SUCCESS(line + ' OK'))
+        return regressions
@@ -0,0 +1,75 @@
+# monitoring/management/commands/microbench.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, teardown_databases
+
+from monitoring.bench.micro import DB_GROUPS, DEFAULT_SIZES, QUICK_SIZES, SETUPS, MicroBenchmarkRunner, compare_results
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark: tổng hợp thống kê tần suất, ProcessingResultOutputSerializer, "
+        "mã hóa/giải mã base64 và get_user_from_token trên dữ liệu tổng hợp. "
+        "Kết quả JSON dùng để so sánh giữa các commit (--output / --compare)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', action='append', choices=sorted(SETUPS), help='Nhóm benchmark cần chạy (lặp lại để chạy nhiều). Mặc định: tất cả.')
+        parser.add_argument('--size', action='append', type=int, help='Ghi đè kích thước cho các nhóm được chọn (lặp lại để đo nhiều kích thước).')
+        parser.add_argument('--quick', action='store_true', help='Dùng kích thước nhỏ để chạy nhanh.')
+        parser.add_argument('--repeat', type=int, default=5, help='Số lần lặp mỗi benchmark.')
+        parser.add_argument('--min-seconds', type=float, default=0.2, help='Thời gian tối thiểu của một lần lặp.')
+        parser.add_argument('--output', help='Ghi kết quả JSON ra file.')
+        parser.add_argument('--compare', metavar='PATH', help='So sánh với kết quả JSON đã lưu (ví dụ của commit trước).')
+        parser.add_argument('--tolerance', type=float, default=0.10, help='Ngưỡng chậm hơn cho phép khi so sánh (mặc định 0.10 = 10%%).')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Trả về lỗi nếu có benchmark chậm hơn baseline.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Không đọc được baseline {options['compare']}: {e}")
+
+        groups = options['group'] or list(SETUPS)
+        sizes = dict(QUICK_SIZES if options['quick'] else DEFAULT_SIZES)
+        if options['size']:
+            sizes.update({group: tuple(options['size']) for group in groups if group not in DB_GROUPS})
+
+        runner = MicroBenchmarkRunner(
+            sizes=sizes, repeat=options['repeat'], min_seconds=options['min_seconds'], groups=groups,
+            log=lambda message: self.stdout.write(message),
+        )
+        # get_user_from_token cần user trong DB: chạy trên DB test riêng
+        needs_db = any(group in DB_GROUPS for group in groups)
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'}) if needs_db else None
+        try:
+            report = runner.run()
+        finally:
+            if old_config is not None:
+                teardown_databases(old_config, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as report_file:
+                json.dump(report, report_file, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Đã ghi kết quả: {options['output']}")
+
+        if baseline is not None:
+            regressions = self.print_comparison(compare_results(baseline, report, tolerance=options['tolerance']))
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{regressions} benchmark chậm hơn baseline.")
+
+    def print_comparison(self, rows):
+        self.stdout.write(self.style.MIGRATE_HEADING("\n== So sánh với baseline (median)"))
+        regressions = 0
+        for key, baseline_median, current_median, ratio, regressed in rows:
+            line = f"  {key:<32} {baseline_median:>12}ms -> {str(current_median) + 'ms':<14} x{ratio}"
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line + ' REGRESSION'))
+            else:
+                self.stdout.write(self.style.SUCCESS(line + ' OK'))
+        return regressions
@@ -0,0 +1,52 @@
+# monitoring/middleware.py
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .profiling import db_execute_wrapper, profile_request, request_timings
+
+
+class RequestTimingMiddleware:
+    """
+    Đo thời gian từng request (chia theo auth/db/serialization/storage/channel_send/view)
+    và lưu vào `request_timings` theo view. Nên đặt ĐẦU TIÊN trong MIDDLEWARE.
+
+    Settings:
+    - PROFILING_ENABLED:     bật/tắt (mặc định True)
+    - PROFILING_SAMPLE_RATE: tỉ lệ request được đo (0.0 - 1.0, mặc định 1.0)
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            return self.get_response(request)
+        sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 1.0)
+        if sample_rate < 1.0 and random.random() >= sample_rate:
+            return self.get_response(request)
+
+        with profile_request() as profile, ExitStack() as db_wrappers:
+            for connection in connections.all():
+                db_wrappers.enter_context(connection.execute_wrapper(db_execute_wrapper))
+            response = self.get_response(request)
+            total_seconds = profile.finish()
+
+        request_timings.record(
+            self.get_view_key(request),
+            total_seconds,
+            profile,
+            is_error=response.status_code >= 500,
+        )
+        return response
+
+    @staticmethod
+    def get_view_key(request):
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match is None:
+            view_name = 'unresolved'
+        else:
+            view_name = resolver_match.view_name or resolver_match._func_path
+        return f"{request.method} {view_name}"
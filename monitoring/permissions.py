@@ -0,0 +1,19 @@
+# monitoring/permissions.py
+import hmac
+
+from django.conf import settings
+from rest_framework import permissions
+
+
+class HasMetricsScrapeToken(permissions.BasePermission):
+    """
+    Cho phép Prometheus (không có JWT) đọc metrics bằng header
+    `X-Metrics-Token` khớp với settings.MONITORING_SCRAPE_TOKEN.
+    Nếu không cấu hình token thì permission này luôn từ chối.
+    """
+    message = "Token metrics không hợp lệ."
+
+    def has_permission(self, request, view):
+        expected_token = getattr(settings, 'MONITORING_SCRAPE_TOKEN', '')
+        provided_token = request.headers.get('X-Metrics-Token', '')
+        return bool(expected_token) and hmac.compare_digest(provided_token, expected_token)
@@ -0,0 +1,183 @@
+# monitoring/profiling.py
+"""
+Đo thời gian theo từng request HTTP, chia theo các phần của hot path:
+
+- auth:          xác thực JWT (CustomJWTAuthentication)
+- db:            thời gian chạy query (và số query) qua connection.execute_wrapper
+- serialization: render JSON / serializer.data
+- storage:       đọc/ghi file media
+- channel_send:  gửi message vào channel layer (group_send)
+- view:          phần còn lại (logic trong view, middleware khác, ...)
+
+Các span lồng nhau được tính "exclusive": thời gian của span con (ví dụ query DB
+bên trong span storage) được trừ khỏi span cha, nên tổng các phần bằng tổng
+thời gian request. Mỗi view giữ một reservoir (lấy mẫu ngẫu nhiên, kích thước
+cố định) để tính p50/p95/p99 mà không tốn bộ nhớ không giới hạn.
+"""
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+SPAN_AUTH = 'auth'
+SPAN_DB = 'db'
+SPAN_SERIALIZATION = 'serialization'
+SPAN_STORAGE = 'storage'
+SPAN_CHANNEL_SEND = 'channel_send'
+SPAN_VIEW = 'view'
+SPANS = (SPAN_AUTH, SPAN_DB, SPAN_SERIALIZATION, SPAN_STORAGE, SPAN_CHANNEL_SEND, SPAN_VIEW)
+
+PERCENTILES = (50, 95, 99)
+
+_current_profile = ContextVar('monitoring_request_profile', default=None)
+
+
+class RequestProfile:
+    """Thời gian các span của một request (chỉ dùng trong một request, không cần lock)."""
+    __slots__ = ('started_at', 'spans', 'db_queries', '_stack')
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.spans = dict.fromkeys(SPANS, 0.0)
+        self.db_queries = 0
+        self._stack = [] # Mỗi phần tử: [tên span, thời điểm bắt đầu, thời gian của các span con]
+
+    def enter(self, name):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def exit(self):
+        name, started_at, children_time = self._stack.pop()
+        elapsed = time.perf_counter() - started_at
+        self.spans[name] = self.spans.get(name, 0.0) + elapsed - children_time
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def finish(self):
+        """Kết thúc request: phần thời gian không thuộc span nào được tính vào 'view'."""
+        total = time.perf_counter() - self.started_at
+        measured = sum(seconds for name, seconds in self.spans.items() if name != SPAN_VIEW)
+        self.spans[SPAN_VIEW] = max(total - measured, 0.0)
+        return total
+
+
+def get_current_profile():
+    return _current_profile.get()
+
+
+@contextmanager
+def profile_span(name):
+    """Đo một đoạn code vào span `name` của request hiện tại (không làm gì nếu request không được đo)."""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    profile.enter(name)
+    try:
+        yield
+    finally:
+        profile.exit()
+
+
+@contextmanager
+def profile_request():
+    profile = RequestProfile()
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """Dùng với connection.execute_wrapper(): đếm query và đo thời gian vào span 'db'."""
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    profile.db_queries += 1
+    profile.enter(SPAN_DB)
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.exit()
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    # Phương pháp nearest-rank
+    index = max(math.ceil(percent / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+class ViewTimings:
+    """Reservoir sampling (Algorithm R) các request của một view."""
+    __slots__ = ('count', 'errors', 'total_seconds', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.samples = [] # (tổng thời gian, {span: giây}, số query)
+
+    def add(self, sample, reservoir_size, is_error):
+        self.count += 1
+        self.total_seconds += sample[0]
+        if is_error:
+            self.errors += 1
+        if len(self.samples) < reservoir_size:
+            self.samples.append(sample)
+        else:
+            slot = random.randrange(self.count)
+            if slot < reservoir_size:
+                self.samples[slot] = sample
+
+    def summary(self):
+        totals = sorted(sample[0] for sample in self.samples)
+        db_queries = sorted(sample[2] for sample in self.samples)
+        spans = {}
+        for name in SPANS:
+            values = sorted(sample[1].get(name, 0.0) for sample in self.samples)
+            spans[name] = {f'p{p}': percentile(values, p) for p in PERCENTILES}
+            spans[name]['avg'] = sum(values) / len(values) if values else 0.0
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_seconds': self.total_seconds / self.count if self.count else 0.0,
+            'sampled': len(self.samples),
+            'latency_seconds': {f'p{p}': percentile(totals, p) for p in PERCENTILES},
+            'db_queries': {f'p{p}': percentile(db_queries, p) for p in PERCENTILES},
+            'spans_seconds': spans,
+        }
+
+
+class RequestTimingRegistry:
+    """Lưu thống kê theo view (key: 'METHOD view_name'), an toàn đa luồng."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = {}
+
+    def record(self, view_key, total_seconds, profile, is_error=False):
+        sample = (total_seconds, dict(profile.spans), profile.db_queries)
+        reservoir_size = getattr(settings, 'PROFILING_RESERVOIR_SIZE', 512)
+        with self._lock:
+            timings = self.views.get(view_key)
+            if timings is None:
+                timings = self.views[view_key] = ViewTimings()
+            timings.add(sample, reservoir_size, is_error)
+
+    def snapshot(self):
+        with self._lock:
+            return {view_key: timings.summary() for view_key, timings in sorted(self.views.items())}
+
+    def reset(self):
+        with self._lock:
+            self.views = {}
+
+
+# Registry dùng chung trong process
+request_timings = RequestTimingRegistry()
@@ -0,0 +1,126 @@
+# monitoring/prometheus.py
+"""Chuyển snapshot metrics sang định dạng text của Prometheus (exposition format 0.0.4)."""
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+class PrometheusWriter:
+    """Gom các dòng metric, mỗi metric có một dòng HELP/TYPE."""
+
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, metric_type, help_text, samples):
+        """`samples` là list (dict label, giá trị)."""
+        self.lines.append(f'# HELP {name} {help_text}')
+        self.lines.append(f'# TYPE {name} {metric_type}')
+        for labels, value in samples:
+            self.lines.append(f'{name}{_labels(**labels) if labels else ""} {value}')
+
+    def histogram(self, name, help_text, samples):
+        """`samples` là list (dict label, dict histogram từ LatencyHistogram.as_dict())."""
+        self.lines.append(f'# HELP {name} {help_text}')
+        self.lines.append(f'# TYPE {name} histogram')
+        for labels, histogram in samples:
+            for upper_bound, count in histogram['buckets'].items():
+                self.lines.append(f'{name}_bucket{_labels(**labels, le=upper_bound)} {count}')
+            self.lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {histogram["count"]}')
+            self.lines.append(f'{name}_sum{_labels(**labels)} {histogram["sum"]}')
+            self.lines.append(f'{name}_count{_labels(**labels)} {histogram["count"]}')
+
+    def render(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+def write_websocket_metrics(writer, snapshot):
+    consumers = snapshot['consumers']
+    groups = snapshot['groups']
+
+    def per_consumer(field):
+        return [({'consumer': label}, stats[field]) for label, stats in sorted(consumers.items())]
+
+    def per_group(field):
+        return [({'group': group}, stats[field]) for group, stats in sorted(groups.items())]
+
+    writer.metric('ws_connections_total', 'counter', 'Tổng số kết nối WebSocket đã được chấp nhận.', per_consumer('connections_total'))
+    writer.metric('ws_connections_active', 'gauge', 'Số kết nối WebSocket đang mở.', per_consumer('connections_active'))
+    writer.metric('ws_messages_received_total', 'counter', 'Số message client gửi lên.', per_consumer('messages_in'))
+    writer.metric('ws_messages_sent_total', 'counter', 'Số message gửi xuống client.', per_consumer('messages_out'))
+    writer.metric('ws_received_bytes_total', 'counter', 'Số byte client gửi lên.', per_consumer('bytes_in'))
+    writer.metric('ws_sent_bytes_total', 'counter', 'Số byte gửi xuống client.', per_consumer('bytes_out'))
+    writer.metric('ws_queue_depth', 'gauge', 'Số message đang chờ trong channel layer của các kết nối.', per_consumer('queue_depth'))
+    writer.metric('ws_slow_consumer_flags_total', 'counter', 'Số lần kết nối bị đánh dấu chậm.', per_consumer('slow_flags'))
+    writer.metric('ws_slow_consumer_disconnects_total', 'counter', 'Số kết nối bị ngắt vì quá chậm.', per_consumer('slow_disconnects'))
+    writer.histogram(
+        'ws_send_latency_seconds', 'Thời gian giao một message cho ASGI server (không gồm thời gian client nhận).',
+        [({'consumer': label}, stats['send_latency_seconds']) for label, stats in sorted(consumers.items())],
+    )
+    writer.histogram(
+        'ws_queue_wait_seconds', 'Thời gian message nằm chờ trong channel layer trước khi consumer nhận.',
+        [({'consumer': label}, stats['queue_wait_seconds']) for label, stats in sorted(consumers.items())],
+    )
+
+    writer.metric('ws_groups_active', 'gauge', 'Số group đang có thành viên (theo loại group).', per_group('groups'))
+    writer.metric('ws_group_members', 'gauge', 'Số channel đang là thành viên của group.', per_group('members'))
+    writer.metric('ws_group_messages_total', 'counter', 'Số lần group_send vào group.', per_group('messages_sent'))
+    writer.metric('ws_group_deliveries_total', 'counter', 'Số message đã được đưa vào hàng đợi của thành viên.', per_group('deliveries'))
+    writer.metric('ws_group_dropped_total', 'counter', 'Số message bị bỏ vì hàng đợi thành viên đầy (ChannelFull).', per_group('drops'))
+
+    layer = snapshot['channel_layer']
+    writer.metric('channel_layer_channels', 'gauge', 'Số channel đang có message chờ.', [({}, layer['channels'])])
+    writer.metric('channel_layer_queued_messages', 'gauge', 'Tổng số message đang chờ trong channel layer.', [({}, layer['queued_messages'])])
+    writer.metric('channel_layer_max_queue_depth', 'gauge', 'Độ sâu hàng đợi lớn nhất của một channel.', [({}, layer['max_queue_depth'])])
+    writer.metric('channel_layer_direct_send_dropped_total', 'counter', 'Số message gửi thẳng vào channel bị bỏ vì hàng đợi đầy.', [({}, layer['direct_send_drops'])])
+
+
+
+def write_request_metrics(writer, snapshot):
+    """Thời gian request theo view (summary với các quantile lấy từ reservoir)."""
+    duration_samples = []
+    span_samples = []
+    error_samples = []
+    for view_key, stats in snapshot.items():
+        method, _, view_name = view_key.partition(' ')
+        labels = {'method': method, 'view': view_name}
+        for quantile_name, value in stats['latency_seconds'].items():
+            duration_samples.append(({**labels, 'quantile': int(quantile_name[1:]) / 100}, value))
+        for span_name, span_stats in stats['spans_seconds'].items():
+            for quantile_name in ('p50', 'p95', 'p99'):
+                span_samples.append(({**labels, 'span': span_name, 'quantile': int(quantile_name[1:]) / 100}, span_stats[quantile_name]))
+        error_samples.append((labels, stats['errors']))
+
+    writer.lines.append('# HELP http_request_duration_seconds Thời gian xử lý request theo view (quantile lấy từ mẫu).')
+    writer.lines.append('# TYPE http_request_duration_seconds summary')
+    for labels, value in duration_samples:
+        writer.lines.append(f'http_request_duration_seconds{_labels(**labels)} {value}')
+    for view_key, stats in snapshot.items():
+        method, _, view_name = view_key.partition(' ')
+        writer.lines.append(f'http_request_duration_seconds_sum{_labels(method=method, view=view_name)} {stats["avg_seconds"] * stats["count"]}')
+        writer.lines.append(f'http_request_duration_seconds_count{_labels(method=method, view=view_name)} {stats["count"]}')
+
+    writer.metric('http_request_errors_total', 'counter', 'Số request trả về lỗi 5xx theo view.', error_samples)
+    writer.metric('http_request_span_seconds', 'gauge', 'Quantile thời gian theo từng phần (auth, db, serialization, storage, channel_send, view).', span_samples)
+
+
+def write_db_pool_metrics(writer, snapshots):
+    """Số liệu pool kết nối DB theo alias (main_config/db/pool.py)."""
+    def per_alias(field):
+        return [({'alias': alias}, stats[field]) for alias, stats in snapshots.items()]
+
+    writer.metric('db_pool_max_size', 'gauge', 'Số kết nối mở tối đa của pool.', per_alias('max_size'))
+    writer.metric('db_pool_connections_open', 'gauge', 'Số kết nối đang mở (đang dùng + rảnh).', per_alias('open'))
+    writer.metric('db_pool_connections_idle', 'gauge', 'Số kết nối rảnh trong pool.', per_alias('idle'))
+    writer.metric('db_pool_connections_created_total', 'counter', 'Số kết nối DB mới đã tạo.', per_alias('created'))
+    writer.metric('db_pool_connections_reused_total', 'counter', 'Số lần dùng lại kết nối rảnh.', per_alias('reused'))
+    writer.metric('db_pool_connections_closed_total', 'counter', 'Số kết nối đã đóng (rảnh quá lâu, lỗi, hỏng).', per_alias('closed'))
+    writer.metric('db_pool_health_check_failures_total', 'counter', 'Số kết nối rảnh bị bỏ vì kiểm tra sức khỏe thất bại.', per_alias('health_check_failures'))
+    writer.metric('db_pool_waits_total', 'counter', 'Số lần phải chờ vì pool đầy.', per_alias('waits'))
+    writer.metric('db_pool_timeouts_total', 'counter', 'Số lần chờ quá DB_POOL_TIMEOUT.', per_alias('timeouts'))
@@ -0,0 +1,12 @@
+# monitoring/renderers.py
+from rest_framework.renderers import JSONRenderer
+
+from .profiling import SPAN_SERIALIZATION, profile_span
+
+
+class ProfiledJSONRenderer(JSONRenderer):
+    """JSONRenderer có đo thời gian render vào span 'serialization' của request."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with profile_span(SPAN_SERIALIZATION):
+            return super().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,414 @@
+# monitoring/tests.py
+import asyncio
+import io
+import logging
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django.db import connections
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+
+from accounts.models import CustomUser
+from main_config.db.pool import ConnectionPool, PooledDatabaseWrapperMixin, PoolTimeout, close_pool, pool_snapshots
+from stats.consumers import StatsConsumer
+from .bench.loadtest import LoadTestRunner, compare_reports
+from .bench.micro import QUICK_SIZES, MicroBenchmarkRunner, compare_results
+from .channel_layer import InstrumentedInMemoryChannelLayer
+from .log_handlers import NonBlockingQueueHandler
+from .profiling import ViewTimings, profile_request, profile_span, request_timings
+from .ws_metrics import SLOW_CONSUMER_EVENT_TYPE, WebSocketMetrics, ws_metrics
+
+# Import thư viện hash
+from argon2 import PasswordHasher
+ph = PasswordHasher()
+
+
+# --- Test cho InstrumentedInMemoryChannelLayer ---
+class InstrumentedChannelLayerTest(SimpleTestCase):
+
+    def setUp(self):
+        self.metrics = WebSocketMetrics()
+        self.layer = InstrumentedInMemoryChannelLayer(capacity=3, metrics=self.metrics)
+
+    @override_settings(WS_SLOW_CONSUMER_QUEUE_THRESHOLD=0)
+    def test_group_send_counts_deliveries_drops_and_queue_depth(self):
+        """Đếm lượt gửi theo group, message bị bỏ khi hàng đợi đầy và độ sâu hàng đợi."""
+        async def scenario():
+            await self.layer.group_add('dashboard', 'specific.a')
+            await self.layer.group_add('dashboard', 'specific.b')
+            for index in range(4):
+                await self.layer.group_send('dashboard', {'type': 'send.stats.update', 'message': index})
+            message = await self.layer.receive('specific.a')
+            return message
+
+        message = async_to_sync(scenario)()
+        self.assertEqual(message, {'type': 'send.stats.update', 'message': 0}) # Key đo thời gian đã được gỡ
+        snapshot = self.metrics.snapshot(self.layer)
+        self.assertEqual(snapshot['groups']['dashboard'], {'groups': 1, 'members': 2, 'messages_sent': 4, 'deliveries': 6, 'drops': 2})
+        self.assertEqual(snapshot['channel_layer']['queued_messages'], 5)
+        self.assertEqual(snapshot['channel_layer']['max_queue_depth'], 3)
+        self.assertEqual(snapshot['consumers']['unknown']['queue_wait_seconds']['count'], 1)
+
+    def test_per_object_groups_are_aggregated_by_label(self):
+        """Group của từng upload được gộp thành một label, số label không tăng theo số upload."""
+        async def scenario():
+            await self.layer.group_add('upload_1_status', 'specific.a')
+            await self.layer.group_add('upload_2_status', 'specific.b')
+            for upload_id in range(1, 6):
+                await self.layer.group_send(f'upload_{upload_id}_status', {'type': 'send.upload.progress'})
+
+        async_to_sync(scenario)()
+        groups = self.metrics.snapshot(self.layer)['groups']
+        self.assertEqual(groups, {'upload_<id>_status': {'groups': 2, 'members': 2, 'messages_sent': 5, 'deliveries': 2, 'drops': 0}})
+
+    @override_settings(WS_SLOW_CONSUMER_QUEUE_THRESHOLD=2, WS_SLOW_CONSUMER_DISCONNECT=True)
+    def test_slow_consumer_is_flagged_and_evicted(self):
+        """Consumer có hàng đợi vượt ngưỡng bị đánh dấu, rời group và chỉ còn message yêu cầu đóng kết nối."""
+        async def scenario():
+            await self.layer.group_add('live', 'specific.slow')
+            for index in range(2):
+                await self.layer.group_send('live', {'type': 'send.live.frame', 'payload': index})
+            return await self.layer.receive('specific.slow')
+
+        message = async_to_sync(scenario)()
+        self.assertEqual(message['type'], SLOW_CONSUMER_EVENT_TYPE)
+        self.assertEqual(self.layer.group_sizes(), {})
+        slow_consumers = self.metrics.snapshot(self.layer)['slow_consumers']
+        self.assertEqual(len(slow_consumers), 1)
+        self.assertEqual(slow_consumers[0]['channel'], 'specific.slow')
+        self.assertEqual(slow_consumers[0]['reason'], 'queue_depth')
+        self.assertTrue(slow_consumers[0]['disconnected'])
+
+    @override_settings(WS_SLOW_CONSUMER_QUEUE_THRESHOLD=0, WS_SLOW_CONSUMER_QUEUE_WAIT_SECONDS=0.01, WS_SLOW_CONSUMER_DISCONNECT=True)
+    def test_long_queue_wait_flags_slow_consumer(self):
+        """Message chờ trong hàng đợi quá lâu: kết nối bị đánh dấu chậm và nhận message yêu cầu đóng."""
+        async def scenario():
+            await self.layer.group_add('live', 'specific.lagging')
+            await self.layer.group_send('live', {'type': 'send.live.frame', 'payload': 1})
+            await asyncio.sleep(0.05)
+            first = await self.layer.receive('specific.lagging')
+            return first, await self.layer.receive('specific.lagging')
+
+        first, second = async_to_sync(scenario)()
+        self.assertEqual(first['type'], 'send.live.frame')
+        self.assertEqual(second['type'], SLOW_CONSUMER_EVENT_TYPE)
+        slow_consumers = self.metrics.snapshot(self.layer)['slow_consumers']
+        self.assertEqual([record['reason'] for record in slow_consumers], ['queue_wait'])
+        self.assertGreaterEqual(slow_consumers[0]['value'], 0.05)
+
+
+# --- Test cho WebSocketMetricsMixin (dùng StatsConsumer) ---
+class WebSocketMetricsMixinTest(SimpleTestCase):
+
+    def setUp(self):
+        ws_metrics.reset()
+
+    def test_consumer_counts_connections_and_messages(self):
+        """Kết nối, message gửi xuống và số byte được ghi nhận theo consumer."""
+        user = SimpleNamespace(id=1, email='metrics@example.com')
+
+        async def scenario():
+            async def application(scope, receive, send):
+                return await StatsConsumer.as_asgi()(dict(scope, user=user), receive, send)
+
+            communicator = WebsocketCommunicator(application, '/ws/stats/')
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            self.assertEqual(ws_metrics.snapshot()['consumers']['stats.StatsConsumer']['connections_active'], 1)
+
+            await communicator.send_to(text_data='muỗi vằn')
+            await get_channel_layer().group_send(StatsConsumer.group_name, {'type': 'send.stats.update', 'message': {'x': 1}})
+            text = await communicator.receive_from()
+            await communicator.disconnect()
+            return text
+
+        text = async_to_sync(scenario)()
+        stats = ws_metrics.snapshot()['consumers']['stats.StatsConsumer']
+        self.assertEqual(stats['connections_total'], 1)
+        self.assertEqual(stats['connections_active'], 0)
+        self.assertEqual(stats['messages_out'], 1)
+        self.assertEqual((stats['messages_in'], stats['bytes_in']), (1, len('muỗi vằn'.encode('utf-8'))))
+        self.assertEqual(stats['bytes_out'], len(text))
+        self.assertEqual(stats['send_latency_seconds']['count'], 1)
+        self.assertEqual(stats['queue_wait_seconds']['count'], 1)
+
+
+# --- Test cho các endpoint metrics ---
+@override_settings(MONITORING_SCRAPE_TOKEN='scrape-secret')
+class MonitoringAPITest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CustomUser.objects.create(email='monitor_admin@example.com', password_hash=ph.hash('adminpass'), user_type='ADMIN')
+        CustomUser.objects.create(email='monitor_user@example.com', password_hash=ph.hash('userpass'))
+
+    def _login(self, email, password):
+        response = self.client.post(reverse('accounts:user_login'), {'email': email, 'password': password}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def test_admin_gets_json_metrics(self):
+        """Admin xem được số liệu WebSocket dạng JSON."""
+        self._login('monitor_admin@example.com', 'adminpass')
+        response = self.client.get(reverse('monitoring-websockets'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('consumers', response.data)
+        self.assertIn('slow_consumers', response.data)
+
+    def test_regular_user_forbidden(self):
+        """User thường không được xem metrics."""
+        self._login('monitor_user@example.com', 'userpass')
+        self.assertEqual(self.client.get(reverse('monitoring-websockets')).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(reverse('monitoring-metrics')).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_prometheus_scrape_with_token(self):
+        """Prometheus đọc metrics dạng text bằng header X-Metrics-Token."""
+        response = self.client.get(reverse('monitoring-metrics'), HTTP_X_METRICS_TOKEN='scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('# TYPE ws_connections_active gauge', response.content.decode())
+
+
+# --- Test cho đo thời gian request ---
+class RequestProfilingTest(SimpleTestCase):
+
+    def test_nested_spans_are_exclusive(self):
+        """Thời gian span con (db) được trừ khỏi span cha (storage); phần còn lại tính vào view."""
+        with profile_request() as profile:
+            with profile_span('storage'):
+                with profile_span('db'):
+                    time.sleep(0.02)
+            total = profile.finish()
+        self.assertGreaterEqual(profile.spans['db'], 0.02)
+        self.assertLess(profile.spans['storage'], 0.02)
+        self.assertAlmostEqual(sum(profile.spans.values()), total, places=6)
+
+    def test_span_outside_request_is_noop(self):
+        """Gọi profile_span ngoài request (ví dụ trong management command) không lỗi."""
+        with profile_span('db'):
+            pass
+
+    def test_reservoir_is_bounded(self):
+        """Reservoir giữ số mẫu cố định nhưng vẫn đếm đủ số request."""
+        timings = ViewTimings()
+        for index in range(100):
+            timings.add((index / 1000, {}, 1), reservoir_size=10, is_error=index == 0)
+        summary = timings.summary()
+        self.assertEqual(summary['count'], 100)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['sampled'], 10)
+
+
+class RequestTimingMiddlewareTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CustomUser.objects.create(email='timing_admin@example.com', password_hash=ph.hash('adminpass'), user_type='ADMIN')
+
+    def setUp(self):
+        request_timings.reset()
+        response = self.client.post(reverse('accounts:user_login'), {'email': 'timing_admin@example.com', 'password': 'adminpass'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def test_view_timings_are_recorded(self):
+        """Request được ghi nhận theo view, kèm số query DB và thời gian xác thực."""
+        self.client.get(reverse('stats-frequency'))
+        response = self.client.get(reverse('monitoring-requests'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stats = response.data['GET stats-frequency']
+        self.assertEqual(stats['count'], 1)
+        self.assertGreaterEqual(stats['db_queries']['p50'], 2) # Query user (auth) + query kết quả
+        self.assertGreater(stats['spans_seconds']['auth']['p50'], 0)
+        self.assertGreater(stats['spans_seconds']['serialization']['p50'], 0)
+
+        self.assertEqual(self.client.delete(reverse('monitoring-requests')).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertNotIn('GET stats-frequency', request_timings.snapshot())
+
+
+class NonBlockingQueueHandlerTest(SimpleTestCase):
+
+    def test_records_written_by_background_thread_and_dropped_when_full(self):
+        """Record được ghi ở thread nền; khi hàng đợi đầy thì bị bỏ thay vì chặn."""
+        stream = io.StringIO()
+        handler = NonBlockingQueueHandler(max_queue_size=1, stream=stream)
+        handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+        handler.listener.stop() # Dừng thread nền để hàng đợi đầy
+        record = logging.LogRecord('test', logging.INFO, __file__, 1, 'upload %s saved', (7,), None)
+        handler.handle(record)
+        handler.handle(record)
+        self.assertEqual(handler.dropped, 1)
+
+        handler.listener.start()
+        handler.close()
+        self.assertEqual(stream.getvalue(), 'INFO upload 7 saved\n')
+
+
+# --- Test cho bộ benchmark tải ---
+class LoadTestRunnerTest(TransactionTestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    @override_settings(JOBS_MODE='in_process')
+    def test_mixed_scenario_report(self):
+        """Kịch bản mixed chạy qua ứng dụng ASGI thật và worker thread 'in_process', báo cáo đủ các chỉ số."""
+        with override_settings(MEDIA_ROOT=self.media_root, ALLOWED_HOSTS=['localhost']):
+            report = LoadTestRunner(rpis=1, dashboards=1, iterations=2, frame_bytes=100, trace_memory=False).run_scenario('mixed')
+        self.assertEqual(report['jobs_mode'], 'in_process')
+        # Thông báo đi qua outbox và worker thread vẫn tới dashboard ngay, không chờ lần poll kế tiếp
+        self.assertEqual(report['websocket']['result_notifications_missing'], 0)
+        self.assertLess(report['websocket']['result_notification_latency_ms']['p99'], 1000)
+        self.assertEqual(set(report['operations']), {'post_result', 'live_frame', 'get_media'})
+        for operation_stats in report['operations'].values():
+            self.assertEqual(operation_stats['count'], 2)
+            self.assertEqual(operation_stats['errors'], 0)
+        self.assertGreater(report['db_queries'], 0)
+        self.assertEqual(report['websocket']['connect_failures'], 0)
+        self.assertGreater(report['websocket']['messages_received'], 0)
+
+
+class CompareReportsTest(SimpleTestCase):
+
+    def _report(self, throughput, p95, queries_per_operation):
+        return {'scenarios': {'results': {
+            'throughput_per_second': throughput,
+            'db_queries_per_operation': queries_per_operation,
+            'operations': {'post_result': {'latency_ms': {'p50': 1, 'p95': p95, 'p99': p95}}},
+            'memory': {},
+        }}}
+
+    def test_regressions_are_detected(self):
+        """Throughput giảm/p95 tăng quá ngưỡng hoặc số query tăng là regression."""
+        baseline = self._report(throughput=100, p95=10, queries_per_operation=5)
+        rows = compare_reports(baseline, self._report(throughput=95, p95=11, queries_per_operation=5), tolerance=0.15)
+        self.assertFalse(any(row[4] for row in rows))
+
+        rows = compare_reports(baseline, self._report(throughput=80, p95=20, queries_per_operation=6), tolerance=0.15)
+        self.assertEqual({row[1] for row in rows if row[4]}, {'throughput_per_second', 'post_result.p95_ms', 'db_queries_per_operation'})
+
+
+
+class MicroBenchmarkTest(APITestCase):
+
+    def test_quick_run_reports_every_group(self):
+        """Chạy nhanh tất cả micro-benchmark, kết quả có median theo từng kích thước."""
+        report = MicroBenchmarkRunner(sizes=QUICK_SIZES, repeat=2, min_seconds=0.001).run()
+        self.assertEqual(
+            set(report['benchmarks']),
+            {'aggregation[1000]', 'serializer[50]', 'base64_encode[10000]', 'base64_decode[10000]', 'token_auth[1]', 'token_auth_async[1]',
+             'db_connection[5]', 'db_connection_pooled[5]'},
+        )
+        self.assertIn('connections_per_request', report['benchmarks']['db_connection_pooled[5]'])
+        for result in report['benchmarks'].values():
+            self.assertEqual(result['repeat'], 2)
+            self.assertGreater(result['median_ms'], 0)
+        self.assertTrue(CustomUser.objects.filter(email='microbench@example.com').exists())
+
+    def test_compare_results(self):
+        """Median chậm hơn quá ngưỡng là regression."""
+        baseline = {'benchmarks': {'aggregation[1000]': {'median_ms': 10.0}, 'serializer[50]': {'median_ms': 10.0}}}
+        current = {'benchmarks': {'aggregation[1000]': {'median_ms': 10.5}, 'serializer[50]': {'median_ms': 15.0}}}
+        rows = compare_results(baseline, current, tolerance=0.10)
+        self.assertEqual([row[0] for row in rows if row[4]], ['serializer[50]'])
+
+
+# --- Test cho pool kết nối DB ---
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.healthy = True
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+    def _pool(self, **options):
+        self.created = []
+        def connect():
+            self.created.append(FakeConnection())
+            return self.created[-1]
+        return ConnectionPool(connect, check=lambda connection: connection.healthy, **options)
+
+    def test_released_connection_is_reused(self):
+        pool = self._pool()
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual((pool.snapshot()['created'], pool.snapshot()['reused']), (1, 1))
+
+    def test_max_size_and_timeout(self):
+        pool = self._pool(max_size=1, timeout=0.05)
+        connection = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        pool.discard(connection) # Kết nối hỏng: giải phóng chỗ trong pool
+        self.assertIsNot(pool.acquire(), connection)
+        self.assertTrue(connection.closed)
+
+    def test_idle_timeout_and_health_check(self):
+        pool = self._pool(idle_timeout=0, health_check_seconds=0)
+        connection = pool.acquire()
+        pool.release(connection)
+        self.assertTrue(connection.closed) # Rảnh quá IDLE_TIMEOUT
+        self.assertEqual(pool.snapshot()['open'], 0)
+
+        pool = self._pool(health_check_seconds=0)
+        broken = pool.acquire()
+        pool.release(broken)
+        broken.healthy = False
+        self.assertIsNot(pool.acquire(), broken)
+        self.assertEqual(pool.snapshot()['health_check_failures'], 1)
+
+
+class PooledSQLiteWrapper(PooledDatabaseWrapperMixin, SQLiteDatabaseWrapper):
+    pass
+
+
+class PooledDatabaseWrapperTest(SimpleTestCase):
+    """Mixin pool trên một DB SQLite dạng file (DB test in-memory không bao giờ đóng kết nối)."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_dict = {
+            **connections['default'].settings_dict,
+            'NAME': f'{directory}/pool.sqlite3', 'CONN_MAX_AGE': 0, 'POOL': {'MAX_SIZE': 2},
+        }
+        self.wrapper = PooledSQLiteWrapper(settings_dict, 'pool_test')
+        self.addCleanup(close_pool, 'pool_test')
+
+    def _request(self):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.wrapper.close_if_unusable_or_obsolete()
+
+    def test_requests_reuse_one_connection(self):
+        for _ in range(5):
+            self._request()
+        stats = pool_snapshots()['pool_test']
+        self.assertEqual((stats['created'], stats['reused'], stats['idle']), (1, 4, 1))
+
+    def test_connection_with_changed_state_is_discarded(self):
+        """Kết nối bị đổi autocommit (ví dụ đóng giữa transaction) không được trả về pool."""
+        self._request()
+        self.wrapper.ensure_connection()
+        self.wrapper.set_autocommit(False)
+        self.wrapper.close()
+        stats = pool_snapshots()['pool_test']
+        self.assertEqual((stats['open'], stats['closed']), (0, 1))
+        self._request() # Kết nối mới, autocommit mặc định
+        self.assertTrue(self.wrapper.get_autocommit() if self.wrapper.connection else True)
@@ -0,0 +1,12 @@
+# monitoring/urls.py
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # Endpoint cho Prometheus scrape
+    path('metrics/', views.PrometheusMetricsView.as_view(), name='monitoring-metrics'),
+    # API JSON cho trang quản trị
+    path('websockets/', views.WebSocketMetricsAPIView.as_view(), name='monitoring-websockets'),
+    # Thời gian request theo view (RequestTimingMiddleware)
+    path('requests/', views.RequestTimingsAPIView.as_view(), name='monitoring-requests'),
+]
@@ -0,0 +1,62 @@
+# monitoring/views.py
+from django.http import HttpResponse
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+try:
+    from channels.layers import get_channel_layer
+except ImportError:
+    def get_channel_layer(): return None
+
+from accounts.permissions import IsAdminUserType
+from main_config.db.pool import pool_snapshots
+from .permissions import HasMetricsScrapeToken
+from .profiling import request_timings
+from .prometheus import CONTENT_TYPE, PrometheusWriter, write_db_pool_metrics, write_request_metrics, write_websocket_metrics
+from .ws_metrics import ws_metrics
+
+
+class PrometheusMetricsView(APIView):
+    """
+    Metrics ở định dạng text của Prometheus.
+    GET: /api/monitoring/metrics/
+    Admin (JWT) hoặc Prometheus với header X-Metrics-Token.
+    """
+    permission_classes = [IsAdminUserType | HasMetricsScrapeToken]
+
+    def get(self, request, *args, **kwargs):
+        writer = PrometheusWriter()
+        write_websocket_metrics(writer, ws_metrics.snapshot(get_channel_layer()))
+        write_request_metrics(writer, request_timings.snapshot())
+        write_db_pool_metrics(writer, pool_snapshots())
+        return HttpResponse(writer.render(), content_type=CONTENT_TYPE)
+
+
+class WebSocketMetricsAPIView(APIView):
+    """
+    Số liệu WebSocket/channel layer dạng JSON cho trang quản trị:
+    theo consumer, theo group, hàng đợi channel layer và danh sách consumer chậm.
+    GET: /api/monitoring/websockets/
+    """
+    permission_classes = [IsAdminUserType]
+
+    def get(self, request, *args, **kwargs):
+        return Response(ws_metrics.snapshot(get_channel_layer()), status=status.HTTP_200_OK)
+
+
+class RequestTimingsAPIView(APIView):
+    """
+    Thời gian request theo view (p50/p95/p99, số query DB, chia theo auth/db/
+    serialization/storage/channel_send/view) do RequestTimingMiddleware thu thập.
+    GET: /api/monitoring/requests/
+    DELETE: xóa số liệu đã thu thập (bắt đầu đo lại)
+    """
+    permission_classes = [IsAdminUserType]
+
+    def get(self, request, *args, **kwargs):
+        return Response(request_timings.snapshot(), status=status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        request_timings.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,313 @@
+# monitoring/ws_metrics.py
+"""
+Số liệu (metrics) cho các kết nối WebSocket và channel layer.
+
+- Theo consumer: số kết nối (tổng/đang mở), message vào/ra, bytes vào/ra,
+  thời gian giao message cho ASGI server (send latency, không gồm thời gian
+  client nhận) và thời gian message nằm chờ trong hàng đợi của channel layer (queue wait).
+- Theo loại group: số lần group_send, số lượt gửi tới thành viên, số message bị bỏ
+  do hàng đợi đầy (ChannelFull), số thành viên và số group hiện tại. Group theo từng đối tượng
+  (ví dụ upload_<id>_status) được gộp theo tên đã bỏ ID (group_label) để số label không tăng theo số upload.
+- Consumer chậm (slow consumer): hàng đợi trong channel layer vượt ngưỡng hoặc
+  message chờ trong hàng đợi quá lâu được đánh dấu và (tùy chọn) bị ngắt kết nối.
+  send() chỉ giao frame cho ASGI server, không chờ client, nên không dùng để phát hiện client chậm.
+
+Registry là một object dùng chung trong process (`ws_metrics`), được đọc bởi
+endpoint Prometheus và API JSON cho Admin (monitoring/views.py).
+"""
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+
+# Các mốc (giây) của histogram latency
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+# Close code gửi cho client khi bị ngắt vì quá chậm
+SLOW_CONSUMER_CLOSE_CODE = 4008
+
+# Type của message điều khiển mà channel layer gửi cho consumer chậm
+SLOW_CONSUMER_EVENT_TYPE = 'monitoring.slow.consumer'
+
+
+def get_slow_consumer_queue_threshold():
+    return getattr(settings, 'WS_SLOW_CONSUMER_QUEUE_THRESHOLD', 50)
+
+
+def get_slow_consumer_queue_wait_seconds():
+    return getattr(settings, 'WS_SLOW_CONSUMER_QUEUE_WAIT_SECONDS', 1.0)
+
+
+def slow_consumer_disconnect_enabled():
+    return getattr(settings, 'WS_SLOW_CONSUMER_DISCONNECT', False)
+
+
+_GROUP_ID_PATTERN = re.compile(r'\d+')
+
+
+def group_label(group):
+    """Tên group đã thay các ID bằng '<id>', ví dụ 'upload_12_status' -> 'upload_<id>_status'."""
+    return _GROUP_ID_PATTERN.sub('<id>', group)
+
+
+def consumer_label(consumer_class):
+    """Tên consumer dùng làm label, ví dụ 'livefeed.LiveFeedConsumer'."""
+    return f"{consumer_class.__module__.split('.')[0]}.{consumer_class.__name__}"
+
+
+class LatencyHistogram:
+    """Histogram tích lũy đơn giản (giống histogram của Prometheus)."""
+    __slots__ = ('bucket_counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        for index, upper_bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= upper_bound:
+                self.bucket_counts[index] += 1
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'max': self.max,
+            'avg': self.total / self.count if self.count else 0.0,
+            'buckets': dict(zip(LATENCY_BUCKETS, self.bucket_counts)),
+        }
+
+
+class ConsumerStats:
+    __slots__ = (
+        'connections_total', 'connections_active', 'messages_in', 'messages_out',
+        'bytes_in', 'bytes_out', 'send_latency', 'queue_wait', 'slow_flags', 'slow_disconnects',
+    )
+
+    def __init__(self):
+        self.connections_total = 0
+        self.connections_active = 0
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.send_latency = LatencyHistogram()
+        self.queue_wait = LatencyHistogram()
+        self.slow_flags = 0
+        self.slow_disconnects = 0
+
+
+class GroupStats:
+    __slots__ = ('messages_sent', 'deliveries', 'drops')
+
+    def __init__(self):
+        self.messages_sent = 0
+        self.deliveries = 0
+        self.drops = 0
+
+
+class WebSocketMetrics:
+    """Registry metrics dùng chung (an toàn khi đọc từ thread của view)."""
+
+    UNKNOWN_CONSUMER = 'unknown'
+
+    def __init__(self, max_slow_records=200):
+        self.max_slow_records = max_slow_records
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.consumers = defaultdict(ConsumerStats)
+            self.groups = defaultdict(GroupStats) # group_label -> số liệu gộp
+            self.channel_consumers = {} # channel_name -> label consumer đang mở
+            self.slow_consumers = OrderedDict() # channel_name -> thông tin lần bị đánh dấu gần nhất
+            self.channel_drops = 0 # Message bị bỏ khi gửi thẳng vào channel (không qua group)
+
+    def _label_for(self, channel_name):
+        return self.channel_consumers.get(channel_name, self.UNKNOWN_CONSUMER)
+
+    # --- Ghi nhận từ consumer ---
+    def connection_opened(self, label, channel_name):
+        with self._lock:
+            stats = self.consumers[label]
+            stats.connections_total += 1
+            stats.connections_active += 1
+            self.channel_consumers[channel_name] = label
+
+    def connection_closed(self, label, channel_name):
+        with self._lock:
+            self.consumers[label].connections_active -= 1
+            self.channel_consumers.pop(channel_name, None)
+
+    def message_received(self, label, size):
+        with self._lock:
+            stats = self.consumers[label]
+            stats.messages_in += 1
+            stats.bytes_in += size
+
+    def message_sent(self, label, size, seconds):
+        with self._lock:
+            stats = self.consumers[label]
+            stats.messages_out += 1
+            stats.bytes_out += size
+            stats.send_latency.observe(seconds)
+
+    # --- Ghi nhận từ channel layer ---
+    def queue_wait_observed(self, channel_name, seconds):
+        with self._lock:
+            self.consumers[self._label_for(channel_name)].queue_wait.observe(seconds)
+
+    def group_message_sent(self, group, deliveries, drops):
+        with self._lock:
+            stats = self.groups[group_label(group)]
+            stats.messages_sent += 1
+            stats.deliveries += deliveries
+            stats.drops += drops
+
+    def channel_message_dropped(self):
+        with self._lock:
+            self.channel_drops += 1
+
+    def flag_slow_consumer(self, channel_name, reason, value, disconnected=False):
+        """Đánh dấu một kết nối là chậm (giữ tối đa `max_slow_records` bản ghi gần nhất)."""
+        with self._lock:
+            label = self._label_for(channel_name)
+            stats = self.consumers[label]
+            stats.slow_flags += 1
+            if disconnected:
+                stats.slow_disconnects += 1
+            self.slow_consumers.pop(channel_name, None)
+            self.slow_consumers[channel_name] = {
+                'consumer': label,
+                'reason': reason,
+                'value': value,
+                'disconnected': disconnected,
+                'flagged_at': time.time(),
+            }
+            while len(self.slow_consumers) > self.max_slow_records:
+                self.slow_consumers.popitem(last=False)
+
+    # --- Đọc số liệu ---
+    def snapshot(self, channel_layer=None):
+        """
+        Trả về dict số liệu hiện tại. Nếu truyền channel layer có hỗ trợ
+        `queue_depths()`/`group_sizes()` thì kèm độ sâu hàng đợi và số thành viên group.
+        Group được gộp theo group_label().
+        """
+        queue_depths = channel_layer.queue_depths() if hasattr(channel_layer, 'queue_depths') else {}
+        group_sizes = channel_layer.group_sizes() if hasattr(channel_layer, 'group_sizes') else {}
+        label_members = defaultdict(int)
+        label_group_counts = defaultdict(int)
+        for group, size in group_sizes.items():
+            label = group_label(group)
+            label_members[label] += size
+            label_group_counts[label] += 1
+
+        with self._lock:
+            consumer_queue_depths = defaultdict(int)
+            for channel_name, depth in queue_depths.items():
+                consumer_queue_depths[self._label_for(channel_name)] += depth
+
+            consumers = {}
+            for label, stats in self.consumers.items():
+                consumers[label] = {
+                    'connections_total': stats.connections_total,
+                    'connections_active': stats.connections_active,
+                    'messages_in': stats.messages_in,
+                    'messages_out': stats.messages_out,
+                    'bytes_in': stats.bytes_in,
+                    'bytes_out': stats.bytes_out,
+                    'send_latency_seconds': stats.send_latency.as_dict(),
+                    'queue_wait_seconds': stats.queue_wait.as_dict(),
+                    'queue_depth': consumer_queue_depths.get(label, 0),
+                    'slow_flags': stats.slow_flags,
+                    'slow_disconnects': stats.slow_disconnects,
+                }
+
+            groups = {}
+            for label in set(self.groups) | set(label_members):
+                stats = self.groups.get(label) or GroupStats()
+                groups[label] = {
+                    'groups': label_group_counts.get(label, 0),
+                    'members': label_members.get(label, 0),
+                    'messages_sent': stats.messages_sent,
+                    'deliveries': stats.deliveries,
+                    'drops': stats.drops,
+                }
+
+            slow_consumers = [
+                dict(record, channel=channel_name, active=channel_name in self.channel_consumers)
+                for channel_name, record in reversed(self.slow_consumers.items())
+            ]
+
+            return {
+                'consumers': consumers,
+                'groups': groups,
+                'channel_layer': {
+                    'channels': len(queue_depths),
+                    'queued_messages': sum(queue_depths.values()),
+                    'max_queue_depth': max(queue_depths.values(), default=0),
+                    'direct_send_drops': self.channel_drops,
+                },
+                'slow_consumers': slow_consumers,
+            }
+
+
+# Registry dùng chung trong process
+ws_metrics = WebSocketMetrics()
+
+
+class WebSocketMetricsMixin:
+    """
+    Mixin cho AsyncWebsocketConsumer: đếm kết nối, message/bytes vào-ra và
+    thời gian giao message cho ASGI server. Phải đứng TRƯỚC AsyncWebsocketConsumer trong
+    danh sách lớp cha, ví dụ `class StatsConsumer(WebSocketMetricsMixin, AsyncWebsocketConsumer)`.
+    """
+    _metrics_connected = False
+
+    @property
+    def metrics_label(self):
+        return consumer_label(type(self))
+
+    async def accept(self, *args, **kwargs):
+        await super().accept(*args, **kwargs)
+        if not self._metrics_connected:
+            self._metrics_connected = True
+            ws_metrics.connection_opened(self.metrics_label, self.channel_name)
+
+    async def websocket_disconnect(self, message):
+        if self._metrics_connected:
+            self._metrics_connected = False
+            ws_metrics.connection_closed(self.metrics_label, self.channel_name)
+        await super().websocket_disconnect(message)
+
+    async def websocket_receive(self, message):
+        text = message.get('text')
+        size = len(text.encode('utf-8')) if text is not None else len(message.get('bytes') or b'')
+        ws_metrics.message_received(self.metrics_label, size)
+        await super().websocket_receive(message)
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        started_at = time.perf_counter()
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+        elapsed = time.perf_counter() - started_at
+        if text_data is not None:
+            ws_metrics.message_sent(self.metrics_label, len(text_data.encode('utf-8')), elapsed)
+        elif bytes_data is not None:
+            ws_metrics.message_sent(self.metrics_label, len(bytes_data), elapsed)
+
+    async def monitoring_slow_consumer(self, event):
+        """
+        Channel layer gửi message type='monitoring.slow.consumer' khi hàng đợi của
+        kết nối này vượt ngưỡng hoặc chờ quá lâu và đã bị xóa (WS_SLOW_CONSUMER_DISCONNECT=True).
+        """
+        await self.close(code=SLOW_CONSUMER_CLOSE_CODE)
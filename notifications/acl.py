@@ -0,0 +1,163 @@
+# notifications/acl.py
+"""
+Lớp ACL (access control) cho các WebSocket consumer theo dõi upload.
+
+Cache theo từng process: user_id -> tập upload ID đã biết là của user (và tập ID
+đã biết là KHÔNG phải của user), giới hạn số user bằng LRU.
+- Cache hit: kiểm tra quyền không cần DB và không cần thread hop.
+- Cache miss: các ID chưa biết được tra trong MỘT query `IN`, kết quả được dùng
+  để làm ấm cache cho cả những user khác đang có trong cache.
+- Cache được cập nhật khi upload được tạo/xóa (signal post_save/post_delete) và bỏ entry
+  của user khi tài khoản bị sửa/vô hiệu hóa/xóa (accounts.signals.users_changed).
+
+ID upload không bao giờ được dùng lại và chủ sở hữu của upload không đổi,
+nên các thông tin "không phải của user" không bị cũ khi có upload mới.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from channels.db import database_sync_to_async
+
+from accounts.signals import users_changed
+from uploads.models import UserUpload
+
+
+class _UserUploadACL:
+    __slots__ = ('owned', 'not_owned')
+
+    def __init__(self):
+        self.owned = set()
+        self.not_owned = set()
+
+
+class UploadACLCache:
+    """Cache LRU (user_id -> quyền trên các upload) an toàn khi dùng đa luồng."""
+
+    def __init__(self, max_users=None):
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_max_users(self):
+        if self.max_users is not None:
+            return self.max_users
+        return getattr(settings, 'UPLOAD_ACL_CACHE_MAX_USERS', 10000)
+
+    def _entry(self, user_id, create=False):
+        """Lấy entry của user (đánh dấu mới dùng gần đây). Phải gọi khi đang giữ lock."""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries.move_to_end(user_id)
+        elif create:
+            entry = self._entries[user_id] = _UserUploadACL()
+            while len(self._entries) > self._get_max_users():
+                self._entries.popitem(last=False) # Loại user ít dùng nhất
+        return entry
+
+    def lookup(self, user_id, upload_ids):
+        """
+        Kiểm tra quyền chỉ dựa vào cache (không truy vấn DB).
+        Trả về (tập ID được phép, tập ID chưa biết cần tra DB).
+        """
+        upload_ids = set(upload_ids)
+        with self._lock:
+            entry = self._entry(user_id)
+            if entry is None:
+                return set(), upload_ids
+            permitted = upload_ids & entry.owned
+            return permitted, upload_ids - permitted - entry.not_owned
+
+    def load(self, user_id, upload_ids):
+        """
+        Tra các upload ID chưa biết bằng MỘT query IN, cập nhật cache
+        và trả về tập ID mà user được phép.
+        """
+        rows = list(UserUpload.objects.filter(pk__in=list(upload_ids)).values_list('id', 'uploaded_by_id'))
+        permitted = set()
+        with self._lock:
+            entry = self._entry(user_id, create=True)
+            for upload_id, owner_id in rows:
+                if owner_id == user_id:
+                    entry.owned.add(upload_id)
+                    permitted.add(upload_id)
+                else:
+                    entry.not_owned.add(upload_id)
+                    owner_entry = self._entries.get(owner_id)
+                    if owner_entry is not None:
+                        owner_entry.owned.add(upload_id)
+        return permitted
+
+    def authorize(self, user_id, upload_ids):
+        """Phiên bản đồng bộ: tra cache, chỉ truy vấn DB cho các ID chưa biết."""
+        permitted, missing = self.lookup(user_id, upload_ids)
+        if missing:
+            permitted |= self.load(user_id, missing)
+        return permitted
+
+    def upload_created(self, upload_id, owner_id):
+        with self._lock:
+            entry = self._entries.get(owner_id)
+            if entry is not None:
+                entry.owned.add(upload_id)
+
+    def upload_deleted(self, upload_id, owner_id):
+        with self._lock:
+            entry = self._entries.get(owner_id)
+            if entry is not None:
+                entry.owned.discard(upload_id)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Instance dùng chung trong process
+upload_acl = UploadACLCache()
+
+
+def _existing_upload_ids(upload_ids):
+    return set(UserUpload.objects.filter(pk__in=list(upload_ids)).values_list('id', flat=True))
+
+
+async def authorize_upload_ids(user, upload_ids):
+    """
+    Trả về tập upload ID mà `user` được phép theo dõi qua WebSocket.
+    Admin được theo dõi mọi upload tồn tại; user thường chỉ upload của mình.
+    Khi cache đủ thông tin thì không có truy vấn DB và không có thread hop.
+    """
+    upload_ids = set(upload_ids)
+    if not upload_ids or not user or getattr(user, 'id', None) is None:
+        return set()
+    if getattr(user, 'is_admin', False):
+        return await database_sync_to_async(_existing_upload_ids)(upload_ids)
+    permitted, missing = upload_acl.lookup(user.id, upload_ids)
+    if missing:
+        permitted |= await database_sync_to_async(upload_acl.load)(user.id, missing)
+    return permitted
+
+
+@receiver(post_save, sender=UserUpload, dispatch_uid='notifications_acl_upload_created')
+def _on_upload_saved(sender, instance, created, **kwargs):
+    if created:
+        upload_acl.upload_created(instance.pk, instance.uploaded_by_id)
+
+
+@receiver(post_delete, sender=UserUpload, dispatch_uid='notifications_acl_upload_deleted')
+def _on_upload_deleted(sender, instance, **kwargs):
+    upload_acl.upload_deleted(instance.pk, instance.uploaded_by_id)
+
+
+@receiver(users_changed, dispatch_uid='notifications_acl_users_changed')
+def _on_users_changed(sender, user_ids, **kwargs):
+    for user_id in user_ids:
+        upload_acl.invalidate_user(user_id)
@@ -1,31 +1,101 @@
 # notifications/consumers.py
+import asyncio
 import json
+import logging
+from django.conf import settings
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async # Để chạy query DB bất đồng bộ (nếu cần)
 from uploads.models import UserUpload # Ví dụ, nếu UploadStatusConsumer cần kiểm tra
 from accounts.models import CustomUser # Ví dụ, nếu cần kiểm tra user_type
+from stats.consumers import StatsConsumer
+from monitoring.ws_metrics import WebSocketMetricsMixin
+from livefeed import consumers as livefeed_consumers # Tránh trùng tên với LiveFeedConsumer bên dưới
+from .acl import authorize_upload_ids
+from .progress import (
+    ProgressCoalescer,
+    get_max_messages_per_second,
+    get_upload_snapshots,
+    get_upload_status_group_name,
+)
 
-class UploadStatusConsumer(AsyncWebsocketConsumer):
+logger = logging.getLogger(__name__)
+
+
+class ProgressCoalescingMixin:
+    """
+    Gộp các sự kiện tiến độ (type='send.upload.progress') trước khi gửi xuống client
+    để mỗi kết nối nhận tối đa UPLOAD_STATUS_MAX_MESSAGES_PER_SECOND message/giây.
+    Lớp con có thể ghi đè `send_progress_payloads` để đổi định dạng message.
+    """
+
+    def init_progress_coalescing(self):
+        self.progress_coalescer = ProgressCoalescer(get_max_messages_per_second())
+        self._progress_flush_task = None
+
+    async def send_upload_progress(self, event):
+        """
+        Được gọi khi có message type='send.upload.progress' (queued/claimed/processing).
+        Sự kiện được đưa vào coalescer và chỉ gửi khi đã đủ khoảng cách tối thiểu.
+        """
+        self.progress_coalescer.add(event['message'])
+        if self._progress_flush_task and not self._progress_flush_task.done():
+            return # Đã có lịch gửi, sự kiện mới sẽ được gộp vào lần gửi đó
+        delay = self.progress_coalescer.delay_until_ready()
+        if delay <= 0:
+            await self._flush_progress()
+        else:
+            self._progress_flush_task = asyncio.ensure_future(self._flush_progress_later(delay))
+
+    async def send_progress_payloads(self, payloads):
+        for payload in payloads:
+            await self.send(text_data=json.dumps(payload))
+
+    def drop_pending_progress(self, upload_id):
+        """Bỏ các sự kiện tiến độ cũ còn chờ của một upload (khi đã có thông báo kết thúc)."""
+        self.progress_coalescer.discard(upload_id)
+        if not self.progress_coalescer.has_pending():
+            self._cancel_progress_flush()
+
+    async def _flush_progress_later(self, delay):
+        await asyncio.sleep(delay)
+        await self._flush_progress()
+
+    async def _flush_progress(self):
+        payloads = self.progress_coalescer.pop_ready()
+        if payloads:
+            await self.send_progress_payloads(payloads)
+
+    def _cancel_progress_flush(self):
+        if self._progress_flush_task and not self._progress_flush_task.done():
+            self._progress_flush_task.cancel()
+        self._progress_flush_task = None
+
+
+class UploadStatusConsumer(WebSocketMetricsMixin, ProgressCoalescingMixin, AsyncWebsocketConsumer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.upload_id = None
         self.user = None
         self.group_name = None
+        # Gộp các sự kiện tiến độ để client nhận tối đa N message/giây
+        self.init_progress_coalescing()
         # print(f"DEBUG (UploadStatusConsumer - __init__): self.channel_layer type: {type(self.channel_layer)}")
 
-    @database_sync_to_async
-    def check_upload_permission(self, user_object, upload_id_to_check):
-        if not user_object or not hasattr(user_object, 'id'):
-            return False
+    async def check_upload_permission(self, user_object, upload_id_to_check):
+        """Kiểm tra quyền qua ACL cache (chỉ truy vấn DB khi cache chưa biết upload này)."""
         try:
-            upload_instance = UserUpload.objects.select_related('uploaded_by').get(pk=upload_id_to_check)
-            if upload_instance.uploaded_by == user_object or (hasattr(user_object, 'is_admin') and user_object.is_admin):
-                return True
-            return False
-        except UserUpload.DoesNotExist:
-            return False
+            permitted_ids = await authorize_upload_ids(user_object, [int(upload_id_to_check)])
         except Exception: # Bắt các lỗi khác
             return False
+        return int(upload_id_to_check) in permitted_ids
+
+    @database_sync_to_async
+    def get_upload_snapshot(self, upload_id):
+        """
+        Lấy trạng thái hiện tại của upload để gửi ngay khi client kết nối,
+        nhờ đó client không cần poll /api/results/by-upload/.
+        """
+        return get_upload_snapshots([upload_id]).get(upload_id)
 
     async def connect(self):
         # if self.channel_layer is None: # Bạn cần đảm bảo channel_layer được gán đúng
@@ -45,10 +115,13 @@ class UploadStatusConsumer(AsyncWebsocketConsumer):
         is_allowed = await self.check_upload_permission(self.user, self.upload_id)
 
         if is_allowed:
-            self.group_name = f"upload_{self.upload_id}_status"
+            self.group_name = get_upload_status_group_name(self.upload_id)
             if self.channel_layer: # Kiểm tra trước khi sử dụng
                  await self.channel_layer.group_add(self.group_name, self.channel_name)
             await self.accept()
+            snapshot = await self.get_upload_snapshot(self.upload_id)
+            if snapshot:
+                await self.send(text_data=json.dumps(snapshot))
             # print(f"DEBUG (UploadStatusConsumer - connect): User {user_email_for_log} accepted for upload {self.upload_id}.")
             # await self.send(text_data=json.dumps({'type': 'connection_established', 'message': f'Connected for upload ID: {self.upload_id}'}))
         else:
@@ -57,17 +130,20 @@ class UploadStatusConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         # print(f"DEBUG (UploadStatusConsumer - disconnect): Upload ID {self.upload_id}, Close code: {close_code}")
+        self._cancel_progress_flush()
         if self.group_name and self.channel_layer:
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
     async def send_upload_status(self, event): # Tên hàm khớp với type trong group_send
         message_content = event['message']
+        # Thông báo kết thúc: bỏ các sự kiện tiến độ cũ còn chờ và gửi ngay
+        self.drop_pending_progress(message_content.get('upload_id'))
         # print(f"DEBUG (UploadStatusConsumer - send_upload_status): Sending to client: {message_content}")
         await self.send(text_data=json.dumps(message_content))
 
 
 # ---- ĐỊNH NGHĨA CLASS LiveFeedConsumer Ở ĐÂY ----
-class LiveFeedConsumer(AsyncWebsocketConsumer):
+class LiveFeedConsumer(WebSocketMetricsMixin, AsyncWebsocketConsumer):
     group_name = "live_camera_feed_viewers" # Tên group chung
 
     def __init__(self, *args, **kwargs):
@@ -126,17 +202,17 @@ class LiveFeedConsumer(AsyncWebsocketConsumer):
 # ------------------------------------------
 # === THÊM CONSUMER MỚI CHO RASPBERRY PI NHẬN TASK ===
 # ===========================================================
-class RPiTaskConsumer(AsyncWebsocketConsumer):
+class RPiTaskConsumer(WebSocketMetricsMixin, AsyncWebsocketConsumer):
     group_name = "rpi_workers_group" # Tên group cố định cho các RPi worker
 
     async def connect(self):
         # TẠM THỜI CHẤP NHẬN MỌI KẾT NỐI ĐẾN ENDPOINT NÀY
         # Không kiểm tra API Key hay user đặc biệt nào
         # GHI CHÚ: Cần thêm cơ chế xác thực RPi ở đây sau này!
-        print(f"DEBUG ({self.__class__.__name__} - connect): Incoming RPi connection attempt...")
+        logger.debug("%s connect: Incoming RPi connection attempt.", self.__class__.__name__)
         
         if self.channel_layer is None: 
-            print(f"DEBUG ({self.__class__.__name__} - connect): CRITICAL! Channel layer is None. Closing.")
+            logger.critical("%s connect: Channel layer is None. Closing.", self.__class__.__name__)
             await self.close()
             return
 
@@ -146,10 +222,10 @@ class RPiTaskConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         await self.accept()
-        print(f"DEBUG ({self.__class__.__name__} - connect): RPi connected (channel: {self.channel_name}) and joined group {self.group_name}. Waiting for tasks.")
+        logger.info("%s connect: RPi connected (channel: %s) and joined group %s.", self.__class__.__name__, self.channel_name, self.group_name)
 
     async def disconnect(self, close_code):
-        print(f"DEBUG ({self.__class__.__name__} - disconnect): RPi disconnected (channel: {self.channel_name}). Code: {close_code}")
+        logger.info("%s disconnect: RPi disconnected (channel: %s). Code: %s", self.__class__.__name__, self.channel_name, close_code)
         # Tự động rời khỏi group
         if self.channel_layer:
             await self.channel_layer.group_discard(
@@ -164,12 +240,188 @@ class RPiTaskConsumer(AsyncWebsocketConsumer):
         Nó sẽ lấy thông tin task và gửi xuống cho RPi client đang kết nối.
         """
         task_info = event['message'] # Dữ liệu BE gửi, ví dụ: {'type': 'new_upload', 'upload_id': 133}
-        print(f"DEBUG ({self.__class__.__name__} - rpi_new_task): Relaying task to RPi {self.channel_name}: {task_info}")
+        logger.debug("%s rpi_new_task: Relaying task to RPi %s: %s", self.__class__.__name__, self.channel_name, task_info)
         try:
             await self.send(text_data=json.dumps({
                 'type': 'new_task_assignment', # Loại message để RPi nhận biết
                 'data': task_info
             }))
-            print(f"DEBUG ({self.__class__.__name__} - rpi_new_task): Task relayed successfully.")
-        except Exception as e:
-             print(f"DEBUG ({self.__class__.__name__} - rpi_new_task): Error sending task to RPi: {e}")
\ No newline at end of file
+        except Exception:
+            logger.exception("%s rpi_new_task: Error sending task to RPi %s.", self.__class__.__name__, self.channel_name)
+
+# ===========================================================
+# === CONSUMER GHÉP KÊNH (MULTIPLEX) CHO DASHBOARD ===
+# ===========================================================
+class MultiplexConsumer(WebSocketMetricsMixin, ProgressCoalescingMixin, AsyncWebsocketConsumer):
+    """
+    Một WebSocket duy nhất cho tất cả các đăng ký của client (ws/multiplex/).
+    Xác thực chỉ một lần khi kết nối (TokenAuthMiddleware), sau đó client
+    đăng ký/hủy đăng ký các topic bằng message trong kênh:
+
+        {"action": "subscribe", "topics": ["stats", "upload:12", "upload:13", "camera"]}
+        {"action": "unsubscribe", "topics": ["upload:12"]}
+
+    Topic hỗ trợ:
+    - "stats":       cập nhật thống kê dashboard (user đã đăng nhập)
+    - "upload:<id>": trạng thái/tiến độ của một upload (chủ sở hữu hoặc Admin)
+    - "camera":      frame camera trực tiếp (chỉ Admin)
+
+    Mọi message gửi xuống đều kèm trường "topic" để client phân luồng. Riêng tiến độ của nhiều
+    upload trong cùng một lượt gửi được gộp vào một message để giới hạn tần suất tính theo kết nối:
+
+        {"type": "upload_progress_batch", "updates": [{"topic": "upload:12", ...}, {"topic": "upload:13", ...}]}
+    Quyền của nhiều topic upload được kiểm tra gộp qua ACL cache (tối đa một query IN).
+    """
+    TOPIC_STATS = 'stats'
+    TOPIC_CAMERA = 'camera'
+    UPLOAD_TOPIC_PREFIX = 'upload:'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = None
+        self.subscriptions = {} # topic -> tên group đã tham gia
+        self.init_progress_coalescing()
+
+    # --- Helpers ---
+    def _is_authenticated(self):
+        return bool(self.user and getattr(self.user, 'id', None) is not None)
+
+    def _is_admin(self):
+        return self._is_authenticated() and getattr(self.user, 'is_admin', False)
+
+    def _max_topics(self):
+        return getattr(settings, 'MULTIPLEX_MAX_TOPICS_PER_CONNECTION', 100)
+
+    @classmethod
+    def upload_topic(cls, upload_id):
+        return f"{cls.UPLOAD_TOPIC_PREFIX}{upload_id}"
+
+    @database_sync_to_async
+    def fetch_upload_snapshots(self, upload_ids):
+        return get_upload_snapshots(upload_ids)
+
+    async def send_envelope(self, topic, payload):
+        await self.send(text_data=json.dumps({'topic': topic, **payload}))
+
+    # --- Vòng đời kết nối ---
+    async def connect(self):
+        self.user = self.scope.get('user')
+        if not self._is_authenticated():
+            await self.close(code=4001)
+            return
+        if self.channel_layer is None:
+            await self.close(code=4002)
+            return
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        self._cancel_progress_flush()
+        if self.channel_layer:
+            for group_name in self.subscriptions.values():
+                await self.channel_layer.group_discard(group_name, self.channel_name)
+        self.subscriptions = {}
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            content = json.loads(text_data or '')
+        except (TypeError, ValueError):
+            await self.send(text_data=json.dumps({'type': 'error', 'detail': 'Message phải là JSON hợp lệ.'}))
+            return
+        action = content.get('action') if isinstance(content, dict) else None
+        topics = content.get('topics') if isinstance(content, dict) else None
+        if action not in ('subscribe', 'unsubscribe') or not isinstance(topics, list):
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'detail': "Cần có 'action' (subscribe/unsubscribe) và 'topics' (list).",
+            }))
+            return
+
+        topics = [str(topic) for topic in dict.fromkeys(topics)] # Bỏ trùng, giữ thứ tự
+        if action == 'subscribe':
+            await self.subscribe(topics)
+        else:
+            await self.unsubscribe(topics)
+
+    # --- Đăng ký / hủy đăng ký ---
+    async def subscribe(self, topics):
+        rejected = {}
+        allowed_groups = {}
+        requested_upload_ids = {}
+
+        for topic in topics:
+            if topic in self.subscriptions:
+                continue
+            if topic == self.TOPIC_STATS:
+                allowed_groups[topic] = StatsConsumer.group_name
+            elif topic == self.TOPIC_CAMERA:
+                if self._is_admin():
+                    allowed_groups[topic] = livefeed_consumers.LiveFeedConsumer.group_name
+                else:
+                    rejected[topic] = 'forbidden'
+            elif topic.startswith(self.UPLOAD_TOPIC_PREFIX) and topic[len(self.UPLOAD_TOPIC_PREFIX):].isdigit():
+                requested_upload_ids[int(topic[len(self.UPLOAD_TOPIC_PREFIX):])] = topic
+            else:
+                rejected[topic] = 'unknown_topic'
+
+        if requested_upload_ids:
+            permitted_ids = await authorize_upload_ids(self.user, requested_upload_ids.keys())
+            for upload_id, topic in requested_upload_ids.items():
+                if upload_id in permitted_ids:
+                    allowed_groups[topic] = get_upload_status_group_name(upload_id)
+                else:
+                    rejected[topic] = 'forbidden'
+
+        free_slots = self._max_topics() - len(self.subscriptions)
+        for topic in list(allowed_groups)[max(free_slots, 0):]:
+            allowed_groups.pop(topic)
+            rejected[topic] = 'too_many_topics'
+
+        for topic, group_name in allowed_groups.items():
+            await self.channel_layer.group_add(group_name, self.channel_name)
+            self.subscriptions[topic] = group_name
+
+        await self.send(text_data=json.dumps({
+            'type': 'subscription_update',
+            'subscribed': sorted(self.subscriptions),
+            'rejected': rejected,
+        }))
+
+        # Gửi trạng thái hiện tại của các upload vừa đăng ký (không cần poll)
+        new_upload_ids = [upload_id for upload_id, topic in requested_upload_ids.items() if topic in allowed_groups]
+        if new_upload_ids:
+            snapshots = await self.fetch_upload_snapshots(new_upload_ids)
+            for upload_id, snapshot in snapshots.items():
+                await self.send_envelope(self.upload_topic(upload_id), snapshot)
+
+    async def unsubscribe(self, topics):
+        for topic in topics:
+            group_name = self.subscriptions.pop(topic, None)
+            if group_name is None:
+                continue
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+            if topic.startswith(self.UPLOAD_TOPIC_PREFIX):
+                self.drop_pending_progress(int(topic[len(self.UPLOAD_TOPIC_PREFIX):]))
+        await self.send(text_data=json.dumps({
+            'type': 'subscription_update',
+            'subscribed': sorted(self.subscriptions),
+            'rejected': {},
+        }))
+
+    # --- Các handler nhận event từ channel layer (cùng type với các consumer riêng lẻ) ---
+    async def send_stats_update(self, event):
+        await self.send_envelope(self.TOPIC_STATS, {'type': 'stats_dashboard_update', 'data': event['message']})
+
+    async def send_live_frame(self, event):
+        await self.send_envelope(self.TOPIC_CAMERA, {'type': 'live_feed_frame', 'data': event['payload']})
+
+    async def send_upload_status(self, event):
+        message_content = event['message']
+        self.drop_pending_progress(message_content.get('upload_id'))
+        await self.send_envelope(self.upload_topic(message_content.get('upload_id')), message_content)
+
+    async def send_progress_payloads(self, payloads):
+        if len(payloads) == 1:
+            await self.send_envelope(self.upload_topic(payloads[0].get('upload_id')), payloads[0])
+            return
+        updates = [{'topic': self.upload_topic(payload.get('upload_id')), **payload} for payload in payloads]
+        await self.send(text_data=json.dumps({'type': 'upload_progress_batch', 'updates': updates}))
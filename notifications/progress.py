@@ -0,0 +1,224 @@
+# notifications/progress.py
+"""
+Các tiện ích cho kênh WebSocket trạng thái upload (ws/upload-status/<id>/).
+
+Ngoài thông báo kết thúc `upload_status_update` (do SaveResultAPIView gửi),
+kênh này còn phát các sự kiện tiến độ theo từng giai đoạn:
+- queued:     đang chờ trong hàng đợi (kèm vị trí trong hàng đợi)
+- claimed:    đã có RPi nhận xử lý
+- processing: đang xử lý (kèm phần trăm và các phát hiện tạm thời)
+
+Các sự kiện tiến độ được gộp (coalesce) phía server để mỗi kết nối nhận
+tối đa UPLOAD_STATUS_MAX_MESSAGES_PER_SECOND message tiến độ mỗi giây
+(MultiplexConsumer gửi tiến độ của nhiều upload trong cùng một message).
+"""
+import logging
+import time
+
+from django.conf import settings
+
+try:
+    from channels.layers import get_channel_layer
+    CHANNELS_INSTALLED_SUCCESSFULLY = True
+except ImportError:
+    def get_channel_layer(): return None
+    CHANNELS_INSTALLED_SUCCESSFULLY = False
+
+from jobs.asgi_loop import run_on_asgi_loop
+from uploads.models import UserUpload
+from monitoring.profiling import SPAN_CHANNEL_SEND, profile_span
+
+logger = logging.getLogger(__name__)
+
+STAGE_QUEUED = 'queued'
+STAGE_CLAIMED = 'claimed'
+STAGE_PROCESSING = 'processing'
+PROGRESS_STAGES = (STAGE_QUEUED, STAGE_CLAIMED, STAGE_PROCESSING)
+
+# Các trạng thái UserUpload được coi là "còn trong hàng đợi"
+QUEUED_UPLOAD_STATUSES = (UserUpload.STATUS_PENDING, UserUpload.STATUS_ASSIGNED)
+
+
+def get_upload_status_group_name(upload_id):
+    """Tên group mà UploadStatusConsumer lắng nghe cho một upload."""
+    return f"upload_{upload_id}_status"
+
+
+def get_max_messages_per_second():
+    return getattr(settings, 'UPLOAD_STATUS_MAX_MESSAGES_PER_SECOND', 4)
+
+
+def build_progress_payload(upload_id, stage, queue_position=None, percent=None, partial_detections=None):
+    """Tạo payload JSON gửi xuống client cho một sự kiện tiến độ."""
+    payload = {
+        "type": "upload_progress",
+        "upload_id": upload_id,
+        "stage": stage,
+    }
+    if queue_position is not None:
+        payload["queue_position"] = queue_position
+    if percent is not None:
+        payload["percent"] = percent
+    if partial_detections:
+        payload["partial_detections"] = list(partial_detections)
+    return payload
+
+
+def _progress_event(upload_id, stage, **fields):
+    return get_upload_status_group_name(upload_id), {
+        "type": "send.upload.progress", "message": build_progress_payload(upload_id, stage, **fields),
+    }
+
+
+async def _group_send_all(channel_layer, events):
+    for group, event in events:
+        await channel_layer.group_send(group, event)
+
+
+def _send_progress_events(events, description):
+    """
+    Gửi các sự kiện (group, event) trong một lần vào event loop của ASGI server
+    (view hoặc worker thread của jobs, xem jobs/asgi_loop.py). Trả về True nếu gửi thành công.
+    """
+    if not CHANNELS_INSTALLED_SUCCESSFULLY:
+        return False
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        logger.error("send_upload_progress: Channel layer is None! Cannot send progress for %s.", description)
+        return False
+    try:
+        with profile_span(SPAN_CHANNEL_SEND):
+            run_on_asgi_loop(_group_send_all, channel_layer, events)
+        return True
+    except Exception as e:
+        logger.error("send_upload_progress: Could not send progress for %s: %s", description, e)
+        return False
+
+
+def send_upload_progress(upload_id, stage, **fields):
+    """
+    Gửi một sự kiện tiến độ vào group của upload (gọi từ code đồng bộ - view hoặc job).
+    Trả về True nếu gửi thành công.
+    """
+    return _send_progress_events([_progress_event(upload_id, stage, **fields)], f"upload {upload_id}")
+
+
+def get_queue_position(upload_id):
+    """
+    Vị trí (bắt đầu từ 1) của upload trong hàng đợi xử lý, tính theo thứ tự ID.
+    Trả về None nếu upload không còn trong hàng đợi.
+    """
+    queued = UserUpload.objects.filter(status__in=QUEUED_UPLOAD_STATUSES)
+    if not queued.filter(pk=upload_id).exists():
+        return None
+    return queued.filter(pk__lt=upload_id).count() + 1
+
+
+def get_queue_positions(upload_ids):
+    """
+    Vị trí hàng đợi của nhiều upload bằng một query: lấy ID các upload đang chờ tới upload lớn nhất
+    theo thứ tự rồi đánh số trong Python. Upload không còn trong hàng đợi không có trong kết quả.
+    """
+    wanted = set(upload_ids)
+    if not wanted:
+        return {}
+    queued_ids = (
+        UserUpload.objects.filter(status__in=QUEUED_UPLOAD_STATUSES, pk__lte=max(wanted))
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+    return {upload_id: position for position, upload_id in enumerate(queued_ids, start=1) if upload_id in wanted}
+
+
+def get_upload_snapshots(upload_ids):
+    """
+    Trạng thái hiện tại của nhiều upload (một query IN cho trạng thái và một query cho vị trí
+    hàng đợi của mọi upload đang chờ), dùng để gửi ngay khi client kết nối/đăng ký thay vì
+    để client poll /api/results/by-upload/. Trả về dict {upload_id: payload}.
+    """
+    snapshots = {}
+    upload_rows = list(UserUpload.objects.filter(pk__in=list(upload_ids)).values('id', 'status', 'processing_result__id'))
+    positions = get_queue_positions(
+        upload_row['id'] for upload_row in upload_rows if upload_row['status'] in QUEUED_UPLOAD_STATUSES
+    )
+    for upload_row in upload_rows:
+        upload_id = upload_row['id']
+        if upload_row['status'] in QUEUED_UPLOAD_STATUSES:
+            snapshots[upload_id] = build_progress_payload(upload_id, STAGE_QUEUED, queue_position=positions.get(upload_id))
+        else:
+            snapshots[upload_id] = {
+                "type": "upload_status_update",
+                "status": upload_row['status'],
+                "upload_id": upload_id,
+                "result_id": upload_row['processing_result__id'],
+            }
+    return snapshots
+
+
+def broadcast_queue_positions(limit=None):
+    """
+    Gửi lại vị trí hàng đợi cho các upload đứng đầu hàng đợi
+    (gọi sau khi một upload hoàn thành để các client biết hàng đợi đã dịch chuyển).
+    Chỉ dùng một query để lấy danh sách ID và một lần vào event loop cho cả lô.
+    """
+    if limit is None:
+        limit = getattr(settings, 'UPLOAD_QUEUE_POSITION_BROADCAST_LIMIT', 50)
+    queued_ids = (
+        UserUpload.objects.filter(status__in=QUEUED_UPLOAD_STATUSES)
+        .order_by('id')
+        .values_list('id', flat=True)[:limit]
+    )
+    events = [
+        _progress_event(upload_id, STAGE_QUEUED, queue_position=position)
+        for position, upload_id in enumerate(queued_ids, start=1)
+    ]
+    if events:
+        _send_progress_events(events, f"{len(events)} queued upload(s)")
+
+
+class ProgressCoalescer:
+    """
+    Gộp các sự kiện tiến độ cho một client để giới hạn tần suất gửi.
+
+    - Các sự kiện cùng giai đoạn của một upload được gộp: trường mới ghi đè trường cũ,
+      riêng `partial_detections` được nối thêm để client không bị mất phát hiện.
+    - Khi upload sang giai đoạn khác, sự kiện mới thay hẳn sự kiện cũ để không giữ lại
+      trường của giai đoạn trước (ví dụ `queue_position` sau khi đã claimed).
+    - `delay_until_ready()` cho biết còn bao lâu mới được gửi lần tiếp theo.
+    - `pop_ready()` lấy toàn bộ payload đang chờ và ghi nhận thời điểm gửi.
+    """
+
+    def __init__(self, max_messages_per_second):
+        self.min_interval = 1.0 / max_messages_per_second if max_messages_per_second and max_messages_per_second > 0 else 0.0
+        self._pending = {}
+        self._last_sent_at = None
+
+    def add(self, payload):
+        key = payload.get('upload_id')
+        previous = self._pending.get(key)
+        if previous is None or previous.get('stage') != payload.get('stage'):
+            self._pending[key] = dict(payload)
+            return
+        merged = {**previous, **payload}
+        detections = list(previous.get('partial_detections') or []) + list(payload.get('partial_detections') or [])
+        if detections:
+            merged['partial_detections'] = detections
+        self._pending[key] = merged
+
+    def discard(self, key):
+        self._pending.pop(key, None)
+
+    def has_pending(self):
+        return bool(self._pending)
+
+    def delay_until_ready(self, now=None):
+        if self._last_sent_at is None or not self.min_interval:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        return max(0.0, self._last_sent_at + self.min_interval - now)
+
+    def pop_ready(self, now=None):
+        payloads = list(self._pending.values())
+        self._pending = {}
+        self._last_sent_at = time.monotonic() if now is None else now
+        return payloads
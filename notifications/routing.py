@@ -17,4 +17,7 @@ websocket_urlpatterns = [
     # URL để RPi kết nối vào lắng nghe task mới
     path('ws/rpi/listen-tasks/', consumers.RPiTaskConsumer.as_asgi()),
     # ---------------------------------
+
+    # WebSocket ghép kênh: một kết nối cho stats, upload-status và camera
+    path('ws/multiplex/', consumers.MultiplexConsumer.as_asgi()),
 ]
\ No newline at end of file
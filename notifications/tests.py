@@ -0,0 +1,358 @@
+# notifications/tests.py
+import asyncio
+import json
+import threading
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import path
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+
+from accounts.models import CustomUser
+from jobs.asgi_loop import set_asgi_loop
+from uploads.models import UserUpload
+from .consumers import UploadStatusConsumer, MultiplexConsumer
+from .acl import UploadACLCache, upload_acl
+from .progress import ProgressCoalescer, broadcast_queue_positions, get_upload_snapshots, get_upload_status_group_name
+
+# Import thư viện hash
+from argon2 import PasswordHasher
+ph = PasswordHasher()
+
+
+class ScopeUserMiddleware:
+    """Middleware giả lập TokenAuthMiddleware: gán sẵn user vào scope."""
+    def __init__(self, app, user):
+        self.app = app
+        self.user = user
+
+    async def __call__(self, scope, receive, send):
+        return await self.app(dict(scope, user=self.user), receive, send)
+
+
+# --- Test cho ProgressCoalescer ---
+class ProgressCoalescerTest(SimpleTestCase):
+
+    def test_first_event_is_ready_immediately(self):
+        """Sự kiện đầu tiên được gửi ngay, không phải chờ."""
+        coalescer = ProgressCoalescer(max_messages_per_second=2)
+        coalescer.add({'upload_id': 1, 'stage': 'claimed'})
+        self.assertEqual(coalescer.delay_until_ready(now=100.0), 0.0)
+        self.assertEqual(coalescer.pop_ready(now=100.0), [{'upload_id': 1, 'stage': 'claimed'}])
+        self.assertFalse(coalescer.has_pending())
+
+    def test_events_are_rate_limited_and_merged(self):
+        """Các sự kiện trong cùng khoảng thời gian được gộp, partial_detections được nối thêm."""
+        coalescer = ProgressCoalescer(max_messages_per_second=2)
+        coalescer.add({'upload_id': 1, 'stage': 'claimed'})
+        coalescer.pop_ready(now=100.0)
+
+        coalescer.add({'upload_id': 1, 'stage': 'processing', 'percent': 10, 'partial_detections': [{'name': 'A'}]})
+        coalescer.add({'upload_id': 1, 'stage': 'processing', 'percent': 40, 'partial_detections': [{'name': 'B'}]})
+        self.assertAlmostEqual(coalescer.delay_until_ready(now=100.1), 0.4)
+
+        payloads = coalescer.pop_ready(now=100.5)
+        self.assertEqual(len(payloads), 1)
+        self.assertEqual(payloads[0]['percent'], 40)
+        self.assertEqual(payloads[0]['partial_detections'], [{'name': 'A'}, {'name': 'B'}])
+
+    def test_discard_drops_pending_event(self):
+        """Thông báo kết thúc bỏ các sự kiện tiến độ còn chờ."""
+        coalescer = ProgressCoalescer(max_messages_per_second=1)
+        coalescer.add({'upload_id': 5, 'stage': 'processing', 'percent': 90})
+        coalescer.discard(5)
+        self.assertFalse(coalescer.has_pending())
+
+    def test_stage_change_drops_previous_stage_fields(self):
+        """Sang giai đoạn mới thì không giữ lại queue_position của giai đoạn queued."""
+        coalescer = ProgressCoalescer(max_messages_per_second=1)
+        coalescer.add({'upload_id': 3, 'stage': 'queued', 'queue_position': 4})
+        coalescer.add({'upload_id': 3, 'stage': 'claimed'})
+        self.assertEqual(coalescer.pop_ready(now=100.0), [{'upload_id': 3, 'stage': 'claimed'}])
+
+
+# --- Test cho UploadStatusConsumer (dùng WebsocketCommunicator) ---
+class UploadStatusConsumerTest(TransactionTestCase):
+
+    def setUp(self):
+        upload_acl.clear() # Không để cache của test trước ảnh hưởng
+        self.user = CustomUser.objects.create(email='wsowner@example.com', password_hash=ph.hash('wspass'))
+        self.upload = UserUpload.objects.create(
+            uploaded_by=self.user,
+            file=SimpleUploadedFile('ws_test.jpg', b'ws', 'image/jpeg')
+        )
+
+    def _communicator(self, user):
+        application = ScopeUserMiddleware(
+            URLRouter([path('ws/upload-status/<int:upload_id>/', UploadStatusConsumer.as_asgi())]),
+            user
+        )
+        return WebsocketCommunicator(application, f'/ws/upload-status/{self.upload.id}/')
+
+    def test_connect_sends_snapshot_and_coalesced_progress(self):
+        """Khi kết nối nhận ngay vị trí hàng đợi; nhiều sự kiện tiến độ liên tiếp được gộp lại."""
+        async def scenario():
+            communicator = self._communicator(self.user)
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+
+            snapshot = json.loads(await communicator.receive_from())
+            self.assertEqual(snapshot['type'], 'upload_progress')
+            self.assertEqual(snapshot['stage'], 'queued')
+            self.assertEqual(snapshot['queue_position'], 1)
+
+            channel_layer = get_channel_layer()
+            group_name = get_upload_status_group_name(self.upload.id)
+            for percent in (10, 20, 30):
+                await channel_layer.group_send(group_name, {
+                    "type": "send.upload.progress",
+                    "message": {"type": "upload_progress", "upload_id": self.upload.id, "stage": "processing", "percent": percent},
+                })
+
+            first = json.loads(await communicator.receive_from())
+            self.assertEqual(first['percent'], 10)
+            # Hai sự kiện sau bị gộp thành một message với giá trị mới nhất
+            second = json.loads(await communicator.receive_from(timeout=2))
+            self.assertEqual(second['percent'], 30)
+            self.assertTrue(await communicator.receive_nothing(timeout=0.3))
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_connect_rejected_for_other_user(self):
+        """User không sở hữu upload bị từ chối kết nối."""
+        other_user = CustomUser.objects.create(email='wsother@example.com', password_hash=ph.hash('wspass'))
+
+        async def scenario():
+            communicator = self._communicator(other_user)
+            connected, close_code = await communicator.connect()
+            self.assertFalse(connected)
+            self.assertEqual(close_code, 4004)
+
+        async_to_sync(scenario)()
+
+
+# --- Test cho MultiplexConsumer ---
+class MultiplexConsumerTest(TransactionTestCase):
+
+    def setUp(self):
+        upload_acl.clear() # Không để cache của test trước ảnh hưởng
+        self.user = CustomUser.objects.create(email='muxuser@example.com', password_hash=ph.hash('muxpass'))
+        self.other_user = CustomUser.objects.create(email='muxother@example.com', password_hash=ph.hash('muxpass'))
+        self.own_upload = UserUpload.objects.create(
+            uploaded_by=self.user,
+            file=SimpleUploadedFile('mux_own.jpg', b'own', 'image/jpeg')
+        )
+        self.other_upload = UserUpload.objects.create(
+            uploaded_by=self.other_user,
+            file=SimpleUploadedFile('mux_other.jpg', b'other', 'image/jpeg')
+        )
+
+    def _communicator(self, user):
+        application = ScopeUserMiddleware(URLRouter([path('ws/multiplex/', MultiplexConsumer.as_asgi())]), user)
+        return WebsocketCommunicator(application, '/ws/multiplex/')
+
+    def test_subscribe_filters_topics_and_routes_events(self):
+        """Chỉ các topic được phép mới được đăng ký; event gửi xuống kèm topic tương ứng."""
+        async def scenario():
+            communicator = self._communicator(self.user)
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+
+            await communicator.send_json_to({
+                'action': 'subscribe',
+                'topics': ['stats', f'upload:{self.own_upload.id}', f'upload:{self.other_upload.id}', 'camera', 'bogus'],
+            })
+            update = await communicator.receive_json_from()
+            self.assertEqual(update['type'], 'subscription_update')
+            self.assertEqual(update['subscribed'], sorted(['stats', f'upload:{self.own_upload.id}']))
+            self.assertEqual(update['rejected'], {
+                f'upload:{self.other_upload.id}': 'forbidden',
+                'camera': 'forbidden',
+                'bogus': 'unknown_topic',
+            })
+
+            snapshot = await communicator.receive_json_from()
+            self.assertEqual(snapshot['topic'], f'upload:{self.own_upload.id}')
+            self.assertEqual(snapshot['stage'], 'queued')
+
+            channel_layer = get_channel_layer()
+            await channel_layer.group_send('dashboard_stats_updates', {'type': 'send.stats.update', 'message': {'result_id': 7}})
+            stats_event = await communicator.receive_json_from()
+            self.assertEqual(stats_event, {'topic': 'stats', 'type': 'stats_dashboard_update', 'data': {'result_id': 7}})
+
+            await communicator.send_json_to({'action': 'unsubscribe', 'topics': ['stats']})
+            update = await communicator.receive_json_from()
+            self.assertEqual(update['subscribed'], [f'upload:{self.own_upload.id}'])
+            await channel_layer.group_send('dashboard_stats_updates', {'type': 'send.stats.update', 'message': {}})
+            self.assertTrue(await communicator.receive_nothing(timeout=0.2))
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_progress_of_several_uploads_is_sent_in_one_message(self):
+        """Tiến độ của nhiều upload trong cùng một lượt gửi được gộp vào một message."""
+        second_upload = UserUpload.objects.create(
+            uploaded_by=self.user,
+            file=SimpleUploadedFile('mux_second.jpg', b'second', 'image/jpeg')
+        )
+
+        async def scenario():
+            communicator = self._communicator(self.user)
+            await communicator.connect()
+            await communicator.send_json_to({
+                'action': 'subscribe',
+                'topics': [f'upload:{self.own_upload.id}', f'upload:{second_upload.id}'],
+            })
+            await communicator.receive_json_from() # subscription_update
+            await communicator.receive_json_from() # snapshot
+            await communicator.receive_json_from() # snapshot
+
+            channel_layer = get_channel_layer()
+            for upload_id in (self.own_upload.id, second_upload.id, self.own_upload.id):
+                await channel_layer.group_send(get_upload_status_group_name(upload_id), {
+                    'type': 'send.upload.progress',
+                    'message': {'type': 'upload_progress', 'upload_id': upload_id, 'stage': 'claimed'},
+                })
+            first = await communicator.receive_json_from()
+            self.assertEqual(first['topic'], f'upload:{self.own_upload.id}')
+
+            batch = await communicator.receive_json_from(timeout=2)
+            self.assertEqual(batch['type'], 'upload_progress_batch')
+            self.assertEqual(
+                sorted(update['topic'] for update in batch['updates']),
+                sorted([f'upload:{self.own_upload.id}', f'upload:{second_upload.id}'])
+            )
+            self.assertTrue(await communicator.receive_nothing(timeout=0.3))
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_invalid_message_returns_error(self):
+        """Message sai định dạng nhận về lỗi nhưng kết nối vẫn giữ."""
+        async def scenario():
+            communicator = self._communicator(self.user)
+            await communicator.connect()
+            await communicator.send_to(text_data='not json')
+            response = await communicator.receive_json_from()
+            self.assertEqual(response['type'], 'error')
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
+
+
+# --- Test cho get_upload_snapshots ---
+class UploadSnapshotTest(TestCase):
+
+    def test_queue_positions_use_one_query(self):
+        """Vị trí hàng đợi của mọi upload đang chờ được tính bằng một query, không phải một COUNT mỗi upload."""
+        user = CustomUser.objects.create(email='snapshot@example.com', password_hash='x')
+        uploads = [
+            UserUpload.objects.create(uploaded_by=user, file=SimpleUploadedFile(f'snap_{i}.jpg', b's', 'image/jpeg'))
+            for i in range(4)
+        ]
+        UserUpload.objects.filter(pk=uploads[1].pk).update(status=UserUpload.STATUS_COMPLETED)
+        with self.assertNumQueries(2):
+            snapshots = get_upload_snapshots([uploads[0].id, uploads[1].id, uploads[3].id])
+        self.assertEqual(snapshots[uploads[0].id]['queue_position'], 1)
+        self.assertEqual(snapshots[uploads[3].id]['queue_position'], 3)
+        self.assertEqual(snapshots[uploads[1].id]['type'], 'upload_status_update')
+
+
+# --- Test gửi vị trí hàng đợi từ worker thread ---
+class QueuePositionBroadcastTest(TestCase):
+    """Consumer sống trên event loop của server (thread riêng), job broadcast chạy ở thread khác."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        thread.start()
+        set_asgi_loop(self.loop)
+
+        def stop_loop():
+            set_asgi_loop(None)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            thread.join(timeout=5)
+            self.loop.close()
+        self.addCleanup(stop_loop)
+
+        user = CustomUser.objects.create(email='queuepos@example.com', password_hash='x')
+        self.uploads = [
+            UserUpload.objects.create(uploaded_by=user, file=SimpleUploadedFile(f'queue_{i}.jpg', b'q', 'image/jpeg'))
+            for i in range(2)
+        ]
+
+    def _on_loop(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def test_positions_reach_consumers_waiting_on_server_loop(self):
+        channel_layer = get_channel_layer()
+
+        async def subscribe(upload_id):
+            channel_name = await channel_layer.new_channel()
+            await channel_layer.group_add(get_upload_status_group_name(upload_id), channel_name)
+            return channel_name
+        pending = {}
+        for upload in self.uploads:
+            channel_name = self._on_loop(subscribe(upload.id)).result(timeout=5)
+            pending[upload.id] = self._on_loop(channel_layer.receive(channel_name))
+
+        broadcast_queue_positions()
+        positions = {upload_id: future.result(timeout=1)['message']['queue_position'] for upload_id, future in pending.items()}
+        self.assertEqual(positions, {self.uploads[0].id: 1, self.uploads[1].id: 2})
+
+
+# --- Test cho UploadACLCache ---
+class UploadACLCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = CustomUser.objects.create(email='aclowner@example.com', password_hash=ph.hash('aclpass'))
+        cls.stranger = CustomUser.objects.create(email='aclstranger@example.com', password_hash=ph.hash('aclpass'))
+        cls.uploads = [
+            UserUpload.objects.create(uploaded_by=cls.owner, file=SimpleUploadedFile(f'acl_{i}.jpg', b'acl', 'image/jpeg'))
+            for i in range(3)
+        ]
+        cls.stranger_upload = UserUpload.objects.create(
+            uploaded_by=cls.stranger, file=SimpleUploadedFile('acl_s.jpg', b'acl', 'image/jpeg')
+        )
+
+    def test_batch_authorization_uses_single_query_then_cache(self):
+        """Nhiều upload được kiểm tra bằng một query; lần sau dùng cache, không truy vấn DB."""
+        cache = UploadACLCache(max_users=10)
+        requested = [u.id for u in self.uploads] + [self.stranger_upload.id, 999999]
+        with self.assertNumQueries(1):
+            permitted = cache.authorize(self.owner.id, requested)
+        self.assertEqual(permitted, {u.id for u in self.uploads})
+        with self.assertNumQueries(0):
+            permitted, missing = cache.lookup(self.owner.id, [u.id for u in self.uploads] + [self.stranger_upload.id])
+        self.assertEqual(permitted, {u.id for u in self.uploads})
+        self.assertEqual(missing, set())
+
+    def test_lru_eviction(self):
+        """Vượt quá số user tối đa thì user ít dùng nhất bị loại khỏi cache."""
+        cache = UploadACLCache(max_users=1)
+        cache.authorize(self.owner.id, [self.uploads[0].id])
+        cache.authorize(self.stranger.id, [self.stranger_upload.id])
+        self.assertEqual(len(cache), 1)
+        _, missing = cache.lookup(self.owner.id, [self.uploads[0].id])
+        self.assertEqual(missing, {self.uploads[0].id})
+
+    def test_cache_follows_upload_create_and_delete(self):
+        """Tạo/xóa upload cập nhật cache dùng chung qua signal."""
+        upload_acl.clear()
+        upload_acl.authorize(self.owner.id, [self.uploads[0].id])
+        new_upload = UserUpload.objects.create(uploaded_by=self.owner, file=SimpleUploadedFile('acl_new.jpg', b'n', 'image/jpeg'))
+        with self.assertNumQueries(0):
+            permitted, _ = upload_acl.lookup(self.owner.id, [new_upload.id])
+        self.assertEqual(permitted, {new_upload.id})
+
+        new_upload_id = new_upload.id
+        new_upload.delete()
+        permitted, missing = upload_acl.lookup(self.owner.id, [new_upload_id])
+        self.assertEqual(permitted, set())
+        self.assertEqual(missing, {new_upload_id})
+        upload_acl.clear()
+
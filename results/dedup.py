@@ -0,0 +1,141 @@
+# results/dedup.py
+"""
+Gộp các khung hình camera gần như trùng nhau trước khi lưu (SaveResultAPIView).
+
+Bẫy côn trùng đặt cố định gửi lên rất nhiều khung hình giống hệt nhau với cùng các
+côn trùng. Với kết quả từ camera (không có source_upload):
+1. Tính perceptual hash (dHash 64 bit) của ảnh đã xử lý.
+2. So với các khung hình gần đây của cùng thiết bị trong một ring buffer trong bộ nhớ
+   (mỗi thiết bị CAMERA_DEDUP_FRAMES_PER_DEVICE khung, tối đa CAMERA_DEDUP_MAX_DEVICES thiết bị, LRU).
+3. Nếu khoảng cách Hamming <= CAMERA_DEDUP_MAX_DISTANCE, cùng danh sách côn trùng (tên và
+   số lượng) và cách kết quả gốc không quá CAMERA_DEDUP_WINDOW_SECONDS: không lưu ảnh/dòng
+   mới mà tăng duplicate_count của kết quả trước đó.
+
+Cửa sổ thời gian tính từ kết quả gốc (không gia hạn khi gộp), nên một cảnh tĩnh vẫn tạo
+một kết quả mới sau mỗi cửa sổ và thống kê theo ngày không bị mất. Buffer nằm trong từng
+process: sau khi khởi động lại hoặc khi request rơi vào worker khác thì khung hình đầu tiên
+được lưu bình thường.
+"""
+import io
+import logging
+import threading
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from PIL import Image, UnidentifiedImageError
+
+from stats.rollups import insect_counts
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8 # dHash 8x8 = 64 bit
+DEFAULT_DEVICE_ID = 'default'
+
+
+def dedup_enabled():
+    return getattr(settings, 'CAMERA_DEDUP_ENABLED', True)
+
+
+def perceptual_hash(image_bytes):
+    """
+    dHash: thu ảnh xám về (HASH_SIZE + 1) x HASH_SIZE điểm, mỗi bit cho biết điểm ảnh có sáng
+    hơn điểm bên phải nó không. Ảnh nén lại/nhiễu nhẹ cho hash gần như giống nhau.
+    Trả về số nguyên 64 bit, hoặc None nếu không đọc được ảnh.
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8)) # JPEG: giải mã ở độ phân giải thấp, nhanh hơn nhiều
+            pixels = list(image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BILINEAR).getdata())
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        logger.debug("Dedup: không tính được hash ảnh: %s", e)
+        return None
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(hash_a, hash_b):
+    return (hash_a ^ hash_b).bit_count()
+
+
+def detection_signature(insects_json):
+    """Danh sách côn trùng không phụ thuộc thứ tự/độ tin cậy/bbox: ((tên, số lượng), ...)."""
+    return tuple(sorted(insect_counts(insects_json).items()))
+
+
+class _Frame:
+    __slots__ = ('image_hash', 'signature', 'result_id', 'detected_at')
+
+    def __init__(self, image_hash, signature, result_id, detected_at):
+        self.image_hash = image_hash
+        self.signature = signature
+        self.result_id = result_id
+        self.detected_at = detected_at
+
+
+class FrameDedupBuffer:
+    """Ring buffer các khung hình gần đây theo thiết bị (LRU theo thiết bị), an toàn đa luồng."""
+
+    def __init__(self, frames_per_device=None, max_devices=None, max_distance=None, window_seconds=None):
+        self.frames_per_device = frames_per_device
+        self.max_devices = max_devices
+        self.max_distance = max_distance
+        self.window_seconds = window_seconds
+        self._devices = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _setting(self, value, name, default):
+        return value if value is not None else getattr(settings, name, default)
+
+    def find_duplicate(self, device_id, image_hash, signature, detected_at):
+        """ID kết quả mà khung hình này trùng với, hoặc None."""
+        max_distance = self._setting(self.max_distance, 'CAMERA_DEDUP_MAX_DISTANCE', 6)
+        window_seconds = self._setting(self.window_seconds, 'CAMERA_DEDUP_WINDOW_SECONDS', 600)
+        with self._lock:
+            frames = self._devices.get(device_id)
+            if not frames:
+                return None
+            self._devices.move_to_end(device_id)
+            for frame in reversed(frames): # Khung hình mới nhất trước
+                if frame.signature != signature:
+                    continue
+                if abs((detected_at - frame.detected_at).total_seconds()) > window_seconds:
+                    continue
+                if hamming_distance(frame.image_hash, image_hash) <= max_distance:
+                    return frame.result_id
+        return None
+
+    def remember(self, device_id, image_hash, signature, result_id, detected_at):
+        frames_per_device = self._setting(self.frames_per_device, 'CAMERA_DEDUP_FRAMES_PER_DEVICE', 8)
+        max_devices = self._setting(self.max_devices, 'CAMERA_DEDUP_MAX_DEVICES', 1000)
+        with self._lock:
+            frames = self._devices.get(device_id)
+            if frames is None or frames.maxlen != frames_per_device:
+                frames = self._devices[device_id] = deque(frames or (), maxlen=frames_per_device)
+            self._devices.move_to_end(device_id)
+            frames.append(_Frame(image_hash, signature, result_id, detected_at))
+            while len(self._devices) > max_devices:
+                self._devices.popitem(last=False) # Loại thiết bị lâu không gửi nhất
+
+    def forget(self, device_id, result_id):
+        """Bỏ khung hình của một kết quả không còn tồn tại (ví dụ đã bị xóa/lưu trữ)."""
+        with self._lock:
+            frames = self._devices.get(device_id)
+            if frames:
+                remaining = [frame for frame in frames if frame.result_id != result_id]
+                frames.clear()
+                frames.extend(remaining)
+
+    def clear(self):
+        with self._lock:
+            self._devices.clear()
+
+    def __len__(self):
+        return len(self._devices)
+
+
+# Buffer dùng chung trong process
+camera_frames = FrameDedupBuffer()
@@ -1,12 +1,34 @@
 # results/filters.py
+from datetime import datetime, time, timedelta
+
 import django_filters
+from django.conf import settings
+from django.utils import timezone
 from .models import ProcessingResult
 import json # Import json
 
+
+def day_start(value):
+    """
+    Thời điểm 00:00 (theo TIME_ZONE hiện tại) của ngày `value`. Dùng để lọc theo khoảng
+    timestamp (detection_timestamp >= ... AND < ...) thay cho `__date`: lookup `__date` bọc cột
+    trong hàm DATE()/CONVERT_TZ() nên CSDL không dùng được index của cột.
+    """
+    start = datetime.combine(value, time.min)
+    if settings.USE_TZ:
+        start = timezone.make_aware(start)
+    return start
+
+
+def day_range(start_date, end_date):
+    """Khoảng [start, end) của các ngày start_date..end_date (tính cả end_date)."""
+    return day_start(start_date), day_start(end_date + timedelta(days=1))
+
+
 class ProcessingResultFilter(django_filters.FilterSet):
-    # Lọc theo khoảng ngày phát hiện (detection_timestamp)
-    start_date = django_filters.DateFilter(field_name='detection_timestamp__date', lookup_expr='gte', label='Từ ngày (YYYY-MM-DD)')
-    end_date = django_filters.DateFilter(field_name='detection_timestamp__date', lookup_expr='lte', label='Đến ngày (YYYY-MM-DD)')
+    # Lọc theo khoảng ngày phát hiện (detection_timestamp), chuyển thành khoảng timestamp để dùng được index
+    start_date = django_filters.DateFilter(method='filter_start_date', label='Từ ngày (YYYY-MM-DD)')
+    end_date = django_filters.DateFilter(method='filter_end_date', label='Đến ngày (YYYY-MM-DD)')
 
     # Lọc theo tên côn trùng chứa trong JSONField
     # Sử dụng CharFilter và một phương thức lọc tùy chỉnh
@@ -18,6 +40,12 @@ class ProcessingResultFilter(django_filters.FilterSet):
         # fields = ['source_upload__uploaded_by__email'] # Lọc theo email người upload (cho Admin)
         fields = ['start_date', 'end_date', 'insect_name'] # Các filter đã định nghĩa
 
+    def filter_start_date(self, queryset, name, value):
+        return queryset.filter(detection_timestamp__gte=day_start(value))
+
+    def filter_end_date(self, queryset, name, value):
+        return queryset.filter(detection_timestamp__lt=day_start(value + timedelta(days=1)))
+
     def filter_by_insect_name(self, queryset, name, value):
         """
         Lọc các ProcessingResult mà trường detected_insects_json (là một list các dict)
@@ -36,4 +64,23 @@ class ProcessingResultFilter(django_filters.FilterSet):
         return queryset.filter(detected_insects_json__contains=[{'name': value}])
 
         # Cách khác (kém chính xác hơn, tìm kiếm text đơn giản):
-        # return queryset.filter(detected_insects_json__icontains=f'"name": "{value}"')
\ No newline at end of file
+        # return queryset.filter(detected_insects_json__icontains=f'"name": "{value}"')
+
+
+class DeviceFeedFilter(django_filters.FilterSet):
+    """
+    Lọc feed camera theo ngày phát hiện: ?start_date=...&end_date=... hoặc (tên cũ)
+    ?detection_timestamp__date__gte=...&detection_timestamp__date__lte=...
+    Cả hai đều được chuyển thành khoảng timestamp để dùng được index.
+    """
+    start_date = django_filters.DateFilter(method='filter_start_date', label='Từ ngày (YYYY-MM-DD)')
+    end_date = django_filters.DateFilter(method='filter_end_date', label='Đến ngày (YYYY-MM-DD)')
+    detection_timestamp__date__gte = django_filters.DateFilter(method='filter_start_date', label='Từ ngày (YYYY-MM-DD)')
+    detection_timestamp__date__lte = django_filters.DateFilter(method='filter_end_date', label='Đến ngày (YYYY-MM-DD)')
+
+    class Meta:
+        model = ProcessingResult
+        fields = ['start_date', 'end_date', 'detection_timestamp__date__gte', 'detection_timestamp__date__lte']
+
+    filter_start_date = ProcessingResultFilter.filter_start_date
+    filter_end_date = ProcessingResultFilter.filter_end_date
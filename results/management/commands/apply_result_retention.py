@@ -0,0 +1,40 @@
+# results/management/commands/apply_result_retention.py
+from django.core.management.base import BaseCommand
+
+from results.retention import SOURCE_TYPES, RetentionRunner, get_policies
+
+
+class Command(BaseCommand):
+    help = (
+        "Áp dụng chính sách lưu trữ (settings.RESULT_RETENTION_POLICIES) cho ProcessingResult: "
+        "xóa ảnh đã xử lý quá hạn và chuyển kết quả cũ sang bảng lưu trữ / file NDJSON.gz, theo lô có giới hạn tốc độ. "
+        "Nên chạy định kỳ (cron) vào giờ thấp điểm."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=SOURCE_TYPES, action='append', help='Chỉ chạy cho nguồn này (lặp lại để chọn nhiều nguồn).')
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ đếm số ảnh/kết quả quá hạn, không thay đổi gì.')
+        parser.add_argument('--batch-size', type=int, help='Số kết quả mỗi lô (mặc định RESULT_RETENTION_BATCH_SIZE).')
+        parser.add_argument('--pause', type=float, help='Số giây nghỉ giữa hai lô (mặc định RESULT_RETENTION_BATCH_PAUSE_SECONDS).')
+        parser.add_argument('--max-batches', type=int, help='Số lô tối đa lần chạy này (mặc định RESULT_RETENTION_MAX_BATCHES, 0 = không giới hạn).')
+
+    def handle(self, *args, **options):
+        policies = get_policies()
+        if options['source']:
+            policies = {source_type: policies[source_type] for source_type in options['source']}
+        for policy in policies.values():
+            self.stdout.write(f"Chính sách: {policy!r}")
+
+        runner = RetentionRunner(
+            policies=policies,
+            batch_size=options['batch_size'],
+            pause_seconds=options['pause'],
+            max_batches=options['max_batches'],
+            dry_run=options['dry_run'],
+        )
+        report = runner.run()
+        prefix = "[dry-run] Sẽ xử lý" if options['dry_run'] else "Đã xử lý"
+        for source_type, stats in report.items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{prefix} {source_type}: {stats['images_deleted']} ảnh, {stats['archived']} kết quả lưu trữ ({stats['batches']} lô)."
+            ))
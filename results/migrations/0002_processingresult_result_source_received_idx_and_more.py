@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-19 11:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('results', '0001_initial'),
+        ('uploads', '0003_userupload_upload_user_time_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='processingresult',
+            index=models.Index(fields=['source_upload', '-received_at', '-detection_timestamp'], name='result_source_received_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='processingresult',
+            index=models.Index(fields=['-received_at', '-detection_timestamp'], name='result_received_detected_idx'),
+        ),
+    ]
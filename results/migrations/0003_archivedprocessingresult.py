@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-19 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('results', '0002_processingresult_result_source_received_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedProcessingResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True, verbose_name='ID Kết quả Gốc')),
+                ('source_type', models.CharField(choices=[('camera', 'Camera RPi'), ('user_upload', 'Upload của người dùng')], max_length=20, verbose_name='Nguồn')),
+                ('source_upload_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID Upload Gốc')),
+                ('uploaded_by_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID Người Upload')),
+                ('detection_timestamp', models.DateTimeField(verbose_name='Thời điểm Phát hiện (từ RPi)')),
+                ('received_at', models.DateTimeField(verbose_name='Thời điểm Server Nhận')),
+                ('detected_insects_json', models.JSONField(verbose_name='Danh sách Côn trùng Phát hiện (JSON)')),
+                ('processed_image_path', models.CharField(blank=True, max_length=255, verbose_name='Đường dẫn Ảnh Đã Xử Lý (đã xóa)')),
+                ('archive_month', models.CharField(max_length=7, verbose_name='Tháng Lưu trữ')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Thời điểm Lưu trữ')),
+            ],
+            options={
+                'verbose_name': 'Kết quả Xử lý (Lưu trữ)',
+                'verbose_name_plural': 'Kết quả Xử lý (Lưu trữ)',
+                'db_table': 'results_archivedprocessingresult',
+                'ordering': ['-detection_timestamp'],
+                'indexes': [models.Index(fields=['archive_month', 'source_type'], name='archived_result_month_idx'), models.Index(fields=['uploaded_by_id', '-detection_timestamp'], name='archived_result_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('results', '0003_archivedprocessingresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingresult',
+            name='duplicate_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Số khung hình trùng đã gộp'),
+        ),
+        migrations.AddField(
+            model_name='processingresult',
+            name='last_duplicate_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Thời điểm khung hình trùng gần nhất'),
+        ),
+    ]
@@ -76,6 +76,16 @@ class ProcessingResult(models.Model):
         verbose_name="Danh sách Côn trùng Phát hiện (JSON)"
     )
 
+    # --- Gộp khung hình camera trùng lặp (results/dedup.py) ---
+    duplicate_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Số khung hình trùng đã gộp"
+    )
+    last_duplicate_at = models.DateTimeField(
+        null=True, blank=True,
+        verbose_name="Thời điểm khung hình trùng gần nhất"
+    )
+
     # --- Thông tin Meta ---
     received_at = models.DateTimeField(
         auto_now_add=True, # Thời điểm Server nhận được kết quả này
@@ -91,6 +101,12 @@ class ProcessingResult(models.Model):
         verbose_name = "Kết quả Xử lý"
         verbose_name_plural = "Kết quả Xử lý"
         ordering = ['-received_at', '-detection_timestamp'] # Sắp xếp kết quả mới nhất lên đầu
+        indexes = [
+            # Feed camera (source_upload IS NULL) và kết quả theo upload, mới nhất trước (DeviceFeedAPIView)
+            models.Index(fields=['source_upload', '-received_at', '-detection_timestamp'], name='result_source_received_idx'),
+            # Danh sách kết quả theo thứ tự mặc định (ordering)
+            models.Index(fields=['-received_at', '-detection_timestamp'], name='result_received_detected_idx'),
+        ]
 
     def __str__(self):
         if self.source_upload:
@@ -105,3 +121,42 @@ class ProcessingResult(models.Model):
     #         return self.detected_insects_json if isinstance(self.detected_insects_json, list) else []
     #     except:
     #         return []
+
+
+class ArchivedProcessingResult(models.Model):
+    """
+    Bản lưu trữ gọn (compact) của ProcessingResult đã quá hạn giữ trong bảng "nóng"
+    (xem results/retention.py). Không có khóa ngoại để việc xóa upload/user không
+    ảnh hưởng tới dữ liệu lưu trữ; ảnh đã xử lý chỉ còn lại đường dẫn cũ.
+    """
+    SOURCE_CAMERA = 'camera'
+    SOURCE_USER_UPLOAD = 'user_upload'
+    SOURCE_CHOICES = [
+        (SOURCE_CAMERA, 'Camera RPi'),
+        (SOURCE_USER_UPLOAD, 'Upload của người dùng'),
+    ]
+
+    original_id = models.BigIntegerField(unique=True, verbose_name="ID Kết quả Gốc")
+    source_type = models.CharField(max_length=20, choices=SOURCE_CHOICES, verbose_name="Nguồn")
+    source_upload_id = models.BigIntegerField(null=True, blank=True, verbose_name="ID Upload Gốc")
+    uploaded_by_id = models.BigIntegerField(null=True, blank=True, verbose_name="ID Người Upload")
+    detection_timestamp = models.DateTimeField(verbose_name="Thời điểm Phát hiện (từ RPi)")
+    received_at = models.DateTimeField(verbose_name="Thời điểm Server Nhận")
+    detected_insects_json = models.JSONField(verbose_name="Danh sách Côn trùng Phát hiện (JSON)")
+    processed_image_path = models.CharField(max_length=255, blank=True, verbose_name="Đường dẫn Ảnh Đã Xử Lý (đã xóa)")
+    # Khóa phân vùng theo tháng phát hiện ('YYYY-MM'), dùng để truy vấn/xuất theo từng tháng
+    archive_month = models.CharField(max_length=7, verbose_name="Tháng Lưu trữ")
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name="Thời điểm Lưu trữ")
+
+    class Meta:
+        db_table = 'results_archivedprocessingresult'
+        verbose_name = "Kết quả Xử lý (Lưu trữ)"
+        verbose_name_plural = "Kết quả Xử lý (Lưu trữ)"
+        ordering = ['-detection_timestamp']
+        indexes = [
+            models.Index(fields=['archive_month', 'source_type'], name='archived_result_month_idx'),
+            models.Index(fields=['uploaded_by_id', '-detection_timestamp'], name='archived_result_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"Kết quả lưu trữ #{self.original_id} ({self.get_source_type_display()}, {self.archive_month})"
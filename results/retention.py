@@ -0,0 +1,282 @@
+# results/retention.py
+"""
+Giữ bảng ProcessingResult và thư mục processed_results/ nhỏ gọn theo chính sách lưu trữ
+riêng cho từng nguồn (settings.RESULT_RETENTION_POLICIES):
+
+- camera:      kết quả từ camera RPi (source_upload IS NULL)
+- user_upload: kết quả của ảnh do người dùng upload
+
+Mỗi chính sách có:
+- IMAGE_DAYS:   ảnh đã xử lý cũ hơn N ngày bị xóa khỏi storage (kết quả vẫn giữ, processed_image = '').
+- ARCHIVE_DAYS: kết quả cũ hơn N ngày được chuyển khỏi bảng "nóng" (ảnh cũng bị xóa).
+- ARCHIVE_TO:   'table' (bảng ArchivedProcessingResult) hoặc 'ndjson' (file
+                <RESULT_ARCHIVE_DIR>/<nguồn>/<YYYY>/<YYYY-MM>.ndjson.gz, phân vùng theo tháng phát hiện).
+Giá trị 0 ngày = không bao giờ.
+
+Tuổi của kết quả tính theo received_at (giờ server, dùng được index result_source_received_idx).
+Mọi thao tác chạy theo lô (RESULT_RETENTION_BATCH_SIZE), nghỉ RESULT_RETENTION_BATCH_PAUSE_SECONDS
+giữa các lô để không chiếm hết I/O của DB/storage. Các bảng tổng hợp (rollup theo ngày/loài,
+UserSummary) được giữ nguyên khi lưu trữ: signal xóa của app stats bỏ qua khi
+`retention_in_progress()` là True, và lệnh rebuild của stats đọc cả bảng lưu trữ.
+"""
+import gzip
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedProcessingResult, ProcessingResult
+
+logger = logging.getLogger(__name__)
+
+SOURCE_CAMERA = ArchivedProcessingResult.SOURCE_CAMERA
+SOURCE_USER_UPLOAD = ArchivedProcessingResult.SOURCE_USER_UPLOAD
+SOURCE_TYPES = (SOURCE_CAMERA, SOURCE_USER_UPLOAD)
+
+ARCHIVE_TABLE = 'table'
+ARCHIVE_NDJSON = 'ndjson'
+ARCHIVE_TARGETS = (ARCHIVE_TABLE, ARCHIVE_NDJSON)
+
+_retention_running = ContextVar('results_retention_running', default=False)
+
+
+def retention_in_progress():
+    """True khi đang xóa kết quả để lưu trữ (các bảng tổng hợp không được trừ đi)."""
+    return _retention_running.get()
+
+
+@contextmanager
+def _archiving():
+    token = _retention_running.set(True)
+    try:
+        yield
+    finally:
+        _retention_running.reset(token)
+
+
+class RetentionPolicy:
+    """Chính sách lưu trữ của một nguồn kết quả."""
+
+    def __init__(self, source_type, image_days=0, archive_days=0, archive_to=ARCHIVE_TABLE):
+        if source_type not in SOURCE_TYPES:
+            raise ImproperlyConfigured(f"Nguồn kết quả không hợp lệ: {source_type!r}")
+        if archive_to not in ARCHIVE_TARGETS:
+            raise ImproperlyConfigured(f"ARCHIVE_TO của '{source_type}' phải là một trong {ARCHIVE_TARGETS}")
+        self.source_type = source_type
+        self.image_days = max(int(image_days or 0), 0)
+        self.archive_days = max(int(archive_days or 0), 0)
+        self.archive_to = archive_to
+
+    def __repr__(self):
+        return (
+            f"RetentionPolicy({self.source_type!r}, image_days={self.image_days}, "
+            f"archive_days={self.archive_days}, archive_to={self.archive_to!r})"
+        )
+
+    def queryset(self):
+        return ProcessingResult.objects.filter(source_upload__isnull=self.source_type == SOURCE_CAMERA)
+
+    def image_cutoff(self, now):
+        return now - timedelta(days=self.image_days) if self.image_days else None
+
+    def archive_cutoff(self, now):
+        return now - timedelta(days=self.archive_days) if self.archive_days else None
+
+
+def get_policies():
+    """Đọc settings.RESULT_RETENTION_POLICIES -> {nguồn: RetentionPolicy}."""
+    configured = getattr(settings, 'RESULT_RETENTION_POLICIES', {})
+    policies = {}
+    for source_type in SOURCE_TYPES:
+        config = configured.get(source_type, {})
+        policies[source_type] = RetentionPolicy(
+            source_type,
+            image_days=config.get('IMAGE_DAYS', 0),
+            archive_days=config.get('ARCHIVE_DAYS', 0),
+            archive_to=config.get('ARCHIVE_TO', ARCHIVE_TABLE),
+        )
+    return policies
+
+
+def archive_record(result, source_type):
+    """Dữ liệu lưu trữ gọn của một kết quả (dùng chung cho bảng lưu trữ và file NDJSON)."""
+    upload = result.source_upload
+    detected_at = result.detection_timestamp
+    if timezone.is_aware(detected_at):
+        detected_at = timezone.localtime(detected_at)
+    return {
+        'original_id': result.pk,
+        'source_type': source_type,
+        'source_upload_id': result.source_upload_id,
+        'uploaded_by_id': upload.uploaded_by_id if upload is not None else None,
+        'detection_timestamp': result.detection_timestamp,
+        'received_at': result.received_at,
+        'detected_insects_json': result.detected_insects_json,
+        'processed_image_path': result.processed_image.name or '',
+        'archive_month': detected_at.strftime('%Y-%m'),
+    }
+
+
+def ndjson_archive_path(source_type, archive_month, archive_dir=None):
+    archive_dir = archive_dir or settings.RESULT_ARCHIVE_DIR
+    return os.path.join(archive_dir, source_type, archive_month[:4], f'{archive_month}.ndjson.gz')
+
+
+def write_ndjson_archive(records, archive_dir=None):
+    """
+    Ghi thêm (append) các bản ghi vào file .ndjson.gz theo nguồn/tháng. Mỗi lần ghi là một
+    gzip member mới, gzip.open() đọc nối tiếp được. Trả về danh sách file đã ghi.
+    """
+    by_file = {}
+    for record in records:
+        path = ndjson_archive_path(record['source_type'], record['archive_month'], archive_dir)
+        by_file.setdefault(path, []).append(record)
+    for path, file_records in by_file.items():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, 'at', encoding='utf-8') as archive_file:
+            for record in file_records:
+                archive_file.write(json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False))
+                archive_file.write('\n')
+    return list(by_file)
+
+
+def read_ndjson_archive(path):
+    """Đọc lại một file lưu trữ NDJSON.gz (generator các dict)."""
+    with gzip.open(path, 'rt', encoding='utf-8') as archive_file:
+        for line in archive_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _delete_files(storage, names):
+    deleted = 0
+    for name in names:
+        try:
+            storage.delete(name)
+            deleted += 1
+        except OSError as e:
+            logger.warning("Retention: không xóa được ảnh %s: %s", name, e)
+    return deleted
+
+
+class RetentionRunner:
+    """
+    Chạy các chính sách lưu trữ. Mỗi nguồn: (1) xóa ảnh quá hạn, (2) chuyển kết quả quá hạn
+    sang kho lưu trữ. Trả về {nguồn: {'images_deleted', 'archived', 'batches'}}
+    (dry_run: số kết quả sẽ bị xử lý, không thay đổi gì).
+    """
+
+    def __init__(self, policies=None, batch_size=None, pause_seconds=None, max_batches=None,
+                 dry_run=False, now=None, archive_dir=None, log=None, sleep=time.sleep):
+        self.policies = policies if policies is not None else get_policies()
+        self.batch_size = batch_size or getattr(settings, 'RESULT_RETENTION_BATCH_SIZE', 500)
+        self.pause_seconds = pause_seconds if pause_seconds is not None else getattr(settings, 'RESULT_RETENTION_BATCH_PAUSE_SECONDS', 0.5)
+        self.max_batches = max_batches if max_batches is not None else getattr(settings, 'RESULT_RETENTION_MAX_BATCHES', 0)
+        self.dry_run = dry_run
+        self.now = now or timezone.now()
+        self.archive_dir = archive_dir
+        self.log = log or (lambda message: None)
+        self.sleep = sleep
+        self.storage = ProcessingResult._meta.get_field('processed_image').storage
+        self._batches_run = 0
+
+    # --- Giới hạn tốc độ ---
+    def _next_batch_allowed(self):
+        if self.max_batches and self._batches_run >= self.max_batches:
+            return False
+        if self._batches_run and self.pause_seconds:
+            self.sleep(self.pause_seconds)
+        self._batches_run += 1
+        return True
+
+    def run(self):
+        report = {}
+        for source_type, policy in self.policies.items():
+            report[source_type] = stats = {'images_deleted': 0, 'archived': 0, 'batches': 0}
+            started_batches = self._batches_run
+            if self.dry_run:
+                stats['images_deleted'] = self._expired_images(policy).count()
+                stats['archived'] = self._expired_results(policy).count()
+            else:
+                stats['images_deleted'] = self.delete_expired_images(policy)
+                stats['archived'] = self.archive_expired_results(policy)
+            stats['batches'] = self._batches_run - started_batches
+            self.log(f"{source_type}: {stats}")
+        return report
+
+    # --- Xóa ảnh quá hạn ---
+    def _expired_images(self, policy):
+        cutoff = policy.image_cutoff(self.now)
+        if cutoff is None:
+            return ProcessingResult.objects.none()
+        return policy.queryset().filter(received_at__lt=cutoff).exclude(processed_image='')
+
+    def delete_expired_images(self, policy):
+        queryset = self._expired_images(policy)
+        deleted = 0
+        last_pk = 0
+        while True:
+            rows = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'processed_image')[:self.batch_size])
+            if not rows or not self._next_batch_allowed():
+                break
+            last_pk = rows[-1][0]
+            ids = [pk for pk, _ in rows]
+            names = [name for _, name in rows if name]
+            with transaction.atomic():
+                ProcessingResult.objects.filter(pk__in=ids).update(processed_image='')
+                # Chỉ xóa file khi DB đã commit (rollback thì ảnh vẫn còn nguyên)
+                transaction.on_commit(lambda names=names: _delete_files(self.storage, names))
+            deleted += len(ids)
+        return deleted
+
+    # --- Chuyển kết quả quá hạn sang kho lưu trữ ---
+    def _expired_results(self, policy):
+        cutoff = policy.archive_cutoff(self.now)
+        if cutoff is None:
+            return ProcessingResult.objects.none()
+        return policy.queryset().filter(received_at__lt=cutoff)
+
+    def archive_expired_results(self, policy):
+        queryset = self._expired_results(policy)
+        archived = 0
+        while True:
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:self.batch_size])
+            if not ids or not self._next_batch_allowed():
+                break
+            archived += self._archive_batch(policy, ids)
+        return archived
+
+    def _archive_batch(self, policy, ids):
+        with transaction.atomic():
+            results = list(
+                ProcessingResult.objects.filter(pk__in=ids)
+                .select_related('source_upload')
+                .only(
+                    'pk', 'source_upload_id', 'source_upload__uploaded_by_id', 'processed_image',
+                    'detection_timestamp', 'received_at', 'detected_insects_json',
+                )
+            )
+            records = [archive_record(result, policy.source_type) for result in results]
+            if policy.archive_to == ARCHIVE_TABLE:
+                ArchivedProcessingResult.objects.bulk_create(
+                    [ArchivedProcessingResult(**record) for record in records],
+                    ignore_conflicts=True,
+                )
+            else:
+                # Ghi file trước khi xóa: nếu xóa lỗi, lần chạy sau có thể ghi trùng (lọc theo original_id khi đọc lại)
+                write_ndjson_archive(records, self.archive_dir)
+            with _archiving():
+                ProcessingResult.objects.filter(pk__in=ids).delete()
+            names = [record['processed_image_path'] for record in records if record['processed_image_path']]
+            transaction.on_commit(lambda: _delete_files(self.storage, names))
+        logger.info("Retention: đã lưu trữ %d kết quả %s (%s)", len(records), policy.source_type, policy.archive_to)
+        return len(records)
@@ -2,6 +2,8 @@
 from rest_framework import serializers
 from .models import ProcessingResult, UserUpload # Import cả UserUpload để kiểm tra ID
 from uploads.serializers import UserUploadSerializer # Để hiển thị thông tin upload gốc
+from insect_library.cache import get_reference_summaries # Thông tin tham khảo côn trùng (cache trong process)
+from stats.rollups import insect_counts
 
 # Serializer để validate input từ RPi khi gửi kết quả
 class RPiResultInputSerializer(serializers.Serializer):
@@ -10,6 +12,8 @@ class RPiResultInputSerializer(serializers.Serializer):
     # insects là một list các dictionary, JSONField xử lý tốt việc này
     insects = serializers.JSONField(required=True)
     source_upload_id = serializers.IntegerField(required=False, allow_null=True) # Cho phép null hoặc không có
+    # ID thiết bị camera (dùng để gộp khung hình trùng lặp theo từng thiết bị)
+    device_id = serializers.CharField(required=False, allow_blank=True, max_length=100)
 
     def validate_source_upload_id(self, value):
         """Kiểm tra xem UserUpload ID có tồn tại không nếu được cung cấp."""
@@ -23,6 +27,11 @@ class RPiResultInputSerializer(serializers.Serializer):
 
 # Serializer để hiển thị kết quả xử lý đã lưu
 class ProcessingResultOutputSerializer(serializers.ModelSerializer):
+    """
+    Context `enrich_insects=True` (view: ?enrich=insects) thêm trường `insect_references`:
+    {tên côn trùng phát hiện được: {id, scientific_name, treatment_summary} hoặc null nếu không có trong thư viện}.
+    Bảng tra tên -> thông tin được lấy một lần cho cả response (từ cache thư viện), không query thêm theo từng dòng.
+    """
     # Hiển thị thông tin chi tiết của upload gốc nếu có
     source_upload_details = UserUploadSerializer(source='source_upload', read_only=True)
     # Có thể thêm SerializerMethodField để xử lý URL ảnh nếu cần
@@ -39,9 +48,21 @@ class ProcessingResultOutputSerializer(serializers.ModelSerializer):
             'detection_timestamp',
             'detected_insects_json',
             'received_at',
+            'duplicate_count', # Số khung hình camera trùng lặp đã được gộp vào kết quả này
+            'last_duplicate_at',
         ]
         read_only_fields = fields # Thường thì API kết quả chỉ để đọc
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self.context.get('enrich_insects'):
+            references = self.context.get('insect_references')
+            if references is None:
+                # Context được dùng chung cho mọi dòng của response (many=True)
+                references = self.context['insect_references'] = get_reference_summaries()
+            data['insect_references'] = {name: references.get(name) for name in insect_counts(instance.detected_insects_json)}
+        return data
+
     # def get_processed_image_url(self, obj):
     #     request = self.context.get('request')
     #     if obj.processed_image and request:
@@ -1,14 +1,39 @@
 # results/tests.py
 import base64
-from django.test import TestCase, RequestFactory
-from django.utils.timezone import now, make_aware
+import io
+import os
+import shutil
+import tempfile
+from unittest import skipUnless
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, RequestFactory, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APITestCase
+from django.utils.timezone import localtime, now, make_aware
 from django.core.files.uploadedfile import SimpleUploadedFile
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from io import StringIO
+from types import SimpleNamespace
+from django.conf import settings
+from django.core.cache import cache
 
 # Import models và serializers cần test
-from .models import ProcessingResult, UserUpload # Cần UserUpload để test liên kết
+from .models import ArchivedProcessingResult, ProcessingResult, UserUpload # Cần UserUpload để test liên kết
+from .retention import (
+    ARCHIVE_NDJSON, SOURCE_CAMERA, SOURCE_USER_UPLOAD, RetentionPolicy, RetentionRunner,
+    ndjson_archive_path, read_ndjson_archive,
+)
 from .serializers import RPiResultInputSerializer, ProcessingResultOutputSerializer
+from .filters import DeviceFeedFilter, ProcessingResultFilter, day_range
+from .views import DeviceFeedAPIView
+from .dedup import FrameDedupBuffer, camera_frames, detection_signature, hamming_distance, perceptual_hash
 from accounts.models import CustomUser # Cần CustomUser để tạo UserUpload
+from stats.models import DailyInsectRollup, UserSummary
+from insect_library.cache import library_cache
+from insect_library.models import InsectReference
+from main_config.db.routers import ReadReplicaRouter, ReplicaRoutingMiddleware, is_pinned_to_primary, route_reads_to_replica
 
 # Import thư viện hash
 from argon2 import PasswordHasher
@@ -202,7 +227,8 @@ class ProcessingResultOutputSerializerTest(TestCase):
         serializer = ProcessingResultOutputSerializer(instance=self.result_linked, context={'request': self.request})
         data = serializer.data
         expected_keys = {'id', 'source_upload', 'source_upload_details', 'processed_image',
-                         'detection_timestamp', 'detected_insects_json', 'received_at'}
+                         'detection_timestamp', 'detected_insects_json', 'received_at',
+                         'duplicate_count', 'last_duplicate_at'}
         self.assertEqual(set(data.keys()), expected_keys)
         self.assertEqual(data['source_upload'], self.upload.id)
         self.assertIsNotNone(data['source_upload_details'])
@@ -218,4 +244,435 @@ class ProcessingResultOutputSerializerTest(TestCase):
         self.assertIsNone(data['source_upload'])
         self.assertIsNone(data['source_upload_details']) # Vì source_upload là None
         self.assertTrue(data['processed_image'].endswith('.png'))
-        self.assertEqual(data['detected_insects_json'], [{'name': 'CameraOutput'}])
\ No newline at end of file
+        self.assertEqual(data['detected_insects_json'], [{'name': 'CameraOutput'}])
+
+# --- Test kế hoạch truy vấn (EXPLAIN) dùng đúng index ---
+@skipUnless(connection.vendor in ('sqlite', 'mysql'), "Chỉ kiểm tra trên SQLite và MySQL")
+class QueryPlanIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(email='plan@example.com', password_hash=ph.hash('planpass'))
+        other = CustomUser.objects.create(email='plan_other@example.com', password_hash=ph.hash('planpass'))
+        statuses = [UserUpload.STATUS_COMPLETED] * 8 + [UserUpload.STATUS_PENDING, UserUpload.STATUS_FAILED]
+        uploads = UserUpload.objects.bulk_create([
+            UserUpload(uploaded_by=cls.user if i % 4 == 0 else other, file=f'user_uploads/plan_{i}.jpg', status=statuses[i % len(statuses)])
+            for i in range(100)
+        ])
+        # Phần lớn kết quả đến từ camera (source_upload NULL), giống dữ liệu thật
+        ProcessingResult.objects.bulk_create([
+            ProcessingResult(
+                source_upload=uploads[i // 10] if i % 10 == 0 else None,
+                processed_image=f'processed_results/plan_{i}.jpg',
+                detection_timestamp=make_aware(datetime(2025, 5, 1 + i % 28, i % 24, 0, 0)),
+                detected_insects_json=[],
+            )
+            for i in range(300)
+        ])
+        # Planner chọn index dựa trên thống kê của bảng (production cũng cần ANALYZE định kỳ)
+        tables = [UserUpload._meta.db_table, ProcessingResult._meta.db_table]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute(f"ANALYZE TABLE {', '.join(tables)}")
+            else:
+                cursor.execute("ANALYZE")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f"Không dùng index {index_name}:\n{plan}")
+
+    def _detection_timestamp_index(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, ProcessingResult._meta.db_table)
+        return next(
+            name for name, info in constraints.items()
+            if info['index'] and info['columns'] == ['detection_timestamp']
+        )
+
+    def test_user_uploads_by_time(self):
+        self.assertUsesIndex(UserUpload.objects.filter(uploaded_by=self.user).order_by('-upload_time'), 'upload_user_time_idx')
+
+    def test_upload_queue_by_status(self):
+        """Truy vấn vị trí trong hàng đợi của notifications/progress.py (status IN (...) AND id < ?)."""
+        queued = UserUpload.objects.filter(status__in=[UserUpload.STATUS_PENDING, UserUpload.STATUS_ASSIGNED])
+        self.assertUsesIndex(queued.filter(pk__lt=50).order_by().values('pk'), 'upload_status_id_idx') # Như .count()
+
+    def test_device_feed(self):
+        self.assertUsesIndex(DeviceFeedAPIView.queryset.all(), 'result_source_received_idx')
+
+    def test_detection_date_filters_are_sargable(self):
+        """Lọc theo ngày (filter của API và FrequencyStatsView) dùng index của detection_timestamp."""
+        index_name = self._detection_timestamp_index()
+        queryset = ProcessingResult.objects.order_by()
+        filtered = ProcessingResultFilter({'start_date': '2025-05-01', 'end_date': '2025-05-02'}, queryset=queryset).qs
+        self.assertUsesIndex(filtered, index_name)
+        device_feed = DeviceFeedFilter({'detection_timestamp__date__gte': '2025-05-01'}, queryset=queryset).qs
+        self.assertUsesIndex(device_feed, index_name)
+        range_start, range_end = day_range(date(2025, 5, 1), date(2025, 5, 2))
+        self.assertUsesIndex(queryset.filter(detection_timestamp__gte=range_start, detection_timestamp__lt=range_end), index_name)
+
+    def test_date_filters_keep_day_boundaries(self):
+        """Khoảng timestamp cho kết quả giống lookup __date cũ (tính cả ngày cuối)."""
+        filtered = ProcessingResultFilter({'start_date': '2025-05-02', 'end_date': '2025-05-03'}, queryset=ProcessingResult.objects.all()).qs
+        legacy = ProcessingResult.objects.filter(detection_timestamp__date__gte=date(2025, 5, 2), detection_timestamp__date__lte=date(2025, 5, 3))
+        self.assertEqual(set(filtered.values_list('pk', flat=True)), set(legacy.values_list('pk', flat=True)))
+        self.assertEqual(filtered.count(), 22) # 300 kết quả rải đều trên 28 ngày, 11 kết quả mỗi ngày này
+
+
+# --- Test chính sách lưu trữ (results/retention.py) ---
+class ResultRetentionTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.archive_dir, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, RESULT_ARCHIVE_DIR=self.archive_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.now = now()
+        self.user = CustomUser.objects.create(email='retention@example.com', password_hash=ph.hash('retpass'))
+        self.old_camera = self._create_result(days_old=200, insects=[{'name': 'muoi_vang'}])
+        self.aging_camera = self._create_result(days_old=60, insects=[{'name': 'muoi_vang'}])
+        self.new_camera = self._create_result(days_old=1, insects=[{'name': 'muoi_vang'}])
+        upload = UserUpload.objects.create(uploaded_by=self.user, file='user_uploads/retention.jpg', status=UserUpload.STATUS_COMPLETED)
+        self.old_upload_result = self._create_result(days_old=200, insects=[{'name': 'ray_nau'}], source_upload=upload)
+
+    def _create_result(self, days_old, insects, source_upload=None):
+        result = ProcessingResult.objects.create(
+            source_upload=source_upload,
+            processed_image=SimpleUploadedFile('p.jpg', b'processed', 'image/jpeg'),
+            detection_timestamp=self.now - timedelta(days=days_old),
+            detected_insects_json=insects,
+        )
+        ProcessingResult.objects.filter(pk=result.pk).update(received_at=self.now - timedelta(days=days_old))
+        return result
+
+    def _image_exists(self, result):
+        return os.path.exists(os.path.join(self.media_root, result.processed_image.name))
+
+    def _run(self, policies, **kwargs):
+        runner = RetentionRunner(policies=policies, pause_seconds=0, now=self.now, archive_dir=self.archive_dir, **kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            return runner.run()
+
+    def test_archive_to_table_keeps_aggregates(self):
+        rollups_before = list(DailyInsectRollup.objects.order_by('date', 'insect_name').values_list('date', 'insect_name', 'detections'))
+        summary_before = UserSummary.objects.get(pk=self.user.pk).total_results
+
+        report = self._run({SOURCE_CAMERA: RetentionPolicy(SOURCE_CAMERA, image_days=30, archive_days=180)})
+
+        self.assertEqual(report[SOURCE_CAMERA]['archived'], 1)
+        self.assertEqual(report[SOURCE_CAMERA]['images_deleted'], 2) # Ảnh 200 ngày và 60 ngày tuổi
+        self.assertFalse(ProcessingResult.objects.filter(pk=self.old_camera.pk).exists())
+        archived = ArchivedProcessingResult.objects.get(original_id=self.old_camera.pk)
+        self.assertEqual(archived.source_type, SOURCE_CAMERA)
+        self.assertEqual(archived.detected_insects_json, [{'name': 'muoi_vang'}])
+        self.assertFalse(self._image_exists(self.old_camera))
+        # Kết quả 60 ngày tuổi vẫn ở bảng chính nhưng đã mất ảnh
+        self.aging_camera.refresh_from_db()
+        self.assertEqual(self.aging_camera.processed_image.name, '')
+        self.assertTrue(self._image_exists(self.new_camera))
+        # Kết quả từ upload không thuộc chính sách được chạy
+        self.assertTrue(ProcessingResult.objects.filter(pk=self.old_upload_result.pk).exists())
+        # Rollup và summary giữ nguyên
+        rollups_after = list(DailyInsectRollup.objects.order_by('date', 'insect_name').values_list('date', 'insect_name', 'detections'))
+        self.assertEqual(rollups_before, rollups_after)
+        self.assertEqual(UserSummary.objects.get(pk=self.user.pk).total_results, summary_before)
+
+    def test_archive_to_ndjson(self):
+        self._run({SOURCE_USER_UPLOAD: RetentionPolicy(SOURCE_USER_UPLOAD, archive_days=90, archive_to=ARCHIVE_NDJSON)})
+
+        self.assertFalse(ProcessingResult.objects.filter(pk=self.old_upload_result.pk).exists())
+        self.assertFalse(ArchivedProcessingResult.objects.exists())
+        archive_month = localtime(self.old_upload_result.detection_timestamp).strftime('%Y-%m')
+        records = list(read_ndjson_archive(ndjson_archive_path(SOURCE_USER_UPLOAD, archive_month, self.archive_dir)))
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['original_id'], self.old_upload_result.pk)
+        self.assertEqual(records[0]['uploaded_by_id'], self.user.pk)
+        self.assertEqual(records[0]['detected_insects_json'], [{'name': 'ray_nau'}])
+
+    def test_batches_are_limited(self):
+        for _ in range(3):
+            self._create_result(days_old=300, insects=[])
+        policies = {SOURCE_CAMERA: RetentionPolicy(SOURCE_CAMERA, archive_days=180)}
+        report = self._run(policies, batch_size=2, max_batches=1)
+        self.assertEqual(report[SOURCE_CAMERA], {'images_deleted': 0, 'archived': 2, 'batches': 1})
+        report = self._run(policies, batch_size=2)
+        self.assertEqual(report[SOURCE_CAMERA]['archived'], 2)
+        self.assertEqual(ArchivedProcessingResult.objects.count(), 4)
+
+    def test_rebuild_includes_archived_results(self):
+        self._run({SOURCE_USER_UPLOAD: RetentionPolicy(SOURCE_USER_UPLOAD, archive_days=90)})
+        call_command('rebuild_stats_rollups', stdout=StringIO())
+        call_command('rebuild_user_summaries', stdout=StringIO())
+        self.assertTrue(DailyInsectRollup.objects.filter(insect_name='ray_nau').exists())
+        summary = UserSummary.objects.get(pk=self.user.pk)
+        self.assertEqual(summary.total_results, 1)
+        self.assertEqual(summary.species_counts, {'ray_nau': 1})
+
+    def test_dry_run_changes_nothing(self):
+        out = StringIO()
+        with override_settings(RESULT_RETENTION_POLICIES={'camera': {'IMAGE_DAYS': 30, 'ARCHIVE_DAYS': 180}}):
+            call_command('apply_result_retention', '--dry-run', '--source', SOURCE_CAMERA, stdout=out)
+        self.assertIn('2 ảnh, 1 kết quả', out.getvalue())
+        self.assertEqual(ProcessingResult.objects.count(), 4)
+        self.assertTrue(self._image_exists(self.old_camera))
+
+
+# --- Test gộp khung hình camera trùng lặp (results/dedup.py) ---
+def make_frame_jpeg(shift=0, noise=0, size=(160, 120)):
+    """Ảnh JPEG gradient (shift: dịch vân sáng, noise: làm nhiễu vài điểm ảnh)."""
+    image = Image.new('L', size)
+    width, height = size
+    image.putdata([((x + shift) * 255 // width + (y * 97 % 13)) % 256 for y in range(height) for x in range(width)])
+    for index in range(noise):
+        image.putpixel((index * 7 % width, index * 13 % height), 255)
+    buffer = io.BytesIO()
+    image.convert('RGB').save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+class PerceptualHashTest(SimpleTestCase):
+
+    def test_near_duplicate_frames_have_close_hashes(self):
+        base = perceptual_hash(make_frame_jpeg())
+        self.assertLessEqual(hamming_distance(base, perceptual_hash(make_frame_jpeg(noise=20))), 6)
+        self.assertGreater(hamming_distance(base, perceptual_hash(make_frame_jpeg(shift=80))), 6)
+
+    def test_invalid_image_returns_none(self):
+        self.assertIsNone(perceptual_hash(b'not an image'))
+
+    def test_detection_signature_ignores_order_and_confidence(self):
+        first = detection_signature([{'name': 'a', 'confidence': 0.9}, {'name': 'b', 'confidence': 0.5}])
+        second = detection_signature('[{"name": "b", "confidence": 0.7}, {"name": "a"}]')
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, detection_signature([{'name': 'a'}, {'name': 'a'}, {'name': 'b'}]))
+
+    def test_buffer_window_and_lru(self):
+        buffer = FrameDedupBuffer(frames_per_device=2, max_devices=1, max_distance=2, window_seconds=60)
+        start = make_aware(datetime(2025, 5, 1, 10, 0, 0))
+        buffer.remember('cam-1', 0b1010, (('a', 1),), 1, start)
+        self.assertEqual(buffer.find_duplicate('cam-1', 0b1011, (('a', 1),), start + timedelta(seconds=30)), 1)
+        self.assertIsNone(buffer.find_duplicate('cam-1', 0b1011, (('b', 1),), start)) # Khác côn trùng
+        self.assertIsNone(buffer.find_duplicate('cam-1', 0b1011, (('a', 1),), start + timedelta(seconds=90))) # Quá cửa sổ
+        self.assertIsNone(buffer.find_duplicate('cam-2', 0b1010, (('a', 1),), start)) # Thiết bị khác
+        buffer.remember('cam-2', 0b1010, (('a', 1),), 2, start)
+        self.assertEqual(len(buffer), 1)
+        self.assertIsNone(buffer.find_duplicate('cam-1', 0b1010, (('a', 1),), start)) # cam-1 đã bị loại (LRU)
+
+
+class CameraFrameDedupAPITest(APITestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, CAMERA_DEDUP_ENABLED=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        camera_frames.clear()
+        self.addCleanup(camera_frames.clear)
+        self.url = reverse('save-processing-result')
+
+    def _post(self, image_bytes, insects, timestamp='2025-05-01T10:00:00Z', device_id='trap-1', **extra):
+        return self.client.post(self.url, {
+            'image_base64': 'data:image/jpeg;base64,' + base64.b64encode(image_bytes).decode('ascii'),
+            'timestamp': timestamp,
+            'insects': insects,
+            'device_id': device_id,
+            **extra,
+        }, format='json')
+
+    def test_duplicate_frames_are_collapsed(self):
+        insects = [{'name': 'muoi_vang', 'confidence': 0.9}]
+        first = self._post(make_frame_jpeg(), insects)
+        self.assertEqual(first.status_code, 201)
+        second = self._post(make_frame_jpeg(noise=20), [{'name': 'muoi_vang', 'confidence': 0.8}], timestamp='2025-05-01T10:01:00Z')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(second.data['duplicate_count'], 1)
+        self.assertEqual(ProcessingResult.objects.count(), 1)
+        self.assertEqual(DailyInsectRollup.objects.get(insect_name='muoi_vang').results, 1) # Không làm nhiễu thống kê
+
+    def test_distinct_frames_are_stored(self):
+        insects = [{'name': 'muoi_vang'}]
+        self.assertEqual(self._post(make_frame_jpeg(), insects).status_code, 201)
+        self.assertEqual(self._post(make_frame_jpeg(), [{'name': 'ray_nau'}]).status_code, 201) # Khác côn trùng
+        self.assertEqual(self._post(make_frame_jpeg(shift=80), insects).status_code, 201) # Khác ảnh
+        self.assertEqual(self._post(make_frame_jpeg(), insects, device_id='trap-2').status_code, 201) # Khác thiết bị
+        self.assertEqual(self._post(make_frame_jpeg(), insects, timestamp='2025-05-01T11:00:00Z').status_code, 201) # Quá cửa sổ
+        self.assertEqual(ProcessingResult.objects.count(), 5)
+
+    def test_deleted_result_is_not_reused(self):
+        insects = [{'name': 'muoi_vang'}]
+        first = self._post(make_frame_jpeg(), insects)
+        ProcessingResult.objects.filter(pk=first.data['id']).delete()
+        again = self._post(make_frame_jpeg(), insects)
+        self.assertEqual(again.status_code, 201)
+        self.assertNotEqual(again.data['id'], first.data['id'])
+
+
+@override_settings(INSECT_LIBRARY_CACHE_ENABLED=True, INSECT_LIBRARY_CACHE_CHECK_SECONDS=60)
+class ResultInsectEnrichmentTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create(email='enrich_admin@example.com', password_hash=ph.hash('enrichpass'), user_type='ADMIN', is_active=True)
+        cls.muoi_vang = InsectReference.objects.create(
+            name='muoi_vang', scientific_name='Aedes flavus',
+            treatment='Phát quang bụi rậm, loại bỏ nước đọng quanh nhà. ' * 10,
+        )
+        InsectReference.objects.create(name='ray_nau', scientific_name='Nilaparvata lugens', treatment='Bẫy đèn')
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        library_cache.invalidate()
+        response = self.client.post(reverse('accounts:user_login'), {'email': 'enrich_admin@example.com', 'password': 'enrichpass'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.url = reverse('get-device-feed')
+
+    def _create_results(self, count):
+        for index in range(count):
+            ProcessingResult.objects.create(
+                processed_image=SimpleUploadedFile(f'enrich_{index}.jpg', b'jpg', 'image/jpeg'),
+                detection_timestamp=make_aware(datetime(2025, 5, 7, 8, index)),
+                detected_insects_json=[{'name': 'muoi_vang'}, {'name': 'ray_nau'}, {'name': 'chua_co'}],
+            )
+
+    def test_enriched_results(self):
+        """?enrich=insects gắn thông tin tham khảo cho từng côn trùng phát hiện được."""
+        self._create_results(1)
+        plain = self.client.get(self.url).data[0]
+        self.assertNotIn('insect_references', plain)
+        references = self.client.get(self.url, {'enrich': 'insects'}).data[0]['insect_references']
+        self.assertEqual(set(references), {'muoi_vang', 'ray_nau', 'chua_co'})
+        self.assertIsNone(references['chua_co'])
+        self.assertEqual(references['ray_nau']['scientific_name'], 'Nilaparvata lugens')
+        summary = references['muoi_vang']['treatment_summary']
+        self.assertLessEqual(len(summary), 161)
+        self.assertTrue(summary.endswith('…'))
+
+    def test_no_extra_queries_per_row(self):
+        """Số query không tăng theo số dòng (bảng tra dùng chung cho cả response, lấy từ cache)."""
+        self._create_results(1)
+        self.client.get(self.url, {'enrich': 'insects'}) # Nạp cache thư viện
+        with self.assertNumQueries(2) as one_row: # Xác thực user + danh sách kết quả
+            self.client.get(self.url, {'enrich': 'insects'})
+        self._create_results(5)
+        with self.assertNumQueries(len(one_row.captured_queries)):
+            response = self.client.get(self.url, {'enrich': 'insects'})
+        self.assertEqual(len(response.data), 6)
+
+
+@override_settings(DB_READ_REPLICAS=['replica1', 'replica2'], DB_REPLICA_STICKY_SECONDS=60)
+class ReadReplicaRouterTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.router = ReadReplicaRouter()
+        self.factory = RequestFactory()
+
+    def _run_request(self, view, user_id=None):
+        request = self.factory.get('/')
+        request.user = SimpleNamespace(id=user_id)
+        return ReplicaRoutingMiddleware(view)(request)
+
+    def test_reads_outside_request_use_primary(self):
+        """Ngoài request (consumer, job nền) không chuyển sang replica."""
+        self.assertIsNone(route_reads_to_replica())
+        self.assertIsNone(self.router.db_for_read(ProcessingResult))
+        self.assertEqual(self.router.db_for_write(ProcessingResult), 'default')
+
+    def test_request_reads_one_replica_until_write(self):
+        """Một request đọc từ đúng một replica; sau khi ghi thì đọc từ primary."""
+        def view(request):
+            self.assertIsNone(self.router.db_for_read(ProcessingResult)) # Chưa bật replica
+            alias = route_reads_to_replica()
+            self.assertIn(alias, settings.DB_READ_REPLICAS)
+            self.assertEqual({self.router.db_for_read(ProcessingResult) for _ in range(10)}, {alias})
+            self.assertEqual(self.router.db_for_write(ProcessingResult), 'default')
+            self.assertIsNone(self.router.db_for_read(ProcessingResult))
+            return 'ok'
+        self.assertEqual(self._run_request(view), 'ok')
+        self.assertIsNone(self.router.db_for_read(ProcessingResult))
+
+    def test_user_write_pins_to_primary(self):
+        """User vừa ghi đọc từ primary trong DB_REPLICA_STICKY_SECONDS; user khác vẫn đọc replica."""
+        self._run_request(lambda request: self.router.db_for_write(ProcessingResult), user_id=7)
+        self.assertTrue(is_pinned_to_primary(7))
+        self.assertIsNone(self._run_request(lambda request: route_reads_to_replica(7), user_id=7))
+        self.assertIsNotNone(self._run_request(lambda request: route_reads_to_replica(8), user_id=8))
+        self.assertFalse(is_pinned_to_primary(8)) # Chỉ đọc: không ghim
+
+    @override_settings(DB_READ_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        """Không cấu hình replica: mọi truy vấn dùng primary, không ghim user."""
+        self.assertIsNone(self._run_request(lambda request: route_reads_to_replica(7), user_id=7))
+        self._run_request(lambda request: self.router.db_for_write(ProcessingResult), user_id=7)
+        self.assertFalse(is_pinned_to_primary(7))
+
+
+# Chỉ chạy với main_config.settings_replicas (replica 'replica1' là DB độc lập)
+REPLICA_TESTS_ENABLED = 'replica1' in settings.DATABASES and 'replica1' in settings.DB_READ_REPLICAS
+
+
+@skipUnless(REPLICA_TESTS_ENABLED, "Cần hai DB độc lập: --settings=main_config.settings_replicas")
+class ReadReplicaRoutingTest(APITestCase):
+    """Primary và replica là hai DB riêng: dữ liệu trả về cho biết view đã đọc từ DB nào."""
+    databases = {'default', 'replica1'} if REPLICA_TESTS_ENABLED else {'default'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create(email='replica_admin@example.com', password_hash=ph.hash('replicapass'), user_type='ADMIN', is_active=True)
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        library_cache.invalidate()
+        for alias, insect in (('default', 'muoi_vang'), ('replica1', 'ray_nau')):
+            ProcessingResult.objects.using(alias).create(
+                processed_image=SimpleUploadedFile(f'{alias}.jpg', b'jpg', 'image/jpeg'),
+                detection_timestamp=make_aware(datetime(2025, 5, 7, 8, 0)),
+                detected_insects_json=[{'name': insect}],
+            )
+            InsectReference.objects.using(alias).create(name=insect)
+        response = self.client.post(reverse('accounts:user_login'), {'email': 'replica_admin@example.com', 'password': 'replicapass'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        cache.clear() # Đăng nhập có ghi (refresh session): bỏ ghim để kiểm tra đường đọc
+
+    def _feed_insects(self, url_name='get-device-feed'):
+        response = self.client.get(reverse(url_name), {'start_date': '2025-05-01', 'end_date': '2025-05-31'})
+        self.assertEqual(response.status_code, 200)
+        return [result['detected_insects_json'][0]['name'] for result in response.data]
+
+    def test_read_endpoints_use_replica(self):
+        """Device feed, tìm kiếm, thống kê và danh sách thư viện đọc từ replica; xác thực vẫn ở primary."""
+        self.assertEqual(self._feed_insects(), ['ray_nau'])
+        self.assertEqual(self._feed_insects('search_results'), ['ray_nau'])
+        stats = self.client.get(reverse('stats-frequency'), {'start_date': '2025-05-07', 'end_date': '2025-05-07'}).data
+        self.assertEqual([dataset['label'] for dataset in stats['datasets']], ['ray_nau'])
+        library = self.client.get(reverse('insect-reference-list'), {'ordering': 'name'}).data
+        self.assertEqual([insect['name'] for insect in library], ['ray_nau'])
+
+    def test_library_snapshot_reads_primary(self):
+        """Snapshot dùng chung của thư viện luôn nạp từ primary."""
+        library = self.client.get(reverse('insect-reference-list')).data
+        self.assertEqual([insect['name'] for insect in library], ['muoi_vang'])
+
+    def test_user_reads_primary_after_own_write(self):
+        """Sau khi ghi, chính user đó đọc từ primary trong cửa sổ sticky."""
+        response = self.client.post(reverse('insect-reference-list'), {'name': 'bo_xit'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(InsectReference.objects.using('replica1').filter(name='bo_xit').exists())
+        self.assertEqual(self._feed_insects(), ['muoi_vang'])
+        cache.clear() # Hết cửa sổ sticky
+        self.assertEqual(self._feed_insects(), ['ray_nau'])
@@ -3,11 +3,13 @@ import base64
 import uuid
 import os
 import json
-import traceback # Để in traceback khi có lỗi
+import logging
 from datetime import date
 from django.utils import timezone # Hoặc from datetime import datetime
 
 from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 from django.http import Http404
 
@@ -15,30 +17,40 @@ from rest_framework import generics, permissions, status, views
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied, ValidationError
 
-# Import Channels và Async helper
-# Đảm bảo channels đã được cài đặt và cấu hình đúng trong settings.py và asgi.py
-try:
-    from channels.layers import get_channel_layer
-    from asgiref.sync import async_to_sync
-    CHANNELS_INSTALLED_SUCCESSFULLY = True
-except ImportError:
-    print("WARNING: Django Channels is not installed or configured properly. Real-time features will not work.")
-    # Định nghĩa hàm giả để code không bị lỗi nếu channels chưa cài
-    def get_channel_layer(): return None
-    def async_to_sync(func): return func
-    CHANNELS_INSTALLED_SUCCESSFULLY = False
-
-
 # Import từ các app khác
 from .models import ProcessingResult
+from .dedup import DEFAULT_DEVICE_ID, camera_frames, dedup_enabled, detection_signature, perceptual_hash
 from uploads.models import UserUpload # <<< Import UserUpload để liên kết và cập nhật status
 from .serializers import RPiResultInputSerializer, ProcessingResultOutputSerializer
 from accounts.permissions import IsAuthenticatedCustom, IsAdminUserType #, HasRPiAPIKey (nếu dùng)
 from accounts.models import CustomUser
+from jobs.outbox import publish # Thông báo WebSocket gửi sau commit
+from jobs.queue import enqueue # Side effect chạy nền (uploads/tasks.py)
+from notifications.progress import get_upload_status_group_name
+# Đo thời gian các phần của request (RequestTimingMiddleware)
+from monitoring.profiling import SPAN_SERIALIZATION, SPAN_STORAGE, profile_span
+from main_config.db.routers import ReplicaReadMixin # Đọc từ read replica
 
 # Django-filter imports (cho chức năng search)
 from django_filters.rest_framework import DjangoFilterBackend
-from .filters import ProcessingResultFilter # Giả sử bạn đã tạo file filters.py
+from .filters import DeviceFeedFilter, ProcessingResultFilter # Giả sử bạn đã tạo file filters.py
+
+logger = logging.getLogger(__name__)
+
+
+def decode_image_base64(image_base64):
+    """
+    Giải mã ảnh base64 do RPi gửi lên (data URI 'data:image/png;base64,...' hoặc chuỗi base64 thuần).
+    Trả về (bytes ảnh, phần mở rộng file).
+    """
+    if ';base64,' in image_base64:
+        img_format, imgstr = image_base64.split(';base64,')
+        ext_map = {'jpeg': 'jpg', 'png': 'png', 'gif': 'gif'}
+        ext = ext_map.get(img_format.split('/')[-1], 'jpg')
+    else:
+        imgstr = image_base64
+        ext = 'jpg'
+    return base64.b64decode(imgstr), ext
 
 
 # --- 1. API ĐỂ RPI GỬI KẾT QUẢ ĐÃ XỬ LÝ (ĐÃ CẬP NHẬT LOGIC GỬI WS CHO STATS) ---
@@ -52,6 +64,59 @@ class SaveResultAPIView(views.APIView):
     # permission_classes = [HasRPiAPIKey] # <<< NÊN DÙNG KHI BẢO MẬT
     permission_classes = [permissions.AllowAny] # Tạm thời để test (KHÔNG AN TOÀN)
 
+    def _collapse_duplicate_frame(self, request, camera_frame, detected_at):
+        """
+        Nếu khung hình camera gần như trùng với một kết quả gần đây của cùng thiết bị:
+        tăng duplicate_count của kết quả đó và trả về Response 200 (không lưu ảnh/dòng mới).
+        """
+        device_id, image_hash, signature = camera_frame
+        result_id = camera_frames.find_duplicate(device_id, image_hash, signature, detected_at)
+        if result_id is None:
+            return None
+        updated = ProcessingResult.objects.filter(pk=result_id).update(
+            duplicate_count=F('duplicate_count') + 1,
+            last_duplicate_at=detected_at,
+        )
+        previous_result = ProcessingResult.objects.filter(pk=result_id).first() if updated else None
+        if previous_result is None:
+            # Kết quả cũ đã bị xóa/lưu trữ: lưu khung hình này như bình thường
+            camera_frames.forget(device_id, result_id)
+            return None
+        logger.debug("SaveResultAPIView: Collapsed duplicate camera frame from device %s into result ID %s", device_id, result_id)
+        with profile_span(SPAN_SERIALIZATION):
+            output_data = ProcessingResultOutputSerializer(previous_result, context={'request': request}).data
+        return Response(output_data, status=status.HTTP_200_OK)
+
+    def _publish_notifications(self, request, new_result):
+        """
+        Ghi thông báo WebSocket cho user/dashboard vào outbox (jobs/outbox.py) trong transaction tạo kết quả:
+        chỉ được gửi sau khi commit, không làm chậm request.
+        """
+        upload_id = new_result.source_upload_id
+        if upload_id is not None:
+            processed_image_url = None
+            if new_result.processed_image:
+                # url có thể là đường dẫn tương đối (/media/...) hoặc presigned URL tuyệt đối (S3)
+                processed_image_url = request.build_absolute_uri(new_result.processed_image.url)
+            publish(get_upload_status_group_name(upload_id), "send.upload.status", {
+                "type": "upload_status_update",
+                "status": "completed",
+                "upload_id": upload_id,
+                "result_id": new_result.id,
+                "detail": f"File của bạn (ID upload: {upload_id}) đã được xử lý.",
+                "processed_image_url": processed_image_url,
+            })
+            # Hàng đợi đã dịch chuyển -> gửi lại vị trí cho các upload đang chờ (uploads/tasks.py)
+            enqueue('uploads.broadcast_queue_positions', idempotency_key=f'uploads.broadcast_queue_positions:result-{new_result.id}')
+        # Cập nhật dashboard thống kê
+        publish("dashboard_stats_updates", "send.stats.update", {
+            'event_type': 'new_insect_detection',
+            'result_id': new_result.id,
+            'detected_insects': new_result.detected_insects_json,
+            'detection_date': new_result.detection_timestamp.strftime('%Y-%m-%d'),
+            'source_type': 'user_upload' if upload_id is not None else 'camera_feed',
+        })
+
     def post(self, request, *args, **kwargs):
         serializer = RPiResultInputSerializer(data=request.data)
         if not serializer.is_valid():
@@ -68,31 +133,34 @@ class SaveResultAPIView(views.APIView):
 
         # --- Xử lý ảnh base64 ---
         try:
-            if ';base64,' in image_base64:
-                img_format, imgstr = image_base64.split(';base64,')
-                ext_map = {'jpeg': 'jpg', 'png': 'png', 'gif': 'gif'}
-                ext = ext_map.get(img_format.split('/')[-1], 'jpg')
-            else:
-                imgstr = image_base64
-                ext = 'jpg'
-            
             today = date.today()
             unique_id_val = uuid.uuid4()
+            with profile_span(SPAN_SERIALIZATION):
+                image_bytes, ext = decode_image_base64(image_base64)
             file_name_val = f"processed_{today.strftime('%Y%m%d')}_{unique_id_val}.{ext}"
-            processed_image_data = ContentFile(base64.b64decode(imgstr), name=file_name_val)
+            processed_image_data = ContentFile(image_bytes, name=file_name_val)
         except Exception as e_decode:
-            print(f"Error decoding/processing base64 in SaveResultAPIView: {e_decode}")
-            traceback.print_exc()
+            logger.exception("Error decoding/processing base64 in SaveResultAPIView: %s", e_decode)
             return Response({'status': 'fail', 'reason': 'Invalid processed image base64', 'details': str(e_decode)}, status=status.HTTP_400_BAD_REQUEST)
 
+        # --- Gộp khung hình camera gần như trùng lặp (results/dedup.py) ---
+        camera_frame = None
+        if source_upload_id_from_rpi is None and dedup_enabled():
+            image_hash = perceptual_hash(image_bytes)
+            if image_hash is not None:
+                camera_frame = (validated_data.get('device_id') or DEFAULT_DEVICE_ID, image_hash, detection_signature(insects_json))
+                duplicate_response = self._collapse_duplicate_frame(request, camera_frame, detection_timestamp_from_rpi)
+                if duplicate_response is not None:
+                    return duplicate_response
+
         # --- Lấy đối tượng UserUpload nếu ID được cung cấp ---
         user_upload_instance_for_result = None
         if source_upload_id_from_rpi is not None:
             try:
                 user_upload_instance_for_result = UserUpload.objects.select_related('uploaded_by').get(pk=source_upload_id_from_rpi)
-                print(f"DEBUG (SaveResultAPIView): Found UserUpload ID {source_upload_id_from_rpi} with status {user_upload_instance_for_result.status}")
+                logger.debug("SaveResultAPIView: Found UserUpload ID %s with status %s", source_upload_id_from_rpi, user_upload_instance_for_result.status)
             except UserUpload.DoesNotExist:
-                print(f"ERROR (SaveResultAPIView): UserUpload ID {source_upload_id_from_rpi} not found in DB!")
+                logger.error("SaveResultAPIView: UserUpload ID %s not found in DB!", source_upload_id_from_rpi)
                 return Response({'status': 'fail', 'reason': f'UserUpload with ID={source_upload_id_from_rpi} inconsistency.'}, status=status.HTTP_400_BAD_REQUEST)
 
         # --- Tạo bản ghi ProcessingResult ---
@@ -107,86 +175,26 @@ class SaveResultAPIView(views.APIView):
             if hasattr(ProcessingResult(), 'video_timestamp_sec'): # Kiểm tra model có trường đó không
                 create_kwargs['video_timestamp_sec'] = video_timestamp_sec_from_rpi
 
-            new_result = ProcessingResult.objects.create(**create_kwargs)
-            print(f"DEBUG (SaveResultAPIView): Created ProcessingResult ID {new_result.id}")
-
-            # --- LOGIC GỬI THÔNG BÁO WEBSOCKET CHO USER (TRẠNG THÁI UPLOAD) ---
-            if user_upload_instance_for_result and CHANNELS_INSTALLED_SUCCESSFULLY:
-                upload_id_to_notify = user_upload_instance_for_result.id
-                group_name_to_notify = f"upload_{upload_id_to_notify}_status"
-                channel_layer_user = get_channel_layer()
-
-                if channel_layer_user is None:
-                    print(f"ERROR (SaveResultAPIView): Channel layer is None! Cannot send WS notification for upload {upload_id_to_notify}.")
-                else:
-                    processed_image_url_abs = None
-                    if new_result.processed_image and hasattr(new_result.processed_image, 'url'):
-                        try:
-                            if request: processed_image_url_abs = request.build_absolute_uri(new_result.processed_image.url)
-                            else: processed_image_url_abs = new_result.processed_image.url
-                        except Exception as e_url:
-                            print(f"Warning (SaveResultAPIView): Could not build absolute URI: {e_url}")
-                            if new_result.processed_image: processed_image_url_abs = new_result.processed_image.url
-                    
-                    user_status_payload = {
-                        "type": "upload_status_update",
-                        "status": "completed",
-                        "upload_id": upload_id_to_notify,
-                        "result_id": new_result.id,
-                        "detail": f"File của bạn (ID upload: {upload_id_to_notify}) đã được xử lý.",
-                        "processed_image_url": processed_image_url_abs
-                    }
-                    try:
-                        async_to_sync(channel_layer_user.group_send)(
-                            group_name_to_notify,
-                            {"type": "send.upload.status", "message": user_status_payload}
-                        )
-                        print(f"DEBUG (SaveResultAPIView): Sent WebSocket user status for upload_id: {upload_id_to_notify}")
-                    except Exception as ws_send_error_user:
-                        print(f"ERROR (SaveResultAPIView): Could not send WebSocket user status for upload {upload_id_to_notify}: {ws_send_error_user}")
-                
-                # Cập nhật status của UserUpload
-                if user_upload_instance_for_result.status != UserUpload.STATUS_COMPLETED:
+            # INSERT, cập nhật status của UserUpload, rollup thống kê/tóm tắt dashboard (signal của app stats)
+            # và ghi thông báo WebSocket vào outbox trong một transaction
+            with profile_span(SPAN_STORAGE), transaction.atomic(): # Ghi ảnh + INSERT (thời gian DB được tính riêng)
+                new_result = ProcessingResult.objects.create(**create_kwargs)
+                if user_upload_instance_for_result and user_upload_instance_for_result.status != UserUpload.STATUS_COMPLETED:
                     user_upload_instance_for_result.status = UserUpload.STATUS_COMPLETED
-                    update_fields = ['status']
-                    if hasattr(user_upload_instance_for_result, 'updated_at'):
-                        user_upload_instance_for_result.updated_at = timezone.now()
-                        update_fields.append('updated_at')
-                    user_upload_instance_for_result.save(update_fields=update_fields)
-                    print(f"DEBUG (SaveResultAPIView): UserUpload ID {upload_id_to_notify} status updated to {UserUpload.STATUS_COMPLETED}.")
-            # -----------------------------------------------------------------
-
-            # --- LOGIC GỬI THÔNG BÁO CẬP NHẬT STATS QUA WEBSOCKET ---
-            if CHANNELS_INSTALLED_SUCCESSFULLY:
-                stats_channel_layer = get_channel_layer()
-                if stats_channel_layer is None:
-                     print(f"ERROR (SaveResultAPIView): Channel layer is None! Cannot send stats update for result ID {new_result.id}.")
-                else:
-                    stats_update_payload = {
-                        'event_type': 'new_insect_detection',
-                        'result_id': new_result.id,
-                        'detected_insects': new_result.detected_insects_json,
-                        'detection_date': new_result.detection_timestamp.strftime('%Y-%m-%d'),
-                        'source_type': 'user_upload' if new_result.source_upload else 'camera_feed'
-                    }
-                    stats_group_name = "dashboard_stats_updates"
-                    try:
-                        async_to_sync(stats_channel_layer.group_send)(
-                            stats_group_name,
-                            {"type": "send.stats.update", "message": stats_update_payload}
-                        )
-                        print(f"DEBUG (SaveResultAPIView): Sent stats update notification to group {stats_group_name} for result ID {new_result.id}")
-                    except Exception as stats_send_error:
-                        print(f"ERROR (SaveResultAPIView): Could not send stats update notification for result ID {new_result.id}: {stats_send_error}")
-                        traceback.print_exc()
-            # -----------------------------------------------------------
-            
-            output_serializer = ProcessingResultOutputSerializer(new_result, context={'request': request})
-            return Response(output_serializer.data, status=status.HTTP_201_CREATED)
+                    user_upload_instance_for_result.updated_at = timezone.now()
+                    user_upload_instance_for_result.save(update_fields=['status', 'updated_at'])
+                    logger.debug("SaveResultAPIView: UserUpload ID %s status updated to %s.", user_upload_instance_for_result.id, UserUpload.STATUS_COMPLETED)
+                self._publish_notifications(request, new_result)
+            logger.debug("SaveResultAPIView: Created ProcessingResult ID %s", new_result.id)
+            if camera_frame is not None:
+                camera_frames.remember(*camera_frame, new_result.id, new_result.detection_timestamp)
+
+            with profile_span(SPAN_SERIALIZATION):
+                output_data = ProcessingResultOutputSerializer(new_result, context={'request': request}).data
+            return Response(output_data, status=status.HTTP_201_CREATED)
 
         except Exception as e:
-            print(f"Error creating ProcessingResult or sending WS in SaveResultAPIView: {e}")
-            traceback.print_exc()
+            logger.exception("Error creating ProcessingResult or sending WS in SaveResultAPIView: %s", e)
             if user_upload_instance_for_result:
                 if user_upload_instance_for_result.status != UserUpload.STATUS_FAILED:
                     user_upload_instance_for_result.status = UserUpload.STATUS_FAILED
@@ -195,16 +203,29 @@ class SaveResultAPIView(views.APIView):
                         user_upload_instance_for_result.updated_at = timezone.now()
                         update_fields.append('updated_at')
                     user_upload_instance_for_result.save(update_fields=update_fields)
-                    print(f"DEBUG (SaveResultAPIView): UserUpload ID {user_upload_instance_for_result.id} status updated to {UserUpload.STATUS_FAILED} due to error.")
+                    logger.debug("SaveResultAPIView: UserUpload ID %s status updated to %s due to error.", user_upload_instance_for_result.id, UserUpload.STATUS_FAILED)
             return Response({'status': 'fail', 'reason': 'Could not save processing result', 'details': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class InsectEnrichmentMixin:
+    """
+    ?enrich=insects: gắn thông tin tham khảo (tên khoa học, tóm tắt cách xử lý) của từng côn trùng
+    phát hiện được vào kết quả, thay cho việc client gọi /api/library/insects/?search= cho từng loài.
+    """
+    enrich_param = 'enrich'
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['enrich_insects'] = 'insects' in self.request.query_params.get(self.enrich_param, '').split(',')
+        return context
+
+
 # --- 2. API ĐỂ FRONTEND LẤY KẾT QUẢ THEO UPLOAD ID ---
-class GetResultByUploadAPIView(generics.RetrieveAPIView):
+class GetResultByUploadAPIView(InsectEnrichmentMixin, generics.RetrieveAPIView):
     """
     API endpoint để Frontend lấy kết quả xử lý dựa trên ID của UserUpload gốc.
     Kiểm tra quyền sở hữu của người dùng.
-    GET: /api/results/by-upload/{upload_id}/
+    GET: /api/results/by-upload/{upload_id}/[?enrich=insects]
     """
     queryset = ProcessingResult.objects.select_related('source_upload__uploaded_by').all()
     serializer_class = ProcessingResultOutputSerializer
@@ -236,29 +257,27 @@ class GetResultByUploadAPIView(generics.RetrieveAPIView):
 
 
 # --- 3. API ĐỂ ADMIN LẤY KẾT QUẢ TỪ CAMERA RPI ---
-class DeviceFeedAPIView(generics.ListAPIView):
+class DeviceFeedAPIView(ReplicaReadMixin, InsectEnrichmentMixin, generics.ListAPIView):
     """
     API endpoint để Frontend (chỉ Admin) lấy danh sách kết quả xử lý từ Camera RPi
     (những bản ghi có source_upload là NULL). Có thể thêm filter ngày tháng.
-    GET: /api/results/device-feed/?start_date=...&end_date=...
+    GET: /api/results/device-feed/?start_date=...&end_date=...[&enrich=insects]
     """
     queryset = ProcessingResult.objects.filter(source_upload__isnull=True).order_by('-received_at', '-detection_timestamp')
     serializer_class = ProcessingResultOutputSerializer
     permission_classes = [IsAdminUserType] # <<< CHỈ ADMIN ĐƯỢC TRUY CẬP
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = {
-        'detection_timestamp': ['date__gte', 'date__lte'] # Cho phép lọc ?detection_timestamp__date__gte=YYYY-MM-DD
-    }
+    filterset_class = DeviceFeedFilter # ?start_date=/?end_date= (hoặc ?detection_timestamp__date__gte=/__lte=) lọc theo khoảng timestamp
     # (Tùy chọn) Thêm phân trang
     # pagination_class = PageNumberPagination
     # pagination_class.page_size = 20
 
 
 # --- 4. API ĐỂ TÌM KIẾM/LỌC KẾT QUẢ XỬ LÝ ---
-class ProcessingResultSearchView(generics.ListAPIView):
+class ProcessingResultSearchView(ReplicaReadMixin, InsectEnrichmentMixin, generics.ListAPIView):
     """
     API endpoint để tìm kiếm và lọc các kết quả xử lý.
-    GET /api/results/search/?start_date=...&end_date=...&insect_name=...
+    GET /api/results/search/?start_date=...&end_date=...&insect_name=...[&enrich=insects]
     """
     serializer_class = ProcessingResultOutputSerializer
     permission_classes = [IsAuthenticatedCustom] # Yêu cầu đăng nhập
@@ -275,9 +294,9 @@ class ProcessingResultSearchView(generics.ListAPIView):
 
         if hasattr(user, 'is_admin') and user.is_admin:
             # Admin: Lấy tất cả kết quả
-            print(f"DEBUG (ProcessingResultSearchView): Admin Query")
+            logger.debug("ProcessingResultSearchView: Admin Query")
             return ProcessingResult.objects.select_related('source_upload__uploaded_by').all().order_by('-received_at')
         else: # Mặc định là user thường nếu không phải admin và đã xác thực
             # User thường: Chỉ lấy kết quả từ file họ đã upload
-             print(f"DEBUG (ProcessingResultSearchView): Regular User Query for user ID {user.id}")
+             logger.debug("ProcessingResultSearchView: Regular User Query for user ID %s", user.id)
              return ProcessingResult.objects.select_related('source_upload__uploaded_by').filter(source_upload__uploaded_by=user).order_by('-received_at')
\ No newline at end of file
@@ -0,0 +1,39 @@
+# stats/aggregation.py
+"""
+Logic tổng hợp dữ liệu thống kê tần suất, tách khỏi FrequencyStatsView để
+có thể dùng lại và benchmark trên dữ liệu tổng hợp (không cần DB).
+Phần tính toán nằm trong stats/engine.py (ma trận côn trùng × ngày).
+"""
+from .engine import build_frequency_matrix
+
+# Các chuỗi dẫn xuất có thể yêu cầu qua ?include=... của FrequencyStatsView
+DERIVED_ROLLING_AVERAGE = 'rolling_average'
+DERIVED_CO_OCCURRENCE = 'co_occurrence'
+DERIVED_FIRST_APPEARANCE = 'first_appearance'
+DERIVED_SERIES = (DERIVED_ROLLING_AVERAGE, DERIVED_CO_OCCURRENCE, DERIVED_FIRST_APPEARANCE)
+
+
+def build_frequency_chart(rows, start_date, end_date, include=()):
+    """
+    Dữ liệu cho Chart.js: {'labels': [ngày...], 'datasets': [{'label': tên, 'data': [0/1...]}]}.
+    Mỗi loại côn trùng chỉ được tính tối đa 1 lần mỗi ngày. `include` chọn thêm các chuỗi dẫn xuất
+    (xem DERIVED_SERIES).
+    """
+    matrix = build_frequency_matrix(rows, start_date, end_date)
+    chart_data = {
+        'labels': matrix.day_labels(),
+        'datasets': [
+            {'label': name, 'data': data_points}
+            for name, data_points in zip(matrix.labels, matrix.presence_matrix())
+        ],
+    }
+    if DERIVED_ROLLING_AVERAGE in include:
+        chart_data[DERIVED_ROLLING_AVERAGE] = [
+            {'label': name, 'data': averages}
+            for name, averages in zip(matrix.labels, matrix.rolling_average())
+        ]
+    if DERIVED_CO_OCCURRENCE in include:
+        chart_data[DERIVED_CO_OCCURRENCE] = {'labels': matrix.labels, 'matrix': matrix.co_occurrence()}
+    if DERIVED_FIRST_APPEARANCE in include:
+        chart_data[DERIVED_FIRST_APPEARANCE] = dict(zip(matrix.labels, matrix.first_appearance()))
+    return chart_data
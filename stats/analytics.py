@@ -0,0 +1,105 @@
+# stats/analytics.py
+"""
+Phân tích cho nhà nông học, đọc từ các bảng rollup (không quét ProcessingResult):
+- Đồng xuất hiện: các cặp loài cùng có trong một kết quả, và cùng xuất hiện trong một ngày.
+- Xu hướng tuần: số cá thể 7 ngày cuối khoảng so với 7 ngày trước đó.
+- Bất thường: ngày mà số cá thể của một loài vượt baseline trượt 7 ngày trước đó.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Sum
+
+from .engine import ROLLING_WINDOW_DAYS, DetectionColumns, FrequencyMatrix
+from .models import DailyCoOccurrenceRollup, DailyInsectRollup
+
+WEEK_DAYS = 7
+
+
+def get_anomaly_std_multiplier():
+    return getattr(settings, 'STATS_ANOMALY_STD_MULTIPLIER', 3.0)
+
+
+def get_anomaly_min_count():
+    return getattr(settings, 'STATS_ANOMALY_MIN_COUNT', 3)
+
+
+def build_analytics(start_date, end_date):
+    # Lấy thêm dữ liệu trước start_date làm baseline cho xu hướng tuần và phát hiện bất thường
+    lookback = max(ROLLING_WINDOW_DAYS, 2 * WEEK_DAYS - (end_date - start_date).days - 1, 0)
+    load_start = start_date - timedelta(days=lookback)
+    rollup_rows = DailyInsectRollup.objects.filter(date__range=(load_start, end_date)).order_by().values_list('date', 'insect_name', 'detections')
+    matrix = FrequencyMatrix(DetectionColumns.from_counts(rollup_rows, load_start, end_date))
+    start_day = (start_date - load_start).days
+    end_day = (end_date - load_start).days
+
+    return {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'co_occurrence': {
+            'same_result': same_result_pairs(start_date, end_date),
+            'same_day': same_day_pairs(matrix, start_day),
+        },
+        'trends': weekly_trends(matrix, end_day),
+        'anomalies': anomalies(matrix, start_day),
+    }
+
+
+def same_result_pairs(start_date, end_date):
+    pairs = (
+        DailyCoOccurrenceRollup.objects.filter(date__range=(start_date, end_date))
+        .values('insect_a', 'insect_b')
+        .annotate(total=Sum('results'))
+        .order_by('-total', 'insect_a', 'insect_b')
+    )
+    return [{'insects': [pair['insect_a'], pair['insect_b']], 'results': pair['total']} for pair in pairs]
+
+
+def same_day_pairs(matrix, start_day):
+    """Số ngày (trong khoảng yêu cầu) mà cả hai loài cùng xuất hiện."""
+    co_occurrence = matrix.co_occurrence(from_day=start_day)
+    pairs = []
+    for i, insect_a in enumerate(matrix.labels):
+        for j in range(i + 1, len(matrix.labels)):
+            if co_occurrence[i][j]:
+                pairs.append({'insects': [insect_a, matrix.labels[j]], 'days': co_occurrence[i][j]})
+    pairs.sort(key=lambda pair: (-pair['days'], pair['insects']))
+    return pairs
+
+
+def weekly_trends(matrix, end_day):
+    current = matrix.window_totals(end_day - WEEK_DAYS + 1, end_day)
+    previous = matrix.window_totals(end_day - 2 * WEEK_DAYS + 1, end_day - WEEK_DAYS)
+    trends = []
+    for insect_name, current_week, previous_week in zip(matrix.labels, current, previous):
+        if not current_week and not previous_week:
+            continue
+        trends.append({
+            'insect': insect_name,
+            'current_week': current_week,
+            'previous_week': previous_week,
+            'delta': current_week - previous_week,
+            # None khi tuần trước không có phát hiện nào (không tính được %)
+            'delta_percent': round((current_week - previous_week) / previous_week * 100, 2) if previous_week else None,
+        })
+    trends.sort(key=lambda trend: (-abs(trend['delta']), trend['insect']))
+    return trends
+
+
+def anomalies(matrix, start_day):
+    flagged = matrix.anomalies(
+        window=ROLLING_WINDOW_DAYS,
+        std_multiplier=get_anomaly_std_multiplier(),
+        min_count=get_anomaly_min_count(),
+        from_day=start_day,
+    )
+    return [
+        {
+            'insect': matrix.labels[row],
+            'date': (matrix.start_date + timedelta(days=day)).isoformat(),
+            'count': count,
+            'baseline_mean': mean,
+            'baseline_std': std,
+        }
+        for row, day, count, mean, std in sorted(flagged, key=lambda item: (item[1], item[0]))
+    ]
@@ -1,10 +1,14 @@
 # stats/consumers.py
 import json
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
+from monitoring.ws_metrics import WebSocketMetricsMixin
 # Import permission và model User nếu bạn muốn kiểm tra quyền truy cập phức tạp hơn
 # (hiện tại, chỉ cần user đã đăng nhập)
 
-class StatsConsumer(AsyncWebsocketConsumer):
+logger = logging.getLogger(__name__)
+
+class StatsConsumer(WebSocketMetricsMixin, AsyncWebsocketConsumer):
     group_name = "dashboard_stats_updates" # Tên group chung cho tất cả client xem dashboard
 
     async def connect(self):
@@ -14,11 +18,11 @@ class StatsConsumer(AsyncWebsocketConsumer):
         is_authenticated = bool(self.user and getattr(self.user, 'id', None) is not None) 
         user_email_for_log = getattr(self.user, 'email', 'Anonymous')
 
-        print(f"DEBUG (StatsConsumer - connect): User attempting connect: {user_email_for_log}, authenticated: {is_authenticated}")
+        logger.debug("StatsConsumer connect: User attempting connect: %s, authenticated: %s", user_email_for_log, is_authenticated)
 
         if is_authenticated:
             if self.channel_layer is None: 
-                print(f"DEBUG ({self.__class__.__name__} - connect): CRITICAL! Channel layer is None. Closing connection.")
+                logger.critical("%s connect: Channel layer is None. Closing connection.", self.__class__.__name__)
                 await self.close(code=4002) # Mã lỗi tùy chọn
                 return
 
@@ -28,17 +32,17 @@ class StatsConsumer(AsyncWebsocketConsumer):
                 self.channel_name # ID duy nhất của kết nối WebSocket này
             )
             await self.accept() # Chấp nhận kết nối WebSocket
-            print(f"DEBUG (StatsConsumer - connect): User {user_email_for_log} connected to group '{self.group_name}' for real-time stats.")
+            logger.debug("StatsConsumer connect: User %s connected to group '%s' for real-time stats.", user_email_for_log, self.group_name)
 
             # (Tùy chọn) Bạn có thể gửi dữ liệu thống kê ban đầu ngay khi client kết nối
             # await self.send_initial_stats_data()
         else:
-            print(f"DEBUG (StatsConsumer - connect): Connection REJECTED. User not authenticated.")
+            logger.debug("StatsConsumer connect: Connection rejected. User not authenticated.")
             await self.close()
 
     async def disconnect(self, close_code):
         user_email_for_log = getattr(self.user, 'email', 'Anonymous')
-        print(f"DEBUG (StatsConsumer - disconnect): User {user_email_for_log} disconnected from group '{self.group_name}'. Code: {close_code}")
+        logger.debug("StatsConsumer disconnect: User %s disconnected from group '%s'. Code: %s", user_email_for_log, self.group_name, close_code)
         if self.channel_layer: # Luôn kiểm tra trước khi dùng
             await self.channel_layer.group_discard(
                 self.group_name,
@@ -53,7 +57,7 @@ class StatsConsumer(AsyncWebsocketConsumer):
         """
         stats_data_payload = event['message'] # Dữ liệu thống kê mới từ BE
 
-        print(f"DEBUG (StatsConsumer - send_stats_update): Relaying stats update to client {self.channel_name}: {str(stats_data_payload)[:200]}...") # Log một phần dữ liệu
+        logger.debug("StatsConsumer send_stats_update: Relaying stats update to client %s.", self.channel_name)
 
         try:
             # Gửi dữ liệu xuống client WebSocket
@@ -61,8 +65,8 @@ class StatsConsumer(AsyncWebsocketConsumer):
                 'type': 'stats_dashboard_update', # Một type rõ ràng để Frontend nhận biết
                 'data': stats_data_payload
             }))
-        except Exception as e:
-            print(f"ERROR (StatsConsumer - send_stats_update): Could not send stats update to client {self.channel_name}: {e}")
+        except Exception:
+            logger.exception("StatsConsumer send_stats_update: Could not send stats update to client %s.", self.channel_name)
 
     # (Tùy chọn) Hàm để gửi dữ liệu thống kê ban đầu
     # async def send_initial_stats_data(self):
@@ -0,0 +1,283 @@
+# stats/engine.py
+"""
+Engine tính thống kê theo cột (columnar) cho dữ liệu phát hiện côn trùng.
+
+Dữ liệu thô (ngày, detected_insects_json) được nạp một lần thành 3 cột số nguyên
+(day_index, insect_id, count). Ma trận côn trùng × ngày được dựng bằng MỘT phép
+scatter (numpy.bincount trên chỉ số phẳng insect_id * n_days + day_index) thay vì
+vòng lặp lồng nhau theo từng côn trùng. Các chuỗi dẫn xuất (trung bình trượt 7 ngày,
+ma trận đồng xuất hiện, ngày xuất hiện đầu tiên) cũng được tính trên ma trận.
+
+NumPy là tùy chọn: nếu không cài, engine dùng module `array` (bộ nhớ gọn, một lượt
+duyệt cho scatter) và cho ra kết quả giống hệt.
+"""
+import json
+from array import array
+from datetime import timedelta
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+ROLLING_WINDOW_DAYS = 7
+
+
+def parse_detected_insects(insects_json):
+    """
+    Trả về list côn trùng từ giá trị detected_insects_json
+    (JSONField trả về list; dữ liệu cũ có thể là chuỗi JSON). Dữ liệu hỏng -> list rỗng.
+    """
+    insects = []
+    if isinstance(insects_json, str):
+        try:
+            insects = json.loads(insects_json)
+        except json.JSONDecodeError:
+            return []
+    elif isinstance(insects_json, list):
+        insects = insects_json
+    return insects if isinstance(insects, list) else []
+
+
+class DetectionColumns:
+    """
+    Các cột (day_index, insect_id, count) của một khoảng ngày [start_date, end_date].
+    Mỗi phần tử là số lần một loại côn trùng xuất hiện trong một kết quả; các kết quả
+    ngoài khoảng ngày hoặc không có tên côn trùng bị bỏ qua.
+    """
+
+    def __init__(self, start_date, end_date):
+        self.start_date = start_date
+        self.n_days = (end_date - start_date).days + 1
+        self.insect_ids = {} # tên côn trùng -> id (theo thứ tự gặp)
+        self.day_index = array('q')
+        self.insect_id = array('q')
+        self.count = array('q')
+
+    @classmethod
+    def from_rows(cls, rows, start_date, end_date):
+        """`rows`: các cặp (ngày phát hiện, detected_insects_json), ví dụ từ values_list()."""
+        columns = cls(start_date, end_date)
+        # Vòng lặp nóng (chạy cho từng kết quả): gán sẵn biến cục bộ thay vì gọi self.add()
+        n_days = columns.n_days
+        insect_ids = columns.insect_ids
+        append_day = columns.day_index.append
+        append_insect = columns.insect_id.append
+        append_count = columns.count.append
+        day_cache = {} # ngày -> day_index (hoặc -1 nếu ngoài khoảng)
+        for detection_date, insects_json in rows:
+            day = day_cache.get(detection_date)
+            if day is None:
+                day = (detection_date - start_date).days
+                day = day_cache[detection_date] = day if 0 <= day < n_days else -1
+            if day < 0:
+                continue
+            if type(insects_json) is not list:
+                insects_json = parse_detected_insects(insects_json)
+            counts = {}
+            for insect_data in insects_json:
+                if type(insect_data) is dict:
+                    insect_name = insect_data.get('name')
+                    if insect_name:
+                        counts[insect_name] = counts.get(insect_name, 0) + 1
+            for insect_name, count in counts.items():
+                insect_id = insect_ids.get(insect_name)
+                if insect_id is None:
+                    insect_id = insect_ids[insect_name] = len(insect_ids)
+                append_day(day)
+                append_insect(insect_id)
+                append_count(count)
+        return columns
+
+    @classmethod
+    def from_counts(cls, rows, start_date, end_date):
+        """`rows`: các bộ (ngày, tên côn trùng, số lần phát hiện) đã tổng hợp sẵn (ví dụ từ bảng rollup)."""
+        columns = cls(start_date, end_date)
+        insect_ids = columns.insect_ids
+        for detection_date, insect_name, count in rows:
+            day = (detection_date - start_date).days
+            if not 0 <= day < columns.n_days or not count:
+                continue
+            insect_id = insect_ids.get(insect_name)
+            if insect_id is None:
+                insect_id = insect_ids[insect_name] = len(insect_ids)
+            columns.day_index.append(day)
+            columns.insect_id.append(insect_id)
+            columns.count.append(count)
+        return columns
+
+    @property
+    def n_insects(self):
+        return len(self.insect_ids)
+
+    def __len__(self):
+        return len(self.count)
+
+
+class FrequencyMatrix:
+    """
+    Ma trận côn trùng × ngày (hàng sắp xếp theo tên côn trùng) cùng các chuỗi dẫn xuất.
+    Kết quả trả về luôn là list Python (dùng trực tiếp cho Response JSON).
+    """
+
+    def __init__(self, columns, use_numpy=None):
+        self.start_date = columns.start_date
+        self.n_days = columns.n_days
+        self.labels = sorted(columns.insect_ids)
+        self.use_numpy = NUMPY_AVAILABLE if use_numpy is None else use_numpy and NUMPY_AVAILABLE
+        # Đổi id theo thứ tự gặp sang thứ tự hàng đã sắp xếp theo tên
+        row_of_id = [0] * columns.n_insects
+        for row, insect_name in enumerate(self.labels):
+            row_of_id[columns.insect_ids[insect_name]] = row
+        if self.use_numpy:
+            self._counts = self._scatter_numpy(columns, row_of_id)
+        else:
+            self._counts = self._scatter_array(columns, row_of_id)
+
+    # --- Dựng ma trận số lần xuất hiện bằng một phép scatter ---
+    def _scatter_numpy(self, columns, row_of_id):
+        n_cells = len(self.labels) * self.n_days
+        if not n_cells:
+            return np.zeros((len(self.labels), self.n_days), dtype=np.int64)
+        rows = np.asarray(row_of_id, dtype=np.int64)[np.frombuffer(columns.insect_id, dtype=np.int64)]
+        flat_index = rows * self.n_days + np.frombuffer(columns.day_index, dtype=np.int64)
+        weights = np.frombuffer(columns.count, dtype=np.int64)
+        counts = np.bincount(flat_index, weights=weights, minlength=n_cells)
+        return counts.astype(np.int64).reshape(len(self.labels), self.n_days)
+
+    def _scatter_array(self, columns, row_of_id):
+        n_days = self.n_days
+        counts = array('q', bytes(array('q').itemsize * len(self.labels) * n_days))
+        for day, insect_id, count in zip(columns.day_index, columns.insect_id, columns.count):
+            counts[row_of_id[insect_id] * n_days + day] += count
+        return counts
+
+    def _row(self, row):
+        """Một hàng của ma trận (bản fallback array)."""
+        return self._counts[row * self.n_days:(row + 1) * self.n_days]
+
+    # --- Ma trận cơ bản ---
+    def day_labels(self):
+        return [(self.start_date + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(self.n_days)]
+
+    def count_matrix(self):
+        """Số lần phát hiện mỗi loại côn trùng theo ngày."""
+        if self.use_numpy:
+            return self._counts.tolist()
+        return [self._row(row).tolist() for row in range(len(self.labels))]
+
+    def presence_matrix(self):
+        """1 nếu côn trùng xuất hiện trong ngày, 0 nếu không (mỗi loại tối đa 1 lần mỗi ngày)."""
+        if self.use_numpy:
+            return (self._counts > 0).astype(np.int8).tolist()
+        return [[1 if value else 0 for value in self._row(row)] for row in range(len(self.labels))]
+
+    # --- Chuỗi dẫn xuất ---
+    def rolling_average(self, window=ROLLING_WINDOW_DAYS):
+        """
+        Trung bình trượt `window` ngày (tính cả ngày hiện tại) của số lần phát hiện.
+        Các ngày đầu khoảng chưa đủ `window` ngày thì chia cho số ngày đã có.
+        """
+        if self.use_numpy:
+            cumulative = np.zeros((len(self.labels), self.n_days + 1), dtype=np.float64)
+            np.cumsum(self._counts, axis=1, out=cumulative[:, 1:])
+            ends = np.arange(1, self.n_days + 1)
+            starts = np.maximum(ends - window, 0)
+            averages = (cumulative[:, ends] - cumulative[:, starts]) / (ends - starts)
+            return np.round(averages, 4).tolist()
+        result = []
+        for row in range(len(self.labels)):
+            cumulative = [0]
+            for value in self._row(row):
+                cumulative.append(cumulative[-1] + value)
+            result.append([
+                round((cumulative[end] - cumulative[max(end - window, 0)]) / (end - max(end - window, 0)), 4)
+                for end in range(1, self.n_days + 1)
+            ])
+        return result
+
+    def co_occurrence(self, from_day=0):
+        """
+        Ma trận đồng xuất hiện: [i][j] = số ngày (có chỉ số >= from_day) cả côn trùng i và j
+        cùng xuất hiện (đường chéo = số ngày xuất hiện).
+        """
+        if self.use_numpy:
+            presence = (self._counts[:, from_day:] > 0).astype(np.int64)
+            return (presence @ presence.T).tolist()
+        n_insects = len(self.labels)
+        matrix = [[0] * n_insects for _ in range(n_insects)]
+        for day in range(from_day, self.n_days):
+            present = [row for row in range(n_insects) if self._counts[row * self.n_days + day]]
+            for i in present:
+                matrix_row = matrix[i]
+                for j in present:
+                    matrix_row[j] += 1
+        return matrix
+
+    def first_appearance(self):
+        """Ngày (YYYY-MM-DD) đầu tiên mỗi côn trùng xuất hiện trong khoảng, theo thứ tự `labels`."""
+        if self.use_numpy:
+            first_days = (self._counts > 0).argmax(axis=1).tolist()
+        else:
+            first_days = [next(day for day, value in enumerate(self._row(row)) if value) for row in range(len(self.labels))]
+        # Mỗi côn trùng trong labels có ít nhất một lần xuất hiện nên argmax luôn hợp lệ
+        return [(self.start_date + timedelta(days=day)).strftime('%Y-%m-%d') for day in first_days]
+
+
+    def window_totals(self, first_day, last_day):
+        """Tổng số lần phát hiện của mỗi côn trùng trong các ngày [first_day, last_day] (chỉ số ngày)."""
+        first_day = max(first_day, 0)
+        if self.use_numpy:
+            return self._counts[:, first_day:last_day + 1].sum(axis=1).tolist()
+        return [sum(self._row(row)[first_day:last_day + 1]) for row in range(len(self.labels))]
+
+    def anomalies(self, window=ROLLING_WINDOW_DAYS, std_multiplier=3.0, min_count=3, from_day=0):
+        """
+        Các ngày số lần phát hiện tăng vọt so với baseline trượt: trung bình và độ lệch chuẩn
+        của `window` ngày TRƯỚC đó (không tính ngày hiện tại). Một ngày bị đánh dấu khi
+        count >= min_count và count > mean + std_multiplier * std.
+        Chỉ xét các ngày có chỉ số >= from_day (các ngày trước đó chỉ dùng làm baseline).
+        Trả về list (hàng, ngày, count, mean, std).
+        """
+        if self.use_numpy:
+            counts = self._counts.astype(np.float64)
+            cumulative = np.zeros((len(self.labels), self.n_days + 1))
+            cumulative_sq = np.zeros((len(self.labels), self.n_days + 1))
+            np.cumsum(counts, axis=1, out=cumulative[:, 1:])
+            np.cumsum(counts * counts, axis=1, out=cumulative_sq[:, 1:])
+            days = np.arange(self.n_days)
+            starts = np.maximum(days - window, 0)
+            sizes = np.maximum(days - starts, 1) # Ngày 0 không có baseline (bị loại bởi điều kiện days > starts)
+            mean = (cumulative[:, days] - cumulative[:, starts]) / sizes
+            variance = np.maximum((cumulative_sq[:, days] - cumulative_sq[:, starts]) / sizes - mean * mean, 0.0)
+            std = np.sqrt(variance)
+            flagged = (counts >= min_count) & (counts > mean + std_multiplier * std) & (days > starts) & (days >= from_day)
+            rows, flagged_days = np.nonzero(flagged)
+            return [
+                (row, day, int(counts[row, day]), round(float(mean[row, day]), 4), round(float(std[row, day]), 4))
+                for row, day in zip(rows.tolist(), flagged_days.tolist())
+            ]
+        result = []
+        for row in range(len(self.labels)):
+            values = self._row(row)
+            cumulative, cumulative_sq = [0], [0]
+            for value in values:
+                cumulative.append(cumulative[-1] + value)
+                cumulative_sq.append(cumulative_sq[-1] + value * value)
+            for day in range(max(from_day, 1), self.n_days):
+                count = values[day]
+                if count < min_count:
+                    continue
+                start = max(day - window, 0)
+                size = day - start
+                mean = (cumulative[day] - cumulative[start]) / size
+                std = max((cumulative_sq[day] - cumulative_sq[start]) / size - mean * mean, 0.0) ** 0.5
+                if count > mean + std_multiplier * std:
+                    result.append((row, day, count, round(mean, 4), round(std, 4)))
+        return result
+
+
+def build_frequency_matrix(rows, start_date, end_date, use_numpy=None):
+    return FrequencyMatrix(DetectionColumns.from_rows(rows, start_date, end_date), use_numpy=use_numpy)
@@ -0,0 +1,20 @@
+# stats/management/commands/rebuild_stats_rollups.py
+from django.core.management.base import BaseCommand
+
+from stats.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Tính lại các bảng rollup thống kê (theo ngày/loài và đồng xuất hiện) từ toàn bộ ProcessingResult. "
+        "Chạy sau lần triển khai đầu tiên hoặc sau khi import/xóa kết quả hàng loạt."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Số kết quả đọc mỗi lần từ DB.')
+
+    def handle(self, *args, **options):
+        insect_rows, pair_rows = rebuild_rollups(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã tính lại rollup: {insect_rows} dòng theo loài/ngày, {pair_rows} dòng đồng xuất hiện."
+        ))
@@ -0,0 +1,23 @@
+# stats/management/commands/rebuild_user_summaries.py
+from django.core.management.base import BaseCommand
+
+from stats.summaries import rebuild_user_summaries, recompute_user_summary
+
+
+class Command(BaseCommand):
+    help = (
+        "Tính lại tóm tắt dashboard (stats.UserSummary) từ UserUpload và ProcessingResult. "
+        "Dùng để sửa summary bị lệch (ví dụ sau khi cập nhật dữ liệu hàng loạt không qua signal)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, action='append', help='Chỉ tính lại cho user này (lặp lại để chọn nhiều user).')
+
+    def handle(self, *args, **options):
+        if options['user_id']:
+            for user_id in options['user_id']:
+                recompute_user_summary(user_id)
+            self.stdout.write(self.style.SUCCESS(f"Đã tính lại summary cho {len(options['user_id'])} user."))
+            return
+        count = rebuild_user_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Đã tính lại summary cho {count} user."))
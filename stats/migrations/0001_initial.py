@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-19 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCoOccurrenceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True, verbose_name='Ngày phát hiện')),
+                ('insect_a', models.CharField(max_length=100, verbose_name='Côn trùng A')),
+                ('insect_b', models.CharField(max_length=100, verbose_name='Côn trùng B')),
+                ('results', models.PositiveIntegerField(default=0, verbose_name='Số kết quả có cả hai loài')),
+            ],
+            options={
+                'verbose_name': 'Đồng xuất hiện Côn trùng theo Ngày',
+                'verbose_name_plural': 'Đồng xuất hiện Côn trùng theo Ngày',
+                'db_table': 'stats_dailycooccurrencerollup',
+                'ordering': ['date', 'insect_a', 'insect_b'],
+                'unique_together': {('date', 'insect_a', 'insect_b')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyInsectRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True, verbose_name='Ngày phát hiện')),
+                ('insect_name', models.CharField(max_length=100, verbose_name='Tên côn trùng')),
+                ('detections', models.PositiveIntegerField(default=0, verbose_name='Số cá thể phát hiện')),
+                ('results', models.PositiveIntegerField(default=0, verbose_name='Số kết quả có loài này')),
+            ],
+            options={
+                'verbose_name': 'Thống kê Côn trùng theo Ngày',
+                'verbose_name_plural': 'Thống kê Côn trùng theo Ngày',
+                'db_table': 'stats_dailyinsectrollup',
+                'ordering': ['date', 'insect_name'],
+                'unique_together': {('date', 'insect_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-19 11:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('stats', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dashboard_summary', serialize=False, to='accounts.customuser', verbose_name='Người dùng')),
+                ('total_uploads', models.PositiveIntegerField(default=0, verbose_name='Tổng số upload')),
+                ('pending_uploads', models.PositiveIntegerField(default=0, verbose_name='Đang chờ xử lý')),
+                ('processing_uploads', models.PositiveIntegerField(default=0, verbose_name='Đã giao cho RPi')),
+                ('completed_uploads', models.PositiveIntegerField(default=0, verbose_name='Hoàn thành')),
+                ('failed_uploads', models.PositiveIntegerField(default=0, verbose_name='Thất bại')),
+                ('total_results', models.PositiveIntegerField(default=0, verbose_name='Tổng số kết quả')),
+                ('species_counts', models.JSONField(blank=True, default=dict, verbose_name='Các loài đã phát hiện')),
+                ('last_detection_at', models.DateTimeField(blank=True, null=True, verbose_name='Lần phát hiện gần nhất')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Cập nhật lần cuối')),
+            ],
+            options={
+                'verbose_name': 'Tóm tắt Dashboard Người dùng',
+                'verbose_name_plural': 'Tóm tắt Dashboard Người dùng',
+                'db_table': 'stats_usersummary',
+            },
+        ),
+    ]
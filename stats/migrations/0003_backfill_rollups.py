@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def build_rollups(apps, schema_editor):
+    # Dựng rollup từ dữ liệu có sẵn để các cập nhật tăng dần sau đó bắt đầu từ số liệu đúng
+    from stats.rollups import rebuild_rollups
+    rebuild_rollups(
+        apps.get_model('results', 'ProcessingResult').objects.all(),
+        archived_queryset=apps.get_model('results', 'ArchivedProcessingResult').objects.all(),
+        insect_rollup_model=apps.get_model('stats', 'DailyInsectRollup'),
+        pair_rollup_model=apps.get_model('stats', 'DailyCoOccurrenceRollup'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('results', '0004_processingresult_duplicate_count_and_more'),
+        ('stats', '0002_usersummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# stats/models.py
+from django.db import models
+
+
+class DailyInsectRollup(models.Model):
+    """
+    Bảng tổng hợp (rollup) theo ngày và loài côn trùng, được cập nhật tăng dần
+    khi ProcessingResult được tạo/sửa/xóa (stats/signals.py) để các API thống kê
+    không phải quét lại detected_insects_json.
+    """
+    date = models.DateField(db_index=True, verbose_name="Ngày phát hiện")
+    insect_name = models.CharField(max_length=100, verbose_name="Tên côn trùng")
+    detections = models.PositiveIntegerField(default=0, verbose_name="Số cá thể phát hiện")
+    results = models.PositiveIntegerField(default=0, verbose_name="Số kết quả có loài này")
+
+    class Meta:
+        db_table = 'stats_dailyinsectrollup'
+        verbose_name = "Thống kê Côn trùng theo Ngày"
+        verbose_name_plural = "Thống kê Côn trùng theo Ngày"
+        unique_together = ('date', 'insect_name')
+        ordering = ['date', 'insect_name']
+
+    def __str__(self):
+        return f"{self.date} {self.insect_name}: {self.detections}"
+
+
+class DailyCoOccurrenceRollup(models.Model):
+    """
+    Số kết quả (trong một ngày) có cả hai loài cùng xuất hiện.
+    Mỗi cặp chỉ lưu một lần với insect_a < insect_b.
+    """
+    date = models.DateField(db_index=True, verbose_name="Ngày phát hiện")
+    insect_a = models.CharField(max_length=100, verbose_name="Côn trùng A")
+    insect_b = models.CharField(max_length=100, verbose_name="Côn trùng B")
+    results = models.PositiveIntegerField(default=0, verbose_name="Số kết quả có cả hai loài")
+
+    class Meta:
+        db_table = 'stats_dailycooccurrencerollup'
+        verbose_name = "Đồng xuất hiện Côn trùng theo Ngày"
+        verbose_name_plural = "Đồng xuất hiện Côn trùng theo Ngày"
+        unique_together = ('date', 'insect_a', 'insect_b')
+        ordering = ['date', 'insect_a', 'insect_b']
+
+    def __str__(self):
+        return f"{self.date} {self.insect_a} + {self.insect_b}: {self.results}"
+
+
+class UserSummary(models.Model):
+    """
+    Tóm tắt dashboard của một người dùng (materialized): được cập nhật trong cùng
+    transaction khi upload được tạo/đổi trạng thái và khi kết quả được lưu
+    (stats/summaries.py), để dashboard chỉ cần đọc một dòng.
+    """
+    user = models.OneToOneField(
+        'accounts.CustomUser',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='dashboard_summary',
+        verbose_name="Người dùng"
+    )
+    total_uploads = models.PositiveIntegerField(default=0, verbose_name="Tổng số upload")
+    pending_uploads = models.PositiveIntegerField(default=0, verbose_name="Đang chờ xử lý")
+    processing_uploads = models.PositiveIntegerField(default=0, verbose_name="Đã giao cho RPi")
+    completed_uploads = models.PositiveIntegerField(default=0, verbose_name="Hoàn thành")
+    failed_uploads = models.PositiveIntegerField(default=0, verbose_name="Thất bại")
+    total_results = models.PositiveIntegerField(default=0, verbose_name="Tổng số kết quả")
+    # {tên côn trùng: tổng số cá thể đã phát hiện}
+    species_counts = models.JSONField(default=dict, blank=True, verbose_name="Các loài đã phát hiện")
+    last_detection_at = models.DateTimeField(null=True, blank=True, verbose_name="Lần phát hiện gần nhất")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Cập nhật lần cuối")
+
+    class Meta:
+        db_table = 'stats_usersummary'
+        verbose_name = "Tóm tắt Dashboard Người dùng"
+        verbose_name_plural = "Tóm tắt Dashboard Người dùng"
+
+    def __str__(self):
+        return f"Tóm tắt của user {self.user_id}: {self.total_uploads} upload, {self.total_results} kết quả"
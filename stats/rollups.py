@@ -0,0 +1,131 @@
+# stats/rollups.py
+"""
+Cập nhật tăng dần (incremental) các bảng rollup trong stats/models.py.
+
+Mỗi ProcessingResult đóng góp vào ngày phát hiện của nó (theo TIME_ZONE, giống
+`detection_timestamp__date` của FrequencyStatsView):
+- DailyInsectRollup: +số cá thể và +1 kết quả cho mỗi loài có trong kết quả.
+- DailyCoOccurrenceRollup: +1 cho mỗi cặp loài cùng có trong kết quả.
+
+Các thao tác hàng loạt (bulk_create, queryset.update/delete) không phát signal:
+sau khi dùng chúng cần chạy `python manage.py rebuild_stats_rollups`.
+Rollup được dựng lần đầu bởi migration stats/0003_backfill_rollups; phép trừ không xuống dưới 0.
+Kết quả đã lưu trữ vào bảng ArchivedProcessingResult vẫn được tính khi rebuild
+(kết quả lưu trữ ra file NDJSON thì không).
+"""
+from collections import Counter
+from itertools import chain, combinations
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .engine import parse_detected_insects
+from .models import DailyCoOccurrenceRollup, DailyInsectRollup
+
+
+def detection_date(detection_timestamp):
+    if timezone.is_aware(detection_timestamp):
+        return timezone.localdate(detection_timestamp)
+    return detection_timestamp.date()
+
+
+def insect_counts(insects_json):
+    """{tên côn trùng: số cá thể} của một kết quả."""
+    counts = Counter()
+    for insect_data in parse_detected_insects(insects_json):
+        if isinstance(insect_data, dict) and insect_data.get('name'):
+            counts[insect_data['name']] += 1
+    return counts
+
+
+def _add(model, lookup, increments):
+    """Cộng `increments` vào dòng rollup `lookup` (tạo mới nếu chưa có)."""
+    updates = {field: F(field) + value for field, value in increments.items()}
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **increments)
+    except IntegrityError:
+        # Một request khác vừa tạo dòng này
+        model.objects.filter(**lookup).update(**updates)
+
+
+def _subtract(model, lookup, decrements):
+    # Không trừ xuống dưới 0: kết quả có trước khi rollup được dựng có thể chưa được tính vào rollup.
+    # Dùng CASE thay cho GREATEST(F - value, 0): với cột UNSIGNED của MySQL, phép trừ âm lỗi trước khi so sánh.
+    model.objects.filter(**lookup).update(**{
+        field: Case(When(**{f'{field}__gt': value}, then=F(field) - value), default=Value(0))
+        for field, value in decrements.items()
+    })
+    model.objects.filter(**lookup, results__lte=0).delete()
+
+
+def apply_result(detection_timestamp, insects_json, sign=1):
+    """Cộng (sign=1) hoặc trừ (sign=-1) đóng góp của một kết quả vào các bảng rollup."""
+    counts = insect_counts(insects_json)
+    if not counts:
+        return
+    day = detection_date(detection_timestamp)
+    change = _add if sign > 0 else _subtract
+    with transaction.atomic():
+        for insect_name, count in counts.items():
+            change(DailyInsectRollup, {'date': day, 'insect_name': insect_name}, {'detections': count, 'results': 1})
+        for insect_a, insect_b in combinations(sorted(counts), 2):
+            change(DailyCoOccurrenceRollup, {'date': day, 'insect_a': insect_a, 'insect_b': insect_b}, {'results': 1})
+
+
+def rebuild_rollups(results_queryset=None, chunk_size=2000, include_archived=True, archived_queryset=None,
+                    insect_rollup_model=DailyInsectRollup, pair_rollup_model=DailyCoOccurrenceRollup):
+    """
+    Tính lại toàn bộ rollup từ ProcessingResult và bảng lưu trữ ArchivedProcessingResult
+    (dùng sau khi import/xóa hàng loạt; lần đầu triển khai do migration stats/0003 chạy).
+    Migration truyền queryset/model lịch sử qua các tham số.
+    Trả về (số dòng DailyInsectRollup, số dòng DailyCoOccurrenceRollup).
+    """
+    from results.models import ArchivedProcessingResult, ProcessingResult
+
+    if results_queryset is None:
+        results_queryset = ProcessingResult.objects.all()
+    if archived_queryset is None:
+        archived_queryset = ArchivedProcessingResult.objects.all()
+    insect_totals = {} # (ngày, tên) -> [detections, results]
+    pair_totals = Counter() # (ngày, a, b) -> results
+    sources = [results_queryset]
+    if include_archived:
+        sources.append(archived_queryset)
+    rows = chain.from_iterable(
+        source.order_by().values_list('detection_timestamp', 'detected_insects_json').iterator(chunk_size=chunk_size)
+        for source in sources
+    )
+    for detection_timestamp, insects_json in rows:
+        counts = insect_counts(insects_json)
+        if not counts:
+            continue
+        day = detection_date(detection_timestamp)
+        for insect_name, count in counts.items():
+            totals = insect_totals.setdefault((day, insect_name), [0, 0])
+            totals[0] += count
+            totals[1] += 1
+        for insect_a, insect_b in combinations(sorted(counts), 2):
+            pair_totals[(day, insect_a, insect_b)] += 1
+
+    with transaction.atomic():
+        insect_rollup_model.objects.all().delete()
+        pair_rollup_model.objects.all().delete()
+        insect_rollup_model.objects.bulk_create(
+            [
+                insect_rollup_model(date=day, insect_name=insect_name, detections=detections, results=results)
+                for (day, insect_name), (detections, results) in insect_totals.items()
+            ],
+            batch_size=chunk_size,
+        )
+        pair_rollup_model.objects.bulk_create(
+            [
+                pair_rollup_model(date=day, insect_a=insect_a, insect_b=insect_b, results=results)
+                for (day, insect_a, insect_b), results in pair_totals.items()
+            ],
+            batch_size=chunk_size,
+        )
+    return len(insect_totals), len(pair_totals)
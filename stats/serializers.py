@@ -0,0 +1,28 @@
+# stats/serializers.py
+from rest_framework import serializers
+
+from .models import UserSummary
+
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    """Tóm tắt dashboard của người dùng hiện tại."""
+    # [{"name": ..., "detections": ...}] sắp xếp theo số cá thể giảm dần
+    species_seen = serializers.SerializerMethodField()
+    species_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserSummary
+        fields = (
+            'total_uploads', 'pending_uploads', 'processing_uploads', 'completed_uploads', 'failed_uploads',
+            'total_results', 'species_count', 'species_seen', 'last_detection_at', 'updated_at',
+        )
+        read_only_fields = fields
+
+    def get_species_seen(self, obj):
+        return [
+            {'name': name, 'detections': detections}
+            for name, detections in sorted(obj.species_counts.items(), key=lambda item: (-item[1], item[0]))
+        ]
+
+    def get_species_count(self, obj):
+        return len(obj.species_counts)
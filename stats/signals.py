@@ -0,0 +1,111 @@
+# stats/signals.py
+"""
+Giữ các bảng tổng hợp của app stats đồng bộ với dữ liệu gốc:
+- rollup theo ngày/loài (stats/rollups.py) với ProcessingResult;
+- tóm tắt dashboard của từng user (stats/summaries.py) với UserUpload và ProcessingResult.
+
+Kết quả bị xóa để lưu trữ (results/retention.py) không bị trừ khỏi các bảng tổng hợp:
+dữ liệu tổng hợp được giữ vĩnh viễn. Upload bị xóa theo tài khoản (accounts.signals.deleting_users)
+không cập nhật UserSummary từng dòng: summary của user đó bị xóa theo CASCADE.
+"""
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from accounts.signals import user_deletion_in_progress
+from results.models import ProcessingResult
+from results.retention import retention_in_progress
+from uploads.models import UserUpload
+from . import summaries
+from .rollups import apply_result
+
+
+def _result_owner_id(result, source_upload_id):
+    if source_upload_id is None:
+        return None
+    if ProcessingResult.source_upload.is_cached(result) and result.source_upload is not None and result.source_upload.pk == source_upload_id:
+        return result.source_upload.uploaded_by_id
+    return UserUpload.objects.filter(pk=source_upload_id).values_list('uploaded_by_id', flat=True).first()
+
+
+# --- ProcessingResult ---
+@receiver(pre_save, sender=ProcessingResult, dispatch_uid='stats_rollup_result_pre_save')
+def remember_previous_result(sender, instance, raw=False, **kwargs):
+    """Khi sửa một kết quả đã có, lưu lại giá trị cũ để trừ khỏi rollup."""
+    instance._stats_rollup_previous = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._stats_rollup_previous = (
+        ProcessingResult.objects.filter(pk=instance.pk)
+        .values_list('detection_timestamp', 'detected_insects_json', 'source_upload_id')
+        .first()
+    )
+
+
+@receiver(post_save, sender=ProcessingResult, dispatch_uid='stats_rollup_result_saved')
+def update_rollups_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_stats_rollup_previous', None)
+    if not created and previous is not None:
+        if previous[:2] == (instance.detection_timestamp, instance.detected_insects_json):
+            return
+        apply_result(*previous[:2], sign=-1)
+    apply_result(instance.detection_timestamp, instance.detected_insects_json)
+
+
+@receiver(post_delete, sender=ProcessingResult, dispatch_uid='stats_rollup_result_deleted')
+def update_rollups_on_delete(sender, instance, **kwargs):
+    if retention_in_progress():
+        return
+    apply_result(instance.detection_timestamp, instance.detected_insects_json, sign=-1)
+
+
+@receiver(post_save, sender=ProcessingResult, dispatch_uid='stats_summary_result_saved')
+def update_summary_on_result_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        owner_id = _result_owner_id(instance, instance.source_upload_id)
+        if owner_id is not None:
+            summaries.record_result_created(instance, owner_id)
+        return
+    # Sửa kết quả đã có (hiếm): tính lại summary của chủ cũ và chủ mới
+    previous = getattr(instance, '_stats_rollup_previous', None)
+    previous_upload_id = previous[2] if previous is not None else None
+    owner_ids = {_result_owner_id(instance, instance.source_upload_id), _result_owner_id(instance, previous_upload_id)}
+    for owner_id in owner_ids - {None}:
+        summaries.recompute_user_summary(owner_id)
+
+
+@receiver(post_delete, sender=ProcessingResult, dispatch_uid='stats_summary_result_deleted')
+def update_summary_on_result_delete(sender, instance, **kwargs):
+    if retention_in_progress():
+        return
+    owner_id = _result_owner_id(instance, instance.source_upload_id)
+    if owner_id is not None:
+        summaries.record_result_deleted(instance, owner_id)
+
+
+# --- UserUpload ---
+@receiver(post_init, sender=UserUpload, dispatch_uid='stats_summary_upload_init')
+def remember_upload_status(sender, instance, **kwargs):
+    # Không truy cập instance.status nếu trường bị defer (tránh query)
+    instance._stats_summary_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=UserUpload, dispatch_uid='stats_summary_upload_saved')
+def update_summary_on_upload_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        summaries.record_upload_created(instance)
+    elif instance._stats_summary_status is not None:
+        summaries.record_upload_status_changed(instance, instance._stats_summary_status)
+    instance._stats_summary_status = instance.status
+
+
+@receiver(pre_delete, sender=UserUpload, dispatch_uid='stats_summary_upload_deleted')
+def update_summary_on_upload_delete(sender, instance, **kwargs):
+    if user_deletion_in_progress():
+        return
+    summaries.record_upload_deleted(instance)
@@ -0,0 +1,182 @@
+# stats/summaries.py
+"""
+Cập nhật bảng UserSummary (tóm tắt dashboard của từng người dùng).
+
+- Upload được tạo / đổi trạng thái và kết quả (của upload) được tạo: cập nhật tăng dần
+  trên dòng summary đã khóa (select_for_update) trong một transaction; được gọi từ
+  signal nên nếu nơi gọi save() đang ở trong transaction.atomic() thì summary được
+  commit/rollback cùng với thay đổi đó.
+- Xóa upload/kết quả: trừ phần đóng góp của chúng (không tạo summary mới, an toàn khi
+  xóa user kéo theo xóa upload). Sửa kết quả đã có (hiếm): tính lại summary của user đó.
+- `python manage.py rebuild_user_summaries` tính lại summary của mọi user (gồm cả kết quả
+  đã lưu trữ vào bảng ArchivedProcessingResult).
+"""
+from collections import Counter
+from itertools import chain
+
+from django.db import transaction
+from django.db.models import Count
+
+from uploads.models import UserUpload
+from .models import UserSummary
+from .rollups import insect_counts
+
+# Trạng thái upload -> trường đếm tương ứng trong UserSummary
+STATUS_FIELDS = {
+    UserUpload.STATUS_PENDING: 'pending_uploads',
+    UserUpload.STATUS_ASSIGNED: 'processing_uploads',
+    UserUpload.STATUS_COMPLETED: 'completed_uploads',
+    UserUpload.STATUS_FAILED: 'failed_uploads',
+}
+
+
+def _locked_summary(user_id):
+    summary, _ = UserSummary.objects.get_or_create(user_id=user_id)
+    return UserSummary.objects.select_for_update().get(pk=summary.pk)
+
+
+def _adjust_status(summary, status, delta):
+    field = STATUS_FIELDS.get(status)
+    if field:
+        setattr(summary, field, max(getattr(summary, field) + delta, 0))
+
+
+def record_upload_created(upload):
+    with transaction.atomic():
+        summary = _locked_summary(upload.uploaded_by_id)
+        summary.total_uploads += 1
+        _adjust_status(summary, upload.status, 1)
+        summary.save()
+
+
+def record_upload_status_changed(upload, previous_status):
+    if previous_status == upload.status:
+        return
+    with transaction.atomic():
+        summary = _locked_summary(upload.uploaded_by_id)
+        _adjust_status(summary, previous_status, -1)
+        _adjust_status(summary, upload.status, 1)
+        summary.save()
+
+
+def record_result_created(result, user_id):
+    with transaction.atomic():
+        summary = _locked_summary(user_id)
+        summary.total_results += 1
+        species_counts = Counter(summary.species_counts)
+        species_counts.update(insect_counts(result.detected_insects_json))
+        summary.species_counts = dict(species_counts)
+        if summary.last_detection_at is None or result.detection_timestamp > summary.last_detection_at:
+            summary.last_detection_at = result.detection_timestamp
+        summary.save()
+
+
+def _existing_locked_summary(user_id):
+    return UserSummary.objects.select_for_update().filter(pk=user_id).first()
+
+
+def _remove_result(summary, result_id, detection_timestamp, insects_json):
+    from results.models import ProcessingResult
+
+    summary.total_results = max(summary.total_results - 1, 0)
+    species_counts = Counter(summary.species_counts)
+    species_counts.subtract(insect_counts(insects_json))
+    summary.species_counts = {name: count for name, count in species_counts.items() if count > 0}
+    if summary.last_detection_at is not None and detection_timestamp >= summary.last_detection_at:
+        # Kết quả mới nhất bị xóa: tìm lại lần phát hiện gần nhất
+        summary.last_detection_at = (
+            ProcessingResult.objects.filter(source_upload__uploaded_by_id=summary.user_id)
+            .exclude(pk=result_id)
+            .order_by('-detection_timestamp')
+            .values_list('detection_timestamp', flat=True)
+            .first()
+        )
+
+
+def record_upload_deleted(upload):
+    """Gọi TRƯỚC khi xóa upload (pre_delete), khi kết quả của upload vẫn còn liên kết."""
+    from results.models import ProcessingResult
+
+    with transaction.atomic():
+        summary = _existing_locked_summary(upload.uploaded_by_id)
+        if summary is None:
+            return
+        summary.total_uploads = max(summary.total_uploads - 1, 0)
+        _adjust_status(summary, upload.status, -1)
+        result = (
+            ProcessingResult.objects.filter(source_upload_id=upload.pk)
+            .values_list('pk', 'detection_timestamp', 'detected_insects_json')
+            .first()
+        )
+        if result is not None:
+            _remove_result(summary, *result)
+        summary.save()
+
+
+def record_result_deleted(result, user_id):
+    with transaction.atomic():
+        summary = _existing_locked_summary(user_id)
+        if summary is None:
+            return
+        _remove_result(summary, result.pk, result.detection_timestamp, result.detected_insects_json)
+        summary.save()
+
+
+def _compute_summaries(user_ids=None):
+    """Tính summary từ UserUpload và ProcessingResult. Trả về {user_id: UserSummary (chưa lưu)}."""
+    from results.models import ArchivedProcessingResult, ProcessingResult
+
+    summaries = {}
+
+    def summary_for(user_id):
+        if user_id not in summaries:
+            summaries[user_id] = UserSummary(user_id=user_id, species_counts={})
+        return summaries[user_id]
+
+    uploads = UserUpload.objects.order_by()
+    results = ProcessingResult.objects.filter(source_upload__isnull=False).order_by()
+    archived = ArchivedProcessingResult.objects.filter(uploaded_by_id__isnull=False).order_by()
+    if user_ids is not None:
+        uploads = uploads.filter(uploaded_by_id__in=user_ids)
+        results = results.filter(source_upload__uploaded_by_id__in=user_ids)
+        archived = archived.filter(uploaded_by_id__in=user_ids)
+        for user_id in user_ids:
+            summary_for(user_id)
+
+    for row in uploads.values('uploaded_by_id', 'status').annotate(total=Count('id')):
+        summary = summary_for(row['uploaded_by_id'])
+        summary.total_uploads += row['total']
+        _adjust_status(summary, row['status'], row['total'])
+
+    rows = chain(
+        results.values_list('source_upload__uploaded_by_id', 'detection_timestamp', 'detected_insects_json').iterator(chunk_size=2000),
+        archived.values_list('uploaded_by_id', 'detection_timestamp', 'detected_insects_json').iterator(chunk_size=2000),
+    )
+    species = {}
+    for user_id, detection_timestamp, insects_json in rows:
+        summary = summary_for(user_id)
+        summary.total_results += 1
+        species.setdefault(user_id, Counter()).update(insect_counts(insects_json))
+        if summary.last_detection_at is None or detection_timestamp > summary.last_detection_at:
+            summary.last_detection_at = detection_timestamp
+    for user_id, species_counts in species.items():
+        summaries[user_id].species_counts = dict(species_counts)
+    return summaries
+
+
+def recompute_user_summary(user_id):
+    """Tính lại (và lưu) summary của một user."""
+    with transaction.atomic():
+        summary = _compute_summaries([user_id])[user_id]
+        UserSummary.objects.filter(pk=user_id).delete()
+        summary.save(force_insert=True)
+    return summary
+
+
+def rebuild_user_summaries(batch_size=1000):
+    """Tính lại summary của mọi user có upload. Trả về số summary đã ghi."""
+    summaries = _compute_summaries()
+    with transaction.atomic():
+        UserSummary.objects.all().delete()
+        UserSummary.objects.bulk_create(summaries.values(), batch_size=batch_size)
+    return len(summaries)
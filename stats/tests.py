@@ -4,11 +4,18 @@ from datetime import date, datetime, timedelta
 from django.urls import reverse
 from django.utils.timezone import make_aware
 from rest_framework import status
+from unittest import skipUnless
+from django.test import SimpleTestCase
 from rest_framework.test import APITestCase
 
 # Import models từ các app khác
 from accounts.models import CustomUser
 from results.models import ProcessingResult, UserUpload # Cần cả hai
+from .aggregation import build_frequency_chart
+from .engine import NUMPY_AVAILABLE, build_frequency_matrix
+from .models import DailyCoOccurrenceRollup, DailyInsectRollup, UserSummary
+from .rollups import rebuild_rollups
+from .summaries import rebuild_user_summaries
 
 # Import thư viện hash
 from argon2 import PasswordHasher
@@ -125,4 +132,243 @@ class FrequencyStatsViewTest(APITestCase):
         """Kiểm tra lỗi khi chưa đăng nhập."""
         self.client.credentials() # Xóa token
         response = self.client.get(self.url, {'start_date': '2025-05-01', 'end_date': '2025-05-01'})
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_get_frequency_stats_with_derived_series(self):
+        """Kiểm tra ?include= trả thêm trung bình trượt, đồng xuất hiện và ngày xuất hiện đầu tiên."""
+        response = self.client.get(self.url, {
+            'start_date': '2025-05-01', 'end_date': '2025-05-03',
+            'include': 'rolling_average,co_occurrence,first_appearance',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['first_appearance'], {'BoCanhCam': '2025-05-01', 'MuoiVang': '2025-05-01', 'SauXanh': '2025-05-03'})
+        self.assertEqual(response.data['co_occurrence']['labels'], ['BoCanhCam', 'MuoiVang', 'SauXanh'])
+        self.assertEqual(response.data['co_occurrence']['matrix'], [[2, 1, 0], [1, 1, 0], [0, 0, 1]])
+        muoi_vang = next(ds for ds in response.data['rolling_average'] if ds['label'] == 'MuoiVang')
+        self.assertEqual(muoi_vang['data'], [2.0, 1.0, 0.6667]) # 2 lần phát hiện ngày 1
+
+    def test_get_frequency_stats_invalid_include(self):
+        """Kiểm tra lỗi khi include có giá trị không hỗ trợ."""
+        response = self.client.get(self.url, {'start_date': '2025-05-01', 'end_date': '2025-05-03', 'include': 'unknown'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class BuildFrequencyChartTest(SimpleTestCase):
+    """Test logic tổng hợp tách khỏi FrequencyStatsView (không cần DB)."""
+
+    def test_counts_each_insect_once_per_day(self):
+        day1, day2 = date(2025, 5, 1), date(2025, 5, 2)
+        rows = [
+            (day1, [{'name': 'MuoiVang'}, {'name': 'MuoiVang'}]),
+            (day1, json.dumps([{'name': 'BoCanhCam'}])), # Dữ liệu cũ dạng chuỗi JSON
+            (day2, 'not json'), # Dữ liệu hỏng bị bỏ qua
+            (day2, [{'name': 'MuoiVang'}, {'confidence': 0.5}]),
+        ]
+        chart = build_frequency_chart(rows, day1, day2)
+        self.assertEqual(chart['labels'], ['2025-05-01', '2025-05-02'])
+        self.assertEqual(chart['datasets'], [
+            {'label': 'BoCanhCam', 'data': [1, 0]},
+            {'label': 'MuoiVang', 'data': [1, 1]},
+        ])
+
+
+class FrequencyMatrixTest(SimpleTestCase):
+    """Test engine ma trận côn trùng × ngày và các chuỗi dẫn xuất."""
+
+    def setUp(self):
+        self.start, self.end = date(2025, 5, 1), date(2025, 5, 4)
+        self.rows = [
+            (date(2025, 5, 1), [{'name': 'MuoiVang'}, {'name': 'MuoiVang'}, {'name': 'BoCanhCam'}]),
+            (date(2025, 5, 2), [{'name': 'MuoiVang'}]),
+            (date(2025, 5, 4), [{'name': 'SauXanh'}, {'name': 'MuoiVang'}]),
+            (date(2025, 4, 30), [{'name': 'NgoaiKhoang'}]), # Ngoài khoảng ngày: bỏ qua
+        ]
+
+    def _check(self, matrix):
+        self.assertEqual(matrix.labels, ['BoCanhCam', 'MuoiVang', 'SauXanh'])
+        self.assertEqual(matrix.count_matrix(), [[1, 0, 0, 0], [2, 1, 0, 1], [0, 0, 0, 1]])
+        self.assertEqual(matrix.presence_matrix(), [[1, 0, 0, 0], [1, 1, 0, 1], [0, 0, 0, 1]])
+        self.assertEqual(matrix.rolling_average(window=2), [[1.0, 0.5, 0.0, 0.0], [2.0, 1.5, 0.5, 0.5], [0.0, 0.0, 0.0, 0.5]])
+        self.assertEqual(matrix.co_occurrence(), [[1, 1, 0], [1, 3, 1], [0, 1, 1]])
+        self.assertEqual(matrix.first_appearance(), ['2025-05-01', '2025-05-01', '2025-05-04'])
+
+    def test_anomalies(self):
+        """Ngày có số lượng vượt baseline trượt của các ngày trước bị đánh dấu (cả hai backend)."""
+        rows = [(date(2025, 5, day), [{'name': 'MuoiVang'}]) for day in range(1, 8)]
+        rows += [(date(2025, 5, 8), [{'name': 'MuoiVang'}] * 6)]
+        for use_numpy in {False, NUMPY_AVAILABLE}:
+            matrix = build_frequency_matrix(rows, date(2025, 5, 1), date(2025, 5, 8), use_numpy=use_numpy)
+            self.assertEqual(matrix.anomalies(window=7, std_multiplier=3.0, min_count=3), [(0, 7, 6, 1.0, 0.0)])
+            self.assertEqual(matrix.anomalies(window=7, std_multiplier=3.0, min_count=10), [])
+            self.assertEqual(matrix.window_totals(4, 7), [9])
+
+    def test_array_fallback(self):
+        self._check(build_frequency_matrix(self.rows, self.start, self.end, use_numpy=False))
+
+    @skipUnless(NUMPY_AVAILABLE, "Cần NumPy")
+    def test_numpy_backend(self):
+        self._check(build_frequency_matrix(self.rows, self.start, self.end, use_numpy=True))
+
+    def test_empty_range(self):
+        matrix = build_frequency_matrix([], self.start, self.end)
+        self.assertEqual(matrix.labels, [])
+        self.assertEqual(matrix.presence_matrix(), [])
+        self.assertEqual(matrix.co_occurrence(), [])
+
+
+class InsectAnalyticsTest(APITestCase):
+    """Test bảng rollup (cập nhật qua signal) và API /api/stats/analytics/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(email='analytics@example.com', password_hash=ph.hash('analyticspass'), is_active=True)
+        cls.url = reverse('stats-analytics')
+
+    def setUp(self):
+        response = self.client.post(reverse('accounts:user_login'), {'email': 'analytics@example.com', 'password': 'analyticspass'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def _create(self, day, names):
+        return ProcessingResult.objects.create(
+            detection_timestamp=make_aware(datetime(2025, 5, day, 9, 0)),
+            detected_insects_json=[{'name': name, 'confidence': 0.9} for name in names],
+        )
+
+    def _rollups(self):
+        return (
+            sorted(DailyInsectRollup.objects.values_list('date__day', 'insect_name', 'detections', 'results')),
+            sorted(DailyCoOccurrenceRollup.objects.values_list('date__day', 'insect_a', 'insect_b', 'results')),
+        )
+
+    def test_rollups_follow_create_update_delete(self):
+        """Tạo/sửa/xóa kết quả cập nhật rollup giống như tính lại từ đầu."""
+        first = self._create(1, ['MuoiVang', 'MuoiVang', 'BoCanhCam'])
+        self._create(1, ['MuoiVang'])
+        self.assertEqual(self._rollups(), (
+            [(1, 'BoCanhCam', 1, 1), (1, 'MuoiVang', 3, 2)],
+            [(1, 'BoCanhCam', 'MuoiVang', 1)],
+        ))
+
+        first.detected_insects_json = [{'name': 'SauXanh'}]
+        first.save()
+        self.assertEqual(self._rollups(), ([(1, 'MuoiVang', 1, 1), (1, 'SauXanh', 1, 1)], []))
+        incremental = self._rollups()
+        rebuild_rollups()
+        self.assertEqual(self._rollups(), incremental)
+
+        first.delete()
+        self.assertEqual(self._rollups(), ([(1, 'MuoiVang', 1, 1)], []))
+
+    def test_delete_result_created_before_rollups(self):
+        """Xóa kết quả chưa được tính vào rollup (có trước khi dựng rollup) không làm bộ đếm âm."""
+        older = ProcessingResult.objects.bulk_create([ProcessingResult( # bulk_create: không phát signal
+            detection_timestamp=make_aware(datetime(2025, 5, 1, 8, 0)),
+            detected_insects_json=[{'name': 'MuoiVang'}] * 5,
+        )])[0]
+        self._create(1, ['MuoiVang'])
+        self._create(1, ['MuoiVang'])
+        ProcessingResult.objects.get(pk=older.pk).delete()
+        self.assertEqual(self._rollups(), ([(1, 'MuoiVang', 0, 1)], []))
+
+    def test_analytics_endpoint(self):
+        """API trả về đồng xuất hiện, xu hướng tuần và bất thường mà không cần quét ProcessingResult."""
+        for day in range(1, 8): # Tuần trước: mỗi ngày 1 MuoiVang
+            self._create(day, ['MuoiVang'])
+        for day in range(8, 14): # Tuần này: MuoiVang + BoCanhCam
+            self._create(day, ['MuoiVang', 'BoCanhCam'])
+        self._create(14, ['MuoiVang'] * 6 + ['BoCanhCam'])
+
+        with self.assertNumQueries(3): # Xác thực user + đọc 2 bảng rollup
+            response = self.client.get(self.url, {'start_date': '2025-05-08', 'end_date': '2025-05-14'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertEqual(data['co_occurrence']['same_result'], [{'insects': ['BoCanhCam', 'MuoiVang'], 'results': 7}])
+        self.assertEqual(data['co_occurrence']['same_day'], [{'insects': ['BoCanhCam', 'MuoiVang'], 'days': 7}])
+        self.assertEqual(data['trends'], [
+            {'insect': 'BoCanhCam', 'current_week': 7, 'previous_week': 0, 'delta': 7, 'delta_percent': None},
+            {'insect': 'MuoiVang', 'current_week': 12, 'previous_week': 7, 'delta': 5, 'delta_percent': 71.43},
+        ])
+        self.assertEqual(data['anomalies'], [
+            {'insect': 'MuoiVang', 'date': '2025-05-14', 'count': 6, 'baseline_mean': 1.0, 'baseline_std': 0.0},
+        ])
+
+    def test_analytics_invalid_date(self):
+        response = self.client.get(self.url, {'start_date': '2025-05-10', 'end_date': '2025-05-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UserSummaryTest(APITestCase):
+    """Test tóm tắt dashboard theo user (stats.UserSummary) và API /api/stats/my-summary/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(email='summary@example.com', password_hash=ph.hash('summarypass'), is_active=True)
+        cls.other = CustomUser.objects.create(email='summary_other@example.com', password_hash=ph.hash('otherpass'), is_active=True)
+        cls.url = reverse('stats-my-summary')
+
+    def setUp(self):
+        response = self.client.post(reverse('accounts:user_login'), {'email': 'summary@example.com', 'password': 'summarypass'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def _upload(self, user, name):
+        return UserUpload.objects.create(uploaded_by=user, file=f'user_uploads/{user.id}/{name}.jpg')
+
+    def _result(self, upload, day, names):
+        return ProcessingResult.objects.create(
+            source_upload=upload,
+            detection_timestamp=make_aware(datetime(2025, 5, day, 9, 0)),
+            detected_insects_json=[{'name': name, 'confidence': 0.9} for name in names],
+        )
+
+    def _summary_values(self, user):
+        summary = UserSummary.objects.get(pk=user.pk)
+        return (
+            summary.total_uploads, summary.pending_uploads, summary.processing_uploads,
+            summary.completed_uploads, summary.failed_uploads, summary.total_results,
+            summary.species_counts, summary.last_detection_at,
+        )
+
+    def test_summary_tracks_uploads_and_results(self):
+        """Tạo upload, đổi trạng thái, lưu/xóa kết quả cập nhật summary giống như tính lại từ đầu."""
+        first = self._upload(self.user, 'a')
+        second = self._upload(self.user, 'b')
+        self._upload(self.other, 'c')
+        second.status = UserUpload.STATUS_ASSIGNED
+        second.save(update_fields=['status'])
+        self._result(first, 1, ['MuoiVang', 'MuoiVang'])
+        first.status = UserUpload.STATUS_COMPLETED
+        first.save(update_fields=['status'])
+        latest = self._result(second, 3, ['SauXanh', 'MuoiVang'])
+        second.status = UserUpload.STATUS_FAILED
+        second.save(update_fields=['status'])
+        self._result(None, 4, ['BoCanhCam']) # Kết quả từ camera: không thuộc user nào
+
+        expected = (2, 0, 0, 1, 1, 2, {'MuoiVang': 3, 'SauXanh': 1}, make_aware(datetime(2025, 5, 3, 9, 0)))
+        self.assertEqual(self._summary_values(self.user), expected)
+        rebuild_user_summaries()
+        self.assertEqual(self._summary_values(self.user), expected)
+
+        latest.delete()
+        self.assertEqual(self._summary_values(self.user), (2, 0, 0, 1, 1, 1, {'MuoiVang': 2}, make_aware(datetime(2025, 5, 1, 9, 0))))
+        first.delete()
+        self.assertEqual(self._summary_values(self.user), (1, 0, 0, 0, 1, 0, {}, None))
+
+    def test_my_summary_is_single_row_lookup(self):
+        upload = self._upload(self.user, 'a')
+        self._result(upload, 2, ['MuoiVang', 'BoCanhCam', 'MuoiVang'])
+        with self.assertNumQueries(2): # Xác thực user + đọc một dòng summary
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_uploads'], 1)
+        self.assertEqual(response.data['pending_uploads'], 1)
+        self.assertEqual(response.data['total_results'], 1)
+        self.assertEqual(response.data['species_count'], 2)
+        self.assertEqual(response.data['species_seen'], [{'name': 'MuoiVang', 'detections': 2}, {'name': 'BoCanhCam', 'detections': 1}])
+
+    def test_missing_summary_is_computed(self):
+        """User chưa có dòng summary (dữ liệu cũ) thì được tính lại khi xem lần đầu."""
+        self._upload(self.user, 'a')
+        UserSummary.objects.all().delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_uploads'], 1)
+        self.assertTrue(UserSummary.objects.filter(pk=self.user.pk).exists())
@@ -5,5 +5,9 @@ from . import views # Import views từ app stats
 urlpatterns = [
     # Định nghĩa URL cho API thống kê tần suất
     path('frequency/', views.FrequencyStatsView.as_view(), name='stats-frequency'),
+    # Phân tích đồng xuất hiện, xu hướng tuần và bất thường (từ bảng rollup)
+    path('analytics/', views.InsectAnalyticsView.as_view(), name='stats-analytics'),
+    # Tóm tắt dashboard của người dùng đang đăng nhập
+    path('my-summary/', views.MySummaryView.as_view(), name='stats-my-summary'),
     # Thêm các URL cho các loại thống kê khác sau này nếu cần
 ]
\ No newline at end of file
@@ -2,83 +2,100 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import permissions, status
-from datetime import date, timedelta, datetime # Import datetime đầy đủ
-from collections import defaultdict
-import json # Để parse JSON an toàn hơn
+from datetime import date, timedelta
 
 # Import models và permissions
 from results.models import ProcessingResult # <<< QUAN TRỌNG: Import từ results
+from results.filters import day_range
 from accounts.permissions import IsAuthenticatedCustom # <<< Import permission
+from main_config.db.routers import ReplicaReadMixin
+from .aggregation import DERIVED_SERIES, build_frequency_chart
+from .analytics import build_analytics
+from .models import UserSummary
+from .serializers import UserSummarySerializer
+from .summaries import recompute_user_summary
 
-class FrequencyStatsView(APIView):
+
+def parse_date_range(query_params, default_days):
+    """
+    Đọc start_date/end_date (YYYY-MM-DD) từ query params. Mặc định là `default_days` ngày
+    gần nhất tính đến hôm nay. Raise ValueError nếu ngày sai định dạng hoặc start > end.
+    """
+    today = date.today()
+    end_date_str = query_params.get('end_date', today.isoformat())
+    default_start_date = today - timedelta(days=default_days - 1)
+    start_date_str = query_params.get('start_date', default_start_date.isoformat())
+    start_date = date.fromisoformat(start_date_str)
+    end_date = date.fromisoformat(end_date_str)
+    if start_date > end_date:
+        raise ValueError("Ngày bắt đầu không thể sau ngày kết thúc.")
+    return start_date, end_date
+
+
+class FrequencyStatsView(ReplicaReadMixin, APIView):
     """
     API endpoint để lấy dữ liệu tần suất xuất hiện côn trùng.
     Mỗi loại côn trùng chỉ được tính tối đa 1 lần cho mỗi ngày nó xuất hiện.
     GET: /api/stats/frequency/?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+    Tùy chọn ?include=rolling_average,co_occurrence,first_appearance để lấy thêm các chuỗi dẫn xuất
+    (trung bình trượt 7 ngày, ma trận đồng xuất hiện, ngày xuất hiện đầu tiên).
     """
     permission_classes = [IsAuthenticatedCustom] # Yêu cầu đăng nhập để xem thống kê
 
     def get(self, request, *args, **kwargs):
         # 1. Lấy và Validate Ngày Tháng từ Query Params
         try:
-            today = date.today()
-            end_date_str = request.query_params.get('end_date', today.isoformat())
-            default_start_date = today - timedelta(days=6)
-            start_date_str = request.query_params.get('start_date', default_start_date.isoformat())
-            start_date = date.fromisoformat(start_date_str)
-            end_date = date.fromisoformat(end_date_str)
-            if start_date > end_date:
-                raise ValueError("Ngày bắt đầu không thể sau ngày kết thúc.")
+            start_date, end_date = parse_date_range(request.query_params, default_days=7)
         except ValueError as e:
             return Response({'error': f'Ngày không hợp lệ: {e}. Dùng định dạng YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
 
+        include = [name for name in request.query_params.get('include', '').split(',') if name]
+        unknown = [name for name in include if name not in DERIVED_SERIES]
+        if unknown:
+            return Response({'error': f"Giá trị include không hợp lệ: {', '.join(unknown)}. Chọn trong: {', '.join(DERIVED_SERIES)}."}, status=status.HTTP_400_BAD_REQUEST)
+
         # 2. Truy vấn dữ liệu thô từ DB trong khoảng thời gian
+        # Khoảng timestamp [00:00 start_date, 00:00 ngày sau end_date) thay cho __date__range để dùng được index
+        range_start, range_end = day_range(start_date, end_date)
         results_queryset = ProcessingResult.objects.filter(
-            detection_timestamp__date__range=[start_date, end_date]
-        ).values_list('detection_timestamp__date', 'detected_insects_json')
-
-        # 3. Xử lý trong Python để lấy các cặp (Ngày, Tên côn trùng) duy nhất
-        daily_presence = set()
-        all_insect_names = set()
-
-        for detection_date, insects_json_str in results_queryset:
-            insects = []
-            try:
-                if isinstance(insects_json_str, str):
-                    insects = json.loads(insects_json_str)
-                elif isinstance(insects_json_str, list):
-                    insects = insects_json_str
-                if not isinstance(insects, list): continue
-
-                for insect_data in insects:
-                    if isinstance(insect_data, dict) and 'name' in insect_data:
-                        insect_name = insect_data['name']
-                        if insect_name:
-                            presence_entry = (detection_date, insect_name)
-                            daily_presence.add(presence_entry)
-                            all_insect_names.add(insect_name)
-            except json.JSONDecodeError: continue
-            except Exception as e:
-                print(f"Error processing record for {detection_date}: {e}")
-                continue
-
-        # 4. Chuẩn bị dữ liệu cho Chart.js
-        date_list = [start_date + timedelta(days=x) for x in range((end_date - start_date).days + 1)]
-        labels = [d.strftime('%Y-%m-%d') for d in date_list]
-        date_index_map = {d: i for i, d in enumerate(date_list)}
-        sorted_insect_names = sorted(list(all_insect_names))
-        datasets = []
-        for name in sorted_insect_names:
-            data_points = [0] * len(labels)
-            for day, insect_name_found in daily_presence:
-                if insect_name_found == name and day in date_index_map:
-                    index = date_index_map[day]
-                    data_points[index] = 1
-            datasets.append({'label': name, 'data': data_points})
+            detection_timestamp__gte=range_start, detection_timestamp__lt=range_end
+        ).values_list('detection_timestamp__date', 'detected_insects_json').iterator(chunk_size=2000)
+
+        # 3-4. Lấy các cặp (Ngày, Tên côn trùng) duy nhất và chuẩn bị dữ liệu cho Chart.js
+        chart_data = build_frequency_chart(results_queryset, start_date, end_date, include=include)
 
         # 5. Trả về Response JSON
-        chart_data = {
-            'labels': labels,
-            'datasets': datasets,
-        }
-        return Response(chart_data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(chart_data, status=status.HTTP_200_OK)
+
+
+class InsectAnalyticsView(APIView):
+    """
+    API phân tích côn trùng cho nhà nông học (đọc từ bảng rollup, không quét lại kết quả):
+    các cặp loài xuất hiện cùng nhau (cùng kết quả / cùng ngày), xu hướng tuần này so với
+    tuần trước và các ngày có số lượng tăng bất thường so với baseline 7 ngày.
+    GET: /api/stats/analytics/?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD (mặc định 30 ngày gần nhất)
+    """
+    permission_classes = [IsAuthenticatedCustom]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            start_date, end_date = parse_date_range(request.query_params, default_days=30)
+        except ValueError as e:
+            return Response({'error': f'Ngày không hợp lệ: {e}. Dùng định dạng YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(build_analytics(start_date, end_date), status=status.HTTP_200_OK)
+
+
+class MySummaryView(APIView):
+    """
+    Tóm tắt dashboard của người dùng đang đăng nhập (số upload theo trạng thái, số kết quả,
+    các loài đã phát hiện, lần phát hiện gần nhất), đọc từ một dòng UserSummary.
+    GET: /api/stats/my-summary/
+    """
+    permission_classes = [IsAuthenticatedCustom]
+
+    def get(self, request, *args, **kwargs):
+        summary = UserSummary.objects.filter(pk=request.user.id).first()
+        if summary is None:
+            # Chưa có summary (user chưa upload hoặc dữ liệu trước khi có bảng này): tính một lần
+            summary = recompute_user_summary(request.user.id)
+        return Response(UserSummarySerializer(summary).data, status=status.HTTP_200_OK)
@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-19 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('uploads', '0002_userupload_status_userupload_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userupload',
+            index=models.Index(fields=['uploaded_by', '-upload_time'], name='upload_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userupload',
+            index=models.Index(fields=['status', 'id'], name='upload_status_id_idx'),
+        ),
+    ]
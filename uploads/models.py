@@ -50,6 +50,12 @@ class UserUpload(models.Model):
         verbose_name = "File Người dùng Tải lên"
         verbose_name_plural = "File Người dùng Tải lên"
         ordering = ['-upload_time']
+        indexes = [
+            # Upload của một user, mới nhất trước
+            models.Index(fields=['uploaded_by', '-upload_time'], name='upload_user_time_idx'),
+            # Hàng đợi xử lý: status IN (pending, assigned) theo thứ tự id (notifications/progress.py)
+            models.Index(fields=['status', 'id'], name='upload_status_id_idx'),
+        ]
 
     def __str__(self):
         email = self.uploaded_by.email if self.uploaded_by else 'N/A'
@@ -39,4 +39,11 @@ class UserUploadSerializer(serializers.ModelSerializer):
             'uploaded_by_info',
             'uploaded_by' # <<< THÊM VÀO ĐÂY
         )
-        # Không cần extra_kwargs cho 'file' ở đây vì nó được xử lý trong perform_create
\ No newline at end of file
+        # Không cần extra_kwargs cho 'file' ở đây vì nó được xử lý trong perform_create
+
+class UploadProgressInputSerializer(serializers.Serializer):
+    """Validate dữ liệu tiến độ do RPi gửi lên cho một upload."""
+    stage = serializers.ChoiceField(choices=['claimed', 'processing'])
+    percent = serializers.FloatField(required=False, allow_null=True, min_value=0, max_value=100)
+    # Các phát hiện tạm thời (cùng cấu trúc với detected_insects_json)
+    partial_detections = serializers.ListField(child=serializers.DictField(), required=False, allow_empty=True)
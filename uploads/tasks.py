@@ -0,0 +1,10 @@
+# uploads/tasks.py
+"""Tác vụ nền sau khi UserUpload hoàn thành (xem jobs/)."""
+from jobs.registry import register_job
+from notifications.progress import broadcast_queue_positions
+
+
+@register_job('uploads.broadcast_queue_positions')
+def broadcast_queue_positions_job():
+    """Hàng đợi đã dịch chuyển (một upload vừa hoàn thành): gửi lại vị trí cho các upload đang chờ."""
+    broadcast_queue_positions()
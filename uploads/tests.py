@@ -1,13 +1,28 @@
 # uploads/tests.py
-from django.test import TestCase, RequestFactory
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import path, reverse
 from django.utils.timezone import now # Import now để so sánh thời gian nếu cần
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
 import os
 
 # Import models và serializers từ app uploads và accounts
 from .models import UserUpload
 from .serializers import UserUploadSerializer
 from accounts.models import CustomUser # Cần để tạo user cho upload
+from jobs.models import OutboxMessage
+from notifications.acl import upload_acl
+from notifications.consumers import UploadStatusConsumer
+from notifications.tests import ScopeUserMiddleware
 
 # Import thư viện hash
 from argon2 import PasswordHasher
@@ -138,4 +153,138 @@ class UserUploadSerializerTest(TestCase):
 
         # Kiểm tra xem các trường read_only có bị thay đổi không
         self.assertEqual(updated_instance.uploaded_by, self.user) # Phải là user gốc
-        self.assertEqual(updated_instance.upload_time, original_upload_time) # Phải là thời gian gốc
\ No newline at end of file
+        self.assertEqual(updated_instance.upload_time, original_upload_time) # Phải là thời gian gốc
+
+
+class UserUploadAPITest(APITestCase):
+    """Test cho POST /api/uploads/upload/ (UserUploadAPIView)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(email='uploadapi@example.com', password_hash=ph.hash('uploadpass'))
+        cls.url = reverse('user-upload')
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        response = self.client.post(reverse('accounts:user_login'), {'email': 'uploadapi@example.com', 'password': 'uploadpass'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def _upload(self):
+        return self.client.post(self.url, {'file': SimpleUploadedFile('api_upload.jpg', b'jpeg', 'image/jpeg')}, format='multipart')
+
+    def test_upload_writes_task_and_queued_progress_to_outbox(self):
+        """Một upload ghi dòng outbox giao task cho RPi và vị trí hàng đợi; upload ở trạng thái 'pending'."""
+        response = self._upload()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload = UserUpload.objects.get(pk=response.data['id'])
+        self.assertEqual(upload.status, UserUpload.STATUS_PENDING) # Chỉ thành 'assigned_to_rpi' khi RPi báo claimed
+        rows = list(OutboxMessage.objects.order_by('id').values_list('group', 'message'))
+        self.assertEqual(rows, [
+            ('rpi_workers_group', {'type': 'rpi.new.task', 'message': {'type': 'new_upload', 'upload_id': upload.id}}),
+            (f'upload_{upload.id}_status', {'type': 'send.upload.progress', 'message': {
+                'type': 'upload_progress', 'upload_id': upload.id, 'stage': 'queued', 'queue_position': 1,
+            }}),
+        ])
+
+    def test_failed_save_leaves_no_upload_or_outbox_rows(self):
+        """Lỗi giữa chừng rollback cả upload lẫn các dòng outbox đã ghi."""
+        with mock.patch('uploads.views.get_queue_position', side_effect=RuntimeError("Lỗi DB")):
+            with self.assertRaises(RuntimeError):
+                self._upload()
+        self.assertFalse(UserUpload.objects.exists())
+        self.assertFalse(OutboxMessage.objects.exists())
+
+
+RPI_KEY = 'test-rpi-key'
+
+
+@override_settings(RPI_API_KEY=RPI_KEY)
+class UploadProgressAPITest(APITestCase):
+    """Test cho POST /api/uploads/progress/<id>/ (UploadProgressAPIView)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(email='progressapi@example.com', password_hash=ph.hash('progresspass'))
+        cls.upload = UserUpload.objects.create(uploaded_by=cls.user, file=SimpleUploadedFile('progress.jpg', b'p', 'image/jpeg'))
+
+    def _report(self, upload_id, key=RPI_KEY, **data):
+        headers = {'HTTP_X_RPI_KEY': key} if key is not None else {}
+        return self.client.post(reverse('upload-progress', args=[upload_id]), data, format='json', **headers)
+
+    def test_requests_without_valid_rpi_key_are_rejected(self):
+        """Client không có khóa RPi không phát được tiến độ giả tới người dùng."""
+        for key in (None, 'wrong-key'):
+            with self.subTest(key=key):
+                response = self._report(self.upload.id, key=key, stage='processing', percent=50)
+                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        with self.settings(RPI_API_KEY=''): # Chưa cấu hình khóa: từ chối mọi request
+            self.assertEqual(self._report(self.upload.id, key='', stage='processing').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_unknown_upload_returns_404(self):
+        response = self._report(self.upload.id + 1000, stage='processing', percent=10)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_finished_upload_returns_409(self):
+        """Upload đã hoàn thành/thất bại không nhận thêm tiến độ."""
+        for final_status in (UserUpload.STATUS_COMPLETED, UserUpload.STATUS_FAILED):
+            with self.subTest(status=final_status):
+                UserUpload.objects.filter(pk=self.upload.pk).update(status=final_status)
+                response = self._report(self.upload.id, stage='processing', percent=10)
+                self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_invalid_stage_returns_400(self):
+        """'queued' do server tự phát, RPi không được gửi."""
+        response = self._report(self.upload.id, stage='queued')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('stage', response.data)
+
+    def test_claimed_moves_pending_upload_to_assigned(self):
+        self.assertEqual(self.upload.status, UserUpload.STATUS_PENDING)
+        response = self._report(self.upload.id, stage='claimed')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.status, UserUpload.STATUS_ASSIGNED)
+
+
+@override_settings(RPI_API_KEY=RPI_KEY, UPLOAD_STATUS_MAX_MESSAGES_PER_SECOND=4)
+class UploadProgressRelayTest(TransactionTestCase):
+    """Tiến độ RPi báo qua API tới được WebSocket của chủ upload."""
+
+    def setUp(self):
+        upload_acl.clear()
+        self.user = CustomUser.objects.create(email='progressws@example.com', password_hash=ph.hash('progresspass'))
+        self.upload = UserUpload.objects.create(uploaded_by=self.user, file=SimpleUploadedFile('relay.jpg', b'r', 'image/jpeg'))
+        self.client = APIClient()
+
+    def test_progress_reaches_connected_consumer_within_rate_limit(self):
+        application = ScopeUserMiddleware(
+            URLRouter([path('ws/upload-status/<int:upload_id>/', UploadStatusConsumer.as_asgi())]),
+            self.user
+        )
+        url = reverse('upload-progress', args=[self.upload.id])
+        post = sync_to_async(self.client.post)
+
+        async def scenario():
+            communicator = WebsocketCommunicator(application, f'/ws/upload-status/{self.upload.id}/')
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.receive_json_from() # snapshot 'queued'
+
+            for percent in (10, 50, 90):
+                response = await post(url, {'stage': 'processing', 'percent': percent}, format='json', HTTP_X_RPI_KEY=RPI_KEY)
+                self.assertEqual(response.data['status'], 'progress_relayed')
+
+            first = await communicator.receive_json_from(timeout=1)
+            self.assertEqual((first['stage'], first['percent']), ('processing', 10))
+            # Hai sự kiện sau được gộp, gửi trong khoảng 1/UPLOAD_STATUS_MAX_MESSAGES_PER_SECOND giây
+            started = time.monotonic()
+            merged = await communicator.receive_json_from(timeout=1)
+            self.assertEqual(merged['percent'], 90)
+            self.assertLess(time.monotonic() - started, 0.25 + 0.2)
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
@@ -1,34 +1,33 @@
 # uploads/views.py
 import base64
+import logging
 import os
-import traceback # Để log lỗi chi tiết
-import json      # Để tạo message cho WebSocket
-from django.http import Http404
+from django.db import transaction
 from django.shortcuts import get_object_or_404
-from django.utils import timezone # Import timezone nếu bạn cập nhật updated_at
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.exceptions import ValidationError, PermissionDenied
 
-# Import Channels (để gửi thông báo trigger RPi)
-try:
-    from channels.layers import get_channel_layer
-    from asgiref.sync import async_to_sync
-    CHANNELS_INSTALLED_SUCCESSFULLY = True
-except ImportError:
-    print("WARNING: Django Channels is not installed or configured properly. RPi trigger via WebSocket will not work.")
-    get_channel_layer = lambda: None
-    async_to_sync = lambda func: func
-    CHANNELS_INSTALLED_SUCCESSFULLY = False
-
 # Import từ các app khác
 from .models import UserUpload
-from .serializers import UserUploadSerializer # Serializer để trả về thông tin
+from .serializers import UserUploadSerializer, UploadProgressInputSerializer # Serializer để trả về thông tin
 from accounts.models import CustomUser # Import CustomUser để kiểm tra type nếu cần
 # Import các permission cần thiết từ accounts/permissions.py
-from accounts.permissions import IsAuthenticatedCustom, IsRegularUserType
+from accounts.permissions import HasRPiAPIKey, IsAuthenticatedCustom, IsRegularUserType
+# Tiện ích phát sự kiện tiến độ lên kênh upload-status
+from notifications.progress import (
+    send_upload_progress, build_progress_payload, get_queue_position, get_upload_status_group_name, STAGE_QUEUED, STAGE_CLAIMED,
+)
+# Thông báo WebSocket gửi sau commit
+from jobs.outbox import publish
+# Đo thời gian các phần của request (RequestTimingMiddleware)
+from monitoring.profiling import SPAN_STORAGE, profile_span
+
+logger = logging.getLogger(__name__)
+
+RPI_GROUP_NAME = "rpi_workers_group" # Group RPi lắng nghe
 
 # --- 1. API ĐỂ USER THƯỜNG UPLOAD FILE (ĐÃ THÊM LOGIC TRIGGER RPI) ---
 class UserUploadAPIView(generics.CreateAPIView):
@@ -49,11 +48,11 @@ class UserUploadAPIView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         """
-        Lưu file, gán người dùng, và gửi thông báo task mới cho RPi qua WebSocket.
+        Lưu file, gán người dùng, và ghi thông báo task mới cho RPi vào outbox.
         """
         current_user = self.request.user
         if not isinstance(current_user, CustomUser) or not current_user.is_regular_user:
-            print(f"ERROR in perform_create: User {current_user} is not a valid regular user.")
+            logger.error("perform_create: User %s is not a valid regular user.", current_user)
             raise PermissionDenied("Lỗi quyền không mong đợi.")
 
         file_obj = self.request.FILES.get('file')
@@ -63,57 +62,73 @@ class UserUploadAPIView(generics.CreateAPIView):
         # (Optional) File validation here
 
         try:
-            # Lưu UserUpload, status mặc định là 'pending' (đã định nghĩa trong model)
-            instance = serializer.save(uploaded_by=current_user, file=file_obj)
-            print(f"DEBUG (UserUploadAPIView): File uploaded by {current_user.email}, ID: {instance.id}, Initial Status: {instance.status}")
-
-            # ---- TRIGGER GỬI TASK CHO RPI QUA WEBSOCKET ----
-            if CHANNELS_INSTALLED_SUCCESSFULLY:
-                channel_layer = get_channel_layer()
-                if channel_layer is None:
-                     print(f"ERROR (UserUploadAPIView): Channel layer is None! Cannot send task notification for upload {instance.id}.")
-                else:
-                     rpi_group_name = "rpi_workers_group" # Group RPi lắng nghe
-                     task_message = {
-                         "type": "new_upload", # Loại task để RPi biết
-                         "upload_id": instance.id
-                         # Có thể thêm các thông tin khác nếu RPi cần
-                     }
-                     try:
-                         # Gửi message vào group của RPi
-                         async_to_sync(channel_layer.group_send)(
-                             rpi_group_name,
-                             {
-                                 "type": "rpi.new.task", # Gọi hàm rpi_new_task trong RPiTaskConsumer
-                                 "message": task_message
-                             }
-                         )
-                         print(f"DEBUG (UserUploadAPIView): Sent task notification for upload {instance.id} to group {rpi_group_name}")
-
-                         # Cập nhật status thành 'assigned' sau khi gửi thông báo thành công
-                         instance.status = UserUpload.STATUS_ASSIGNED # Đảm bảo STATUS_ASSIGNED định nghĩa trong model
-                         if hasattr(instance, 'updated_at'):
-                             instance.updated_at = timezone.now() # Cần import timezone
-                             instance.save(update_fields=['status', 'updated_at'])
-                         else:
-                              instance.save(update_fields=['status'])
-                         print(f"DEBUG (UserUploadAPIView): UserUpload ID {instance.id} status updated to {instance.status}")
-
-                     except Exception as ws_send_error:
-                         print(f"ERROR (UserUploadAPIView): Could not send task notification for upload {instance.id}: {ws_send_error}")
-                         traceback.print_exc()
-                         # Giữ status là 'pending' nếu gửi task thất bại
-                         instance.status = UserUpload.STATUS_PENDING
-                         instance.save(update_fields=['status'])
-                         print(f"WARNING (UserUploadAPIView): UserUpload ID {instance.id} status kept as pending due to WS send error.")
-            # ---------------------------------------------
+            # Lưu UserUpload ở trạng thái 'pending' (chuyển sang 'assigned_to_rpi' khi RPi báo đã nhận, xem
+            # UploadProgressAPIView) và ghi thông báo task mới cho RPi (group rpi_workers_group) cùng vị trí hàng đợi
+            # vào outbox (jobs/outbox.py); INSERT, tóm tắt dashboard (stats.UserSummary, qua signal) và outbox nằm
+            # trong cùng transaction, thông báo chỉ được gửi sau khi commit
+            with profile_span(SPAN_STORAGE), transaction.atomic(): # Ghi file + INSERT (thời gian DB được tính riêng)
+                instance = serializer.save(uploaded_by=current_user, file=file_obj)
+                publish(RPI_GROUP_NAME, "rpi.new.task", {"type": "new_upload", "upload_id": instance.id})
+                publish(
+                    get_upload_status_group_name(instance.id), "send.upload.progress",
+                    build_progress_payload(instance.id, STAGE_QUEUED, queue_position=get_queue_position(instance.id)),
+                )
+            logger.debug("UserUploadAPIView: File uploaded by %s, ID: %s, Initial Status: %s", current_user.email, instance.id, instance.status)
 
         except Exception as e:
-            print(f"Error saving UserUpload for user {current_user.id}: {e}")
-            traceback.print_exc()
+            logger.exception("Error saving UserUpload for user %s: %s", current_user.id, e)
             raise
 
-# --- 2. API ĐỂ LẤY FILE MEDIA ĐÃ UPLOAD (CHO RPI/BACKEND - GIỮ NGUYÊN AllowAny) ---
+# --- 2. API ĐỂ RPI BÁO CÁO TIẾN ĐỘ XỬ LÝ MỘT UPLOAD ---
+class UploadProgressAPIView(APIView):
+    """
+    API endpoint để RPi báo cáo tiến độ xử lý một file upload.
+    Server chuyển tiếp sự kiện qua WebSocket ws/upload-status/{upload_id}/ (đã được gộp/giới hạn tần suất).
+    POST: /api/uploads/progress/{upload_id}/
+    Header: X-RPi-Key: <RPI_API_KEY>
+    Body: {"stage": "claimed" | "processing", "percent": 0-100, "partial_detections": [...]}
+    """
+    # Chỉ RPi (header X-RPi-Key) được phát tiến độ tới WebSocket của người dùng
+    permission_classes = [HasRPiAPIKey]
+
+    def post(self, request, upload_id, *args, **kwargs):
+        serializer = UploadProgressInputSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        upload = get_object_or_404(UserUpload, pk=upload_id)
+        if upload.status in (UserUpload.STATUS_COMPLETED, UserUpload.STATUS_FAILED):
+            return Response({"detail": "Upload này đã kết thúc xử lý."}, status=status.HTTP_409_CONFLICT)
+
+        # RPi đã nhận task: upload rời trạng thái 'pending'
+        if data['stage'] == STAGE_CLAIMED and upload.status == UserUpload.STATUS_PENDING:
+            upload.status = UserUpload.STATUS_ASSIGNED
+            upload.save(update_fields=['status', 'updated_at'])
+
+        sent = send_upload_progress(
+            upload.id,
+            data['stage'],
+            percent=data.get('percent'),
+            partial_detections=data.get('partial_detections'),
+        )
+        return Response({"status": "progress_relayed" if sent else "progress_not_relayed"}, status=status.HTTP_200_OK)
+
+MEDIA_MIME_TYPES = {
+    'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png',
+    'gif': 'image/gif', 'mp4': 'video/mp4', 'mov': 'video/quicktime',
+    'avi': 'video/x-msvideo',
+}
+
+
+def encode_media_as_data_uri(file_bytes, file_name):
+    """Mã hóa nội dung file thành data URI base64. Trả về (mime_type, data_uri)."""
+    file_ext = file_name.split('.')[-1].lower()
+    mime_type = MEDIA_MIME_TYPES.get(file_ext, 'application/octet-stream')
+    base64_string = base64.b64encode(file_bytes).decode('utf-8')
+    return mime_type, f"data:{mime_type};base64,{base64_string}"
+
+
+# --- 3. API ĐỂ LẤY FILE MEDIA ĐÃ UPLOAD (CHO RPI/BACKEND - GIỮ NGUYÊN AllowAny) ---
 class GetMediaForProcessingAPIView(APIView):
     """
     API endpoint để lấy nội dung file (ảnh/video) đã được user upload
@@ -131,22 +146,12 @@ class GetMediaForProcessingAPIView(APIView):
             return Response({"detail": "File không tồn tại trên hệ thống lưu trữ."}, status=status.HTTP_404_NOT_FOUND)
 
         try:
-            with upload.file.open('rb') as file_content:
-                file_bytes = file_content.read()
-
-            base64_encoded_data = base64.b64encode(file_bytes)
-            base64_string = base64_encoded_data.decode('utf-8')
+            with profile_span(SPAN_STORAGE):
+                with upload.file.open('rb') as file_content:
+                    file_bytes = file_content.read()
 
             file_name = os.path.basename(upload.file.name)
-            file_ext = file_name.split('.')[-1].lower()
-            mime_map = {
-                'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png',
-                'gif': 'image/gif', 'mp4': 'video/mp4', 'mov': 'video/quicktime',
-                'avi': 'video/x-msvideo',
-            }
-            mime_type = mime_map.get(file_ext, 'application/octet-stream')
-
-            data_uri = f"data:{mime_type};base64,{base64_string}"
+            mime_type, data_uri = encode_media_as_data_uri(file_bytes, file_name)
 
             response_data = {
                 "upload_id": upload.id,
@@ -158,9 +163,8 @@ class GetMediaForProcessingAPIView(APIView):
             return Response(response_data, status=status.HTTP_200_OK)
 
         except FileNotFoundError:
-             print(f"Error: File not found on disk for ID {upload_id} (Path: {upload.file.name})")
+             logger.error("File not found on disk for ID %s (Path: %s)", upload_id, upload.file.name)
              return Response({"detail": "File không tìm thấy trên hệ thống lưu trữ (disk error)."}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
-            print(f"Error reading/encoding file ID {upload_id} (Path: {upload.file.name}): {e}")
-            traceback.print_exc()
+            logger.exception("Error reading/encoding file ID %s (Path: %s): %s", upload_id, upload.file.name, e)
             return Response({"detail": "Lỗi máy chủ khi xử lý file."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)